@@ -0,0 +1,57 @@
+"""add user_stats aggregate for achievements
+
+Revision ID: 20261016_user_stats
+Revises: 20261016_vector_hnsw
+Create Date: 2026-10-16
+
+Проверка достижений считала COUNT по chat_history, distinct-даты и сканировала
+все тексты сообщений пользователя на каждое сообщение. Агрегат user_stats
+обновляется одним UPDATE при записи; заполняется scripts/backfill_user_stats.py
+(или лениво при первом обращении к пользователю).
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "20261016_user_stats"
+down_revision: Union[str, None] = "20261016_vector_hnsw"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _counter(name: str, column_type: sa.types.TypeEngine | None = None) -> sa.Column:
+    return sa.Column(name, column_type or sa.Integer(), nullable=False, server_default="0")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_stats",
+        sa.Column("user_telegram_id", sa.BigInteger(), nullable=False),
+        _counter("total_messages"),
+        _counter("total_questions"),
+        _counter("subjects_mask", sa.BigInteger()),
+        _counter("current_streak"),
+        sa.Column("last_active_date", sa.Date(), nullable=True),
+        _counter("total_game_wins"),
+        _counter("total_game_sessions"),
+        _counter("tic_tac_toe_wins"),
+        _counter("checkers_wins"),
+        _counter("best_2048_score"),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_telegram_id"],
+            ["users.telegram_id"],
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("user_telegram_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("user_stats")
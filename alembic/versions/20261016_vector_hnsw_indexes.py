@@ -0,0 +1,49 @@
+"""replace ivfflat with hnsw on knowledge_embeddings and embedding_cache
+
+Revision ID: 20261016_vector_hnsw
+Revises: 20260223_climb_fall
+Create Date: 2026-10-16
+
+IVFFlat строился на пустых таблицах (lists=100 без данных — плохие центроиды,
+recall падает по мере роста). HNSW не требует обучения и держит задержку
+при росте таблицы; recall настраивается через hnsw.ef_search на запрос.
+Индексы строятся CONCURRENTLY, чтобы не блокировать запись.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "20261016_vector_hnsw"
+down_revision: Union[str, None] = "20260223_climb_fall"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_TABLES = ("knowledge_embeddings", "embedding_cache")
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table in _TABLES:
+            op.execute(
+                f"""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_embedding_hnsw_idx
+                ON {table}
+                USING hnsw (embedding vector_cosine_ops)
+                WITH (m = 16, ef_construction = 64)
+                """
+            )
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {table}_embedding_idx")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table in _TABLES:
+            op.execute(
+                f"""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_embedding_idx
+                ON {table}
+                USING ivfflat (embedding vector_cosine_ops)
+                WITH (lists = 100)
+                """
+            )
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {table}_embedding_hnsw_idx")
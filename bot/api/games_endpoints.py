@@ -5,24 +5,27 @@ API endpoints для игр PandaPalGo
 from aiohttp import web
 from loguru import logger
 from pydantic import BaseModel, ValidationError
+from sqlalchemy import select
 
 from bot.api.validators import require_owner, validate_telegram_id
-from bot.database import get_db
+from bot.database import get_async_db
 from bot.models import GameSession
 from bot.services.games_service import GamesService
 
 
-def _require_game_session_owner(request: web.Request, session_id: int) -> web.Response | None:
+async def _require_game_session_owner(request: web.Request, session_id: int) -> web.Response | None:
     """
     A01: проверка владельца игровой сессии.
     Возвращает 404 если сессия не найдена, 403 если запрос не от владельца, иначе None.
     """
-    with get_db() as db:
-        session = db.get(GameSession, session_id)
-        if not session:
-            return web.json_response({"error": "Session not found"}, status=404)
-        if err := require_owner(request, session.user_telegram_id):
-            return err
+    async with get_async_db() as db:
+        owner_id = await db.scalar(
+            select(GameSession.user_telegram_id).where(GameSession.id == session_id)
+        )
+    if owner_id is None:
+        return web.json_response({"error": "Session not found"}, status=404)
+    if err := require_owner(request, owner_id):
+        return err
     return None
 
 
@@ -167,12 +170,12 @@ async def create_game(request: web.Request) -> web.Response:
                 status=500,
             )
 
-        with get_db() as db:
-            games_service = GamesService(db)
-            session = games_service.create_game_session(
-                telegram_id, validated.game_type, initial_state
+        async with get_async_db() as db:
+            session = await db.run_sync(
+                lambda s: GamesService(s).create_game_session(
+                    telegram_id, validated.game_type, initial_state
+                )
             )
-            db.commit()
 
             # Сохраняем данные до закрытия сессии
             session_id = session.id
@@ -206,7 +209,7 @@ async def tic_tac_toe_move(request: web.Request) -> web.Response:
     """
     try:
         session_id = int(request.match_info["session_id"])
-        if err := _require_game_session_owner(request, session_id):
+        if err := await _require_game_session_owner(request, session_id):
             return err
         data = await request.json()
 
@@ -220,10 +223,10 @@ async def tic_tac_toe_move(request: web.Request) -> web.Response:
         if validated.position < 0 or validated.position > 8:
             return web.json_response({"error": "Position must be 0-8"}, status=400)
 
-        with get_db() as db:
-            games_service = GamesService(db)
-            result = await games_service.tic_tac_toe_make_move(session_id, validated.position)
-            db.commit()
+        async with get_async_db() as db:
+            result = await db.run_sync(
+                lambda s: GamesService(s).tic_tac_toe_apply_move(session_id, validated.position)
+            )
 
         return web.json_response({"success": True, **result})
 
@@ -245,7 +248,7 @@ async def checkers_move(request: web.Request) -> web.Response:
     """
     try:
         session_id = int(request.match_info["session_id"])
-        if err := _require_game_session_owner(request, session_id):
+        if err := await _require_game_session_owner(request, session_id):
             return err
         data = await request.json()
 
@@ -264,19 +267,18 @@ async def checkers_move(request: web.Request) -> web.Response:
                 {"error": "All coordinates must be between 0 and 7"}, status=400
             )
 
-        with get_db() as db:
-            games_service = GamesService(db)
+        async with get_async_db() as db:
             try:
-                result = await games_service.checkers_move(
-                    session_id,
-                    validated.from_row,
-                    validated.from_col,
-                    validated.to_row,
-                    validated.to_col,
+                result = await db.run_sync(
+                    lambda s: GamesService(s).checkers_apply_move(
+                        session_id,
+                        validated.from_row,
+                        validated.from_col,
+                        validated.to_row,
+                        validated.to_col,
+                    )
                 )
-                db.commit()
             except Exception as e:
-                db.rollback()
                 logger.error(f"❌ Ошибка в checkers_move: {e}", exc_info=True)
                 raise
 
@@ -300,7 +302,7 @@ async def game_2048_move(request: web.Request) -> web.Response:
     """
     try:
         session_id = int(request.match_info["session_id"])
-        if err := _require_game_session_owner(request, session_id):
+        if err := await _require_game_session_owner(request, session_id):
             return err
         data = await request.json()
 
@@ -314,10 +316,10 @@ async def game_2048_move(request: web.Request) -> web.Response:
         if validated.direction not in ["up", "down", "left", "right"]:
             return web.json_response({"error": "Invalid direction"}, status=400)
 
-        with get_db() as db:
-            games_service = GamesService(db)
-            result = games_service.game_2048_move(session_id, validated.direction)
-            db.commit()
+        async with get_async_db() as db:
+            result = await db.run_sync(
+                lambda s: GamesService(s).game_2048_move(session_id, validated.direction)
+            )
 
         return web.json_response({"success": True, **result})
 
@@ -339,7 +341,7 @@ async def erudite_place_tile(request: web.Request) -> web.Response:
     """
     try:
         session_id = int(request.match_info["session_id"])
-        if err := _require_game_session_owner(request, session_id):
+        if err := await _require_game_session_owner(request, session_id):
             return err
         data = await request.json()
 
@@ -350,12 +352,12 @@ async def erudite_place_tile(request: web.Request) -> web.Response:
                 {"error": "Invalid request", "details": e.errors()}, status=400
             )
 
-        with get_db() as db:
-            games_service = GamesService(db)
-            state = games_service.erudite_move(
-                session_id, validated.row, validated.col, validated.letter
+        async with get_async_db() as db:
+            state = await db.run_sync(
+                lambda s: GamesService(s).erudite_move(
+                    session_id, validated.row, validated.col, validated.letter
+                )
             )
-            db.commit()
 
         return web.json_response({"success": True, **state})
 
@@ -376,13 +378,11 @@ async def erudite_clear_move(request: web.Request) -> web.Response:
     """
     try:
         session_id = int(request.match_info["session_id"])
-        if err := _require_game_session_owner(request, session_id):
+        if err := await _require_game_session_owner(request, session_id):
             return err
 
-        with get_db() as db:
-            games_service = GamesService(db)
-            state = games_service.erudite_clear_move(session_id)
-            db.commit()
+        async with get_async_db() as db:
+            state = await db.run_sync(lambda s: GamesService(s).erudite_clear_move(session_id))
 
         return web.json_response({"success": True, **state})
 
@@ -403,13 +403,11 @@ async def erudite_confirm_move(request: web.Request) -> web.Response:
     """
     try:
         session_id = int(request.match_info["session_id"])
-        if err := _require_game_session_owner(request, session_id):
+        if err := await _require_game_session_owner(request, session_id):
             return err
 
-        with get_db() as db:
-            games_service = GamesService(db)
-            state = games_service.erudite_confirm_move(session_id)
-            db.commit()
+        async with get_async_db() as db:
+            state = await db.run_sync(lambda s: GamesService(s).erudite_confirm_move(session_id))
 
         return web.json_response({"success": True, **state})
 
@@ -430,13 +428,11 @@ async def erudite_pass_move(request: web.Request) -> web.Response:
     """
     try:
         session_id = int(request.match_info["session_id"])
-        if err := _require_game_session_owner(request, session_id):
+        if err := await _require_game_session_owner(request, session_id):
             return err
 
-        with get_db() as db:
-            games_service = GamesService(db)
-            state = games_service.erudite_pass_move(session_id)
-            db.commit()
+        async with get_async_db() as db:
+            state = await db.run_sync(lambda s: GamesService(s).erudite_pass_move(session_id))
 
         return web.json_response({"success": True, **state})
 
@@ -465,9 +461,10 @@ async def get_game_stats(request: web.Request) -> web.Response:
 
         game_type = request.query.get("game_type")
 
-        with get_db() as db:
-            games_service = GamesService(db)
-            stats = games_service.get_game_stats(telegram_id, game_type)
+        async with get_async_db() as db:
+            stats = await db.run_sync(
+                lambda s: GamesService(s).get_game_stats(telegram_id, game_type)
+            )
 
         return web.json_response({"success": True, "stats": stats})
 
@@ -488,11 +485,11 @@ async def get_game_session(request: web.Request) -> web.Response:
     """
     try:
         session_id = int(request.match_info["session_id"])
-        if err := _require_game_session_owner(request, session_id):
+        if err := await _require_game_session_owner(request, session_id):
             return err
 
-        with get_db() as db:
-            session = db.get(GameSession, session_id)
+        async with get_async_db() as db:
+            session = await db.get(GameSession, session_id)
             if not session:
                 return web.json_response({"error": "Session not found"}, status=404)
             session_dict = session.to_dict()
@@ -516,12 +513,13 @@ async def get_checkers_valid_moves(request: web.Request) -> web.Response:
     """
     try:
         session_id = int(request.match_info["session_id"])
-        if err := _require_game_session_owner(request, session_id):
+        if err := await _require_game_session_owner(request, session_id):
             return err
 
-        with get_db() as db:
-            games_service = GamesService(db)
-            result = games_service.get_checkers_valid_moves(session_id)
+        async with get_async_db() as db:
+            result = await db.run_sync(
+                lambda s: GamesService(s).get_checkers_valid_moves(session_id)
+            )
 
         return web.json_response(
             {
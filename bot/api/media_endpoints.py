@@ -0,0 +1,51 @@
+"""
+Раздача картинок из content-addressed хранилища.
+
+GET /media/{sha256}.{png|jpg}
+
+Имя — хэш содержимого, поэтому ответ неизменяем: Cache-Control
+immutable на год и ETag = хэш (If-None-Match -> 304 без чтения файла).
+"""
+
+import asyncio
+
+from aiohttp import web
+from loguru import logger
+
+from bot.services.media_store import MEDIA_CONTENT_TYPES, MEDIA_NAME_RE, get_media_store
+
+MEDIA_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+async def serve_media(request: web.Request) -> web.Response:
+    """Отдать картинку по имени <sha256>.<расширение>."""
+    match = MEDIA_NAME_RE.match(request.match_info.get("name", ""))
+    if not match:
+        return web.Response(status=404, text="Not Found")
+
+    etag = match.group("digest")
+    headers = {"Cache-Control": MEDIA_CACHE_CONTROL, "ETag": f'"{etag}"'}
+    if_none_match = request.if_none_match
+    if if_none_match and any(tag.value in (etag, "*") for tag in if_none_match):
+        return web.Response(status=304, headers=headers)
+
+    try:
+        data = await asyncio.to_thread(get_media_store().get, match.group(0))
+    except OSError as e:
+        logger.error(f"❌ Ошибка чтения медиа {match.group(0)}: {e}")
+        return web.Response(status=503, text="Media storage unavailable")
+    if data is None:
+        return web.Response(status=404, text="Not Found")
+
+    return web.Response(
+        body=data,
+        content_type=MEDIA_CONTENT_TYPES[match.group("extension")],
+        headers=headers,
+    )
+
+
+def setup_media_routes(app: web.Application) -> None:
+    """Регистрация маршрута раздачи медиа"""
+    app.router.add_get("/media/{name}", serve_media)
+
+    logger.info("✅ Media routes зарегистрированы")
@@ -8,6 +8,7 @@ Mini App API endpoints модуль.
 - chat_stream: streaming чат
 - other: логи, предметы
 - helpers: вспомогательные функции
+- media_upload: бинарная загрузка фото и аудио (multipart/form-data)
 """
 
 import asyncio
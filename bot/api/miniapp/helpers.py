@@ -9,15 +9,15 @@ import httpx
 from aiohttp import web
 from loguru import logger
 
-from bot.database import get_db
-from bot.services import UserService
+from bot.database import get_async_db
+from bot.services import AsyncUserService
 from bot.services.speech_service import get_speech_service
 from bot.services.translate_service import get_translate_service
 from bot.services.vision_service import VisionService
 
 
 async def process_audio_message(
-    audio_base64: str,
+    audio: bytes | str,
     telegram_id: int,
     message: str,
     language_code: str | None = None,
@@ -25,34 +25,42 @@ async def process_audio_message(
     """
     Обработка голосового сообщения.
 
+    Args:
+        audio: Байты аудио (multipart) или base64 строка (JSON)
+
     Returns:
         tuple: (user_message, error_response) - если error_response не None, вернуть его
     """
     try:
         logger.info(f"🎤 Mini App: Обработка голосового сообщения от {telegram_id}")
-        logger.info(f"🎤 Mini App: audio_base64 length: {len(audio_base64)}")
 
-        if "base64," in audio_base64:
-            audio_base64 = audio_base64.split("base64,")[1]
-            logger.info(f"🎤 Mini App: После удаления префикса, length: {len(audio_base64)}")
+        if isinstance(audio, str):
+            audio_base64 = audio
+            logger.info(f"🎤 Mini App: audio_base64 length: {len(audio_base64)}")
 
-        MAX_AUDIO_BASE64_SIZE = 14 * 1024 * 1024  # 14MB
-        if len(audio_base64) > MAX_AUDIO_BASE64_SIZE:
-            logger.warning(f"⚠️ Аудио слишком большое: {len(audio_base64)} байт")
-            return None, web.json_response(
-                {"error": "Аудио слишком большое. Максимум 10MB. Попробуй записать короче!"},
-                status=413,
-            )
+            if "base64," in audio_base64:
+                audio_base64 = audio_base64.split("base64,")[1]
+                logger.info(f"🎤 Mini App: После удаления префикса, length: {len(audio_base64)}")
 
-        try:
-            audio_bytes = base64.b64decode(audio_base64)
-            logger.info(f"🎤 Mini App: Декодировано {len(audio_bytes)} байт аудио")
-        except Exception as decode_error:
-            logger.error(f"❌ Ошибка декодирования base64 аудио: {decode_error}")
-            return None, web.json_response(
-                {"error": "Неверный формат аудио. Попробуй записать заново!"},
-                status=400,
-            )
+            MAX_AUDIO_BASE64_SIZE = 14 * 1024 * 1024  # 14MB
+            if len(audio_base64) > MAX_AUDIO_BASE64_SIZE:
+                logger.warning(f"⚠️ Аудио слишком большое: {len(audio_base64)} байт")
+                return None, web.json_response(
+                    {"error": "Аудио слишком большое. Максимум 10MB. Попробуй записать короче!"},
+                    status=413,
+                )
+
+            try:
+                audio_bytes = base64.b64decode(audio_base64)
+                logger.info(f"🎤 Mini App: Декодировано {len(audio_bytes)} байт аудио")
+            except Exception as decode_error:
+                logger.error(f"❌ Ошибка декодирования base64 аудио: {decode_error}")
+                return None, web.json_response(
+                    {"error": "Неверный формат аудио. Попробуй записать заново!"},
+                    status=400,
+                )
+        else:
+            audio_bytes = audio
 
         MAX_AUDIO_SIZE = 10 * 1024 * 1024  # 10MB
         if len(audio_bytes) > MAX_AUDIO_SIZE:
@@ -141,77 +149,84 @@ async def process_audio_message(
 
 
 async def process_photo_message(
-    photo_base64: str, telegram_id: int, message: str
+    photo: bytes | str, telegram_id: int, message: str
 ) -> tuple[str | None, web.Response | None]:
     """
     Обработка фото сообщения.
 
+    Args:
+        photo: Байты изображения (multipart) или base64 строка (JSON)
+
     Returns:
         tuple: (user_message, error_response) - если error_response не None, вернуть его
     """
     try:
         logger.info(f"📷 Mini App: Обработка фото от {telegram_id}")
-        logger.info(f"📷 Mini App: photo_base64 length: {len(photo_base64)}")
+        if isinstance(photo, str):
+            photo_base64 = photo
+            logger.info(f"📷 Mini App: photo_base64 length: {len(photo_base64)}")
 
-        if "base64," in photo_base64:
-            photo_base64 = photo_base64.split("base64,")[1]
-            logger.info(f"📷 Mini App: После удаления префикса, length: {len(photo_base64)}")
+            if "base64," in photo_base64:
+                photo_base64 = photo_base64.split("base64,")[1]
+                logger.info(f"📷 Mini App: После удаления префикса, length: {len(photo_base64)}")
 
-        photo_bytes = base64.b64decode(photo_base64)
-        logger.info(f"📷 Mini App: Декодировано {len(photo_bytes)} байт изображения")
+            photo_bytes = base64.b64decode(photo_base64)
+            logger.info(f"📷 Mini App: Декодировано {len(photo_bytes)} байт изображения")
+        else:
+            photo_bytes = photo
 
-        with get_db() as db:
-            user_service = UserService(db)
-            user = user_service.get_user_by_telegram_id(telegram_id)
+        # Соединение нужно только для возраста: закрываем его до вызова Vision
+        async with get_async_db() as db:
+            user = await AsyncUserService(db).get_user_by_telegram_id(telegram_id)
 
-            if not user:
-                return None, web.json_response({"error": "User not found"}, status=404)
+        if not user:
+            return None, web.json_response({"error": "User not found"}, status=404)
 
-            vision_service = VisionService()
-            logger.info(f"📷 Mini App: Вызываю analyze_image для пользователя {user.age} лет")
-            # Формируем запрос с требованием полного ответа с примерами
-            vision_prompt = (
-                message or "Проанализируй это фото с заданием и реши задачу полностью и подробно"
-            )
-            if "полностью" not in vision_prompt.lower() and "подробно" not in vision_prompt.lower():
-                vision_prompt += (
-                    ". Реши задачу полностью и подробно: разбери задачу пошагово, "
-                    "объясни каждый шаг, приведи примеры, дай исчерпывающее объяснение с пояснениями. "
-                    "Ответ должен быть глубоким и развернутым с примерами."
-                )
-            vision_result = await vision_service.analyze_image(
-                image_data=photo_bytes,
-                user_message=vision_prompt,
-                user_age=user.age,
+        vision_service = VisionService()
+        logger.info(f"📷 Mini App: Вызываю analyze_image для пользователя {user.age} лет")
+        # Формируем запрос с требованием полного ответа с примерами
+        vision_prompt = (
+            message or "Проанализируй это фото с заданием и реши задачу полностью и подробно"
+        )
+        if "полностью" not in vision_prompt.lower() and "подробно" not in vision_prompt.lower():
+            vision_prompt += (
+                ". Реши задачу полностью и подробно: разбери задачу пошагово, "
+                "объясни каждый шаг, приведи примеры, дай исчерпывающее объяснение с пояснениями. "
+                "Ответ должен быть глубоким и развернутым с примерами."
             )
+        vision_result = await vision_service.analyze_image(
+            image_data=photo_bytes,
+            user_message=vision_prompt,
+            user_age=user.age,
+        )
 
-            # КРИТИЧЕСКИ ВАЖНО: Если Vision API дал готовый ответ - возвращаем его как готовый
-            if vision_result.analysis and vision_result.analysis.strip():
-                # Vision API уже решил задачу - возвращаем готовый ответ с маркером
-                logger.info(
-                    f"✅ Фото проанализировано, готовый ответ получен: {len(vision_result.analysis)} символов"
-                )
-                # Возвращаем специальный маркер в начале строки
-                return f"__READY_ANSWER__{vision_result.analysis}", None
-
-            # Если Vision API не дал готовый ответ - используем распознанный текст
-            if vision_result.recognized_text:
-                user_message = (
-                    f"На фото написано: {vision_result.recognized_text}\n\n"
-                    f"Помоги решить эту задачу полностью и подробно: "
-                    f"разбери задачу пошагово, объясни каждый шаг, приведи примеры, "
-                    f"дай исчерпывающее объяснение с пояснениями. "
-                    f"Ответ должен быть глубоким и развернутым с примерами."
-                )
-            else:
-                user_message = (message or "Помоги мне разобраться с этой задачей") + (
-                    "\n\nДай исчерпывающее объяснение с примерами: "
-                    "разбери задачу пошагово, объясни каждый шаг, приведи примеры. "
-                    "Ответ должен быть глубоким и развернутым."
-                )
+        # КРИТИЧЕСКИ ВАЖНО: Если Vision API дал готовый ответ - возвращаем его как готовый
+        if vision_result.analysis and vision_result.analysis.strip():
+            # Vision API уже решил задачу - возвращаем готовый ответ с маркером
+            logger.info(
+                f"✅ Фото проанализировано, готовый ответ получен: {len(vision_result.analysis)} символов"
+            )
+            # Возвращаем специальный маркер в начале строки
+            return f"__READY_ANSWER__{vision_result.analysis}", None
+
+        # Если Vision API не дал готовый ответ - используем распознанный текст
+        if vision_result.recognized_text:
+            user_message = (
+                f"На фото написано: {vision_result.recognized_text}\n\n"
+                f"Помоги решить эту задачу полностью и подробно: "
+                f"разбери задачу пошагово, объясни каждый шаг, приведи примеры, "
+                f"дай исчерпывающее объяснение с пояснениями. "
+                f"Ответ должен быть глубоким и развернутым с примерами."
+            )
+        else:
+            user_message = (message or "Помоги мне разобраться с этой задачей") + (
+                "\n\nДай исчерпывающее объяснение с примерами: "
+                "разбери задачу пошагово, объясни каждый шаг, приведи примеры. "
+                "Ответ должен быть глубоким и развернутым."
+            )
 
-            logger.info(f"✅ Фото проанализировано, текст распознан: {len(user_message)} символов")
-            return user_message, None
+        logger.info(f"✅ Фото проанализировано, текст распознан: {len(user_message)} символов")
+        return user_message, None
 
     except Exception as e:
         logger.error(f"❌ Ошибка обработки фото: {e}", exc_info=True)
@@ -8,6 +8,11 @@ from aiohttp import web
 from loguru import logger
 from pydantic import ValidationError
 
+from bot.api.miniapp.media_upload import (
+    MediaUploadError,
+    is_multipart_request,
+    read_media_upload,
+)
 from bot.api.validators import HomeworkCheckRequest, require_owner, validate_telegram_id
 from bot.database import get_db
 from bot.services import UserService
@@ -26,9 +31,19 @@ async def miniapp_check_homework(request: web.Request) -> web.Response:
         "topic": "дроби",  # опционально
         "message": "Проверь это задание"  # опционально
     }
+    или multipart/form-data: поля telegram_id, subject, topic, message
+    и файл photo (бинарно, без base64)
     """
     try:
-        data = await request.json()
+        if is_multipart_request(request):
+            # Бинарный режим: фото байтами, лимит проверяется при чтении
+            try:
+                data = (await read_media_upload(request)).as_request_data()
+            except MediaUploadError as e:
+                logger.warning(f"⚠️ Multipart ДЗ отклонён ({e.status}): {e.message}")
+                return e.to_response()
+        else:
+            data = await request.json()
 
         # Валидация входных данных
         try:
@@ -71,17 +86,20 @@ async def miniapp_check_homework(request: web.Request) -> web.Response:
             # Получаем возраст пользователя для адаптации ответа
             user_age = user.age
 
-            # Декодируем фото из base64
-            try:
-                photo_base64 = validated.photo_base64
-                # Убираем префикс data:image/...;base64, если есть
-                if "," in photo_base64:
-                    photo_base64 = photo_base64.split(",", 1)[1]
-
-                image_data = base64.b64decode(photo_base64)
-            except Exception as e:
-                logger.error(f"❌ Ошибка декодирования фото: {e}")
-                return web.json_response({"error": "Invalid photo_base64 format"}, status=400)
+            if validated.photo_bytes:
+                image_data = validated.photo_bytes
+            else:
+                # Декодируем фото из base64
+                try:
+                    photo_base64 = validated.photo_base64
+                    # Убираем префикс data:image/...;base64, если есть
+                    if "," in photo_base64:
+                        photo_base64 = photo_base64.split(",", 1)[1]
+
+                    image_data = base64.b64decode(photo_base64)
+                except Exception as e:
+                    logger.error(f"❌ Ошибка декодирования фото: {e}")
+                    return web.json_response({"error": "Invalid photo_base64 format"}, status=400)
 
             # Проверяем ДЗ
             homework_service = HomeworkService(db)
@@ -0,0 +1,128 @@
+"""
+Бинарная загрузка фото и голосовых в Mini App (multipart/form-data).
+
+В JSON-режиме медиа приходит base64-строкой: тело буферизуется целиком,
+парсится JSON, отрезается префикс data:...;base64, и строка декодируется —
+несколько копий payload, раздутого в 1.33 раза. В multipart-режиме части
+читаются потоково через request.multipart() в ограниченные буферы: лимит
+проверяется во время чтения (413 без дочитывания тела), а сервисы
+получают исходные bytes без base64.
+
+Части формы:
+- photo, audio — файлы (бинарно, без Content-Transfer-Encoding)
+- telegram_id, message, language_code, stream_delta, subject, topic — текст
+
+JSON-режим (photo_base64/audio_base64) сохранён для совместимости.
+"""
+
+import io
+from dataclasses import dataclass, field
+
+from aiohttp import BodyPartReader, web
+
+MAX_PHOTO_BYTES = 10 * 1024 * 1024  # 10MB
+MAX_AUDIO_BYTES = 10 * 1024 * 1024  # 10MB
+MAX_TEXT_FIELD_BYTES = 16 * 1024
+# Запас на текстовые поля и заголовки частей
+MAX_MULTIPART_BYTES = MAX_PHOTO_BYTES + MAX_AUDIO_BYTES + 256 * 1024
+_CHUNK_SIZE = 64 * 1024
+
+MEDIA_PARTS: dict[str, int] = {"photo": MAX_PHOTO_BYTES, "audio": MAX_AUDIO_BYTES}
+TEXT_PARTS = frozenset(
+    {"telegram_id", "message", "language_code", "stream_delta", "subject", "topic"}
+)
+
+MEDIA_TOO_LARGE_MESSAGE = (
+    "Фото или аудио слишком большие. Уменьши размер фото или длину голосового."
+)
+
+
+class MediaUploadError(Exception):
+    """Ошибка чтения multipart-запроса (HTTP статус + сообщение для пользователя)."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+    def to_response(self) -> web.Response:
+        """JSON-ответ с ошибкой."""
+        return web.json_response({"error": self.message}, status=self.status)
+
+
+@dataclass
+class MediaUpload:
+    """
+    Разобранный multipart-запрос.
+
+    Attributes:
+        fields: Текстовые поля формы
+        photo: Байты фото или None
+        audio: Байты аудио или None
+    """
+
+    fields: dict[str, str] = field(default_factory=dict)
+    photo: bytes | None = None
+    audio: bytes | None = None
+
+    def as_request_data(self) -> dict:
+        """Данные для Pydantic-моделей запроса (AIChatRequest, HomeworkCheckRequest)."""
+        data: dict = dict(self.fields)
+        if self.photo:
+            data["photo_bytes"] = self.photo
+        if self.audio:
+            data["audio_bytes"] = self.audio
+        return data
+
+
+def is_multipart_request(request: web.Request) -> bool:
+    """Запрос пришёл в бинарном режиме (multipart/form-data)."""
+    return getattr(request, "content_type", None) == "multipart/form-data"
+
+
+async def read_media_upload(request: web.Request) -> MediaUpload:
+    """
+    Потоково прочитать multipart-запрос с фото/аудио.
+
+    Raises:
+        MediaUploadError: Превышен лимит размера (413) или неверный формат (400)
+    """
+    if request.content_length is not None and request.content_length > MAX_MULTIPART_BYTES:
+        raise MediaUploadError(MEDIA_TOO_LARGE_MESSAGE, status=413)
+
+    try:
+        reader = await request.multipart()
+    except (AssertionError, ValueError) as e:
+        raise MediaUploadError("Invalid multipart body") from e
+
+    upload = MediaUpload()
+    while (part := await reader.next()) is not None:
+        if not isinstance(part, BodyPartReader):
+            raise MediaUploadError("Nested multipart is not supported")
+
+        if part.name in MEDIA_PARTS:
+            content = await _read_part(part, MEDIA_PARTS[part.name], MEDIA_TOO_LARGE_MESSAGE)
+            setattr(upload, part.name, content or None)
+        elif part.name in TEXT_PARTS:
+            content = await _read_part(
+                part, MAX_TEXT_FIELD_BYTES, f"Поле {part.name} слишком длинное"
+            )
+            try:
+                upload.fields[part.name] = content.decode(part.get_charset(default="utf-8"))
+            except (LookupError, UnicodeDecodeError) as e:
+                raise MediaUploadError(f"Invalid encoding in field {part.name}") from e
+        else:
+            await part.release()
+
+    return upload
+
+
+async def _read_part(part: BodyPartReader, limit: int, too_large_message: str) -> bytes:
+    """Прочитать часть в буфер, прерываясь сразу при превышении лимита."""
+    buffer = io.BytesIO()
+    while chunk := await part.read_chunk(_CHUNK_SIZE):
+        if buffer.tell() + len(chunk) > limit:
+            raise MediaUploadError(too_large_message, status=413)
+        buffer.write(chunk)
+    # getvalue() отдаёт внутренний буфер BytesIO без копирования
+    return buffer.getvalue()
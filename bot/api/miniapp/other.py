@@ -2,6 +2,7 @@
 Endpoints для логов, предметов и истории чата.
 """
 
+import hashlib
 import json
 import random
 from contextlib import suppress
@@ -20,10 +21,16 @@ from bot.services.proactive_chat_service import (
 
 async def miniapp_get_chat_history(request: web.Request) -> web.Response:
     """
-    Получить историю чата.
+    Получить историю чата (страницами от новых к старым).
 
-    GET /api/miniapp/chat/history/{telegram_id}?limit=50
+    GET /api/miniapp/chat/history/{telegram_id}?limit=50&before=<cursor>&include=media
     Требует заголовок X-Telegram-Init-Data для проверки владельца ресурса.
+
+    - before: курсор nextCursor из предыдущего ответа (id самого старого
+      сообщения страницы) — сообщения старше него, keyset по (timestamp, id).
+    - include=media: добавить imageUrl/videoUrl (по умолчанию не загружаются).
+    - ETag/If-None-Match: если новых сообщений нет, ответ 304 стоит
+      одной пробы индекса (последнее сообщение пользователя).
     """
     try:
         # Безопасная валидация telegram_id
@@ -39,50 +46,93 @@ async def miniapp_get_chat_history(request: web.Request) -> web.Response:
 
         # Безопасная валидация limit
         limit = validate_limit(request.query.get("limit"), default=50, max_limit=100)
+        cursor = request.query.get("before") or None
+        if cursor is not None and not (cursor.isascii() and cursor.isdigit()):
+            return web.json_response({"error": "Invalid history cursor"}, status=400)
+        before = int(cursor) if cursor else None
+        include_media = "media" in request.query.get("include", "").split(",")
 
         with get_db() as db:
             history_service = ChatHistoryService(db)
-            messages = history_service.get_recent_history(telegram_id, limit=limit)
+            latest = history_service.get_latest_message_marker(telegram_id)
 
-            history_for_check = [
-                {
-                    "role": "user" if msg.message_type == "user" else "ai",
-                    "content": msg.message_text,
-                }
-                for msg in messages
-            ]
-            last_user_ts = history_service.get_last_user_message_timestamp(telegram_id)
-            add_proactive, proactive_type = should_add_proactive_message(
-                history_for_check, last_user_ts
+            # Проактивное сообщение добавляется только на первой странице и только
+            # если последнее сообщение — от пользователя; иначе ответ определяется ETag
+            may_add_proactive = (
+                before is None and latest is not None and latest.message_type == "user"
             )
-            if add_proactive and proactive_type:
-                user_service = UserService(db)
-                user = user_service.get_user_by_telegram_id(telegram_id)
-                user_gender = getattr(user, "gender", None) if user else None
-                proactive_text = get_proactive_message(proactive_type, user_gender)
-                history_service.add_message(telegram_id, proactive_text, "ai")
-                db.commit()
-                messages = history_service.get_recent_history(telegram_id, limit=limit)
-
-            history = [
-                {
-                    "role": "user" if msg.message_type == "user" else "ai",
-                    "content": msg.message_text,
-                    "timestamp": msg.timestamp.isoformat() if msg.timestamp else None,
-                    "imageUrl": msg.image_url if msg.image_url else None,
-                    "pandaReaction": getattr(msg, "panda_reaction", None) or None,
-                    "videoUrl": getattr(msg, "video_url", None) or None,
+            etag = _history_etag(latest, limit, cursor, include_media)
+            if not may_add_proactive and _etag_matches(request, etag):
+                return web.Response(status=304, headers=_history_cache_headers(etag))
+
+            rows = history_service.get_history_page(telegram_id, limit, before, include_media)
+
+            if may_add_proactive:
+                history_for_check = [
+                    {
+                        "role": "user" if row.message_type == "user" else "ai",
+                        "content": row.message_text,
+                    }
+                    for row in rows
+                ]
+                add_proactive, proactive_type = should_add_proactive_message(
+                    history_for_check, latest.timestamp
+                )
+                if add_proactive and proactive_type:
+                    user_service = UserService(db)
+                    user = user_service.get_user_by_telegram_id(telegram_id)
+                    user_gender = getattr(user, "gender", None) if user else None
+                    proactive_text = get_proactive_message(proactive_type, user_gender)
+                    history_service.add_message(telegram_id, proactive_text, "ai")
+                    db.commit()
+                    latest = history_service.get_latest_message_marker(telegram_id)
+                    etag = _history_etag(latest, limit, cursor, include_media)
+                    rows = history_service.get_history_page(
+                        telegram_id, limit, before, include_media
+                    )
+
+            history = []
+            for row in rows:
+                item = {
+                    "role": "user" if row.message_type == "user" else "ai",
+                    "content": row.message_text,
+                    "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+                    "pandaReaction": row.panda_reaction or None,
                 }
-                for msg in messages
-            ]
+                if include_media:
+                    item["imageUrl"] = row.image_url or None
+                    item["videoUrl"] = row.video_url or None
+                history.append(item)
+
+            next_cursor = str(rows[0].id) if len(rows) == limit else None
 
-            return web.json_response({"success": True, "history": history})
+            return web.json_response(
+                {"success": True, "history": history, "nextCursor": next_cursor},
+                headers=_history_cache_headers(etag),
+            )
 
     except Exception as e:
         logger.error(f"❌ Ошибка получения истории: {e}", exc_info=True)
         return web.json_response({"error": f"Internal server error: {str(e)}"}, status=500)
 
 
+def _history_etag(latest, limit: int, cursor: str | None, include_media: bool) -> str:
+    """ETag страницы истории: версия истории (последнее сообщение) + параметры запроса."""
+    version = f"{latest.id}:{latest.timestamp.isoformat()}" if latest is not None else "empty"
+    key = f"{version}|{limit}|{cursor or ''}|{int(include_media)}"
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def _etag_matches(request: web.Request, etag: str) -> bool:
+    if_none_match = request.if_none_match
+    return bool(if_none_match) and any(tag.value in (etag, "*") for tag in if_none_match)
+
+
+def _history_cache_headers(etag: str) -> dict[str, str]:
+    # private + no-cache: браузер хранит ответ, но перед использованием ревалидирует по ETag
+    return {"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"}
+
+
 async def miniapp_clear_chat_history(request: web.Request) -> web.Response:
     """
     Очистить историю чата.
@@ -0,0 +1,69 @@
+"""Снимок контекста чата: всё, что нужно стримингу из БД, читается одной короткой транзакцией."""
+
+from dataclasses import dataclass
+
+from bot.database import get_async_db
+
+
+@dataclass(frozen=True)
+class ChatContextSnapshot:
+    """
+    Неизменяемый снимок данных пользователя и истории для одного запроса.
+
+    После создания снимка соединение с БД возвращается в пул: RAG, стриминг
+    YandexGPT и рендеринг визуализаций работают только с этими данными.
+    """
+
+    username: str | None
+    user_age: int | None
+    history: tuple[dict, ...]
+    yandex_history: tuple[dict, ...]
+    system_prompt: str
+    is_history_cleared: bool
+    is_educational: bool
+    first_name: str | None = None
+    user_grade: int | None = None
+    user_gender: str | None = None
+    emoji_in_chat: bool | None = None
+
+
+async def load_context_snapshot(
+    telegram_id: int, normalized_message: str
+) -> ChatContextSnapshot | None:
+    """
+    Фаза 1 pipeline: прочитать контекст в одной транзакции.
+
+    Лимит здесь не проверяется: квота уже зарезервирована в check_premium_and_lazy.
+
+    Returns:
+        ChatContextSnapshot или None, если пользователь не найден.
+    """
+    from bot.services.miniapp.chat_context_service import MiniappChatContextService
+
+    async with get_async_db() as db:
+        try:
+            context = await db.run_sync(
+                lambda session: MiniappChatContextService(session).prepare_context(
+                    telegram_id=telegram_id,
+                    user_message=normalized_message,
+                    skip_premium_check=True,
+                )
+            )
+        except ValueError:
+            # prepare_context бросает ValueError, если пользователя нет
+            return None
+
+        user = context["user"]
+        return ChatContextSnapshot(
+            username=user.username,
+            user_age=user.age,
+            history=tuple(context["history"]),
+            yandex_history=tuple(context["yandex_history"]),
+            system_prompt=context["system_prompt"],
+            is_history_cleared=context["is_history_cleared"],
+            is_educational=context.get("is_educational", False),
+            first_name=user.first_name,
+            user_grade=user.grade,
+            user_gender=getattr(user, "gender", None),
+            emoji_in_chat=getattr(user, "emoji_in_chat", None),
+        )
@@ -0,0 +1,66 @@
+"""
+Delta-кодирование SSE-чанков ответа AI.
+
+YandexGPT присылает кумулятивный текст; в legacy-режиме каждый event: chunk
+повторяет весь ответ (трафик растёт квадратично). Клиент, приславший
+stream_delta=true, получает только новый суффикс:
+
+    event: delta     data: {"seq": N, "d": "<новый суффикс>"}
+    event: checksum  data: {"seq": N, "len": <длина в UTF-16>, "crc32": <crc32 UTF-8>}
+    event: resync    data: {"seq": N, "text": "<весь текст>"}
+
+seq растёт на 1 с каждым delta/resync. checksum приходит каждые
+checksum_every дельт; resync — когда новый текст не продолжает отправленный
+(модель переписала начало). При пропуске seq или несовпадении checksum
+клиент игнорирует дельты до resync или event: final.
+"""
+
+import json
+import zlib
+
+DELTA_CHECKSUM_EVERY = 32
+
+
+def text_checksum(text: str) -> int:
+    """CRC32 от UTF-8 байтов текста."""
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def utf16_length(text: str) -> int:
+    """Длина текста в UTF-16 code units (совпадает с String.length в JS)."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _sse(event: str, payload: dict) -> bytes:
+    data = json.dumps(payload, ensure_ascii=False)
+    return f"event: {event}\ndata: {data}\n\n".encode()
+
+
+class DeltaChunkEncoder:
+    """Состояние одного SSE-стрима: что уже отправлено клиенту."""
+
+    def __init__(self, checksum_every: int = DELTA_CHECKSUM_EVERY):
+        self.checksum_every = checksum_every
+        self.seq = 0
+        self._sent = ""
+
+    def encode(self, text: str) -> bytes:
+        """SSE-события для перехода от отправленного текста к text (b"" если нечего слать)."""
+        if text == self._sent:
+            return b""
+
+        self.seq += 1
+        if text.startswith(self._sent):
+            events = [_sse("delta", {"seq": self.seq, "d": text[len(self._sent) :]})]
+            if self.checksum_every > 0 and self.seq % self.checksum_every == 0:
+                events.append(
+                    _sse(
+                        "checksum",
+                        {"seq": self.seq, "len": utf16_length(text), "crc32": text_checksum(text)},
+                    )
+                )
+        else:
+            events = [_sse("resync", {"seq": self.seq, "text": text})]
+
+        self._sent = text
+        return b"".join(events)
@@ -7,6 +7,11 @@ import re
 from aiohttp import web
 from loguru import logger
 
+from bot.database import get_async_db
+from bot.services import AsyncChatHistoryService, AsyncPremiumFeaturesService
+from bot.services.media_store import get_media_store
+from bot.services.premium_features_service import LIMIT_REACHED_MESSAGE_TEXT
+from bot.services.request_quota import get_request_quota
 from bot.services.yandex_ai_response_generator import finalize_ai_response
 
 from ._utils import format_visualization_explanation as _format_visualization_explanation
@@ -25,9 +30,6 @@ async def run_fallback(
     model_name: str,
     user_message: str,
     telegram_id: int,
-    premium_service,
-    history_service,
-    db,
     visualization_service,
 ) -> bool:
     """Fallback на не-streaming запрос. Возвращает True если успешно."""
@@ -48,6 +50,7 @@ async def run_fallback(
     # Визуализация в fallback
     visualization_image_base64 = None
     try:
+        from bot.services.visualization.render_pool import render_visualization
         from bot.services.visualization_service import get_visualization_service
 
         viz_service = get_visualization_service()
@@ -92,8 +95,8 @@ async def run_fallback(
                     break
 
         if multiplication_number_fallback:
-            visualization_image = viz_service.generate_multiplication_table_image(
-                multiplication_number_fallback
+            visualization_image = await render_visualization(
+                "generate_multiplication_table_image", multiplication_number_fallback
             )
             if visualization_image:
                 visualization_image_base64 = viz_service.image_to_base64(visualization_image)
@@ -101,7 +104,7 @@ async def run_fallback(
                     f"📊 Stream: Fallback - сгенерирована таблица умножения на {multiplication_number_fallback}"
                 )
         elif general_table_fallback:
-            visualization_image = viz_service.generate_full_multiplication_table()
+            visualization_image = await render_visualization("generate_full_multiplication_table")
             if visualization_image:
                 visualization_image_base64 = viz_service.image_to_base64(visualization_image)
                 logger.info("📊 Stream: Fallback - сгенерирована полная таблица умножения")
@@ -136,17 +139,21 @@ async def run_fallback(
 
         if (general_graph_fallback or graph_match) and not visualization_image_base64:
             if re.search(r"(?:синусоид|sin)", combined_text_lower) or general_graph_fallback:
-                visualization_image = viz_service.generate_function_graph("sin(x)")
+                visualization_image = await render_visualization(
+                    "generate_function_graph", "sin(x)"
+                )
                 if visualization_image:
                     visualization_image_base64 = viz_service.image_to_base64(visualization_image)
                     logger.info("📈 Stream: Fallback - сгенерирован график синусоиды")
             elif re.search(r"(?:косинус|cos)", combined_text_lower):
-                visualization_image = viz_service.generate_function_graph("cos(x)")
+                visualization_image = await render_visualization(
+                    "generate_function_graph", "cos(x)"
+                )
                 if visualization_image:
                     visualization_image_base64 = viz_service.image_to_base64(visualization_image)
                     logger.info("📈 Stream: Fallback - сгенерирован график косинуса")
             elif re.search(r"(?:парабол)", combined_text_lower):
-                visualization_image = viz_service.generate_function_graph("x**2")
+                visualization_image = await render_visualization("generate_function_graph", "x**2")
                 if visualization_image:
                     visualization_image_base64 = viz_service.image_to_base64(visualization_image)
                     logger.info("📈 Stream: Fallback - сгенерирован график параболы")
@@ -158,7 +165,9 @@ async def run_fallback(
                     safe_expr = (
                         expression.replace("²", "**2").replace("³", "**3").replace("^", "**")
                     )
-                    visualization_image = viz_service.generate_function_graph(safe_expr)
+                    visualization_image = await render_visualization(
+                        "generate_function_graph", safe_expr
+                    )
                 if visualization_image:
                     visualization_image_base64 = viz_service.image_to_base64(visualization_image)
                     logger.info(f"📈 Stream: Fallback - сгенерирован график функции: {expression}")
@@ -220,34 +229,46 @@ async def run_fallback(
     limit_reached = False
     unlocked_achievements: list = []
     save_succeeded = False
+    image_url = None
+    if visualization_image_base64:
+        image_url = await get_media_store().image_url_from_base64(visualization_image_base64)
     try:
-        limit_reached, total_requests = premium_service.increment_request_count(telegram_id)
-
-        if limit_reached:
-            asyncio.create_task(premium_service.send_limit_reached_notification_async(telegram_id))
-            limit_msg_fb = premium_service.get_limit_reached_message_text()
-            history_service.add_message(telegram_id, limit_msg_fb, "ai")
+        # Короткая транзакция записи: соединение берётся только на время сохранения
+        async with get_async_db() as db:
+            premium_service = AsyncPremiumFeaturesService(db)
+            history_service = AsyncChatHistoryService(db)
+            quota = await get_request_quota().settle(telegram_id)
+            limit_reached = quota.limit_reached
+
+            if limit_reached:
+                asyncio.create_task(
+                    premium_service.send_limit_reached_notification_async(telegram_id)
+                )
+                limit_msg_fb = premium_service.get_limit_reached_message_text()
+                await history_service.add_message(telegram_id, limit_msg_fb, "ai")
 
-        history_service.add_message(telegram_id, user_message, "user")
-        image_url = None
-        if visualization_image_base64:
-            image_url = f"data:image/png;base64,{visualization_image_base64}"
-        history_service.add_message(telegram_id, cleaned_response, "ai", image_url=image_url)
+            await history_service.add_exchange(
+                telegram_id, user_message, cleaned_response, image_url=image_url
+            )
 
-        from bot.services.panda_lazy_service import PandaLazyService
+            from bot.services.panda_lazy_service import PandaLazyService
 
-        PandaLazyService(db).increment_consecutive_after_ai(telegram_id)
+            await db.run_sync(
+                lambda session: PandaLazyService(session).increment_consecutive_after_ai(
+                    telegram_id
+                )
+            )
 
-        from bot.services.gamification_service import GamificationService
+            from bot.services.gamification_service import AsyncGamificationService
 
-        gamification_service = GamificationService(db)
-        unlocked_achievements = gamification_service.process_message(telegram_id, user_message)
-        db.commit()
+            gamification_service = AsyncGamificationService(db)
+            unlocked_achievements = await gamification_service.process_message(
+                telegram_id, user_message
+            )
         save_succeeded = True
         logger.info(f"✅ Stream: Fallback успешен, ответ сохранен для {telegram_id}")
     except Exception as save_err:
         logger.error(f"❌ Stream: Ошибка сохранения fallback ответа: {save_err}")
-        db.rollback()
 
     if save_succeeded and unlocked_achievements:
         from bot.api.miniapp.helpers import send_achievements_event
@@ -257,7 +278,7 @@ async def run_fallback(
     # Сообщение при достижении лимита
     if limit_reached:
         limit_data_fb = json.dumps(
-            {"content": premium_service.get_limit_reached_message_text()},
+            {"content": LIMIT_REACHED_MESSAGE_TEXT},
             ensure_ascii=False,
         )
         await response.write(f"event: message\ndata: {limit_data_fb}\n\n".encode())
@@ -4,101 +4,170 @@ import asyncio
 
 from aiohttp import web
 from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.api.miniapp.helpers import (
     extract_user_grade_from_message,
     extract_user_name_from_message,
     send_achievements_event,
 )
+from bot.database import get_async_db
+from bot.services import AsyncChatHistoryService, AsyncPremiumFeaturesService, AsyncUserService
+from bot.services.media_store import get_media_store
+from bot.services.request_quota import get_request_quota
+
+
+async def record_exchange(
+    db: AsyncSession,
+    telegram_id: int,
+    user_message: str,
+    ai_text: str,
+    image_url: str | None = None,
+    video_url: str | None = None,
+    bump_lazy: bool = False,
+) -> str | None:
+    """
+    Записать короткий обмен (вопрос + готовый ответ) и учесть запрос в лимите.
+
+    Используется ветками маршрутизации, которые отвечают без стриминга.
+    Возвращает текст сообщения о лимите, если лимит достигнут, иначе None.
+    """
+    history_service = AsyncChatHistoryService(db)
+    premium_service = AsyncPremiumFeaturesService(db)
+
+    quota = await get_request_quota().settle(telegram_id)
+    await history_service.add_exchange(
+        telegram_id, user_message, ai_text, image_url=image_url, video_url=video_url
+    )
+
+    limit_msg = None
+    if quota.limit_reached:
+        limit_msg = premium_service.get_limit_reached_message_text()
+        await history_service.add_message(telegram_id, limit_msg, "ai")
+        asyncio.create_task(premium_service.send_limit_reached_notification_async(telegram_id))
+
+    if bump_lazy:
+        from bot.services.panda_lazy_service import PandaLazyService
+
+        await db.run_sync(
+            lambda session: PandaLazyService(session).increment_consecutive_after_ai(telegram_id)
+        )
+
+    return limit_msg
 
 
 async def save_and_notify(
-    db,
-    premium_service,
-    history_service,
     telegram_id: int,
     user_message: str,
     full_response_for_db: str,
     visualization_image_base64: str | None,
     is_educational: bool,
     is_history_cleared: bool,
-    user,
     response: web.StreamResponse,
     panda_reaction: str | None = None,
 ) -> tuple[bool, int]:
-    """Сохранить в историю, проверить достижения, отправить уведомления. Возвращает (limit_reached, total_requests)."""
+    """
+    Фаза записи pipeline: короткая транзакция после стриминга.
+
+    Сохранить в историю, проверить достижения, отправить уведомления.
+    Соединение берётся из пула только на время записи и возвращается
+    до отправки событий клиенту. Возвращает (limit_reached, total_requests).
+    """
     limit_reached = False
     total_requests = 0
+    unlocked_achievements = []
 
-    try:
-        limit_reached, total_requests = premium_service.increment_request_count(telegram_id)
-
-        # Проактивное уведомление при достижении лимита
-        if limit_reached:
-            asyncio.create_task(premium_service.send_limit_reached_notification_async(telegram_id))
-            limit_msg = premium_service.get_limit_reached_message_text()
-            history_service.add_message(telegram_id, limit_msg, "ai")
-
-        history_service.add_message(telegram_id, user_message, "user")
-
-        # Формируем image_url из base64 если есть визуализация
-        image_url = None
-        if visualization_image_base64:
-            image_url = f"data:image/png;base64,{visualization_image_base64}"
-        history_service.add_message(
-            telegram_id,
-            full_response_for_db,
-            "ai",
-            image_url=image_url,
-            panda_reaction=panda_reaction,
-        )
-
-        from bot.services.panda_lazy_service import PandaLazyService
-
-        PandaLazyService(db).increment_consecutive_after_ai(telegram_id)
+    # Картинка визуализации — в content-addressed хранилище, в истории только ссылка.
+    # Пишем до открытия транзакции, чтобы не держать соединение на время записи файла.
+    image_url = None
+    if visualization_image_base64:
+        image_url = await get_media_store().image_url_from_base64(visualization_image_base64)
 
-        if is_educational:
-            from bot.services.learning_session_service import LearningSessionService
-
-            LearningSessionService(db).record_educational_question(telegram_id)
-
-        # Если история была очищена — пробуем извлечь имя или класс
-        if is_history_cleared and not user.skip_name_asking:
-            if not user.first_name:
-                extracted_name, is_refusal = extract_user_name_from_message(user_message)
-                if is_refusal:
-                    user.skip_name_asking = True
-                    logger.info(
-                        "✅ Stream: Пользователь отказался называть имя, устанавливаем флаг skip_name_asking"
+    try:
+        async with get_async_db() as db:
+            premium_service = AsyncPremiumFeaturesService(db)
+            history_service = AsyncChatHistoryService(db)
+
+            # Квота зарезервирована в check_premium_and_lazy: здесь запрос учитывается без I/O
+            quota = await get_request_quota().settle(telegram_id)
+            limit_reached, total_requests = quota.limit_reached, quota.total_requests
+
+            # Проактивное уведомление при достижении лимита
+            if limit_reached:
+                asyncio.create_task(
+                    premium_service.send_limit_reached_notification_async(telegram_id)
+                )
+                limit_msg = premium_service.get_limit_reached_message_text()
+                await history_service.add_message(telegram_id, limit_msg, "ai")
+
+            await history_service.add_exchange(
+                telegram_id,
+                user_message,
+                full_response_for_db,
+                image_url=image_url,
+                panda_reaction=panda_reaction,
+            )
+
+            from bot.services.panda_lazy_service import PandaLazyService
+
+            await db.run_sync(
+                lambda session: PandaLazyService(session).increment_consecutive_after_ai(
+                    telegram_id
+                )
+            )
+
+            if is_educational:
+                from bot.services.learning_session_service import LearningSessionService
+
+                await db.run_sync(
+                    lambda session: LearningSessionService(session).record_educational_question(
+                        telegram_id
                     )
-                elif extracted_name:
-                    user.first_name = extracted_name
-                    logger.info(f"✅ Stream: Имя пользователя обновлено: {user.first_name}")
+                )
 
-            if not user.grade:
-                extracted_grade = extract_user_grade_from_message(user_message)
-                if extracted_grade:
-                    user.grade = extracted_grade
-                    logger.info(f"✅ Stream: Класс пользователя обновлен: {user.grade}")
+            # Если история была очищена — пробуем извлечь имя или класс
+            if is_history_cleared:
+                user = await AsyncUserService(db).get_user_by_telegram_id(telegram_id)
+                if user and not user.skip_name_asking:
+                    _update_user_profile_from_message(user, user_message)
 
-        # Геймификация
-        unlocked_achievements = []
-        try:
-            from bot.services.gamification_service import GamificationService
+            # Геймификация
+            try:
+                from bot.services.gamification_service import AsyncGamificationService
 
-            gamification_service = GamificationService(db)
-            unlocked_achievements = gamification_service.process_message(telegram_id, user_message)
-        except Exception as e:
-            logger.error(f"❌ Stream: Ошибка геймификации: {e}", exc_info=True)
-
-        db.commit()
-
-        # Отправляем информацию о достижениях
-        if unlocked_achievements:
-            await send_achievements_event(response, unlocked_achievements)
+                gamification_service = AsyncGamificationService(db)
+                unlocked_achievements = await gamification_service.process_message(
+                    telegram_id, user_message
+                )
+            except Exception as e:
+                logger.error(f"❌ Stream: Ошибка геймификации: {e}", exc_info=True)
 
     except Exception as save_error:
         logger.error(f"❌ Stream: Ошибка сохранения: {save_error}", exc_info=True)
-        db.rollback()
+        return limit_reached, total_requests
+
+    # Отправляем информацию о достижениях (уже без соединения с БД)
+    if unlocked_achievements:
+        await send_achievements_event(response, unlocked_achievements)
 
     return limit_reached, total_requests
+
+
+def _update_user_profile_from_message(user, user_message: str) -> None:
+    """Заполнить имя/класс из сообщения после очистки истории."""
+    if not user.first_name:
+        extracted_name, is_refusal = extract_user_name_from_message(user_message)
+        if is_refusal:
+            user.skip_name_asking = True
+            logger.info(
+                "✅ Stream: Пользователь отказался называть имя, устанавливаем флаг skip_name_asking"
+            )
+        elif extracted_name:
+            user.first_name = extracted_name
+            logger.info(f"✅ Stream: Имя пользователя обновлено: {user.first_name}")
+
+    if not user.grade:
+        extracted_grade = extract_user_grade_from_message(user_message)
+        if extracted_grade:
+            user.grade = extracted_grade
+            logger.info(f"✅ Stream: Класс пользователя обновлен: {user.grade}")
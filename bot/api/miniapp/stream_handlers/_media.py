@@ -7,28 +7,32 @@ from bot.services.miniapp.photo_service import MiniappPhotoService
 
 
 async def process_media(
-    audio_base64: str | None,
-    photo_base64: str | None,
+    audio: bytes | str | None,
+    photo: bytes | str | None,
     telegram_id: int,
     message: str,
     response: web.StreamResponse,
     language_code: str | None = None,
 ) -> str | None:
-    """Обработка аудио/фото. Возвращает user_message или None (ошибка/завершено)."""
+    """
+    Обработка аудио/фото. Возвращает user_message или None (ошибка/завершено).
+
+    Медиа — bytes (multipart) или base64-строка (JSON).
+    """
     user_message = message
 
-    if audio_base64:
+    if audio:
         audio_service = MiniappAudioService()
         user_message = await audio_service.process_audio(
-            audio_base64, telegram_id, response, language_code=language_code
+            audio, telegram_id, response, language_code=language_code
         )
         if user_message is None:
             return None
 
-    if photo_base64:
+    if photo:
         photo_service = MiniappPhotoService()
         user_message, is_completed = await photo_service.process_photo(
-            photo_base64, telegram_id, message, response
+            photo, telegram_id, message, response
         )
         if is_completed:
             return None
@@ -6,10 +6,16 @@ from aiohttp import web
 from loguru import logger
 from pydantic import ValidationError
 
+from bot.api.miniapp.media_upload import (
+    MEDIA_TOO_LARGE_MESSAGE,
+    MediaUploadError,
+    is_multipart_request,
+    read_media_upload,
+)
 from bot.api.validators import AIChatRequest
-from bot.database import get_db
-from bot.services import UserService
-from bot.services.premium_features_service import PremiumFeaturesService
+from bot.database import get_async_db
+from bot.services import AsyncUserService
+from bot.services.request_quota import get_request_quota
 
 
 async def parse_and_validate_request_early(
@@ -20,6 +26,22 @@ async def parse_and_validate_request_early(
     Возвращает (parsed_dict, None) при успехе или (None, error_response) при ошибке.
     Используется для возврата 400/403 до response.prepare().
     """
+    if is_multipart_request(request):
+        # Бинарный режим: фото/аудио байтами, лимиты проверяются при чтении
+        try:
+            upload = await read_media_upload(request)
+        except MediaUploadError as e:
+            logger.warning(f"⚠️ Stream: multipart отклонён ({e.status}): {e.message}")
+            return (None, e.to_response())
+        data = upload.as_request_data()
+        logger.info(
+            f"📦 Stream: получен multipart запрос: telegram_id={data.get('telegram_id')}, "
+            f"has_message={bool(data.get('message'))}, "
+            f"photo_bytes={len(upload.photo or b'')}, "
+            f"audio_bytes={len(upload.audio or b'')}"
+        )
+        return _validated_request_data(data)
+
     try:
         data = await request.json()
         logger.info(
@@ -32,17 +54,14 @@ async def parse_and_validate_request_early(
         err_str = str(json_error)
         logger.error(f"❌ Stream: ошибка парсинга JSON: {json_error}", exc_info=True)
         if "Content Too Large" in err_str or "too large" in err_str.lower():
-            return (
-                None,
-                web.json_response(
-                    {
-                        "error": "Фото или аудио слишком большие. Уменьши размер фото или длину голосового."
-                    },
-                    status=413,
-                ),
-            )
+            return (None, web.json_response({"error": MEDIA_TOO_LARGE_MESSAGE}, status=413))
         return (None, web.json_response({"error": "Invalid JSON"}, status=400))
 
+    return _validated_request_data(data)
+
+
+def _validated_request_data(data: dict) -> tuple[dict | None, web.Response | None]:
+    """Валидация AIChatRequest; фото и аудио — bytes (multipart) или base64 (JSON)."""
     try:
         validated = AIChatRequest(**data)
     except ValidationError as e:
@@ -53,9 +72,10 @@ async def parse_and_validate_request_early(
         {
             "telegram_id": validated.telegram_id,
             "message": validated.message or "",
-            "photo_base64": validated.photo_base64,
-            "audio_base64": validated.audio_base64,
+            "photo": validated.photo,
+            "audio": validated.audio,
             "language_code": validated.language_code,
+            "stream_delta": validated.stream_delta,
         },
         None,
     )
@@ -93,28 +113,32 @@ async def parse_and_validate_request(
     return {
         "telegram_id": validated.telegram_id,
         "message": validated.message or "",
-        "photo_base64": validated.photo_base64,
-        "audio_base64": validated.audio_base64,
+        "photo": validated.photo,
+        "audio": validated.audio,
         "language_code": validated.language_code,
+        "stream_delta": validated.stream_delta,
     }
 
 
 async def check_premium_and_lazy(
     telegram_id: int, response: web.StreamResponse, raw_message: str = ""
 ) -> bool:
-    """Проверка лимита и ленивости панды. Возвращает True если можно продолжать."""
-    with get_db() as db:
-        user_service = UserService(db)
-        premium_service = PremiumFeaturesService(db)
-        user = user_service.get_user_by_telegram_id(telegram_id)
+    """
+    Проверка лимита и ленивости панды. Возвращает True если можно продолжать.
+
+    Квота резервируется здесь атомарно (check_and_consume) и учитывается при
+    сохранении ответа; если ответа не будет, обработчик возвращает её (release).
+    """
+    async with get_async_db() as db:
+        user_service = AsyncUserService(db)
+        user = await user_service.get_user_by_telegram_id(telegram_id)
         if not user:
             await response.write(b'event: error\ndata: {"error": "User not found"}\n\n')
             return False
 
-        can_request, limit_reason = premium_service.can_make_ai_request(
-            telegram_id, username=user.username
-        )
-        if not can_request:
+        quota = await get_request_quota().check_and_consume(telegram_id, username=user.username)
+        if not quota.allowed:
+            limit_reason = quota.reason or ""
             logger.warning(
                 f"🚫 Stream: AI запрос заблокирован для user={telegram_id} (до audio/photo): {limit_reason}"
             )
@@ -134,8 +158,9 @@ async def check_premium_and_lazy(
         is_explicit_bamboo = bool(BAMBOO_EAT_PATTERN.search(msg)) if msg else False
 
         if not is_feedback and not is_explicit_bamboo:
-            lazy_service = PandaLazyService(db)
-            is_lazy, lazy_message = lazy_service.check_and_update_lazy_state(telegram_id)
+            is_lazy, lazy_message = await db.run_sync(
+                lambda session: PandaLazyService(session).check_and_update_lazy_state(telegram_id)
+            )
             if is_lazy and lazy_message:
                 logger.info(f"😴 Mini App Stream: Панда 'ленива' для пользователя {telegram_id}")
                 event_data = json.dumps({"content": lazy_message}, ensure_ascii=False)
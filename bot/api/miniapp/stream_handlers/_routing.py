@@ -1,15 +1,16 @@
 """Маршрутизация до основного стриминга: adult topics, отдых, изображения, секрет, модерация."""
 
-import asyncio
 import json
 import re
 
 from aiohttp import web
 from loguru import logger
 
-from bot.database import get_db
-from bot.services import ChatHistoryService
-from bot.services.premium_features_service import PremiumFeaturesService
+from bot.database import get_async_db
+from bot.services import AsyncChatHistoryService, AsyncUserService
+from bot.services.media_store import get_media_store
+
+from ._history import record_exchange
 
 
 def _build_quick_viz_caption(viz_type: str | None, user_message: str) -> str:
@@ -68,16 +69,8 @@ async def try_adult_topics(
     if not explanation:
         return False
 
-    with get_db() as db_at:
-        hist = ChatHistoryService(db_at)
-        prem = PremiumFeaturesService(db_at)
-        limit_reached, _ = prem.increment_request_count(telegram_id)
-        hist.add_message(telegram_id, user_message, "user")
-        hist.add_message(telegram_id, explanation, "ai")
-        if limit_reached:
-            hist.add_message(telegram_id, prem.get_limit_reached_message_text(), "ai")
-            asyncio.create_task(prem.send_limit_reached_notification_async(telegram_id))
-        db_at.commit()
+    async with get_async_db() as db:
+        await record_exchange(db, telegram_id, user_message, explanation)
 
     event_data = json.dumps({"content": explanation}, ensure_ascii=False)
     await response.write(f"event: message\ndata: {event_data}\n\n".encode())
@@ -105,32 +98,22 @@ async def try_bamboo_eat_request(
     if not msg_stripped or not BAMBOO_EAT_PATTERN.search(msg_stripped):
         return False
 
-    with get_db() as db_bamboo:
-        from bot.services import UserService
+    async with get_async_db() as db:
         from bot.services.panda_lazy_service import PandaLazyService
 
-        user_bamboo = UserService(db_bamboo).get_user_by_telegram_id(telegram_id)
-        if not user_bamboo:
+        if not await AsyncUserService(db).is_registered(telegram_id):
             return False
-        lazy_service = PandaLazyService(db_bamboo)
-        show_video, response_text = lazy_service.try_show_bamboo_eat_on_request(telegram_id)
-
-        history_bamboo = ChatHistoryService(db_bamboo)
-        prem_bamboo = PremiumFeaturesService(db_bamboo)
-        limit_reached, _ = prem_bamboo.increment_request_count(telegram_id)
-        history_bamboo.add_message(telegram_id, user_message, "user")
-        history_bamboo.add_message(
+        show_video, response_text = await db.run_sync(
+            lambda session: PandaLazyService(session).try_show_bamboo_eat_on_request(telegram_id)
+        )
+
+        await record_exchange(
+            db,
             telegram_id,
+            user_message,
             response_text,
-            "ai",
             video_url=BAMBOO_VIDEO_PATH if show_video else None,
         )
-        if limit_reached:
-            history_bamboo.add_message(
-                telegram_id, prem_bamboo.get_limit_reached_message_text(), "ai"
-            )
-            asyncio.create_task(prem_bamboo.send_limit_reached_notification_async(telegram_id))
-        db_bamboo.commit()
 
     if show_video:
         video_data = json.dumps({"videoUrl": BAMBOO_VIDEO_PATH}, ensure_ascii=False)
@@ -151,38 +134,28 @@ async def try_rest_offer(user_message: str, telegram_id: int, response: web.Stre
     if get_chat_reaction(user_message):
         return False
 
-    with get_db() as db_rest:
-        from bot.services import UserService
-
-        user_rest = UserService(db_rest).get_user_by_telegram_id(telegram_id)
+    async with get_async_db() as db:
+        user_rest = await AsyncUserService(db).get_user_by_telegram_id(telegram_id)
         if not user_rest:
             return False
 
         from bot.services.panda_lazy_service import PandaLazyService
 
-        lazy_service = PandaLazyService(db_rest)
-        rest_response, _skip_ai, show_bamboo_video = lazy_service.check_rest_offer(
-            telegram_id, user_message, user_rest.first_name
+        rest_response, _skip_ai, show_bamboo_video = await db.run_sync(
+            lambda session: PandaLazyService(session).check_rest_offer(
+                telegram_id, user_message, user_rest.first_name
+            )
         )
         if not rest_response:
             return False
 
-        history_service_rest = ChatHistoryService(db_rest)
-        prem_rest = PremiumFeaturesService(db_rest)
-        limit_reached_rest, _ = prem_rest.increment_request_count(telegram_id)
-        history_service_rest.add_message(telegram_id, user_message, "user")
-        history_service_rest.add_message(
+        await record_exchange(
+            db,
             telegram_id,
+            user_message,
             rest_response,
-            "ai",
             video_url=BAMBOO_VIDEO_PATH if show_bamboo_video else None,
         )
-        if limit_reached_rest:
-            history_service_rest.add_message(
-                telegram_id, prem_rest.get_limit_reached_message_text(), "ai"
-            )
-            asyncio.create_task(prem_rest.send_limit_reached_notification_async(telegram_id))
-        db_rest.commit()
 
     if show_bamboo_video:
         video_data = json.dumps({"videoUrl": BAMBOO_VIDEO_PATH}, ensure_ascii=False)
@@ -193,10 +166,12 @@ async def try_rest_offer(user_message: str, telegram_id: int, response: web.Stre
     return True
 
 
-def _extract_location_from_history(telegram_id: int) -> str | None:
+async def _extract_location_from_history(telegram_id: int) -> str | None:
     """Извлекает название локации из последних сообщений (для follow-up 'покажи на карте')."""
-    with get_db() as db:
-        history = ChatHistoryService(db).get_chat_history(telegram_id, limit=6)
+    async with get_async_db() as db:
+        history = await AsyncChatHistoryService(db).get_formatted_history_for_ai(
+            telegram_id, limit=6
+        )
 
     geo_patterns = [
         r"где\s+(?:находится|расположен[аоы]?)\s+(.+?)(?:\?|\s*$)",
@@ -204,10 +179,11 @@ def _extract_location_from_history(telegram_id: int) -> str | None:
         r"что\s+(?:такое|за\s+страна|за\s+город)\s+(.+?)(?:\?|\s*$)",
         r"^([А-ЯЁ][а-яё]+(?:\s+[А-ЯЁа-яё]+){0,3})$",
     ]
-    for msg in history:
+    # От свежих сообщений к старым: берём последнюю упомянутую локацию
+    for msg in reversed(history):
         if msg.get("role") != "user":
             continue
-        text = msg.get("content", "").strip()
+        text = msg.get("text", "").strip()
         for pattern in geo_patterns:
             match = re.search(pattern, text, re.IGNORECASE)
             if match:
@@ -249,23 +225,18 @@ async def try_image_request(
     if not is_image_request:
         return False
 
-    # КРИТИЧНО: Визуализация по нормализованному тексту
-    from bot.services.visualization_service import get_visualization_service
+    # КРИТИЧНО: Визуализация по нормализованному тексту (рендер вне event loop)
+    from bot.services.visualization.render_pool import detect_and_render
 
-    viz_service = get_visualization_service()
-    visualization_image, visualization_type = viz_service.detect_visualization_request(
-        msg_for_routing
-    )
+    visualization_image, visualization_type, map_coords = await detect_and_render(msg_for_routing)
 
     # Follow-up: "покажи на карте" без локации — ищем в истории чата
     if not visualization_image and re.search(r"покажи\s+на\s+карте", msg_lower):
-        location = _extract_location_from_history(telegram_id)
+        location = await _extract_location_from_history(telegram_id)
         if location:
             logger.info(f"🗺️ Контекст из истории: '{location}' для '{msg_for_routing[:40]}'")
             enriched = f"покажи на карте {location}"
-            visualization_image, visualization_type = viz_service.detect_visualization_request(
-                enriched
-            )
+            visualization_image, visualization_type, map_coords = await detect_and_render(enriched)
 
     # Учебная визуализация (карта, график, таблица и т.д.)
     if visualization_image:
@@ -278,40 +249,25 @@ async def try_image_request(
         }
 
         # Для карт передаём координаты — фронтенд покажет интерактивную карту
-        if visualization_type == "map":
-            map_coords = viz_service.get_last_map_coordinates()
-            if map_coords:
-                event_payload["mapData"] = map_coords
+        if visualization_type == "map" and map_coords:
+            event_payload["mapData"] = map_coords
 
         image_data = json.dumps(event_payload, ensure_ascii=False)
         caption = _build_quick_viz_caption(visualization_type, user_message)
-        limit_reached_viz = False
-        limit_msg_viz = ""
-        with get_db() as db:
-            hist = ChatHistoryService(db)
-            prem = PremiumFeaturesService(db)
-            limit_reached_viz, _ = prem.increment_request_count(telegram_id)
-            hist.add_message(
-                telegram_id=telegram_id, message_text=user_message, message_type="user"
+        image_url = await get_media_store().image_url_from_base64(image_base64)
+        async with get_async_db() as db:
+            limit_msg_viz = await record_exchange(
+                db,
+                telegram_id,
+                user_message,
+                caption,
+                image_url=image_url,
+                bump_lazy=True,
             )
-            hist.add_message(
-                telegram_id=telegram_id,
-                message_text=caption,
-                message_type="ai",
-                image_url=f"data:image/png;base64,{image_base64}",
-            )
-            if limit_reached_viz:
-                limit_msg_viz = prem.get_limit_reached_message_text()
-                hist.add_message(telegram_id, limit_msg_viz, "ai")
-                asyncio.create_task(prem.send_limit_reached_notification_async(telegram_id))
-            from bot.services.panda_lazy_service import PandaLazyService
-
-            PandaLazyService(db).increment_consecutive_after_ai(telegram_id)
-            db.commit()
         await response.write(f"event: image\ndata: {image_data}\n\n".encode())
         event_data = json.dumps({"content": caption}, ensure_ascii=False)
         await response.write(f"event: message\ndata: {event_data}\n\n".encode())
-        if limit_reached_viz:
+        if limit_msg_viz:
             limit_data = json.dumps({"content": limit_msg_viz}, ensure_ascii=False)
             await response.write(f"event: message\ndata: {limit_data}\n\n".encode())
         await response.write(b"event: done\ndata: {}\n\n")
@@ -356,25 +312,13 @@ async def try_image_request(
         is_educational_request = any(kw in msg_lower_r for kw in _edu)
         if not is_educational_request:
             caption = "Могу показать что-то по школьным предметам! 📚"
-            limit_reached_edu = False
-            limit_msg_edu = ""
-            with get_db() as db:
-                hist = ChatHistoryService(db)
-                prem = PremiumFeaturesService(db)
-                limit_reached_edu, _ = prem.increment_request_count(telegram_id)
-                hist.add_message(telegram_id, user_message, "user")
-                hist.add_message(telegram_id, caption, "ai")
-                if limit_reached_edu:
-                    limit_msg_edu = prem.get_limit_reached_message_text()
-                    hist.add_message(telegram_id, limit_msg_edu, "ai")
-                    asyncio.create_task(prem.send_limit_reached_notification_async(telegram_id))
-                from bot.services.panda_lazy_service import PandaLazyService
-
-                PandaLazyService(db).increment_consecutive_after_ai(telegram_id)
-                db.commit()
+            async with get_async_db() as db:
+                limit_msg_edu = await record_exchange(
+                    db, telegram_id, user_message, caption, bump_lazy=True
+                )
             event_data = json.dumps({"content": caption}, ensure_ascii=False)
             await response.write(f"event: message\ndata: {event_data}\n\n".encode())
-            if limit_reached_edu:
+            if limit_msg_edu:
                 limit_data = json.dumps({"content": limit_msg_edu}, ensure_ascii=False)
                 await response.write(f"event: message\ndata: {limit_data}\n\n".encode())
             await response.write(b"event: done\ndata: {}\n\n")
@@ -408,38 +352,20 @@ async def try_image_request(
                         ensure_ascii=False,
                     )
                     caption = "Могу нарисовать что-то по школьным предметам! 📚"
-                    limit_reached_art = False
-                    limit_msg_art = ""
-                    with get_db() as db:
-                        history_service = ChatHistoryService(db)
-                        prem = PremiumFeaturesService(db)
-                        limit_reached_art, _ = prem.increment_request_count(telegram_id)
-                        history_service.add_message(
-                            telegram_id=telegram_id,
-                            message_text=user_message,
-                            message_type="user",
-                        )
-                        image_url = f"data:image/jpeg;base64,{image_base64}"
-                        history_service.add_message(
-                            telegram_id=telegram_id,
-                            message_text=caption,
-                            message_type="ai",
+                    image_url = await get_media_store().image_url(image_bytes, extension="jpg")
+                    async with get_async_db() as db:
+                        limit_msg_art = await record_exchange(
+                            db,
+                            telegram_id,
+                            user_message,
+                            caption,
                             image_url=image_url,
+                            bump_lazy=True,
                         )
-                        if limit_reached_art:
-                            limit_msg_art = prem.get_limit_reached_message_text()
-                            history_service.add_message(telegram_id, limit_msg_art, "ai")
-                            asyncio.create_task(
-                                prem.send_limit_reached_notification_async(telegram_id)
-                            )
-                        from bot.services.panda_lazy_service import PandaLazyService
-
-                        PandaLazyService(db).increment_consecutive_after_ai(telegram_id)
-                        db.commit()
                     await response.write(f"event: image\ndata: {image_data}\n\n".encode())
                     event_data = json.dumps({"content": caption}, ensure_ascii=False)
                     await response.write(f"event: message\ndata: {event_data}\n\n".encode())
-                    if limit_reached_art:
+                    if limit_msg_art:
                         limit_data = json.dumps({"content": limit_msg_art}, ensure_ascii=False)
                         await response.write(f"event: message\ndata: {limit_data}\n\n".encode())
                     await response.write(b"event: done\ndata: {}\n\n")
@@ -498,9 +424,9 @@ async def try_secret_message(
 
 async def try_moderation(user_message: str, telegram_id: int, response: web.StreamResponse) -> bool:
     """Модерация контента. Возвращает True если заблокировано."""
-    from bot.services.moderation_service import ContentModerationService
+    from bot.services.moderation_service import get_moderation_service
 
-    moderation_service = ContentModerationService()
+    moderation_service = get_moderation_service()
     is_safe, block_reason = moderation_service.is_safe_content(user_message)
     if is_safe:
         return False
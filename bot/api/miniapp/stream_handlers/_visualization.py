@@ -5,6 +5,8 @@ import re
 
 from loguru import logger
 
+from bot.services.visualization.render_pool import render_visualization
+
 # Шутки для разных типов визуализаций
 VISUALIZATION_JOKES = {
     "bar": [
@@ -209,7 +211,7 @@ def get_diagram_explanation(
     return f"{base} {random.choice(jokes)}"
 
 
-def generate_visualization_images(
+async def generate_visualization_images(
     full_response: str,
     user_message: str,
     intent,
@@ -222,7 +224,7 @@ def generate_visualization_images(
     viz_service,
 ) -> tuple[str | None, str | None, int | None]:
     """
-    Генерация визуализаций на основе intent и ответа.
+    Генерация визуализаций на основе intent и ответа (рендер — в пуле процессов).
     Возвращает (image_base64, visualization_type, multiplication_number).
     """
     visualization_image_base64 = None
@@ -238,7 +240,9 @@ def generate_visualization_images(
                     "Физика": 15,
                     "Химия": 10,
                 }
-                diagram_image = viz_service.generate_pie_chart(demo_data, "Диаграмма")
+                diagram_image = await render_visualization(
+                    "generate_pie_chart", demo_data, "Диаграмма"
+                )
                 if diagram_image:
                     specific_visualization_image = diagram_image
                     visualization_type = "pie"
@@ -289,15 +293,15 @@ def generate_visualization_images(
             ]
             if multiplication_numbers:
                 if len(multiplication_numbers) > 1:
-                    visualization_image = viz_service.generate_multiple_multiplication_tables(
-                        multiplication_numbers
+                    visualization_image = await render_visualization(
+                        "generate_multiple_multiplication_tables", multiplication_numbers
                     )
                     logger.info(
                         f"📊 Stream: Сгенерированы таблицы умножения на {multiplication_numbers}"
                     )
                 else:
-                    visualization_image = viz_service.generate_multiplication_table_image(
-                        multiplication_numbers[0]
+                    visualization_image = await render_visualization(
+                        "generate_multiplication_table_image", multiplication_numbers[0]
                     )
                     logger.info(
                         f"📊 Stream: Сгенерирована таблица умножения на {multiplication_numbers[0]}"
@@ -310,8 +314,8 @@ def generate_visualization_images(
         elif multiplication_number:
             if not visualization_type:
                 visualization_type = "table"
-            visualization_image = viz_service.generate_multiplication_table_image(
-                multiplication_number
+            visualization_image = await render_visualization(
+                "generate_multiplication_table_image", multiplication_number
             )
             if visualization_image:
                 visualization_image_base64 = viz_service.image_to_base64(visualization_image)
@@ -327,7 +331,7 @@ def generate_visualization_images(
         ):
             if not visualization_type:
                 visualization_type = "table"
-            visualization_image = viz_service.generate_full_multiplication_table()
+            visualization_image = await render_visualization("generate_full_multiplication_table")
             if visualization_image:
                 visualization_image_base64 = viz_service.image_to_base64(visualization_image)
                 logger.info("📊 Stream: Сгенерирована полная таблица умножения")
@@ -396,8 +400,8 @@ def generate_visualization_images(
                 )
 
             if table_num and graph_expr:
-                visualization_image = viz_service.generate_combined_table_and_graph(
-                    table_num, graph_expr
+                visualization_image = await render_visualization(
+                    "generate_combined_table_and_graph", table_num, graph_expr
                 )
                 if visualization_image:
                     visualization_image_base64 = viz_service.image_to_base64(visualization_image)
@@ -418,12 +422,14 @@ def generate_visualization_images(
             graph_expressions = [item for item in intent.items if isinstance(item, str)]
             if graph_expressions:
                 if len(graph_expressions) > 1:
-                    visualization_image = viz_service.generate_multiple_function_graphs(
-                        graph_expressions
+                    visualization_image = await render_visualization(
+                        "generate_multiple_function_graphs", graph_expressions
                     )
                     logger.info(f"📈 Stream: Сгенерированы графики функций: {graph_expressions}")
                 else:
-                    visualization_image = viz_service.generate_function_graph(graph_expressions[0])
+                    visualization_image = await render_visualization(
+                        "generate_function_graph", graph_expressions[0]
+                    )
                     logger.info(f"📈 Stream: Сгенерирован график функции: {graph_expressions[0]}")
 
                 if visualization_image:
@@ -446,7 +452,9 @@ def generate_visualization_images(
             )
             if sin_match or (general_graph_request and not graph_match):
                 logger.info("🔍 Stream: Вход в блок генерации графика синуса")
-                visualization_image = viz_service.generate_function_graph("sin(x)")
+                visualization_image = await render_visualization(
+                    "generate_function_graph", "sin(x)"
+                )
                 logger.info(
                     f"🔍 Stream: generate_function_graph вернул: {type(visualization_image)}, "
                     f"size={len(visualization_image) if visualization_image else 0}"
@@ -459,17 +467,21 @@ def generate_visualization_images(
                 else:
                     logger.warning("⚠️ Stream: generate_function_graph вернул None для sin(x)")
             elif re.search(r"(?:косинус|cos)", user_msg_lower):
-                visualization_image = viz_service.generate_function_graph("cos(x)")
+                visualization_image = await render_visualization(
+                    "generate_function_graph", "cos(x)"
+                )
                 if visualization_image:
                     visualization_image_base64 = viz_service.image_to_base64(visualization_image)
                     logger.info("📈 Stream: Сгенерирован график косинуса")
             elif re.search(r"(?:тангенс|tan|тангенсоид)", user_msg_lower):
-                visualization_image = viz_service.generate_function_graph("tan(x)")
+                visualization_image = await render_visualization(
+                    "generate_function_graph", "tan(x)"
+                )
                 if visualization_image:
                     visualization_image_base64 = viz_service.image_to_base64(visualization_image)
                     logger.info("📈 Stream: Сгенерирован график тангенса")
             elif re.search(r"(?:парабол|порабол|парабола|порабола)", user_msg_lower):
-                visualization_image = viz_service.generate_function_graph("x**2")
+                visualization_image = await render_visualization("generate_function_graph", "x**2")
                 if visualization_image:
                     visualization_image_base64 = viz_service.image_to_base64(visualization_image)
                     logger.info("📈 Stream: Сгенерирован график параболы")
@@ -484,7 +496,9 @@ def generate_visualization_images(
                         expression.replace("²", "**2").replace("³", "**3").replace("^", "**")
                     )
                     if re.match(r"^[x\s+\-*/().\d\s]+$", expression):
-                        visualization_image = viz_service.generate_function_graph(expression)
+                        visualization_image = await render_visualization(
+                            "generate_function_graph", expression
+                        )
                         if visualization_image:
                             visualization_image_base64 = viz_service.image_to_base64(
                                 visualization_image
@@ -14,15 +14,19 @@ from aiohttp import web
 from loguru import logger
 
 from bot.api.validators import verify_resource_owner
-from bot.database import get_db
-from bot.services import ChatHistoryService, UserService
+from bot.services.ai_request_queue import AIQueueTimeoutError, bind_ai_request_user
 from bot.services.ai_service_solid import get_ai_service
+from bot.services.answer_cache import get_answer_cache
 from bot.services.miniapp.visualization_service import MiniappVisualizationService
 from bot.services.panda_chat_reactions import add_continue_after_reaction, get_chat_reaction
+from bot.services.premium_features_service import LIMIT_REACHED_MESSAGE_TEXT
+from bot.services.request_quota import get_request_quota
 from bot.services.yandex_ai_response_generator import (
     finalize_ai_response,
 )
 
+from ._context import load_context_snapshot
+from ._delta import DeltaChunkEncoder
 from ._history import save_and_notify
 from ._media import process_media
 from ._pre_checks import check_premium_and_lazy, parse_and_validate_request_early
@@ -51,8 +55,11 @@ async def miniapp_ai_chat_stream(request: web.Request) -> web.StreamResponse:
         "telegram_id": 123,
         "message": "...",
         "photo_base64": "data:image/jpeg;base64,...", # опционально
-        "audio_base64": "data:audio/webm;base64,..." # опционально
+        "audio_base64": "data:audio/webm;base64,...", # опционально
+        "stream_delta": true # опционально: event: delta вместо кумулятивных event: chunk
     }
+    или multipart/form-data: поля telegram_id, message, language_code, stream_delta
+    и файлы photo, audio (бинарно, без base64)
 
     Returns:
         SSE stream с chunks ответа AI
@@ -69,9 +76,10 @@ async def miniapp_ai_chat_stream(request: web.Request) -> web.StreamResponse:
 
     telegram_id = parsed["telegram_id"]
     message = parsed["message"]
-    photo_base64 = parsed["photo_base64"]
-    audio_base64 = parsed["audio_base64"]
+    photo = parsed["photo"]
+    audio = parsed["audio"]
     language_code = parsed["language_code"]
+    stream_delta = parsed.get("stream_delta", False)
 
     # A01: проверка владельца ресурса (X-Telegram-Init-Data); 403 до prepare
     allowed, error_msg = verify_resource_owner(request, telegram_id)
@@ -81,6 +89,9 @@ async def miniapp_ai_chat_stream(request: web.Request) -> web.StreamResponse:
             status=403,
         )
 
+    # Справедливая очередь AI: запросы этого стрима учитываются на пользователя
+    bind_ai_request_user(telegram_id)
+
     # Создаем SSE response и открываем stream
     response = web.StreamResponse()
     response.headers["Content-Type"] = "text/event-stream"
@@ -91,8 +102,8 @@ async def miniapp_ai_chat_stream(request: web.Request) -> web.StreamResponse:
     try:
         await response.prepare(request)
 
-        # Проверка лимитов и ленивости (ранний выход до тяжёлой работы).
-        # Повторная проверка лимита — после prepare_context ниже; при изменении правил лимита обновлять оба места.
+        # Проверка лимита и ленивости (ранний выход до тяжёлой работы).
+        # Квота резервируется атомарно; не учтённая при сохранении ответа возвращается в finally.
         if not await check_premium_and_lazy(telegram_id, response, raw_message=message):
             return response
 
@@ -101,7 +112,7 @@ async def miniapp_ai_chat_stream(request: web.Request) -> web.StreamResponse:
 
         # Обработка медиа
         user_message = await process_media(
-            audio_base64, photo_base64, telegram_id, message, response, language_code
+            audio, photo, telegram_id, message, response, language_code
         )
         if user_message is None:
             return response
@@ -131,61 +142,57 @@ async def miniapp_ai_chat_stream(request: web.Request) -> web.StreamResponse:
         if await try_moderation(user_message, telegram_id, response):
             return response
 
-        # Основной pipeline: streaming AI ответ + визуализации
-        with get_db() as db:
-            user_service = UserService(db)
-            history_service = ChatHistoryService(db)
-
-            user = user_service.get_user_by_telegram_id(telegram_id)
-            if not user:
-                await response.write(b'event: error\ndata: {"error": "User not found"}\n\n')
-                return response
-
-            # Контекст чата
-            from bot.services.miniapp.chat_context_service import MiniappChatContextService
-
-            context_service = MiniappChatContextService(db)
-            context = context_service.prepare_context(
-                telegram_id=telegram_id,
-                user_message=normalized_message,
-                skip_premium_check=True,
-            )
-
-            yandex_history = context["yandex_history"]
-            enhanced_system_prompt = context["system_prompt"]
-            is_history_cleared = context["is_history_cleared"]
-            is_educational = context.get("is_educational", False)
-            premium_service = context["premium_service"]
-            history_service = context["history_service"]
-
-            # Проверка Premium (вторая: после формирования контекста, см. check_premium_and_lazy выше).
-            can_request, limit_reason = premium_service.can_make_ai_request(
-                telegram_id, username=user.username
-            )
-            if not can_request:
-                logger.warning(
-                    f"🚫 Stream: AI запрос заблокирован для user={telegram_id}: {limit_reason}"
-                )
-                await response.write(
-                    f'event: error\ndata: {{"error": "{limit_reason}", "error_code": "RATE_LIMIT_EXCEEDED"}}\n\n'.encode()
-                )
-                return response
-
-            await response.write(b'event: status\ndata: {"status": "generating"}\n\n')
-
-            # AI service + knowledge search
-            ai_service = get_ai_service()
-            response_generator = ai_service.response_generator
-            yandex_service = response_generator.yandex_service
+        # Основной pipeline в три фазы, чтобы соединение с БД не удерживалось
+        # на время RAG, стриминга и рендеринга (десятки секунд):
+        #   1) короткая транзакция — неизменяемый снимок контекста;
+        #   2) только сеть: RAG, стриминг YandexGPT, визуализации;
+        #   3) короткая транзакция записи (save_and_notify / run_fallback).
+        snapshot = await load_context_snapshot(telegram_id, normalized_message)
+        if snapshot is None:
+            await response.write(b'event: error\ndata: {"error": "User not found"}\n\n')
+            return response
 
-            from bot.config import settings
+        yandex_history = list(snapshot.yandex_history)
+        enhanced_system_prompt = snapshot.system_prompt
+        is_history_cleared = snapshot.is_history_cleared
+        is_educational = snapshot.is_educational
+
+        await response.write(b'event: status\ndata: {"status": "generating"}\n\n')
+
+        # AI service + knowledge search
+        ai_service = get_ai_service()
+        response_generator = ai_service.response_generator
+        yandex_service = response_generator.yandex_service
+
+        from bot.config import settings
+
+        model_name = settings.yandex_gpt_model
+        temperature = settings.ai_temperature
+        max_tokens = settings.ai_max_tokens
+
+        # Кэш точных ответов: при попадании RAG и вызов YandexGPT не нужны,
+        # ответ проигрывается теми же SSE-событиями, что и живой стрим
+        answer_cache = get_answer_cache()
+        answer_fingerprint = answer_cache.fingerprint(
+            normalized_message,
+            model=model_name,
+            temperature=temperature,
+            user_age=snapshot.user_age,
+            user_grade=snapshot.user_grade,
+            user_gender=snapshot.user_gender,
+            emoji_in_chat=snapshot.emoji_in_chat,
+            has_media=bool(photo),
+        )
+        cached_answer = await answer_cache.get(answer_fingerprint)
 
-            rag_query = response_generator.knowledge_service.build_rag_query(
-                normalized_message, context["history"]
+        if cached_answer is None:
+            knowledge_service = response_generator.knowledge_service
+            rag_query = knowledge_service.build_rag_query(
+                normalized_message, list(snapshot.history)
             )
-            relevant_materials = await response_generator.knowledge_service.enhanced_search(
+            relevant_materials = await knowledge_service.enhanced_search(
                 user_question=rag_query,
-                user_age=user.age,
+                user_age=snapshot.user_age,
                 top_k=3,
                 use_wikipedia=response_generator._should_use_wikipedia(normalized_message),
                 language_code=language_code,
@@ -198,248 +205,264 @@ async def miniapp_ai_chat_stream(request: web.Request) -> web.StreamResponse:
                 )
                 else 15
             )
-            web_context = response_generator.knowledge_service.format_and_compress_knowledge_for_ai(
+            web_context = knowledge_service.format_and_compress_knowledge_for_ai(
                 relevant_materials, normalized_message, max_sentences=max_sent
             )
             if web_context:
                 from bot.config.prompts import RAG_FORMAT_REMINDER
 
                 enhanced_system_prompt += (
-                    f"\n\n📚 Дополнительная информация:\n{web_context}\n\n{RAG_FORMAT_REMINDER}\n\n"
+                    f"\n\n📚 Дополнительная информация:\n{web_context}\n\n"
+                    f"{RAG_FORMAT_REMINDER}\n\n"
                 )
             from bot.config.prompts import STRUCTURE_REMINDER_ALWAYS
 
             enhanced_system_prompt += f"\n\n{STRUCTURE_REMINDER_ALWAYS}\n\n"
 
-            model_name = settings.yandex_gpt_model
-            temperature = settings.ai_temperature
-            max_tokens = settings.ai_max_tokens
-            logger.info(f"💎 Stream: Используем Pro модель для пользователя {telegram_id}")
+        logger.info(f"💎 Stream: Используем Pro модель для пользователя {telegram_id}")
 
-            # Zero-shot CoT: выравниваем с non-stream режимом для вычислительных задач.
-            message_for_api = normalized_message
-            if response_generator._is_calculation_task(normalized_message):
-                message_for_api = f"{normalized_message.rstrip()} Давайте решать пошагово."
-                logger.debug("Stream CoT: добавлен триггер пошагового рассуждения")
+        # Zero-shot CoT: выравниваем с non-stream режимом для вычислительных задач.
+        message_for_api = normalized_message
+        if response_generator._is_calculation_task(normalized_message):
+            message_for_api = f"{normalized_message.rstrip()} Давайте решать пошагово."
+            logger.debug("Stream CoT: добавлен триггер пошагового рассуждения")
 
-            # Streaming + визуализации
-            full_response = ""
-            limit_reached = False
-            try:
-                from bot.services.miniapp.intent_service import get_intent_service
-                from bot.services.visualization_service import get_visualization_service
-
-                intent_service = get_intent_service()
-                viz_service = get_visualization_service()
-
-                intent = intent_service.parse_intent(normalized_message)
-
-                # Детекция визуализаций
-                visualization_service = MiniappVisualizationService()
-                (
-                    specific_visualization_image,
-                    multiplication_number,
-                    general_table_request,
-                    general_graph_request,
-                    visualization_type,
-                ) = visualization_service.detect_visualization_request(normalized_message, intent)
-
-                # Проверяем запросы на диаграмму
-                has_diagram_request = False
-                if not specific_visualization_image:
-                    diagram_patterns = [
-                        r"покажи\s+диаграмм",
-                        r"нарисуй\s+диаграмм",
-                        r"создай\s+диаграмм",
-                        r"построй\s+диаграмм",
-                        r"выведи\s+диаграмм",
-                        r"покажи\s+к\s+ней\s+диаграмм",
-                        r"покажи\s+к\s+задаче\s+диаграмм",
-                        r"покажи\s+к\s+ней\s+круговую",
-                    ]
-                    has_diagram_request = any(
-                        re.search(pattern, normalized_message.lower())
-                        for pattern in diagram_patterns
-                    )
-
-                will_have_visualization = (
-                    multiplication_number is not None
-                    or general_table_request
-                    or general_graph_request
-                    or has_diagram_request
-                    or specific_visualization_image is not None
+        # Streaming + визуализации
+        full_response = ""
+        limit_reached = False
+        try:
+            from bot.services.miniapp.intent_service import get_intent_service
+            from bot.services.visualization_service import get_visualization_service
+
+            intent_service = get_intent_service()
+            viz_service = get_visualization_service()
+
+            intent = intent_service.parse_intent(normalized_message)
+
+            # Детекция визуализаций
+            visualization_service = MiniappVisualizationService()
+            (
+                specific_visualization_image,
+                multiplication_number,
+                general_table_request,
+                general_graph_request,
+                visualization_type,
+            ) = await visualization_service.detect_visualization_request(normalized_message, intent)
+
+            # Проверяем запросы на диаграмму
+            has_diagram_request = False
+            if not specific_visualization_image:
+                diagram_patterns = [
+                    r"покажи\s+диаграмм",
+                    r"нарисуй\s+диаграмм",
+                    r"создай\s+диаграмм",
+                    r"построй\s+диаграмм",
+                    r"выведи\s+диаграмм",
+                    r"покажи\s+к\s+ней\s+диаграмм",
+                    r"покажи\s+к\s+задаче\s+диаграмм",
+                    r"покажи\s+к\s+ней\s+круговую",
+                ]
+                has_diagram_request = any(
+                    re.search(pattern, normalized_message.lower()) for pattern in diagram_patterns
                 )
-                chunk_count = 0
 
-                async for chunk in yandex_service.generate_text_response_stream(
+            will_have_visualization = (
+                multiplication_number is not None
+                or general_table_request
+                or general_graph_request
+                or has_diagram_request
+                or specific_visualization_image is not None
+            )
+            chunk_count = 0
+            delta_encoder = DeltaChunkEncoder() if stream_delta else None
+
+            if cached_answer is not None:
+                chunk_source = answer_cache.replay(cached_answer)
+            else:
+                chunk_source = yandex_service.generate_text_response_stream(
                     user_message=message_for_api,
                     chat_history=yandex_history,
                     system_prompt=enhanced_system_prompt,
                     temperature=temperature,
                     max_tokens=max_tokens,
                     model=model_name,
-                ):
-                    chunk_count += 1
-
-                    # YandexGPT streaming возвращает кумулятивный текст:
-                    # каждый chunk содержит ВЕСЬ сгенерированный текст на данный момент.
-                    # Используем последний chunk как полный ответ (не +=).
-                    is_cumulative = (
-                        chunk_count > 1 and full_response and chunk.startswith(full_response[:50])
-                    )
-                    if is_cumulative:
-                        full_response = chunk
-                    else:
-                        full_response += chunk
+                )
+
+            async for chunk in chunk_source:
+                chunk_count += 1
 
-                    if chunk_count <= 3:
-                        logger.debug(
-                            f"🔍 Stream chunk #{chunk_count}: cumulative={is_cumulative}, "
-                            f"len={len(chunk)}, preview={repr(chunk[:80])}"
-                        )
+                # YandexGPT streaming возвращает кумулятивный текст:
+                # каждый chunk содержит ВЕСЬ сгенерированный текст на данный момент.
+                # Используем последний chunk как полный ответ (не +=).
+                is_cumulative = (
+                    chunk_count > 1 and full_response and chunk.startswith(full_response[:50])
+                )
+                if is_cumulative:
+                    full_response = chunk
+                else:
+                    full_response += chunk
+
+                if chunk_count <= 3:
+                    logger.debug(
+                        f"🔍 Stream chunk #{chunk_count}: cumulative={is_cumulative}, "
+                        f"len={len(chunk)}, preview={repr(chunk[:80])}"
+                    )
 
-                    if not will_have_visualization:
+                if not will_have_visualization:
+                    if delta_encoder is not None:
+                        delta_events = delta_encoder.encode(full_response)
+                        if delta_events:
+                            await response.write(delta_events)
+                    else:
                         chunk_data = json.dumps({"chunk": chunk}, ensure_ascii=False)
                         await response.write(f"event: chunk\ndata: {chunk_data}\n\n".encode())
 
-                full_response = finalize_ai_response(full_response, user_message=normalized_message)
-
-                # Генерация визуализаций
-                visualization_image_base64, visualization_type, multiplication_number = (
-                    generate_visualization_images(
-                        full_response=full_response,
-                        user_message=user_message,
-                        intent=intent,
-                        specific_visualization_image=specific_visualization_image,
-                        multiplication_number=multiplication_number,
-                        general_table_request=general_table_request,
-                        general_graph_request=general_graph_request,
-                        has_diagram_request=has_diagram_request,
-                        visualization_type=visualization_type,
-                        viz_service=viz_service,
-                    )
+            if cached_answer is None:
+                await answer_cache.store(
+                    answer_fingerprint, full_response, user_name=snapshot.first_name
                 )
 
-                # Отправляем изображение если есть
-                if visualization_image_base64:
-                    event_payload: dict = {
-                        "image": visualization_image_base64,
-                        "type": visualization_type or "visualization",
-                    }
-                    # Для карт передаём координаты — фронтенд покажет InteractiveMap
-                    if visualization_type == "map":
-                        map_coords = viz_service.get_last_map_coordinates()
-                        if map_coords:
-                            event_payload["mapData"] = map_coords
-                    image_data = json.dumps(event_payload, ensure_ascii=False)
-                    await response.write(f"event: image\ndata: {image_data}\n\n".encode())
-                    logger.info(
-                        f"📊 Stream: Изображение визуализации отправлено "
-                        f"(размер: {len(visualization_image_base64)}, специфичная: {bool(specific_visualization_image)})"
-                    )
+            full_response = finalize_ai_response(full_response, user_message=normalized_message)
+
+            # Генерация визуализаций
+            (
+                visualization_image_base64,
+                visualization_type,
+                multiplication_number,
+            ) = await generate_visualization_images(
+                full_response=full_response,
+                user_message=user_message,
+                intent=intent,
+                specific_visualization_image=specific_visualization_image,
+                multiplication_number=multiplication_number,
+                general_table_request=general_table_request,
+                general_graph_request=general_graph_request,
+                has_diagram_request=has_diagram_request,
+                visualization_type=visualization_type,
+                viz_service=viz_service,
+            )
 
-                # Построение пояснения к визуализации
-                full_response = build_visualization_explanation(
-                    full_response=full_response,
-                    visualization_image_base64=visualization_image_base64,
-                    normalized_message=normalized_message,
-                    intent=intent,
-                    visualization_type=visualization_type,
-                    multiplication_number=multiplication_number,
-                    visualization_service=visualization_service,
+            # Отправляем изображение если есть
+            if visualization_image_base64:
+                event_payload: dict = {
+                    "image": visualization_image_base64,
+                    "type": visualization_type or "visualization",
+                }
+                # Для карт передаём координаты — фронтенд покажет InteractiveMap
+                if visualization_type == "map":
+                    map_coords = visualization_service.last_map_coordinates
+                    if map_coords:
+                        event_payload["mapData"] = map_coords
+                image_data = json.dumps(event_payload, ensure_ascii=False)
+                await response.write(f"event: image\ndata: {image_data}\n\n".encode())
+                logger.info(
+                    f"📊 Stream: Изображение визуализации отправлено "
+                    f"(размер: {len(visualization_image_base64)}, специфичная: {bool(specific_visualization_image)})"
                 )
 
-                # Ограничиваем размер ответа
-                MAX_RESPONSE_LENGTH = 8000
-                full_response_for_db = full_response
-                if len(full_response) > MAX_RESPONSE_LENGTH:
-                    full_response = full_response[:MAX_RESPONSE_LENGTH] + "\n\n... (ответ обрезан)"
+            # Построение пояснения к визуализации
+            full_response = build_visualization_explanation(
+                full_response=full_response,
+                visualization_image_base64=visualization_image_base64,
+                normalized_message=normalized_message,
+                intent=intent,
+                visualization_type=visualization_type,
+                multiplication_number=multiplication_number,
+                visualization_service=visualization_service,
+            )
 
-                panda_reaction = get_chat_reaction(normalized_message)
+            # Ограничиваем размер ответа
+            MAX_RESPONSE_LENGTH = 8000
+            full_response_for_db = full_response
+            if len(full_response) > MAX_RESPONSE_LENGTH:
+                full_response = full_response[:MAX_RESPONSE_LENGTH] + "\n\n... (ответ обрезан)"
 
-                # Сохраняем в историю (с реакцией панды для отображения при повторном заходе)
-                limit_reached, total_requests = await save_and_notify(
-                    db=db,
-                    premium_service=premium_service,
-                    history_service=history_service,
-                    telegram_id=telegram_id,
-                    user_message=user_message,
-                    full_response_for_db=full_response_for_db,
-                    visualization_image_base64=visualization_image_base64,
-                    is_educational=is_educational,
-                    is_history_cleared=is_history_cleared,
-                    user=user,
-                    response=response,
-                    panda_reaction=panda_reaction,
-                )
+            panda_reaction = get_chat_reaction(normalized_message)
 
-                # Финальный контент (очищенный + вовлечение) — одним событием, без подмены «другая версия»
-                if full_response:
-                    if panda_reaction is not None:
-                        full_response = add_continue_after_reaction(full_response)
-                    final_payload = {"content": full_response}
-                    if panda_reaction is not None:
-                        final_payload["pandaReaction"] = panda_reaction
-                    final_data = json.dumps(final_payload, ensure_ascii=False)
-                    await response.write(f"event: final\ndata: {final_data}\n\n".encode())
-
-                # Сообщение при достижении лимита
-                if limit_reached:
-                    limit_data = json.dumps(
-                        {"content": premium_service.get_limit_reached_message_text()},
-                        ensure_ascii=False,
-                    )
-                    await response.write(f"event: message\ndata: {limit_data}\n\n".encode())
-
-                await response.write(b'event: done\ndata: {"status": "completed"}\n\n')
-                logger.info(f"✅ Stream: Streaming завершен для {telegram_id}")
-
-            except (
-                httpx.HTTPStatusError,
-                httpx.TimeoutException,
-                httpx.RequestError,
-            ) as stream_error:
-                logger.warning(
-                    f"⚠️ Stream: Ошибка streaming (HTTP {getattr(stream_error, 'response', None) and stream_error.response.status_code or 'unknown'}): {stream_error}"
+            # Сохраняем в историю (с реакцией панды для отображения при повторном заходе)
+            limit_reached, total_requests = await save_and_notify(
+                telegram_id=telegram_id,
+                user_message=user_message,
+                full_response_for_db=full_response_for_db,
+                visualization_image_base64=visualization_image_base64,
+                is_educational=is_educational,
+                is_history_cleared=is_history_cleared,
+                response=response,
+                panda_reaction=panda_reaction,
+            )
+
+            # Финальный контент (очищенный + вовлечение) — одним событием, без подмены «другая версия»
+            if full_response:
+                if panda_reaction is not None:
+                    full_response = add_continue_after_reaction(full_response)
+                final_payload = {"content": full_response}
+                if panda_reaction is not None:
+                    final_payload["pandaReaction"] = panda_reaction
+                final_data = json.dumps(final_payload, ensure_ascii=False)
+                await response.write(f"event: final\ndata: {final_data}\n\n".encode())
+
+            # Сообщение при достижении лимита
+            if limit_reached:
+                limit_data = json.dumps(
+                    {"content": LIMIT_REACHED_MESSAGE_TEXT},
+                    ensure_ascii=False,
                 )
-                logger.info(f"🔄 Stream: Пробуем fallback на не-streaming запрос для {telegram_id}")
-
-                try:
-                    from ._fallback import run_fallback
-
-                    await run_fallback(
-                        response=response,
-                        yandex_service=yandex_service,
-                        normalized_message=normalized_message,
-                        model_user_message=message_for_api,
-                        yandex_history=yandex_history,
-                        enhanced_system_prompt=enhanced_system_prompt,
-                        temperature=temperature,
-                        max_tokens=max_tokens,
-                        model_name=model_name,
-                        user_message=user_message,
-                        telegram_id=telegram_id,
-                        premium_service=premium_service,
-                        history_service=history_service,
-                        db=db,
-                        visualization_service=visualization_service,
-                    )
-                except Exception as fallback_error:
-                    logger.error(
-                        f"❌ Stream: Fallback также не удался: {fallback_error}", exc_info=True
-                    )
-                    error_msg = 'event: error\ndata: {"error": "Временная проблема с AI сервисом. Попробуйте позже."}\n\n'
-                    await response.write(error_msg.encode("utf-8"))
-                    return response
+                await response.write(f"event: message\ndata: {limit_data}\n\n".encode())
 
-            except Exception as stream_error:
+            await response.write(b'event: done\ndata: {"status": "completed"}\n\n')
+            logger.info(f"✅ Stream: Streaming завершен для {telegram_id}")
+
+        except AIQueueTimeoutError as queue_error:
+            # Слот не освободился за max_wait: fallback встал бы в ту же очередь
+            logger.warning(f"⏳ Stream: {queue_error} (telegram_id={telegram_id})")
+            error_msg = (
+                'event: error\ndata: {"error": "Сейчас очень много вопросов. '
+                'Попробуй через минуту 🐼", "error_code": "AI_QUEUE_TIMEOUT", "status": 503}\n\n'
+            )
+            await response.write(error_msg.encode("utf-8"))
+            return response
+
+        except (
+            httpx.HTTPStatusError,
+            httpx.TimeoutException,
+            httpx.RequestError,
+        ) as stream_error:
+            logger.warning(
+                f"⚠️ Stream: Ошибка streaming (HTTP {getattr(stream_error, 'response', None) and stream_error.response.status_code or 'unknown'}): {stream_error}"
+            )
+            logger.info(f"🔄 Stream: Пробуем fallback на не-streaming запрос для {telegram_id}")
+
+            try:
+                from ._fallback import run_fallback
+
+                await run_fallback(
+                    response=response,
+                    yandex_service=yandex_service,
+                    normalized_message=normalized_message,
+                    model_user_message=message_for_api,
+                    yandex_history=yandex_history,
+                    enhanced_system_prompt=enhanced_system_prompt,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    model_name=model_name,
+                    user_message=user_message,
+                    telegram_id=telegram_id,
+                    visualization_service=visualization_service,
+                )
+            except Exception as fallback_error:
                 logger.error(
-                    f"❌ Stream: Неожиданная ошибка streaming: {stream_error}", exc_info=True
+                    f"❌ Stream: Fallback также не удался: {fallback_error}", exc_info=True
                 )
-                error_msg = 'event: error\ndata: {"error": "Ошибка генерации ответа"}\n\n'
+                error_msg = 'event: error\ndata: {"error": "Временная проблема с AI сервисом. Попробуйте позже."}\n\n'
                 await response.write(error_msg.encode("utf-8"))
                 return response
 
+        except Exception as stream_error:
+            logger.error(f"❌ Stream: Неожиданная ошибка streaming: {stream_error}", exc_info=True)
+            error_msg = 'event: error\ndata: {"error": "Ошибка генерации ответа"}\n\n'
+            await response.write(error_msg.encode("utf-8"))
+            return response
+
     except Exception as e:
         logger.error(f"❌ Stream: Критическая ошибка: {e}", exc_info=True)
         try:
@@ -448,6 +471,7 @@ async def miniapp_ai_chat_stream(request: web.Request) -> web.StreamResponse:
         except Exception:
             pass
     finally:
+        await get_request_quota().release(telegram_id)
         with suppress(Exception):
             await response.write_eof()
 
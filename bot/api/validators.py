@@ -6,7 +6,7 @@
 
 from aiohttp import web
 from loguru import logger
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 
 from bot.security.telegram_auth import TelegramWebAppAuth
 
@@ -41,9 +41,19 @@ class AIChatRequest(BaseModel):
     message: str | None = Field(None, max_length=4000, description="Текстовое сообщение")
     photo_base64: str | None = Field(None, max_length=15 * 1024 * 1024, description="Base64 фото")
     audio_base64: str | None = Field(None, max_length=15 * 1024 * 1024, description="Base64 аудио")
+    # Бинарный режим (multipart/form-data); strict — из JSON строкой не принимаются
+    photo_bytes: bytes | None = Field(
+        None, strict=True, repr=False, max_length=10 * 1024 * 1024, description="Байты фото"
+    )
+    audio_bytes: bytes | None = Field(
+        None, strict=True, repr=False, max_length=10 * 1024 * 1024, description="Байты аудио"
+    )
     language_code: str | None = Field(
         None, max_length=10, description="Язык для распознавания речи (ru, en)"
     )
+    stream_delta: bool = Field(
+        False, description="SSE: слать только новый суффикс текста (event: delta)"
+    )
 
     @field_validator("message")
     @classmethod
@@ -62,9 +72,19 @@ class AIChatRequest(BaseModel):
             raise ValueError("telegram_id must be positive")
         return v
 
+    @property
+    def photo(self) -> bytes | str | None:
+        """Фото: байты (multipart) или base64-строка (JSON)."""
+        return self.photo_bytes or self.photo_base64
+
+    @property
+    def audio(self) -> bytes | str | None:
+        """Аудио: байты (multipart) или base64-строка (JSON)."""
+        return self.audio_bytes or self.audio_base64
+
     def model_post_init(self, __context) -> None:
         """Проверка что есть хотя бы одно поле (message, photo или audio)."""
-        if not any([self.message, self.photo_base64, self.audio_base64]):
+        if not any([self.message, self.photo, self.audio]):
             raise ValueError(
                 "At least one of message, photo_base64, or audio_base64 must be provided"
             )
@@ -75,7 +95,13 @@ class HomeworkCheckRequest(BaseModel):
     """Валидация запроса на проверку домашнего задания."""
 
     telegram_id: int = Field(..., ge=1, description="Telegram ID пользователя")
-    photo_base64: str = Field(..., max_length=15 * 1024 * 1024, description="Base64 фото ДЗ")
+    photo_base64: str | None = Field(
+        None, max_length=15 * 1024 * 1024, description="Base64 фото ДЗ"
+    )
+    # Бинарный режим (multipart/form-data); strict — из JSON строкой не принимается
+    photo_bytes: bytes | None = Field(
+        None, strict=True, repr=False, max_length=10 * 1024 * 1024, description="Байты фото ДЗ"
+    )
     subject: str | None = Field(
         None, max_length=100, description="Предмет (математика, русский и т.д.)"
     )
@@ -92,6 +118,18 @@ class HomeworkCheckRequest(BaseModel):
             raise ValueError("telegram_id must be positive")
         return v
 
+    @property
+    def photo(self) -> bytes | str | None:
+        """Фото ДЗ: байты (multipart) или base64-строка (JSON)."""
+        return self.photo_bytes or self.photo_base64
+
+    @model_validator(mode="after")
+    def validate_photo(self) -> "HomeworkCheckRequest":
+        """Фото обязательно в одном из режимов."""
+        if not self.photo:
+            raise ValueError("photo_base64 must be provided")
+        return self
+
 
 class AuthRequest(BaseModel):
     """Валидация запроса на аутентификацию."""
@@ -48,6 +48,28 @@ class Settings(BaseSettings):
         validation_alias=AliasChoices("YANDEX_GPT_MODEL", "yandex_gpt_model"),
     )
 
+    # Планировщик AI запросов (приоритеты + справедливая очередь по пользователям)
+    ai_queue_max_concurrent: int = Field(
+        default=12,
+        ge=1,
+        description="Максимум одновременных запросов к Yandex Cloud AI",
+        validation_alias=AliasChoices("AI_QUEUE_MAX_CONCURRENT", "ai_queue_max_concurrent"),
+    )
+    ai_queue_max_wait_seconds: float = Field(
+        default=10.0,
+        gt=0,
+        description="Максимальное ожидание слота для чата/vision; дальше — быстрый отказ",
+        validation_alias=AliasChoices("AI_QUEUE_MAX_WAIT_SECONDS", "ai_queue_max_wait_seconds"),
+    )
+    ai_queue_batch_max_wait_seconds: float = Field(
+        default=120.0,
+        gt=0,
+        description="Максимальное ожидание слота для фоновых задач (индексация базы знаний)",
+        validation_alias=AliasChoices(
+            "AI_QUEUE_BATCH_MAX_WAIT_SECONDS", "ai_queue_batch_max_wait_seconds"
+        ),
+    )
+
     # Yandex Maps
     yandex_maps_api_key: str | None = Field(
         default=None,
@@ -94,6 +116,94 @@ class Settings(BaseSettings):
         validation_alias=AliasChoices("AI_MAX_TOKENS_PRO", "ai_max_tokens_pro"),
     )
 
+    # Кэш точных ответов для детерминированных учебных вопросов
+    ai_answer_cache_enabled: bool = Field(
+        default=True,
+        description="Кэш ответов AI на одинаковые учебные вопросы (выключатель)",
+        validation_alias=AliasChoices("AI_ANSWER_CACHE_ENABLED", "ai_answer_cache_enabled"),
+    )
+    ai_answer_cache_ttl_seconds: int = Field(
+        default=86400,
+        ge=60,
+        description="Время жизни ответа в кэше ответов AI (секунды)",
+        validation_alias=AliasChoices("AI_ANSWER_CACHE_TTL_SECONDS", "ai_answer_cache_ttl_seconds"),
+    )
+
+    # Рендер визуализаций (matplotlib) в пуле процессов вне event loop
+    visualization_render_workers: int = Field(
+        default=2,
+        ge=0,
+        le=16,
+        description="Процессов рендера визуализаций (0 — один выделенный поток)",
+        validation_alias=AliasChoices(
+            "VISUALIZATION_RENDER_WORKERS", "visualization_render_workers"
+        ),
+    )
+    visualization_render_timeout_seconds: float = Field(
+        default=15.0,
+        ge=1.0,
+        description="Максимальное время ожидания одного рендера визуализации (секунды)",
+        validation_alias=AliasChoices(
+            "VISUALIZATION_RENDER_TIMEOUT_SECONDS", "visualization_render_timeout_seconds"
+        ),
+    )
+
+    visualization_render_cache_mb: int = Field(
+        default=64,
+        ge=0,
+        description="Размер in-process LRU кэша PNG визуализаций в воркере (МБ, 0 = выкл)",
+        validation_alias=AliasChoices(
+            "VISUALIZATION_RENDER_CACHE_MB", "visualization_render_cache_mb"
+        ),
+    )
+    visualization_render_cache_ttl_seconds: int = Field(
+        default=604800,
+        ge=60,
+        description="Время жизни PNG визуализации в Redis и на диске (секунды)",
+        validation_alias=AliasChoices(
+            "VISUALIZATION_RENDER_CACHE_TTL_SECONDS", "visualization_render_cache_ttl_seconds"
+        ),
+    )
+    visualization_render_cache_dir: str = Field(
+        default="",
+        description="Каталог дискового кэша PNG визуализаций (пусто — временный каталог)",
+        validation_alias=AliasChoices(
+            "VISUALIZATION_RENDER_CACHE_DIR", "visualization_render_cache_dir"
+        ),
+    )
+    visualization_render_warmup_top_n: int = Field(
+        default=20,
+        ge=0,
+        description="Сколько частых визуализаций рендерить заранее при старте (0 = выкл)",
+        validation_alias=AliasChoices(
+            "VISUALIZATION_RENDER_WARMUP_TOP_N", "visualization_render_warmup_top_n"
+        ),
+    )
+
+    # Перекодировка голосовых (ffmpeg) вне event loop
+    audio_transcode_concurrency: int = Field(
+        default=2,
+        ge=1,
+        le=16,
+        description="Максимум одновременных процессов ffmpeg для голосовых",
+        validation_alias=AliasChoices("AUDIO_TRANSCODE_CONCURRENCY", "audio_transcode_concurrency"),
+    )
+    audio_transcode_timeout_seconds: float = Field(
+        default=10.0,
+        ge=1.0,
+        description="Максимальное время перекодировки одного голосового (секунды)",
+        validation_alias=AliasChoices(
+            "AUDIO_TRANSCODE_TIMEOUT_SECONDS", "audio_transcode_timeout_seconds"
+        ),
+    )
+
+    # Content-addressed хранилище картинок истории чата (/media/<sha256>.png)
+    media_store_dir: str = Field(
+        default="data/media",
+        description="Каталог хранилища картинок истории чата (на проде — смонтированный volume)",
+        validation_alias=AliasChoices("MEDIA_STORE_DIR", "media_store_dir"),
+    )
+
     # CONTENT MODERATION
     forbidden_topics: str = Field(
         default="политика,насилие,оружие,наркотики,кокаин,героин,марихуана,экстремизм,18+",
@@ -131,6 +241,14 @@ class Settings(BaseSettings):
         description="Количество сообщений в истории для контекста AI",
         validation_alias=AliasChoices("CHAT_HISTORY_LIMIT", "chat_history_limit"),
     )
+    chat_history_retention_messages: int = Field(
+        default=0,
+        ge=0,
+        description="Сколько последних сообщений хранить на пользователя (0 — всю историю)",
+        validation_alias=AliasChoices(
+            "CHAT_HISTORY_RETENTION_MESSAGES", "chat_history_retention_messages"
+        ),
+    )
     chat_history_messages_for_api_free: int = Field(
         default=10,
         ge=1,
@@ -266,6 +384,88 @@ class Settings(BaseSettings):
         description="Redis URL для хранения сессий (опционально, fallback на in-memory)",
         validation_alias=AliasChoices("REDIS_URL", "redis_url"),
     )
+    cache_lock_lease_seconds: float = Field(
+        default=10.0,
+        ge=0,
+        description="Redis lease на загрузку ключа при промахе кэша между инстансами (0 = выкл)",
+        validation_alias=AliasChoices("CACHE_LOCK_LEASE_SECONDS", "cache_lock_lease_seconds"),
+    )
+
+    # Квоты AI запросов (атомарные счётчики в Redis / памяти, write-behind в БД)
+    request_quota_redis_enabled: bool = Field(
+        default=True,
+        description="Вести счётчики лимитов AI запросов в Redis, если задан REDIS_URL",
+        validation_alias=AliasChoices("REQUEST_QUOTA_REDIS_ENABLED", "request_quota_redis_enabled"),
+    )
+    request_quota_flush_interval_seconds: float = Field(
+        default=5.0,
+        gt=0,
+        description="Интервал сброса накопленных счётчиков запросов в daily_request_counts",
+        validation_alias=AliasChoices(
+            "REQUEST_QUOTA_FLUSH_INTERVAL_SECONDS", "request_quota_flush_interval_seconds"
+        ),
+    )
+    request_quota_plan_cache_seconds: float = Field(
+        default=60.0,
+        ge=0,
+        description="Сколько секунд кэшировать тариф пользователя для проверки лимита",
+        validation_alias=AliasChoices(
+            "REQUEST_QUOTA_PLAN_CACHE_SECONDS", "request_quota_plan_cache_seconds"
+        ),
+    )
+
+    # Кэш эмбеддингов (in-process LRU + опционально Redis)
+    embedding_cache_size: int = Field(
+        default=2048,
+        ge=0,
+        description="Максимум эмбеддингов в in-process LRU кэше (0 = выключен)",
+        validation_alias=AliasChoices("EMBEDDING_CACHE_SIZE", "embedding_cache_size"),
+    )
+    embedding_cache_ttl_seconds: int = Field(
+        default=86400,
+        ge=1,
+        description="Время жизни эмбеддинга в кэше (секунды)",
+        validation_alias=AliasChoices("EMBEDDING_CACHE_TTL_SECONDS", "embedding_cache_ttl_seconds"),
+    )
+    embedding_cache_redis_enabled: bool = Field(
+        default=True,
+        description="Хранить эмбеддинги в Redis (float32), если задан REDIS_URL",
+        validation_alias=AliasChoices(
+            "EMBEDDING_CACHE_REDIS_ENABLED", "embedding_cache_redis_enabled"
+        ),
+    )
+
+    # Семантический кэш RAG (in-process уровень перед embedding_cache)
+    semantic_cache_memory_size: int = Field(
+        default=512,
+        ge=0,
+        description="Эмбеддингов запросов в in-process уровне семантического кэша (0 = выключен)",
+        validation_alias=AliasChoices("SEMANTIC_CACHE_MEMORY_SIZE", "semantic_cache_memory_size"),
+    )
+    semantic_cache_eviction_interval_seconds: int = Field(
+        default=3600,
+        ge=60,
+        description="Период фоновой очистки устаревших записей embedding_cache (секунды)",
+        validation_alias=AliasChoices(
+            "SEMANTIC_CACHE_EVICTION_INTERVAL_SECONDS", "semantic_cache_eviction_interval_seconds"
+        ),
+    )
+
+    # ANN-поиск pgvector (knowledge_embeddings, embedding_cache)
+    vector_hnsw_ef_search: int = Field(
+        default=40,
+        ge=1,
+        le=1000,
+        description="hnsw.ef_search для векторных запросов (больше — выше recall, медленнее)",
+        validation_alias=AliasChoices("VECTOR_HNSW_EF_SEARCH", "vector_hnsw_ef_search"),
+    )
+    vector_ivfflat_probes: int = Field(
+        default=10,
+        ge=1,
+        le=1000,
+        description="ivfflat.probes для векторных запросов (если индекс IVFFlat)",
+        validation_alias=AliasChoices("VECTOR_IVFFLAT_PROBES", "vector_ivfflat_probes"),
+    )
 
     # ADMIN (безлимит запросов)
     admin_usernames: str = Field(
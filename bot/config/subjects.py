@@ -3,6 +3,8 @@
 Вынесен в отдельный модуль для устранения дублирования кода.
 """
 
+# Порядок ключей важен: позиция предмета — номер бита в user_stats.subjects_mask.
+# Новые предметы добавлять только в конец словаря.
 SUBJECT_KEYWORDS = {
     "математика": [
         "математик",
@@ -49,3 +51,14 @@ SUBJECT_KEYWORDS = {
     "орксэ": ["орксэ", "религиозн культур", "светск этик"],
     "однкр": ["однкр", "духовно-нравствен", "культур росси"],
 }
+
+SUBJECT_BITS = {subject: 1 << index for index, subject in enumerate(SUBJECT_KEYWORDS)}
+
+
+def detect_subject(text: str) -> str | None:
+    """Первый предмет, ключевое слово которого встречается в тексте (или None)."""
+    text_lower = text.lower()
+    for subject, keywords in SUBJECT_KEYWORDS.items():
+        if any(keyword in text_lower for keyword in keywords):
+            return subject
+    return None
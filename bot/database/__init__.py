@@ -6,6 +6,7 @@
 
 Пакет разделён на модули по ответственности:
 - engine — движок, пул, фабрика сессий, get_db(), init_db()
+- async_engine — асинхронный движок, AsyncSessionLocal, get_async_db()
 - alembic_utils — настройка и применение Alembic-миграций
 - sql_migrations — SQL-миграции (premium, payments)
 - service — DatabaseService (проверка подключения)
@@ -16,15 +17,25 @@ import os
 from loguru import logger
 
 # Re-export: обратная совместимость с `from bot.database import ...`
+from bot.database.async_engine import (  # noqa: F401
+    AsyncSessionLocal,
+    async_engine,
+    dispose_async_engine,
+    get_async_db,
+)
 from bot.database.engine import SessionLocal, engine, get_db, init_db  # noqa: F401
 from bot.database.service import DatabaseService  # noqa: F401
 from bot.models import Base  # noqa: F401
 
 __all__ = [
+    "AsyncSessionLocal",
     "Base",
     "DatabaseService",
     "SessionLocal",
+    "async_engine",
+    "dispose_async_engine",
     "engine",
+    "get_async_db",
     "get_db",
     "init_database",
     "init_db",
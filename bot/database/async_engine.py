@@ -0,0 +1,99 @@
+"""
+Асинхронный движок SQLAlchemy для aiohttp-обработчиков.
+
+Предоставляет async_engine, AsyncSessionLocal и get_async_db().
+Используется тот же DATABASE_URL, что и у синхронного движка:
+psycopg v3 работает в async-режиме без отдельного драйвера,
+для SQLite (тесты, локальная разработка) подключается aiosqlite.
+"""
+
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from bot.config import settings
+from bot.database.engine import (
+    connect_args,
+    is_sqlite,
+    pool_kwargs,
+    track_pool_checkout_duration,
+)
+
+
+def to_async_database_url(url: str) -> str:
+    """
+    Подобрать async-драйвер для DATABASE_URL.
+
+    postgresql+psycopg:// оставляем как есть — create_async_engine сам выбирает
+    асинхронный вариант диалекта psycopg. Для SQLite подставляем aiosqlite.
+    """
+    if url.startswith("sqlite"):
+        scheme, sep, rest = url.partition("://")
+        if "+aiosqlite" not in scheme:
+            scheme = "sqlite+aiosqlite"
+        return f"{scheme}{sep}{rest}"
+    return url
+
+
+# Отдельный пул для async-обработчиков: сессии в них короткие, поэтому пул меньше
+# синхронного (вместе не более 80 соединений на процесс).
+async_pool_kwargs = {}
+if pool_kwargs:
+    async_pool_kwargs = {**pool_kwargs, "pool_size": 10, "max_overflow": 20}
+
+async_engine = create_async_engine(
+    to_async_database_url(settings.database_url),
+    echo=False,
+    connect_args=connect_args,
+    **({"poolclass": NullPool} if is_sqlite else async_pool_kwargs),
+)
+
+
+@event.listens_for(async_engine.sync_engine, "checkout")
+def receive_async_checkout(_dbapi_connection, _connection_record, _connection_proxy):  # noqa: ARG001
+    """Логирование при получении соединения из async-пула."""
+    logger.debug("🔗 Async: соединение получено из пула")
+
+
+@event.listens_for(async_engine.sync_engine, "checkin")
+def receive_async_checkin(_dbapi_connection, _connection_record):  # noqa: ARG001
+    """Логирование при возврате соединения в async-пул."""
+    logger.debug("🔙 Async: соединение возвращено в пул")
+
+
+track_pool_checkout_duration(async_engine.sync_engine, "async")
+
+
+# expire_on_commit=False: после commit атрибуты ORM-объектов читаются без
+# повторного запроса (ленивый IO вне greenlet в AsyncSession недопустим).
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+
+@asynccontextmanager
+async def get_async_db() -> AsyncGenerator[AsyncSession]:
+    """
+    Асинхронный контекстный менеджер сессии БД.
+
+    Запросы не блокируют event loop. Синхронный код сервисов можно выполнить
+    в этой же транзакции через ``await db.run_sync(lambda s: Service(s).method())``.
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+            await db.commit()  # Автоматический commit при успехе
+        except Exception as e:
+            await db.rollback()  # Откат при ошибке
+            error_msg = str(e).replace("{", "{{").replace("}", "}}")
+            logger.error(f"❌ Async database error: {error_msg}")
+            raise
+
+
+async def dispose_async_engine() -> None:
+    """Закрыть соединения async-пула (при остановке сервера)."""
+    await async_engine.dispose()
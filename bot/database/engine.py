@@ -4,11 +4,12 @@
 Предоставляет engine, SessionLocal, get_db() и init_db().
 """
 
+import time
 from collections.abc import Generator
 from contextlib import contextmanager
 
 from loguru import logger
-from sqlalchemy import create_engine, event
+from sqlalchemy import Engine, create_engine, event
 from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.pool import NullPool, QueuePool
 
@@ -81,6 +82,45 @@ def receive_checkin(_dbapi_connection, _connection_record):  # noqa: ARG001
     logger.debug("🔙 Соединение возвращено в пул")
 
 
+# Удержание соединения дольше порога логируется: обычно значит, что сессия
+# открыта вокруг сетевых вызовов (AI, RAG), а не только вокруг запросов к БД.
+SLOW_CHECKOUT_WARNING_SECONDS = 5.0
+
+
+def track_pool_checkout_duration(target_engine: Engine, pool_label: str) -> None:
+    """
+    Подключить метрику db_pool_checkout_duration_seconds к пулу движка.
+
+    Время считается от выдачи соединения из пула до его возврата.
+
+    Args:
+        target_engine: Синхронный движок (для AsyncEngine — его sync_engine)
+        pool_label: Метка пула в метрике ("sync" / "async")
+    """
+
+    @event.listens_for(target_engine, "checkout")
+    def _start_checkout_timer(_dbapi_connection, connection_record, _connection_proxy):  # noqa: ARG001
+        connection_record.info["checkout_started_at"] = time.perf_counter()
+
+    @event.listens_for(target_engine, "checkin")
+    def _record_checkout_duration(_dbapi_connection, connection_record):  # noqa: ARG001
+        started_at = connection_record.info.pop("checkout_started_at", None)
+        if started_at is None:
+            return
+        held_seconds = time.perf_counter() - started_at
+
+        from bot.monitoring.prometheus_metrics import get_metrics
+
+        get_metrics().record_histogram(
+            "db_pool_checkout_duration_seconds", held_seconds, {"pool": pool_label}
+        )
+        if held_seconds > SLOW_CHECKOUT_WARNING_SECONDS:
+            logger.warning(f"🐢 Соединение из пула ({pool_label}) удерживалось {held_seconds:.1f}s")
+
+
+track_pool_checkout_duration(engine, "sync")
+
+
 # Фабрика сессий
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -20,25 +20,26 @@ async def check_premium_limit(telegram_id: int, username: str | None, message: M
     """
     Проверка Premium-лимитов перед AI-запросом.
 
+    Разрешённый запрос резервирует квоту (RequestQuotaService): вызывающий
+    handler учитывает её через settle() и возвращает в finally через release().
+
     Returns:
         True если запрос разрешен, False если заблокирован (ответ уже отправлен).
     """
-    from bot.database import get_db
-    from bot.services import UserService
-    from bot.services.premium_features_service import PremiumFeaturesService
-
-    with get_db() as db:
-        user_service = UserService(db)
-        premium_service = PremiumFeaturesService(db)
-        user = user_service.get_user_by_telegram_id(telegram_id)
-        if user:
-            can_request, limit_reason = premium_service.can_make_ai_request(
-                telegram_id, username=username
-            )
-            if not can_request:
-                logger.warning(f"🚫 AI запрос заблокирован для user={telegram_id}: {limit_reason}")
-                await message.answer(limit_reason, reply_markup=PREMIUM_KEYBOARD, parse_mode="HTML")
-                return False
+    from bot.database import get_async_db
+    from bot.services import AsyncUserService
+    from bot.services.request_quota import get_request_quota
+
+    async with get_async_db() as db:
+        user = await AsyncUserService(db).get_user_by_telegram_id(telegram_id)
+    if not user:
+        return True
+
+    quota = await get_request_quota().check_and_consume(telegram_id, username=username)
+    if not quota.allowed:
+        logger.warning(f"🚫 AI запрос заблокирован для user={telegram_id}: {quota.reason}")
+        await message.answer(quota.reason, reply_markup=PREMIUM_KEYBOARD, parse_mode="HTML")
+        return False
     return True
 
 
@@ -124,10 +125,9 @@ async def handle_image_generation_request(
     Returns:
         True если запрос обработан (ответ отправлен), False — продолжить обработку.
     """
-    from bot.services.visualization_service import get_visualization_service
+    from bot.services.visualization.render_pool import detect_and_render
 
-    viz_service = get_visualization_service()
-    visualization_image, _ = viz_service.detect_visualization_request(user_message)
+    visualization_image, _, _ = await detect_and_render(user_message)
 
     # Если это учебная визуализация — не перехватываем, пусть основной обработчик решает
     if visualization_image:
@@ -169,15 +169,8 @@ async def handle_image_generation_request(
 
                     with get_db() as db:
                         history_service = ChatHistoryService(db)
-                        history_service.add_message(
-                            telegram_id=telegram_id,
-                            message_text=user_message,
-                            message_type="user",
-                        )
-                        history_service.add_message(
-                            telegram_id=telegram_id,
-                            message_text=caption,
-                            message_type="ai",
+                        history_service.add_exchange(
+                            telegram_id=telegram_id, user_message=user_message, ai_message=caption
                         )
                     return True
                 else:
@@ -11,6 +11,7 @@ from bot.database import get_db
 from bot.monitoring import log_user_activity, monitor_performance
 from bot.services import ChatHistoryService, UserService
 from bot.services.ai_service_solid import get_ai_service
+from bot.services.request_quota import get_request_quota
 
 from .helpers import read_file_safely
 
@@ -72,21 +73,21 @@ async def handle_image(message: Message, state: FSMContext):  # noqa: ARG001
                 await processing_msg.edit_text("❌ Сначала зарегистрируйся командой /start")
                 return
 
-            # Проверка Premium-лимитов
+            # Проверка Premium-лимитов (резервирует квоту до ответа Vision)
             from bot.handlers.ai_chat.helpers import PREMIUM_KEYBOARD
             from bot.services.premium_features_service import PremiumFeaturesService
 
             premium_service = PremiumFeaturesService(db)
-            can_request, limit_reason = premium_service.can_make_ai_request(
+            quota = await get_request_quota().check_and_consume(
                 message.from_user.id, username=message.from_user.username
             )
 
-            if not can_request:
+            if not quota.allowed:
                 logger.warning(
                     f"🚫 AI запрос (изображение) заблокирован для user={message.from_user.id}"
                 )
                 await processing_msg.edit_text(
-                    limit_reason, reply_markup=PREMIUM_KEYBOARD, parse_mode="HTML"
+                    quota.reason, reply_markup=PREMIUM_KEYBOARD, parse_mode="HTML"
                 )
                 return
 
@@ -108,10 +109,9 @@ async def handle_image(message: Message, state: FSMContext):  # noqa: ARG001
 
             # Правила по запрещённым темам отключены — ответ AI не фильтруем
 
-            # Увеличиваем счетчик запросов (независимо от истории)
-            limit_reached, total_requests = premium_service.increment_request_count(
-                message.from_user.id
-            )
+            # Учитываем зарезервированный запрос
+            quota = await get_request_quota().settle(message.from_user.id)
+            limit_reached = quota.limit_reached
 
             # Проактивное уведомление от панды при достижении лимита
             if limit_reached:
@@ -129,32 +129,25 @@ async def handle_image(message: Message, state: FSMContext):  # noqa: ARG001
                     logger.error(f"❌ Ошибка отправки проактивного уведомления: {e}")
 
             # Сохраняем в историю (синхронный метод, без await)
-            history_service.add_message(
+            history_service.add_exchange(
                 telegram_id=message.from_user.id,
-                message_text=f"[ИЗОБРАЖЕНИЕ] {caption}" if caption else "[ИЗОБРАЖЕНИЕ]",
-                message_type="user",
-            )
-
-            history_service.add_message(
-                telegram_id=message.from_user.id, message_text=ai_response, message_type="ai"
+                user_message=f"[ИЗОБРАЖЕНИЕ] {caption}" if caption else "[ИЗОБРАЖЕНИЕ]",
+                ai_message=ai_response,
             )
 
             # Проверяем, нужна ли визуализация в ответе AI (из caption или из ответа)
             visualization_image = None
             visualization_type = None
             try:
-                from bot.services.visualization_service import get_visualization_service
+                from bot.services.visualization.render_pool import detect_and_render
 
-                viz_service = get_visualization_service()
                 # Проверяем caption (если есть) - там может быть запрос на визуализацию
                 if caption:
-                    visualization_image, visualization_type = (
-                        viz_service.detect_visualization_request(caption)
-                    )
+                    visualization_image, visualization_type, _ = await detect_and_render(caption)
                 # Если в caption не найдено, проверяем ответ AI
                 if not visualization_image:
-                    visualization_image, visualization_type = (
-                        viz_service.detect_visualization_request(ai_response)
+                    visualization_image, visualization_type, _ = await detect_and_render(
+                        ai_response
                     )
             except Exception as e:
                 logger.debug(f"⚠️ Ошибка генерации визуализации для фото: {e}")
@@ -222,3 +215,6 @@ async def handle_image(message: Message, state: FSMContext):  # noqa: ARG001
             "🖼️ Произошла ошибка при анализе изображения. Попробуй отправить другое фото! 🐼"
         )
         log_user_activity(message.from_user.id, "image_error", False, str(e))
+    finally:
+        # Ошибка Vision или ранний выход — зарезервированная квота возвращается
+        await get_request_quota().release(message.from_user.id)
@@ -11,6 +11,7 @@ from bot.database import get_db
 from bot.monitoring import log_user_activity, monitor_performance
 from bot.services import ChatHistoryService, UserService
 from bot.services.ai_service_solid import get_ai_service
+from bot.services.request_quota import get_request_quota
 
 from .helpers import (
     build_visualization_enhanced_message,
@@ -57,10 +58,9 @@ async def handle_show_map_callback(callback: CallbackQuery):
         location = callback.data.replace("show_map:", "")
         await callback.answer("Загружаю карту...")
 
-        from bot.services.visualization_service import get_visualization_service
+        from bot.services.visualization.render_pool import render_visualization
 
-        viz_service = get_visualization_service()
-        map_image = viz_service.generate_country_map(location)
+        map_image = await render_visualization("generate_country_map", location)
 
         if map_image:
             from aiogram.types import BufferedInputFile
@@ -173,15 +173,8 @@ async def handle_ai_message(message: Message, state: FSMContext):  # noqa: ARG00
             logger.info(f"📚 Объяснена взрослая тема пользователю {telegram_id}")
             with get_db() as db:
                 history_service = ChatHistoryService(db)
-                history_service.add_message(
-                    telegram_id=telegram_id,
-                    message_text=user_message,
-                    message_type="user",
-                )
-                history_service.add_message(
-                    telegram_id=telegram_id,
-                    message_text=explanation,
-                    message_type="ai",
+                history_service.add_exchange(
+                    telegram_id=telegram_id, user_message=user_message, ai_message=explanation
                 )
             return
 
@@ -245,9 +238,9 @@ async def handle_ai_message(message: Message, state: FSMContext):  # noqa: ARG00
             )
 
             # Модерация: только запрещённые слова (мат). При блоке — вежливый перевод темы, не молчание.
-            from bot.services.moderation_service import ContentModerationService
+            from bot.services.moderation_service import get_moderation_service
 
-            moderation_service = ContentModerationService()
+            moderation_service = get_moderation_service()
             is_safe, block_reason = moderation_service.is_safe_content(user_message)
             if not is_safe:
                 redirect_text = moderation_service.get_safe_response_alternative(block_reason or "")
@@ -263,11 +256,8 @@ async def handle_ai_message(message: Message, state: FSMContext):  # noqa: ARG00
                 telegram_id, user_message, user.first_name or message.from_user.first_name
             )
             if rest_response:
-                history_service.add_message(
-                    telegram_id=telegram_id, message_text=user_message, message_type="user"
-                )
-                history_service.add_message(
-                    telegram_id=telegram_id, message_text=rest_response, message_type="ai"
+                history_service.add_exchange(
+                    telegram_id=telegram_id, user_message=user_message, ai_message=rest_response
                 )
                 db.commit()
                 await message.answer(text=rest_response)
@@ -323,13 +313,10 @@ async def handle_ai_message(message: Message, state: FSMContext):  # noqa: ARG00
             visualization_image = None
             visualization_type = None
             try:
-                from bot.services.visualization_service import get_visualization_service
+                from bot.services.visualization.render_pool import detect_and_render
 
-                viz_service = get_visualization_service()
-                # Используем универсальный метод детекции
-                visualization_image, visualization_type = viz_service.detect_visualization_request(
-                    user_message
-                )
+                # Используем универсальный метод детекции (рендер вне event loop)
+                visualization_image, visualization_type, _ = await detect_and_render(user_message)
 
                 # Определяем тип визуализации для контекста AI
                 # Используем тип из детектора, если он есть, иначе определяем по контексту
@@ -390,8 +377,9 @@ async def handle_ai_message(message: Message, state: FSMContext):  # noqa: ARG00
 
                 ai_response = add_random_engagement_question(ai_response)
 
-            # Увеличиваем счетчик запросов (независимо от истории)
-            limit_reached, total_requests = premium_service.increment_request_count(telegram_id)
+            # Учитываем запрос, зарезервированный в check_premium_limit
+            quota = await get_request_quota().settle(telegram_id)
+            limit_reached, total_requests = quota.limit_reached, quota.total_requests
 
             # Проактивное уведомление от панды при достижении лимита
             if limit_reached:
@@ -499,7 +487,7 @@ async def handle_ai_message(message: Message, state: FSMContext):  # noqa: ARG00
             message, ai_response, visualization_image, visualization_type, user_message
         )
 
-        # Предлагаем форму обратной связи (total_requests из increment_request_count)
+        # Предлагаем форму обратной связи (total_requests из квоты)
         await offer_feedback_form(message, total_requests)
 
     except Exception as e:
@@ -509,3 +497,6 @@ async def handle_ai_message(message: Message, state: FSMContext):  # noqa: ARG00
         await message.answer(
             text="Ой, что-то пошло не так. Попробуй переформулировать вопрос или напиши /start"
         )
+    finally:
+        # Ветки без ответа модели (ленивость, модерация, ошибка AI) лимит не тратят
+        await get_request_quota().release(telegram_id)
@@ -11,6 +11,7 @@ from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMar
 from loguru import logger
 
 from bot.monitoring import log_user_activity
+from bot.services.request_quota import get_request_quota
 
 from .helpers import check_premium_limit, read_file_safely
 from .text import handle_ai_message
@@ -173,6 +174,10 @@ async def _process_audio_input(
             f"😔 Произошла ошибка при обработке {label.lower()}.\nПопробуй написать текстом! 📝"
         )
         log_user_activity(telegram_id, f"{activity_prefix}_processing_error", False, str(e))
+    finally:
+        # Запрос учитывается при ответе AI (handle_ai_message); до подтверждения
+        # распознанного текста квота не тратится
+        await get_request_quota().release(telegram_id)
 
 
 async def handle_voice(message: Message, state: FSMContext):
@@ -11,6 +11,7 @@ from aiogram import BaseMiddleware
 from aiogram.types import Message, TelegramObject, Update
 from loguru import logger
 
+from bot.services.ai_request_queue import AIQueueTimeoutError, ai_request_context
 from bot.services.circuit_breaker import CircuitOpenError
 
 # Стандартные ответы на ошибки
@@ -30,11 +31,18 @@ class ErrorHandlerMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: dict[str, Any],
     ) -> Any:
+        # AI запросы handler'а попадают в очередь планировщика под ключом пользователя
+        from_user = data.get("event_from_user") or getattr(event, "from_user", None)
+        user_key = getattr(from_user, "id", None)
         try:
-            return await handler(event, data)
+            with ai_request_context(user_key=user_key):
+                return await handler(event, data)
         except CircuitOpenError as e:
             logger.warning(f"⚡ Circuit Breaker в handler: {e}")
             await self._send_error_reply(event, ERROR_MESSAGES["circuit_open"])
+        except AIQueueTimeoutError as e:
+            logger.warning(f"⏳ AI очередь в handler: {e}")
+            await self._send_error_reply(event, ERROR_MESSAGES["circuit_open"])
         except TimeoutError:
             logger.error("❌ Timeout в handler")
             await self._send_error_reply(event, ERROR_MESSAGES["timeout"])
@@ -29,7 +29,7 @@ from .payments import Payment, Subscription
 from .referral import ReferralPayout, Referrer
 
 # Модели пользователей
-from .user import User, UserProgress
+from .user import User, UserProgress, UserStats
 
 # Экспорт всех моделей
 __all__ = [
@@ -38,6 +38,7 @@ __all__ = [
     # User
     "User",
     "UserProgress",
+    "UserStats",
     # Chat
     "ChatHistory",
     "DailyRequestCount",
@@ -69,7 +69,7 @@ class ChatHistory(Base):
         index=True,
     )
 
-    # URL изображения визуализации (base64 data URL для графиков/таблиц)
+    # URL изображения визуализации: /media/<sha256>.png (старые записи — base64 data URL)
     image_url: Mapped[str | None] = mapped_column(Text, nullable=True)
 
     # Реакция панды на фидбек пользователя (happy, eating, offended, questioning)
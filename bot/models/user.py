@@ -287,3 +287,70 @@ class UserProgress(Base):
             "last_activity": self.last_activity.isoformat() if self.last_activity else None,
             "achievements": self.achievements or {},
         }
+
+
+class UserStats(Base):
+    """
+    Агрегат статистики пользователя для достижений (одна строка на пользователя).
+
+    Обновляется атомарным UPDATE при каждой записи в историю и при завершении
+    игры, поэтому проверка достижений читает только эту строку, а не всю
+    историю. Строится из истории при первом обращении или скриптом
+    scripts/backfill_user_stats.py.
+    """
+
+    __tablename__ = "user_stats"
+
+    user_telegram_id: Mapped[int] = mapped_column(
+        BigInteger,
+        ForeignKey("users.telegram_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+
+    # Сообщения пользователя и вопросы (с "?")
+    total_messages: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+    total_questions: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+    # Битовая маска встреченных предметов (бит = позиция в SUBJECT_KEYWORDS)
+    subjects_mask: Mapped[int] = mapped_column(
+        BigInteger, default=0, server_default="0", nullable=False
+    )
+
+    # Дни активности подряд, заканчивающиеся last_active_date
+    current_streak: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+    last_active_date: Mapped[date | None] = mapped_column(Date, nullable=True)
+
+    # Игры
+    total_game_wins: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+    total_game_sessions: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+    tic_tac_toe_wins: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+    checkers_wins: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+    best_2048_score: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+    )
+
+    def __repr__(self) -> str:
+        """Строковое представление агрегата статистики"""
+        return (
+            f"<UserStats(user_id={self.user_telegram_id}, messages={self.total_messages}, "
+            f"streak={self.current_streak})>"
+        )
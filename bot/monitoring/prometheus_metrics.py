@@ -81,16 +81,27 @@ class PrometheusMetrics:
                     "ai_response_time_seconds": [],
                     "game_session_duration_seconds": [],
                     "db_query_time_seconds": [],
+                    "db_pool_checkout_duration_seconds": [],
+                    "rag_stage_duration_seconds": [],
+                    "ai_queue_wait_seconds": [],
+                    "visualization_render_seconds": [],
+                    "audio_transcode_seconds": [],
+                    "audio_transcode_bytes": [],
                     # Gauge метрики
                     "active_users_count": 0,
                     "active_game_sessions_count": 0,
                     "system_uptime_seconds": 0,
                     "memory_usage_bytes": 0,
                     "cpu_usage_percent": 0,
+                    "ai_queue_depth": {},
                     # Метки для детализации
                     "error_types": {},
                     "user_activity_by_hour": {},
                     "popular_commands": {},
+                    "ai_queue_timeouts_total": {},
+                    "cache_coalesced_waiters_total": {},
+                    "ai_answer_cache_requests_total": {},
+                    "visualization_render_timeouts_total": {},
                 }
             )
 
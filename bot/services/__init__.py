@@ -8,11 +8,14 @@ Barrel export для сервисов
 from bot.services.ai_service_solid import YandexAIService, get_ai_service
 from bot.services.analytics_service import AnalyticsService
 from bot.services.bonus_lessons_service import BonusLessonsService  # noqa: E402
-from bot.services.history_service import ChatHistoryService
+from bot.services.history_service import AsyncChatHistoryService, ChatHistoryService
 from bot.services.moderation_service import ContentModerationService  # noqa: E402
 from bot.services.payment_service import PaymentService  # noqa: E402
 from bot.services.personal_tutor_service import PersonalTutorService  # noqa: E402
-from bot.services.premium_features_service import PremiumFeaturesService  # noqa: E402
+from bot.services.premium_features_service import (  # noqa: E402
+    AsyncPremiumFeaturesService,
+    PremiumFeaturesService,
+)
 from bot.services.priority_support_service import PrioritySupportService  # noqa: E402
 from bot.services.session_service import SessionService, get_session_service  # noqa: E402
 from bot.services.simple_engagement import (  # noqa: E402
@@ -22,21 +25,24 @@ from bot.services.simple_engagement import (  # noqa: E402
 from bot.services.simple_monitor import SimpleMonitor, get_simple_monitor  # noqa: E402
 from bot.services.subscription_service import SubscriptionService  # noqa: E402
 from bot.services.telegram_auth_service import TelegramAuthService  # noqa: E402
-from bot.services.user_service import UserService  # noqa: E402
+from bot.services.user_service import AsyncUserService, UserService  # noqa: E402
 
 __all__ = [
     "YandexAIService",
     "get_ai_service",
     "AnalyticsService",
     "ChatHistoryService",
+    "AsyncChatHistoryService",
     "ContentModerationService",
     "UserService",
+    "AsyncUserService",
     "SubscriptionService",
     "PaymentService",
     "TelegramAuthService",
     "SessionService",
     "get_session_service",
     "PremiumFeaturesService",
+    "AsyncPremiumFeaturesService",
     "PersonalTutorService",
     "PrioritySupportService",
     "BonusLessonsService",
@@ -7,12 +7,12 @@
 import re
 from dataclasses import dataclass
 from enum import Enum
-from re import Pattern
 from typing import Any
 
 from loguru import logger
 
 from bot.config import settings
+from bot.services.keyword_automaton import BoundaryMode, KeywordAutomaton, KeywordMatch
 
 
 class ModerationLevel(Enum):
@@ -74,110 +74,161 @@ class AdvancedModerationService:
         # Синонимы и эвфемизмы
         self._synonyms = self._build_synonyms()
 
+        # Все словари — в одном автомате: текст сканируется один раз
+        self._matcher = self._build_matcher()
+
         logger.info(f"🔒 Продвинутая модерация инициализирована (уровень: {self.filter_level})")
 
-    def _build_category_patterns(self) -> dict[ContentCategory, list[Pattern]]:
-        """Создает паттерны для разных категорий контента"""
+    def _build_category_patterns(self) -> dict[ContentCategory, tuple[tuple[str, ...], ...]]:
+        """
+        Создает группы ключевых слов для разных категорий контента.
+
+        Каждое слово ищется целиком (с границами слов); совпадения считаются
+        по каждой группе отдельно, как у прежних regex-альтернатив.
+        """
         patterns = {}
 
         # Насилие
-        violence_pattern = (
-            r"\b(убить|убийство|смерть|умереть|труп|кровь|ранен|бьют|"
-            r"драка|война|оружие|нож|пистолет|бомба|взрыв)\b"
-        )
-        patterns[ContentCategory.VIOLENCE] = [
-            re.compile(violence_pattern, re.IGNORECASE),
-            re.compile(
-                r"\b(избить|изнасиловать|пытка|мучение|страдание|боль|убийца|преступник)\b",
-                re.IGNORECASE,
+        patterns[ContentCategory.VIOLENCE] = (
+            (
+                "убить",
+                "убийство",
+                "смерть",
+                "умереть",
+                "труп",
+                "кровь",
+                "ранен",
+                "бьют",
+                "драка",
+                "война",
+                "оружие",
+                "нож",
+                "пистолет",
+                "бомба",
+                "взрыв",
             ),
-            re.compile(
-                r"\b(самоубийство|суицид|вешаться|отравиться|резать|резаться)\b", re.IGNORECASE
+            (
+                "избить",
+                "изнасиловать",
+                "пытка",
+                "мучение",
+                "страдание",
+                "боль",
+                "убийца",
+                "преступник",
             ),
-        ]
+            ("самоубийство", "суицид", "вешаться", "отравиться", "резать", "резаться"),
+        )
 
         # Наркотики
-        patterns[ContentCategory.DRUGS] = [
-            re.compile(
-                r"\b(наркотик|наркота|героин|кокаин|амфетамин|марихуана|гашиш|спайс|соль|кристалл)\b",
-                re.IGNORECASE,
-            ),
-            re.compile(
-                r"\b(наркоман|зависимость|доза|инъекция|курение|нюхать|колоться)\b", re.IGNORECASE
+        patterns[ContentCategory.DRUGS] = (
+            (
+                "наркотик",
+                "наркота",
+                "героин",
+                "кокаин",
+                "амфетамин",
+                "марихуана",
+                "гашиш",
+                "спайс",
+                "соль",
+                "кристалл",
             ),
-            re.compile(
-                r"\b(трава|косяк|джойнт|булька|спиды|экстази|лсд|мескалин)\b", re.IGNORECASE
-            ),
-        ]
+            ("наркоман", "зависимость", "доза", "инъекция", "курение", "нюхать", "колоться"),
+            ("трава", "косяк", "джойнт", "булька", "спиды", "экстази", "лсд", "мескалин"),
+        )
 
         # Сексуальный контент
-        patterns[ContentCategory.SEXUAL] = [
-            re.compile(
-                r"\b(секс|порно|интим|голый|голая|раздеться|лечь|трахать|ебать|порнография)\b",
-                re.IGNORECASE,
+        patterns[ContentCategory.SEXUAL] = (
+            (
+                "секс",
+                "порно",
+                "интим",
+                "голый",
+                "голая",
+                "раздеться",
+                "лечь",
+                "трахать",
+                "ебать",
+                "порнография",
             ),
-            re.compile(
-                r"\b(оргазм|возбуждение|мастурбация|педофил|изнасилование|проституция)\b",
-                re.IGNORECASE,
-            ),
-        ]
+            ("оргазм", "возбуждение", "мастурбация", "педофил", "изнасилование", "проституция"),
+        )
 
         # Политика и экстремизм
-        patterns[ContentCategory.POLITICS] = [
-            re.compile(
-                r"\b(путин|зеленский|байден|трамп|выборы|голосование|партия|политика|власть)\b",
-                re.IGNORECASE,
+        patterns[ContentCategory.POLITICS] = (
+            (
+                "путин",
+                "зеленский",
+                "байден",
+                "трамп",
+                "выборы",
+                "голосование",
+                "партия",
+                "политика",
+                "власть",
             ),
-            re.compile(
-                r"\b(революция|переворот|протест|митинг|демонстрация|бунт|мятеж)\b", re.IGNORECASE
-            ),
-        ]
+            ("революция", "переворот", "протест", "митинг", "демонстрация", "бунт", "мятеж"),
+        )
 
-        patterns[ContentCategory.EXTREMISM] = [
-            re.compile(
-                r"\b(фашизм|нацизм|терроризм|ислам|джихад|расизм|ксенофобия|геноцид)\b",
-                re.IGNORECASE,
-            ),
-            re.compile(
-                r"\b(скинхед|неонацист|террорист|боевик|радикал|экстремист)\b", re.IGNORECASE
-            ),
-        ]
+        patterns[ContentCategory.EXTREMISM] = (
+            ("фашизм", "нацизм", "терроризм", "ислам", "джихад", "расизм", "ксенофобия", "геноцид"),
+            ("скинхед", "неонацист", "террорист", "боевик", "радикал", "экстремист"),
+        )
 
         # Буллинг
-        patterns[ContentCategory.BULLYING] = [
-            re.compile(
-                r"\b(дурак|тупой|идиот|дебил|кретин|придурок|неудачник|лузер|толстый|урод)\b",
-                re.IGNORECASE,
-            ),
-            re.compile(
-                r"\b(ненавижу|презираю|убил бы|убью|убейся|сдохни|покончи с собой)\b", re.IGNORECASE
+        patterns[ContentCategory.BULLYING] = (
+            (
+                "дурак",
+                "тупой",
+                "идиот",
+                "дебил",
+                "кретин",
+                "придурок",
+                "неудачник",
+                "лузер",
+                "толстый",
+                "урод",
             ),
-        ]
+            ("ненавижу", "презираю", "убил бы", "убью", "убейся", "сдохни", "покончи с собой"),
+        )
 
         # Мошенничество
-        patterns[ContentCategory.SCAM] = [
-            re.compile(
-                r"\b(деньги|заработать|доход|прибыль|инвестиции|криптовалюта|биткоин|майнинг)\b",
-                re.IGNORECASE,
-            ),
-            re.compile(
-                r"\b(скидка|акция|бесплатно|подарок|выигрыш|приз|лотерея|казино)\b", re.IGNORECASE
+        patterns[ContentCategory.SCAM] = (
+            (
+                "деньги",
+                "заработать",
+                "доход",
+                "прибыль",
+                "инвестиции",
+                "криптовалюта",
+                "биткоин",
+                "майнинг",
             ),
-        ]
+            ("скидка", "акция", "бесплатно", "подарок", "выигрыш", "приз", "лотерея", "казино"),
+        )
 
         # Спам
-        patterns[ContentCategory.SPAM] = [
-            re.compile(
-                r"\b(реклама|продажа|купить|заказать|доставка|скидка|промокод|акция)\b",
-                re.IGNORECASE,
-            ),
-            re.compile(
-                r"\b(подписка|регистрация|ссылка|сайт|телефон|звонок|сообщение)\b", re.IGNORECASE
-            ),
-        ]
+        patterns[ContentCategory.SPAM] = (
+            ("реклама", "продажа", "купить", "заказать", "доставка", "скидка", "промокод", "акция"),
+            ("подписка", "регистрация", "ссылка", "сайт", "телефон", "звонок", "сообщение"),
+        )
 
         return patterns
 
+    def _build_matcher(self) -> KeywordAutomaton:
+        """Собирает категории, образовательные контексты и индикаторы намерений в один автомат"""
+        matcher = KeywordAutomaton()
+        for category, groups in self._category_patterns.items():
+            for group in groups:
+                # Слово, повторяющееся в разных группах, считается в каждой (как findall)
+                matcher.add_many(dict.fromkeys(group), ("category", category), BoundaryMode.WORD)
+        for subject, keywords in self._educational_contexts.items():
+            matcher.add_many(keywords, ("context", subject))
+        for intent_type, indicators in self._intent_indicators.items():
+            matcher.add_many(indicators, ("intent", intent_type))
+        return matcher.build()
+
     def _build_educational_contexts(self) -> dict[str, list[str]]:
         """Создает контексты, где обычно допустим образовательный контент"""
         return {
@@ -263,21 +314,18 @@ class AdvancedModerationService:
         except Exception as e:
             logger.debug(f"⚠️ Ошибка проверки взрослых тем: {e}")
 
-        # Нормализуем текст
+        # Нормализуем текст и ищем все ключевые слова за один проход
         normalized_content = self._normalize_text(content)
+        matches = self._matcher.find_all(normalized_content)
 
         # Анализируем контекст
-        context_analysis = self._analyze_context(normalized_content, user_context)
+        context_analysis = self._analyze_context(matches, user_context)
 
         # Проверяем категории контента
-        category_results = []
-        for category, patterns in self._category_patterns.items():
-            result = self._check_category(normalized_content, category, patterns)
-            if result:
-                category_results.append(result)
+        category_results = self._check_categories(matches)
 
         # Анализируем намерения
-        intent_analysis = self._analyze_intent(normalized_content)
+        intent_analysis = self._analyze_intent(matches)
 
         # Принимаем решение
         final_result = self._make_decision(
@@ -303,20 +351,14 @@ class AdvancedModerationService:
 
     def _analyze_context(
         self,
-        content: str,
+        matches: list[KeywordMatch],
         user_context: dict[str, Any] = None,  # noqa: ARG002
     ) -> dict[str, Any]:
         """Анализирует образовательный контекст"""
-        context_score = 0
-        detected_subjects = []
-
-        # Проверяем образовательные контексты
-        for subject, keywords in self._educational_contexts.items():
-            for keyword in keywords:
-                if keyword in content:
-                    context_score += 1
-                    detected_subjects.append(subject)
-                    break
+        # Каждый предмет учитывается один раз, в порядке объявления
+        found = {match.tag[1] for match in matches if match.tag[0] == "context"}
+        detected_subjects = [subject for subject in self._educational_contexts if subject in found]
+        context_score = len(detected_subjects)
 
         return {
             "score": context_score,
@@ -324,38 +366,38 @@ class AdvancedModerationService:
             "is_educational": context_score > 0,
         }
 
-    def _check_category(
-        self, content: str, category: ContentCategory, patterns: list[Pattern]
-    ) -> dict | None:
-        """Проверяет контент на конкретную категорию"""
-        matches = []
-
-        for pattern in patterns:
-            found = pattern.findall(content)
-            if found:
-                matches.extend(found)
-
-        if matches:
-            confidence = min(len(matches) / 3.0, 1.0)  # Максимум 3 совпадения = 100%
-            return {
-                "category": category,
-                "matches": matches,
-                "confidence": confidence,
-                "count": len(matches),
-            }
-
-        return None
-
-    def _analyze_intent(self, content: str) -> dict[str, Any]:
-        """Анализирует намерения пользователя"""
-        intent_scores = {}
+    def _check_categories(self, matches: list[KeywordMatch]) -> list[dict]:
+        """Группирует найденные слова по категориям контента"""
+        by_category: dict[ContentCategory, list[str]] = {}
+        for match in matches:
+            if match.tag[0] == "category":
+                by_category.setdefault(match.tag[1], []).append(match.keyword)
+
+        results = []
+        for category in self._category_patterns:
+            category_matches = by_category.get(category)
+            if category_matches:
+                # Максимум 3 совпадения = 100%
+                confidence = min(len(category_matches) / 3.0, 1.0)
+                results.append(
+                    {
+                        "category": category,
+                        "matches": category_matches,
+                        "confidence": confidence,
+                        "count": len(category_matches),
+                    }
+                )
 
-        for intent_type, indicators in self._intent_indicators.items():
-            score = 0
-            for indicator in indicators:
-                if indicator in content:
-                    score += 1
-            intent_scores[intent_type] = score
+        return results
+
+    def _analyze_intent(self, matches: list[KeywordMatch]) -> dict[str, Any]:
+        """Анализирует намерения пользователя"""
+        # +1 за каждый различный индикатор, найденный в тексте
+        found = {(match.tag[1], match.keyword) for match in matches if match.tag[0] == "intent"}
+        intent_scores = {
+            intent_type: sum((intent_type, indicator) in found for indicator in indicators)
+            for intent_type, indicators in self._intent_indicators.items()
+        }
 
         # Определяем основной тип намерения
         primary_intent = (
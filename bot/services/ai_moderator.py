@@ -23,7 +23,7 @@ Single Responsibility. Проверяет текстовые сообщения
 - Interface Segregation: минимальный интерфейс IModerator
 """
 
-from bot.services.moderation_service import ContentModerationService
+from bot.services.moderation_service import get_moderation_service
 from bot.services.yandex_ai_response_generator import IModerator
 
 
@@ -36,12 +36,9 @@ class ContentModerator(IModerator):
     - единственная задача: модерация контента.
     """
 
-    def __init__(self) -> None:
-        self._moderation_service = ContentModerationService()
-
     def moderate(self, text: str) -> tuple[bool, str]:
-        """Проверка контента на безопасность через ContentModerationService."""
-        is_safe, reason = self._moderation_service.is_safe_content(text)
+        """Проверка контента на безопасность через общий ContentModerationService."""
+        is_safe, reason = get_moderation_service().is_safe_content(text)
         if is_safe:
             return True, "контент безопасен"
         return False, f"запрещен: {reason or 'запрещённая тема'}"
@@ -1,14 +1,29 @@
 """
-Очередь для управления одновременными AI запросами.
+Очередь (планировщик) для управления одновременными AI запросами.
 
 Ограничивает количество одновременных запросов к Yandex Cloud API
 для предотвращения rate limiting и перегрузки системы.
 
-Использует asyncio.Semaphore для контроля параллелизма.
+Свободный слот выдаётся по правилам:
+- классы приоритета: streaming-чат > обычный чат > vision (ДЗ) > фоновые задачи;
+- внутри класса — round-robin по пользователям: серия сообщений одного
+  пользователя не вытесняет остальных (у каждого не больше одного
+  «хода» за круг);
+- максимальное время ожидания слота: по его истечении запрос сразу
+  получает AIQueueTimeoutError (вызывающая сторона отвечает 503/fallback).
+
+Пользователь и понижение приоритета задаются через ai_request_context()
+или bind_ai_request_user() на входе в handler (contextvars), поэтому
+сигнатуры сервисов не меняются.
 """
 
-from asyncio import Semaphore
-from collections.abc import AsyncIterator, Callable
+import asyncio
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
 from typing import TypeVar
 
 from loguru import logger
@@ -17,45 +32,277 @@ from loguru import logger
 T = TypeVar("T")
 
 
+class RequestPriority(IntEnum):
+    """Класс приоритета AI запроса (меньше значение — выше приоритет)."""
+
+    INTERACTIVE_STREAM = 0
+    CHAT = 1
+    VISION = 2
+    BATCH = 3
+
+
+DEFAULT_MAX_WAIT_SECONDS = 10.0
+DEFAULT_BATCH_MAX_WAIT_SECONDS = 120.0
+
+
+class AIQueueTimeoutError(Exception):
+    """Запрос не дождался свободного слота за отведённое время."""
+
+    def __init__(self, priority: RequestPriority, waited: float):
+        self.priority = priority
+        self.waited = waited
+        super().__init__(
+            f"AI очередь перегружена: {priority.name} ждал слот {waited:.1f}с без результата"
+        )
+
+
+_current_user_key: ContextVar[str | None] = ContextVar("ai_request_user_key", default=None)
+_current_priority: ContextVar[RequestPriority | None] = ContextVar(
+    "ai_request_priority", default=None
+)
+
+
+@contextmanager
+def ai_request_context(
+    user_key: str | int | None = None, priority: RequestPriority | None = None
+) -> Iterator[None]:
+    """
+    Привязать AI запросы текущей задачи к пользователю и/или понизить их приоритет.
+
+    Args:
+        user_key: Идентификатор пользователя для справедливой очереди (telegram_id)
+        priority: Минимальный класс приоритета (например BATCH для фоновых задач);
+                  приоритет запроса не может стать выше заданного здесь
+    """
+    user_token = _current_user_key.set(str(user_key)) if user_key is not None else None
+    priority_token = _current_priority.set(priority) if priority is not None else None
+    try:
+        yield
+    finally:
+        if priority_token is not None:
+            _current_priority.reset(priority_token)
+        if user_token is not None:
+            _current_user_key.reset(user_token)
+
+
+def bind_ai_request_user(user_key: str | int | None) -> None:
+    """
+    Привязать AI запросы текущей задачи к пользователю до её завершения.
+
+    Для aiohttp handlers: каждый HTTP запрос выполняется в своей задаче,
+    поэтому значение не выходит за пределы запроса.
+    """
+    if user_key is not None:
+        _current_user_key.set(str(user_key))
+
+
+class _Waiter:
+    """Запрос, ожидающий слот."""
+
+    __slots__ = ("future", "user_key", "priority", "enqueued_at", "timer")
+
+    def __init__(self, future: asyncio.Future, user_key: str, priority: RequestPriority):
+        self.future = future
+        self.user_key = user_key
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.timer: asyncio.TimerHandle | None = None
+
+
 class AIRequestQueue:
     """
-    Очередь для управления одновременными AI запросами.
+    Планировщик одновременных AI запросов.
 
     Ограничивает количество одновременных запросов к внешним AI сервисам
-    (YandexGPT, SpeechKit, Vision) для предотвращения rate limiting.
+    (YandexGPT, SpeechKit, Vision) и раздаёт слоты по приоритету
+    и справедливо между пользователями.
 
     Attributes:
         max_concurrent: Максимальное количество одновременных запросов
-        semaphore: Semaphore для контроля параллелизма
+        max_wait_seconds: Максимальное ожидание слота для интерактивных классов
+        batch_max_wait_seconds: Максимальное ожидание слота для фоновых задач
     """
 
-    def __init__(self, max_concurrent: int = 50):
+    def __init__(
+        self,
+        max_concurrent: int = 50,
+        max_wait_seconds: float = DEFAULT_MAX_WAIT_SECONDS,
+        batch_max_wait_seconds: float = DEFAULT_BATCH_MAX_WAIT_SECONDS,
+    ):
         """
         Инициализация очереди AI запросов.
 
         Args:
             max_concurrent: Максимальное количество одновременных запросов
-                          (увеличено до 50 для очень высокой нагрузки, было 30)
+            max_wait_seconds: Сколько интерактивный запрос может ждать слот
+            batch_max_wait_seconds: Сколько фоновый запрос может ждать слот
         """
         self.max_concurrent = max_concurrent
-        self.semaphore = Semaphore(max_concurrent)
-        logger.info(f"✅ AIRequestQueue инициализирована: max_concurrent={max_concurrent}")
+        self.max_wait_seconds = max_wait_seconds
+        self.batch_max_wait_seconds = batch_max_wait_seconds
+        self._active = 0
+        self._queued = 0
+        # Для каждого класса: user_key -> очередь его запросов; порядок ключей = круг round-robin
+        self._queues: dict[RequestPriority, OrderedDict[str, deque[_Waiter]]] = {
+            priority: OrderedDict() for priority in RequestPriority
+        }
+        self._anonymous_seq = 0
+        logger.info(
+            f"✅ AIRequestQueue инициализирована: max_concurrent={max_concurrent}, "
+            f"max_wait={max_wait_seconds}s, batch_max_wait={batch_max_wait_seconds}s"
+        )
 
-    async def process(self, func: Callable[..., T], *args, **kwargs) -> T:
+    def _max_wait(self, priority: RequestPriority) -> float:
+        if priority == RequestPriority.BATCH:
+            return self.batch_max_wait_seconds
+        return self.max_wait_seconds
+
+    def _resolve(self, priority: RequestPriority) -> tuple[RequestPriority, str]:
+        """Итоговый приоритет (с учётом контекста) и ключ пользователя."""
+        floor = _current_priority.get()
+        if floor is not None and floor > priority:
+            priority = floor
+        user_key = _current_user_key.get()
+        if user_key is None:
+            # Анонимные запросы не группируются: каждый — отдельный «пользователь»
+            self._anonymous_seq += 1
+            user_key = f"anon:{self._anonymous_seq}"
+        return priority, user_key
+
+    async def _acquire(self, priority: RequestPriority, user_key: str) -> None:
+        """Дождаться слота (или AIQueueTimeoutError по истечении max_wait)."""
+        if self._active < self.max_concurrent and self._queued == 0:
+            self._active += 1
+            self._record_wait(priority, 0.0)
+            return
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(loop.create_future(), user_key, priority)
+        self._queues[priority].setdefault(user_key, deque()).append(waiter)
+        self._queued += 1
+        waiter.timer = loop.call_later(self._max_wait(priority), self._expire, waiter)
+        self._record_depth(priority)
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                if waiter.future.exception() is None:
+                    # Слот уже выдан, но ожидающий отменён — отдаём слот следующему
+                    self._release()
+            else:
+                self._discard(waiter)
+            raise
+        self._record_wait(priority, time.monotonic() - waiter.enqueued_at)
+
+    def _expire(self, waiter: _Waiter) -> None:
+        """Таймер max_wait: убрать запрос из очереди и отказать ему."""
+        if waiter.future.done():
+            return
+        self._discard(waiter)
+        waited = time.monotonic() - waiter.enqueued_at
+        waiter.future.set_exception(AIQueueTimeoutError(waiter.priority, waited))
+        self._record_timeout(waiter.priority, waited)
+
+    def _discard(self, waiter: _Waiter) -> None:
+        """Удалить ожидающий запрос из очереди (таймаут или отмена)."""
+        if waiter.timer is not None:
+            waiter.timer.cancel()
+        user_queues = self._queues[waiter.priority]
+        pending = user_queues.get(waiter.user_key)
+        if pending is None or waiter not in pending:
+            return
+        pending.remove(waiter)
+        if not pending:
+            del user_queues[waiter.user_key]
+        self._queued -= 1
+        self._record_depth(waiter.priority)
+
+    def _pop_next(self) -> _Waiter | None:
+        """Следующий запрос: старший класс, затем следующий пользователь по кругу."""
+        for priority in RequestPriority:
+            user_queues = self._queues[priority]
+            if not user_queues:
+                continue
+            user_key, pending = next(iter(user_queues.items()))
+            waiter = pending.popleft()
+            if pending:
+                user_queues.move_to_end(user_key)
+            else:
+                del user_queues[user_key]
+            self._queued -= 1
+            self._record_depth(priority)
+            return waiter
+        return None
+
+    def _release(self) -> None:
+        """Освободить слот и передать его следующему ожидающему."""
+        self._active -= 1
+        while self._active < self.max_concurrent:
+            waiter = self._pop_next()
+            if waiter is None:
+                return
+            if waiter.timer is not None:
+                waiter.timer.cancel()
+            if waiter.future.done():
+                continue
+            self._active += 1
+            waiter.future.set_result(None)
+
+    @staticmethod
+    def _record_wait(priority: RequestPriority, waited: float) -> None:
+        try:
+            from bot.monitoring.prometheus_metrics import get_metrics
+
+            get_metrics().record_histogram(
+                "ai_queue_wait_seconds", waited, {"priority": priority.name.lower()}
+            )
+        except Exception as e:
+            logger.debug(f"AI queue metrics error: {e}")
+
+    def _record_depth(self, priority: RequestPriority) -> None:
+        try:
+            from bot.monitoring.prometheus_metrics import get_metrics
+
+            depth = sum(len(pending) for pending in self._queues[priority].values())
+            get_metrics().set_gauge("ai_queue_depth", depth, {"priority": priority.name.lower()})
+        except Exception as e:
+            logger.debug(f"AI queue metrics error: {e}")
+
+    @staticmethod
+    def _record_timeout(priority: RequestPriority, waited: float) -> None:
+        logger.warning(f"⏳ AI очередь: {priority.name} отклонён после {waited:.1f}с ожидания")
+        try:
+            from bot.monitoring.prometheus_metrics import get_metrics
+
+            get_metrics().increment_counter(
+                "ai_queue_timeouts_total", {"priority": priority.name.lower()}
+            )
+        except Exception as e:
+            logger.debug(f"AI queue metrics error: {e}")
+
+    async def process(
+        self,
+        func: Callable[..., T],
+        *args,
+        priority: RequestPriority = RequestPriority.CHAT,
+        **kwargs,
+    ) -> T:
         """
         Выполнить AI запрос через очередь.
 
-        Автоматически ограничивает количество одновременных запросов
-        для предотвращения перегрузки и rate limiting.
-
         Args:
             func: Async функция для выполнения (например, ai_service.generate_response)
             *args: Позиционные аргументы для функции
+            priority: Класс приоритета запроса
             **kwargs: Именованные аргументы для функции
 
         Returns:
             Результат выполнения функции
 
+        Raises:
+            AIQueueTimeoutError: Слот не освободился за max_wait
+
         Example:
             >>> queue = AIRequestQueue(max_concurrent=10)
             >>> response = await queue.process(
@@ -64,18 +311,21 @@ class AIRequestQueue:
             ...     chat_history=[]
             ... )
         """
-        async with self.semaphore:
-            try:
-                logger.debug(
-                    f"🔄 AI запрос в очереди: {func.__name__} "
-                    f"(активных: {self.max_concurrent - self.semaphore._value})"
-                )
-                result = await func(*args, **kwargs)
-                logger.debug(f"✅ AI запрос завершен: {func.__name__}")
-                return result
-            except Exception as e:
-                logger.error(f"❌ Ошибка в AI запросе {func.__name__}: {e}")
-                raise
+        priority, user_key = self._resolve(priority)
+        await self._acquire(priority, user_key)
+        try:
+            logger.debug(
+                f"🔄 AI запрос в очереди: {func.__name__} "
+                f"({priority.name}, активных: {self._active})"
+            )
+            result = await func(*args, **kwargs)
+            logger.debug(f"✅ AI запрос завершен: {func.__name__}")
+            return result
+        except Exception as e:
+            logger.error(f"❌ Ошибка в AI запросе {func.__name__}: {e}")
+            raise
+        finally:
+            self._release()
 
     def get_active_count(self) -> int:
         """
@@ -84,7 +334,7 @@ class AIRequestQueue:
         Returns:
             int: Количество активных запросов
         """
-        return self.max_concurrent - self.semaphore._value
+        return self._active
 
     def get_available_slots(self) -> int:
         """
@@ -93,10 +343,28 @@ class AIRequestQueue:
         Returns:
             int: Количество доступных слотов для новых запросов
         """
-        return self.semaphore._value
+        return max(self.max_concurrent - self._active, 0)
+
+    def get_queue_depth(self, priority: RequestPriority | None = None) -> int:
+        """
+        Получить количество запросов, ожидающих слот.
+
+        Args:
+            priority: Класс приоритета (None — все классы)
+
+        Returns:
+            int: Длина очереди
+        """
+        if priority is None:
+            return self._queued
+        return sum(len(pending) for pending in self._queues[priority].values())
 
     async def process_stream(
-        self, func: Callable[..., AsyncIterator[str]], *args, **kwargs
+        self,
+        func: Callable[..., AsyncIterator[str]],
+        *args,
+        priority: RequestPriority = RequestPriority.INTERACTIVE_STREAM,
+        **kwargs,
     ) -> AsyncIterator[str]:
         """
         Выполнить streaming AI запрос через очередь.
@@ -104,11 +372,15 @@ class AIRequestQueue:
         Args:
             func: Async generator функция для выполнения
             *args: Позиционные аргументы для функции
+            priority: Класс приоритета запроса
             **kwargs: Именованные аргументы для функции
 
         Yields:
             Chunks от функции
 
+        Raises:
+            AIQueueTimeoutError: Слот не освободился за max_wait
+
         Example:
             >>> queue = AIRequestQueue(max_concurrent=10)
             >>> async for chunk in queue.process_stream(
@@ -118,25 +390,32 @@ class AIRequestQueue:
             ... ):
             ...     print(chunk)
         """
-        async with self.semaphore:
-            try:
-                logger.debug(
-                    f"🔄 AI streaming запрос в очереди: {func.__name__} "
-                    f"(активных: {self.max_concurrent - self.semaphore._value})"
-                )
-                async for chunk in func(*args, **kwargs):
-                    yield chunk
-                logger.debug(f"✅ AI streaming запрос завершен: {func.__name__}")
-            except Exception as e:
-                logger.error(f"❌ Ошибка в AI streaming запросе {func.__name__}: {e}")
-                raise
+        priority, user_key = self._resolve(priority)
+        await self._acquire(priority, user_key)
+        try:
+            logger.debug(
+                f"🔄 AI streaming запрос в очереди: {func.__name__} "
+                f"({priority.name}, активных: {self._active})"
+            )
+            async for chunk in func(*args, **kwargs):
+                yield chunk
+            logger.debug(f"✅ AI streaming запрос завершен: {func.__name__}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка в AI streaming запросе {func.__name__}: {e}")
+            raise
+        finally:
+            self._release()
 
 
 # Глобальный экземпляр очереди (Singleton)
 _ai_queue: AIRequestQueue | None = None
 
 
-def get_ai_request_queue(max_concurrent: int = 12) -> AIRequestQueue:
+def get_ai_request_queue(
+    max_concurrent: int = 12,
+    max_wait_seconds: float = DEFAULT_MAX_WAIT_SECONDS,
+    batch_max_wait_seconds: float = DEFAULT_BATCH_MAX_WAIT_SECONDS,
+) -> AIRequestQueue:
     """
     Получить глобальный экземпляр очереди AI запросов.
 
@@ -145,12 +424,18 @@ def get_ai_request_queue(max_concurrent: int = 12) -> AIRequestQueue:
 
     Args:
         max_concurrent: Максимальное количество одновременных запросов
-                      (используется только при первом вызове)
+        max_wait_seconds: Максимальное ожидание слота для интерактивных запросов
+        batch_max_wait_seconds: Максимальное ожидание слота для фоновых задач
+        (параметры используются только при первом вызове)
 
     Returns:
         AIRequestQueue: Глобальный экземпляр очереди
     """
     global _ai_queue
     if _ai_queue is None:
-        _ai_queue = AIRequestQueue(max_concurrent=max_concurrent)
+        _ai_queue = AIRequestQueue(
+            max_concurrent=max_concurrent,
+            max_wait_seconds=max_wait_seconds,
+            batch_max_wait_seconds=batch_max_wait_seconds,
+        )
     return _ai_queue
@@ -0,0 +1,352 @@
+"""
+Кэш точных ответов AI для детерминированных учебных вопросов.
+
+«Что такое фотосинтез» для 5 класса, таблица умножения, формулы —
+одинаковые вопросы от разных учеников получают один и тот же ответ
+без платного вызова YandexGPT.
+
+Ключ — отпечаток запроса: нормализованный текст + класс/возрастная
+группа + версия системных промптов + модель + температура (шаг 0.1)
++ пол и предпочтение по эмодзи (влияют на формулировки ответа).
+Кэшируются только самостоятельные вопросы (без ссылок на предыдущие
+сообщения и без личных деталей) и только ответы, прошедшие модерацию
+и не содержащие имени ученика. Хранится «сырой» ответ модели: при
+попадании он проходит ту же постобработку, что и живой ответ.
+
+Хранилище — AIResponseCache (Redis или in-memory), выключатель —
+AI_ANSWER_CACHE_ENABLED.
+"""
+
+import hashlib
+import re
+from collections.abc import AsyncIterator
+
+from loguru import logger
+
+from bot.config import settings
+from bot.services.cache import AIResponseCache
+
+# Увеличить при изменении правил кэширования или формата хранимого ответа
+ANSWER_CACHE_VERSION = "a1"
+
+_MIN_MESSAGE_LENGTH = 3
+_MAX_MESSAGE_LENGTH = 200
+_MIN_ANSWER_LENGTH = 20
+_REPLAY_CHUNK_CHARS = 120
+
+_WORD_RE = re.compile(r"[a-zа-я0-9]+")
+
+# Вопросы с детерминированным ответом (определения, формулы, таблицы, вычисления)
+_CACHEABLE_INTENT_PATTERNS = tuple(
+    re.compile(pattern)
+    for pattern in (
+        r"^(что|кто) так(ое|ой|ая|ие)\b",
+        r"^что (значит|означает)\b",
+        r"^(объясни|расскажи)( мне)? (что такое|про|о|об|как)\b",
+        r"^как (найти|вычислить|посчитать|решать|решить|пишется|пишутся|определить)\b",
+        r"\bформул",
+        r"\bтаблиц[аеуы]? умножения\b",
+        r"^(сколько будет|чему равн[оаы]|вычисли|посчитай)\b",
+        r"^[\d\s+\-*/×÷:=().,^]+$",
+        r"\bправило\b",
+    )
+)
+
+# Слова, делающие вопрос зависимым от диалога или от личности ученика
+_CONTEXT_WORDS = frozenset(
+    {
+        # Указательные
+        "это",
+        "этот",
+        "эта",
+        "эту",
+        "этого",
+        "этой",
+        "этом",
+        "эти",
+        "этих",
+        # Местоимения третьего лица
+        "он",
+        "она",
+        "оно",
+        "они",
+        "его",
+        "ее",
+        "их",
+        "ему",
+        "ей",
+        "им",
+        "нем",
+        "ней",
+        "них",
+        # Отсылки к месту и времени
+        "там",
+        "тут",
+        "здесь",
+        "тогда",
+        # Продолжение диалога
+        "еще",
+        "снова",
+        "опять",
+        "дальше",
+        "продолжи",
+        "продолжай",
+        "подробнее",
+        "выше",
+        "ниже",
+        "предыдущий",
+        # Первое лицо, ед. ч.
+        "я",
+        "мне",
+        "меня",
+        "мной",
+        "мой",
+        "моя",
+        "мое",
+        "мои",
+        "мою",
+        "моего",
+        "моей",
+        "моих",
+        # Первое лицо, мн. ч.
+        "мы",
+        "нас",
+        "нам",
+        "наш",
+        "наша",
+        "наше",
+        "наши",
+        "нашего",
+        "нашей",
+        # Второе лицо
+        "ты",
+        "тебя",
+        "тебе",
+        "твой",
+        "твоя",
+        "твое",
+        "твои",
+    }
+)
+
+# Признаки персонального обращения в ответе (просьба назвать имя и т.п.)
+_PERSONAL_ANSWER_MARKERS = ("как тебя зовут", "твое имя", "твоё имя")
+
+_prompt_version_cache: str | None = None
+
+
+def normalize_question(text: str) -> str:
+    """Нормализация вопроса для ключа: регистр, ё→е, пробелы, хвостовая пунктуация."""
+    text = text.lower().replace("ё", "е")
+    text = " ".join(text.split())
+    return text.strip(" ?!.,;…")
+
+
+def _prompt_version() -> str:
+    """Короткий хэш текстов системных промптов: правка промптов сбрасывает кэш."""
+    global _prompt_version_cache
+    if _prompt_version_cache is None:
+        from bot.config import prompts
+
+        texts = [
+            f"{name}={value}"
+            for name, value in sorted(vars(prompts).items())
+            if name.isupper() and isinstance(value, str)
+        ]
+        digest = hashlib.sha256("\n".join(texts).encode("utf-8")).hexdigest()
+        _prompt_version_cache = digest[:12]
+    return _prompt_version_cache
+
+
+def _audience_band(user_age: int | None, user_grade: int | None) -> str:
+    """Группа аудитории: класс, иначе возрастная группа по 2 года."""
+    if user_grade:
+        return f"g{user_grade}"
+    if user_age:
+        return f"a{min(max(user_age, 6), 18) // 2 * 2}"
+    return "any"
+
+
+class AnswerCache:
+    """
+    Кэш точных ответов AI поверх AIResponseCache.
+
+    Attributes:
+        hits: Попадания в кэш
+        misses: Промахи по кэшируемым вопросам
+        bypassed: Вопросы, не подходящие под правила кэширования
+        stored: Сохранённые ответы
+    """
+
+    def __init__(self, ttl_seconds: int | None = None):
+        self.ttl_seconds = ttl_seconds or settings.ai_answer_cache_ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stored = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Выключатель читается на каждый запрос (без перезапуска процесса)."""
+        return settings.ai_answer_cache_enabled
+
+    @property
+    def hit_rate(self) -> float:
+        """Доля попаданий среди кэшируемых вопросов."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict[str, float | int | bool]:
+        """Счётчики для мониторинга."""
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "stored": self.stored,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+    @staticmethod
+    def is_cacheable_question(message: str) -> bool:
+        """Самостоятельный учебный вопрос с детерминированным ответом."""
+        normalized = normalize_question(message)
+        if not _MIN_MESSAGE_LENGTH <= len(normalized) <= _MAX_MESSAGE_LENGTH:
+            return False
+        if any(word in _CONTEXT_WORDS for word in _WORD_RE.findall(normalized)):
+            return False
+        return any(pattern.search(normalized) for pattern in _CACHEABLE_INTENT_PATTERNS)
+
+    @staticmethod
+    def is_cacheable_answer(answer: str, user_name: str | None = None) -> bool:
+        """Ответ без персональных деталей и прошедший модерацию."""
+        if not answer or len(answer.strip()) < _MIN_ANSWER_LENGTH:
+            return False
+        answer_lower = answer.lower()
+        if user_name and len(user_name) > 1 and user_name.lower() in answer_lower:
+            return False
+        if any(marker in answer_lower for marker in _PERSONAL_ANSWER_MARKERS):
+            return False
+
+        from bot.services.moderation_service import get_moderation_service
+
+        is_safe, _reason = get_moderation_service().is_safe_content(answer)
+        return is_safe
+
+    def fingerprint(
+        self,
+        message: str,
+        *,
+        model: str,
+        temperature: float,
+        user_age: int | None = None,
+        user_grade: int | None = None,
+        user_gender: str | None = None,
+        emoji_in_chat: bool | None = None,
+        has_media: bool = False,
+    ) -> str | None:
+        """
+        Ключ кэша для запроса или None, если запрос не кэшируется.
+
+        Args:
+            message: Нормализованное (опечатки исправлены) сообщение пользователя
+            model: Модель YandexGPT
+            temperature: Температура генерации
+            user_age: Возраст ученика
+            user_grade: Класс ученика
+            user_gender: Пол (влияет на формы обращения)
+            emoji_in_chat: Предпочтение по эмодзи
+            has_media: В запросе есть фото (ответ зависит от изображения)
+        """
+        if not self.enabled:
+            return None
+        if has_media or not self.is_cacheable_question(message):
+            self.bypassed += 1
+            self._record("bypass")
+            return None
+
+        parts = (
+            ANSWER_CACHE_VERSION,
+            _prompt_version(),
+            model,
+            f"t{round(temperature * 10)}",
+            _audience_band(user_age, user_grade),
+            user_gender or "-",
+            {True: "e1", False: "e0"}.get(emoji_in_chat, "e-"),
+            normalize_question(message),
+        )
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    async def get(self, fingerprint: str | None) -> str | None:
+        """Сохранённый ответ модели или None."""
+        if fingerprint is None or not self.enabled:
+            return None
+        try:
+            answer = await AIResponseCache.get_response(fingerprint)
+        except Exception as e:
+            logger.debug(f"Answer cache get error: {e}")
+            answer = None
+        if answer:
+            self.hits += 1
+            self._record("hit")
+            logger.info(f"💾 Кэш ответов: попадание ({fingerprint[:12]})")
+            return answer
+        self.misses += 1
+        self._record("miss")
+        return None
+
+    async def store(
+        self, fingerprint: str | None, answer: str, user_name: str | None = None
+    ) -> bool:
+        """Сохранить ответ модели, если он проходит правила кэширования."""
+        if fingerprint is None or not self.enabled:
+            return False
+        if not self.is_cacheable_answer(answer, user_name=user_name):
+            return False
+        try:
+            saved = await AIResponseCache.set_response(fingerprint, answer, ttl=self.ttl_seconds)
+        except Exception as e:
+            logger.debug(f"Answer cache set error: {e}")
+            return False
+        if saved:
+            self.stored += 1
+            self._record("store")
+        return bool(saved)
+
+    @staticmethod
+    async def replay(answer: str) -> AsyncIterator[str]:
+        """
+        Выдать сохранённый ответ как streaming YandexGPT: кумулятивными chunks.
+
+        Текст режется по границам слов примерно по _REPLAY_CHUNK_CHARS символов,
+        поэтому клиент получает ту же последовательность SSE-событий, что и вживую.
+        """
+        pos = 0
+        while pos < len(answer):
+            end = min(pos + _REPLAY_CHUNK_CHARS, len(answer))
+            if end < len(answer):
+                space = answer.rfind(" ", pos + 1, end)
+                if space > pos:
+                    end = space
+            pos = end
+            yield answer[:pos]
+
+    @staticmethod
+    def _record(result: str) -> None:
+        try:
+            from bot.monitoring.prometheus_metrics import get_metrics
+
+            get_metrics().increment_counter("ai_answer_cache_requests_total", {"result": result})
+        except Exception as e:
+            logger.debug(f"Answer cache metrics error: {e}")
+
+
+_answer_cache: AnswerCache | None = None
+
+
+def get_answer_cache() -> AnswerCache:
+    """Синглтон AnswerCache."""
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = AnswerCache()
+    return _answer_cache
@@ -0,0 +1,212 @@
+"""
+Асинхронная перекодировка аудио через ffmpeg.
+
+Голосовые из Mini App приходят в WebM, Yandex SpeechKit принимает OGG Opus.
+ffmpeg запускается через asyncio.create_subprocess_exec: вход подаётся
+в stdin, результат читается из stdout (без временных файлов), event loop
+не блокируется на время перекодировки.
+
+- Одновременно работает не больше max_concurrency процессов ffmpeg
+  (остальные запросы ждут семафор), чтобы голосовые не съели все CPU.
+- Таймаут и отмена запроса убивают процесс ffmpeg — «зомби» не остаются.
+- Выход собирается в bytearray с ограничением размера.
+"""
+
+import asyncio
+import time
+
+from loguru import logger
+
+DEFAULT_TRANSCODE_CONCURRENCY = 2
+DEFAULT_TRANSCODE_TIMEOUT_SECONDS = 10.0
+MAX_TRANSCODED_BYTES = 20 * 1024 * 1024  # 20MB
+_CHUNK_SIZE = 64 * 1024
+_MAX_STDERR_BYTES = 4 * 1024
+
+# -i pipe:0 ... -f ogg pipe:1: WebM из stdin -> OGG Opus 48 кГц моно в stdout
+WEBM_TO_OGG_OPUS_ARGS = (
+    "-acodec",
+    "libopus",
+    "-ar",
+    "48000",
+    "-ac",
+    "1",
+    "-f",
+    "ogg",
+)
+
+
+class AudioTranscoder:
+    """
+    Пул перекодировок аудио через ffmpeg.
+
+    Attributes:
+        max_concurrency: Максимум одновременно запущенных ffmpeg
+        timeout_seconds: Максимальное время одной перекодировки
+        max_output_bytes: Лимит размера результата
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_TRANSCODE_CONCURRENCY,
+        timeout_seconds: float = DEFAULT_TRANSCODE_TIMEOUT_SECONDS,
+        max_output_bytes: int = MAX_TRANSCODED_BYTES,
+        ffmpeg_binary: str = "ffmpeg",
+    ):
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self.max_output_bytes = max_output_bytes
+        self.ffmpeg_binary = ffmpeg_binary
+        self._semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+
+    async def webm_to_ogg_opus(self, audio_bytes: bytes) -> bytes | None:
+        """
+        Перекодировать WebM в OGG Opus.
+
+        Returns:
+            bytes: OGG Opus или None (ошибка ffmpeg, таймаут, превышен лимит размера)
+        """
+        return await self.transcode(audio_bytes, WEBM_TO_OGG_OPUS_ARGS, kind="webm_ogg")
+
+    async def transcode(
+        self, audio_bytes: bytes, output_args: tuple[str, ...], kind: str = "audio"
+    ) -> bytes | None:
+        """
+        Перекодировать аудио: stdin -> ffmpeg -> stdout.
+
+        Args:
+            audio_bytes: Исходное аудио
+            output_args: Аргументы ffmpeg для выхода (кодек, формат через -f)
+            kind: Метка для логов и метрик
+
+        Returns:
+            bytes: Результат или None при ошибке
+        """
+        async with self._semaphore:
+            start = time.perf_counter()
+            result = "error"
+            output: bytes | None = None
+            try:
+                output = await asyncio.wait_for(
+                    self._run_ffmpeg(audio_bytes, output_args), timeout=self.timeout_seconds
+                )
+                result = "ok" if output is not None else "error"
+            except TimeoutError:
+                result = "timeout"
+                logger.error(
+                    f"❌ ffmpeg timeout ({self.timeout_seconds}с) - "
+                    "конвертация заняла слишком много времени"
+                )
+            except FileNotFoundError:
+                logger.error(f"❌ {self.ffmpeg_binary} не найден, конвертация аудио невозможна")
+            finally:
+                self._record_metrics(
+                    kind,
+                    result,
+                    time.perf_counter() - start,
+                    len(audio_bytes),
+                    len(output) if output else 0,
+                )
+            return output
+
+    async def _run_ffmpeg(self, audio_bytes: bytes, output_args: tuple[str, ...]) -> bytes | None:
+        process = await asyncio.create_subprocess_exec(
+            self.ffmpeg_binary,
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-i",
+            "pipe:0",
+            *output_args,
+            "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            # stdin пишем параллельно с чтением stdout, иначе ffmpeg
+            # заблокируется на заполненном pipe
+            _written, output, stderr = await asyncio.gather(
+                self._feed_stdin(process, audio_bytes),
+                self._read_stdout(process),
+                self._read_stderr(process),
+            )
+            returncode = await process.wait()
+        finally:
+            # Таймаут, отмена запроса или превышение лимита: процесс не должен пережить вызов
+            if process.returncode is None:
+                process.kill()
+                await asyncio.shield(process.wait())
+
+        if output is None:
+            logger.error(f"❌ Конвертированный файл больше {self.max_output_bytes} байт")
+            return None
+        if returncode != 0:
+            logger.error(f"❌ Ошибка ffmpeg (код {returncode}): {stderr.decode(errors='replace')}")
+            return None
+        return bytes(output)
+
+    @staticmethod
+    async def _feed_stdin(process: asyncio.subprocess.Process, audio_bytes: bytes) -> None:
+        try:
+            process.stdin.write(audio_bytes)
+            await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg завершился раньше (битый вход) — код возврата скажет больше
+            pass
+        finally:
+            process.stdin.close()
+
+    async def _read_stdout(self, process: asyncio.subprocess.Process) -> bytearray | None:
+        output = bytearray()
+        while chunk := await process.stdout.read(_CHUNK_SIZE):
+            output += chunk
+            if len(output) > self.max_output_bytes:
+                process.kill()
+                return None
+        return output
+
+    @staticmethod
+    async def _read_stderr(process: asyncio.subprocess.Process) -> bytes:
+        stderr = bytearray()
+        while chunk := await process.stderr.read(_CHUNK_SIZE):
+            if len(stderr) < _MAX_STDERR_BYTES:
+                stderr += chunk[: _MAX_STDERR_BYTES - len(stderr)]
+        return bytes(stderr)
+
+    @staticmethod
+    def _record_metrics(
+        kind: str, result: str, seconds: float, input_bytes: int, output_bytes: int
+    ) -> None:
+        try:
+            from bot.monitoring.prometheus_metrics import get_metrics
+
+            metrics = get_metrics()
+            metrics.record_histogram(
+                "audio_transcode_seconds", seconds, {"kind": kind, "result": result}
+            )
+            metrics.record_histogram(
+                "audio_transcode_bytes", input_bytes, {"kind": kind, "direction": "input"}
+            )
+            if output_bytes:
+                metrics.record_histogram(
+                    "audio_transcode_bytes", output_bytes, {"kind": kind, "direction": "output"}
+                )
+        except Exception as e:
+            logger.debug(f"Audio transcoder metrics error: {e}")
+
+
+_audio_transcoder: AudioTranscoder | None = None
+
+
+def get_audio_transcoder() -> AudioTranscoder:
+    """Синглтон AudioTranscoder (параллелизм и таймаут из настроек)."""
+    global _audio_transcoder
+    if _audio_transcoder is None:
+        from bot.config import settings
+
+        _audio_transcoder = AudioTranscoder(
+            max_concurrency=settings.audio_transcode_concurrency,
+            timeout_seconds=settings.audio_transcode_timeout_seconds,
+        )
+    return _audio_transcoder
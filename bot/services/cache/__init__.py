@@ -4,11 +4,15 @@
 Публичный API:
     CacheConfig, MemoryCache  — конфигурация и in-memory реализация
     CacheService, cache_service, cached  — основной сервис и декоратор
+    SingleFlight  — схлопывание одновременных загрузок одного ключа
+    RedisTier  — опциональный Redis-уровень с повторной проверкой после сбоя
     UserCache, ModerationCache, AIResponseCache  — специализированные кэши
 """
 
 from bot.services.cache.memory import CacheConfig, MemoryCache  # noqa: F401
+from bot.services.cache.redis_tier import RedisTier  # noqa: F401
 from bot.services.cache.service import CacheService, cache_service, cached  # noqa: F401
+from bot.services.cache.single_flight import SingleFlight  # noqa: F401
 from bot.services.cache.specialized import (  # noqa: F401
     AIResponseCache,
     ModerationCache,
@@ -21,6 +25,8 @@ __all__ = [
     "CacheService",
     "cache_service",
     "cached",
+    "SingleFlight",
+    "RedisTier",
     "UserCache",
     "ModerationCache",
     "AIResponseCache",
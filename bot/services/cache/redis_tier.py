@@ -0,0 +1,68 @@
+"""
+Опциональный Redis-уровень с повторной проверкой после сбоя.
+
+Сервисы с общим Redis-кэшем (эмбеддинги, PNG визуализаций, квоты) не должны
+терять Redis до перезапуска из-за одного таймаута: после ошибки уровень
+уходит на паузу, а первая операция после неё снова пробует Redis.
+"""
+
+import time
+from collections.abc import Callable
+from typing import Any
+
+from loguru import logger
+
+
+class RedisTier:
+    """
+    Ленивый Redis-клиент с паузой после ошибки.
+
+    Клиент создаётся фабрикой при первом обращении. После сбоя (fail)
+    client() возвращает None в течение cooldown_seconds — вызывающий код
+    работает без Redis, — затем Redis пробуется снова.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        connect: Callable[[str], Any],
+        name: str,
+        cooldown_seconds: float = 30.0,
+    ):
+        self.url = url
+        self.name = name
+        self.cooldown_seconds = cooldown_seconds
+        self._connect = connect
+        self._client = None
+        self._down_until = 0.0
+
+    @property
+    def configured(self) -> bool:
+        """Задан ли REDIS_URL для этого уровня."""
+        return bool(self.url)
+
+    @property
+    def available(self) -> bool:
+        """Redis задан и не на паузе после ошибки."""
+        return self.configured and time.monotonic() >= self._down_until
+
+    def client(self):
+        """Клиент Redis или None (не задан или на паузе после ошибки)."""
+        if not self.available:
+            return None
+        if self._client is None:
+            try:
+                self._client = self._connect(self.url)
+            except Exception as e:
+                self.fail(e)
+                return None
+        return self._client
+
+    def fail(self, error: Exception) -> None:
+        """Отметить сбой: Redis не используется cooldown_seconds."""
+        if self.available:
+            logger.warning(
+                f"⚠️ Redis ({self.name}) недоступен: {error}, "
+                f"повтор через {self.cooldown_seconds:.0f} с"
+            )
+        self._down_until = time.monotonic() + self.cooldown_seconds
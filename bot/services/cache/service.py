@@ -2,17 +2,33 @@
 Основной сервис кэширования (Redis + in-memory fallback).
 
 Содержит CacheService, глобальный singleton и декоратор cached.
+
+Промах кэша загружается один раз на ключ: одновременные запросы внутри
+процесса схлопываются через SingleFlight, между инстансами — через
+короткий Redis lease (SET NX PX), пока лидер не положит значение в кэш.
 """
 
 import asyncio
 import hashlib
 import json
+import time
+import uuid
 from typing import Any
 
 from loguru import logger
 
 from bot.config import settings
 from bot.services.cache.memory import CacheConfig, MemoryCache
+from bot.services.cache.single_flight import SingleFlight
+
+# Снять lease, только если он всё ещё наш (не истёк и не перехвачен другим инстансом)
+_RELEASE_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+_LEASE_POLL_INTERVAL_SECONDS = 0.05
 
 # Попытка импорта Redis
 try:
@@ -36,6 +52,8 @@ class CacheService:
         self._redis_client = None
         self._memory_cache = MemoryCache()
         self._use_redis = False
+        self._flight = SingleFlight("cache")
+        self.lease_seconds = float(getattr(settings, "cache_lock_lease_seconds", 0) or 0)
 
         # Пытаемся подключиться к Redis
         if REDIS_AVAILABLE:
@@ -296,6 +314,18 @@ class CacheService:
         if cached_value is not None:
             return cached_value
 
+        # Промах: одновременные запросы того же ключа ждут одну загрузку
+        return await self._flight.do(key, self._load, key, fetch_func, ttl, args, kwargs)
+
+    async def _load(self, key: str, fetch_func, ttl: int | None, args: tuple, kwargs: dict) -> Any:
+        """Загрузка значения лидером single-flight (с Redis lease между инстансами)."""
+        acquired, token = await self._acquire_lease(key)
+        if not acquired:
+            # Ключ загружает другой инстанс — ждём его результата в кэше
+            value = await self._wait_for_value(key)
+            if value is not None:
+                return value
+
         # Получаем значение через функцию
         try:
             if asyncio.iscoroutinefunction(fetch_func):
@@ -311,6 +341,59 @@ class CacheService:
         except Exception as e:
             logger.error(f"❌ Ошибка в fetch_func для ключа {key}: {e}")
             raise
+        finally:
+            if token is not None:
+                await self._release_lease(key, token)
+
+    async def _redis_ready(self) -> bool:
+        """Доступен ли Redis (с ленивой проверкой подключения)."""
+        if self._redis_client and not self._use_redis:
+            await self._ensure_redis_connection()
+        return bool(self._use_redis and self._redis_client)
+
+    async def _acquire_lease(self, key: str) -> tuple[bool, str | None]:
+        """
+        Взять lease на загрузку ключа.
+
+        Returns:
+            (получен ли lease, токен для снятия). Без Redis или при выключенных
+            lease загрузку выполняет этот инстанс: (True, None).
+        """
+        if self.lease_seconds <= 0 or not await self._redis_ready():
+            return True, None
+
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self._redis_client.set(
+                f"lock:{key}", token, nx=True, px=int(self.lease_seconds * 1000)
+            )
+        except Exception as e:
+            logger.debug(f"Redis lease недоступен для {key}: {e}")
+            return True, None
+        return (True, token) if acquired else (False, None)
+
+    async def _release_lease(self, key: str, token: str) -> None:
+        """Снять lease, если он ещё принадлежит этому инстансу."""
+        try:
+            await self._redis_client.eval(_RELEASE_LEASE_SCRIPT, 1, f"lock:{key}", token)
+        except Exception as e:
+            logger.debug(f"Не удалось снять Redis lease {key}: {e}")
+
+    async def _wait_for_value(self, key: str) -> Any | None:
+        """Дождаться значения от инстанса-лидера (не дольше срока lease)."""
+        deadline = time.monotonic() + self.lease_seconds
+        while time.monotonic() < deadline:
+            await asyncio.sleep(_LEASE_POLL_INTERVAL_SECONDS)
+            value = await self.get(key)
+            if value is not None:
+                return value
+            try:
+                if not await self._redis_client.exists(f"lock:{key}"):
+                    # Лидер завершился без значения (ошибка) — загружаем сами
+                    return None
+            except Exception:
+                return None
+        return None
 
     async def get_stats(self) -> dict[str, Any]:
         """
@@ -331,12 +414,14 @@ class CacheService:
                     "keyspace_hits": info.get("keyspace_hits", 0),
                     "keyspace_misses": info.get("keyspace_misses", 0),
                     "hit_rate": self._calculate_hit_rate(info),
+                    "single_flight": self._flight.stats(),
                 }
             else:
                 stats_result = await self._memory_cache.get_stats()
                 stats: dict[str, Any] = dict(stats_result) if isinstance(stats_result, dict) else {}
                 stats["type"] = "memory"
                 stats["connected"] = False
+                stats["single_flight"] = self._flight.stats()
                 return stats
 
         except Exception as e:
@@ -380,21 +465,8 @@ def cached(ttl: int = 3600, key_prefix: str = "cache"):
             # Генерируем ключ кэша
             key = cache_service.generate_key(key_prefix, func.__name__, *args, **kwargs)
 
-            # Пытаемся получить из кэша
-            cached_result = await cache_service.get(key)
-            if cached_result is not None:
-                return cached_result
-
-            # Выполняем функцию
-            if asyncio.iscoroutinefunction(func):
-                result = await func(*args, **kwargs)
-            else:
-                result = func(*args, **kwargs)
-
-            # Сохраняем в кэш
-            await cache_service.set(key, result, ttl)
-
-            return result
+            # Кэш + single-flight: одновременные промахи выполняют func один раз
+            return await cache_service.get_or_set(key, func, ttl, *args, **kwargs)
 
         return wrapper
 
@@ -0,0 +1,108 @@
+"""
+Single-flight: схлопывание одновременных запросов одного ключа.
+
+Первый запрос по ключу («лидер») выполняет загрузку, остальные
+одновременные запросы ждут его future и получают тот же результат
+(или то же исключение). После завершения ключ освобождается —
+это не кэш, а защита от stampede при промахе кэша.
+
+Если лидер отменён (например, дедлайн RAG), ожидающие не получают
+CancelledError: один из них становится новым лидером.
+"""
+
+import asyncio
+import inspect
+from collections.abc import Callable
+from typing import Any
+
+from loguru import logger
+
+
+class _LeaderCancelled(Exception):
+    """Лидер отменён до результата — ожидающим нужно повторить."""
+
+
+class SingleFlight:
+    """
+    In-process single-flight по строковому ключу.
+
+    Attributes:
+        name: Имя группы (метка метрики cache_coalesced_waiters_total)
+        leaders: Сколько раз загрузка действительно выполнялась
+        coalesced: Сколько запросов дождались чужой загрузки
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.leaders = 0
+        self.coalesced = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def in_flight(self) -> int:
+        """Количество ключей, загрузка которых сейчас выполняется."""
+        return len(self._inflight)
+
+    def stats(self) -> dict[str, int]:
+        """Счётчики для мониторинга."""
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+        }
+
+    async def do(self, key: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Выполнить func(*args, **kwargs) не более одного раза на ключ одновременно.
+
+        Args:
+            key: Ключ схлопывания (обычно ключ кэша)
+            func: Async или sync функция загрузки
+            *args: Позиционные аргументы для func
+            **kwargs: Именованные аргументы для func
+
+        Returns:
+            Результат func (общий для всех одновременных вызовов)
+        """
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                return await self._lead(key, func, *args, **kwargs)
+
+            self.coalesced += 1
+            self._record_coalesced()
+            try:
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                continue
+
+    async def _lead(self, key: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.leaders += 1
+        try:
+            result = func(*args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if future.done() and not future.cancelled():
+                # Исключение уже проброшено лидеру; ожидающих может не быть
+                future.exception()
+
+    def _record_coalesced(self) -> None:
+        try:
+            from bot.monitoring.prometheus_metrics import get_metrics
+
+            get_metrics().increment_counter("cache_coalesced_waiters_total", {"flight": self.name})
+        except Exception as e:
+            logger.debug(f"Single-flight metrics error: {e}")
@@ -2,12 +2,35 @@
 Сервис эмбеддингов для векторного поиска.
 
 Использует Yandex Embeddings API (text-search-doc, text-search-query).
+
+Эмбеддинги мемоизируются по (text_type, нормализованный текст): in-process LRU
+с TTL и опциональный Redis-уровень (вектор хранится компактно, как float32 bytes).
+Один вопрос пользователя в RAG pipeline эмбеддится один раз, а не на каждом шаге.
+Одновременные промахи по одному тексту (класс задаёт один вопрос) схлопываются
+в один запрос к API через SingleFlight.
 """
 
+import hashlib
+import time
+from array import array
+from collections import OrderedDict
+
 from loguru import logger
 
+from bot.config import settings
+from bot.services.cache.redis_tier import RedisTier
+from bot.services.cache.single_flight import SingleFlight
 from bot.services.yandex_cloud_service import get_yandex_cloud_service
 
+try:
+    import redis.asyncio as aioredis
+
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+EMBEDDING_CACHE_KEY_PREFIX = "emb:v1"
+
 
 def _normalize_text(text: str) -> str:
     """Нормализация: схлопнуть пробелы."""
@@ -23,34 +46,177 @@ def _truncate_on_word_boundary(text: str, max_len: int) -> str:
     return cut[:last_space] if last_space > 0 else cut
 
 
+def _pack_vector(vector: list[float]) -> bytes:
+    """Вектор -> float32 bytes (4 байта на компоненту вместо ~20 в JSON)."""
+    return array("f", vector).tobytes()
+
+
+def _unpack_vector(data: bytes) -> list[float]:
+    """float32 bytes -> вектор."""
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """
+    Двухуровневый кэш эмбеддингов.
+
+    1. In-process LRU с TTL (OrderedDict, без await — дешёвый hit).
+    2. Redis (если задан REDIS_URL): общий для всех воркеров, значения — float32 bytes.
+       Ошибки Redis не ломают поиск: уровень уходит на паузу, работает только LRU.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 2048,
+        ttl_seconds: int = 86400,
+        redis_url: str = "",
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()
+        self._redis = RedisTier(
+            redis_url if REDIS_AVAILABLE else "", self._connect_redis, "кэш эмбеддингов"
+        )
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(text: str, text_type: str) -> str:
+        """Ключ кэша: тип эмбеддинга + sha256 нормализованного текста."""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{EMBEDDING_CACHE_KEY_PREFIX}:{text_type}:{digest}"
+
+    @staticmethod
+    def _connect_redis(url: str):
+        """Binary-клиент Redis (decode_responses=False)."""
+        return aioredis.from_url(
+            url,
+            decode_responses=False,
+            socket_connect_timeout=2,
+            socket_timeout=2,
+        )
+
+    def _get_local(self, key: str) -> list[float] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, vector = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return vector
+
+    def _set_local(self, key: str, vector: list[float]) -> None:
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> list[float] | None:
+        """Вектор из LRU или Redis (найденный в Redis поднимается в LRU)."""
+        vector = self._get_local(key)
+        if vector is not None:
+            self.hits += 1
+            return vector
+
+        client = self._redis.client()
+        if client is not None:
+            try:
+                data = await client.get(key)
+            except Exception as e:
+                self._redis.fail(e)
+                data = None
+            if data:
+                vector = _unpack_vector(data)
+                self._set_local(key, vector)
+                self.redis_hits += 1
+                return vector
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, vector: list[float]) -> None:
+        """Сохранить вектор в LRU и (если есть) в Redis."""
+        self._set_local(key, vector)
+        client = self._redis.client()
+        if client is not None:
+            try:
+                await client.setex(key, self.ttl_seconds, _pack_vector(vector))
+            except Exception as e:
+                self._redis.fail(e)
+
+    def clear(self) -> None:
+        """Очистить in-process уровень (Redis-записи истекают по TTL)."""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Статистика кэша."""
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "redis_enabled": self._redis.available,
+        }
+
+
 class EmbeddingService:
     """Сервис эмбеддингов через Yandex Cloud API."""
 
     MAX_TEXT_LENGTH = 7000  # Yandex limit 8000, оставляем запас
 
-    def __init__(self):
+    def __init__(self, cache: EmbeddingCache | None = None):
         self._yandex = get_yandex_cloud_service()
+        self._cache = cache or EmbeddingCache(
+            max_size=settings.embedding_cache_size,
+            ttl_seconds=settings.embedding_cache_ttl_seconds,
+            redis_url=settings.redis_url if settings.embedding_cache_redis_enabled else "",
+        )
+        self._flight = SingleFlight("embeddings")
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        """Кэш эмбеддингов (для статистики и тестов)."""
+        return self._cache
 
     async def embed_query(self, text: str) -> list[float] | None:
         """Эмбеддинг для поискового запроса."""
-        normalized = _normalize_text(text)
-        if len(normalized) > self.MAX_TEXT_LENGTH:
-            normalized = _truncate_on_word_boundary(normalized, self.MAX_TEXT_LENGTH)
-        return await self._yandex.get_embedding(normalized, text_type="query")
+        return await self.get_embedding(text, text_type="query")
 
     async def embed_document(self, text: str) -> list[float] | None:
         """Эмбеддинг для документа."""
-        normalized = _normalize_text(text)
-        if len(normalized) > self.MAX_TEXT_LENGTH:
-            normalized = _truncate_on_word_boundary(normalized, self.MAX_TEXT_LENGTH)
-        return await self._yandex.get_embedding(normalized, text_type="doc")
+        return await self.get_embedding(text, text_type="doc")
 
     async def get_embedding(self, text: str, text_type: str = "doc") -> list[float] | None:
-        """Получить эмбеддинг текста (doc или query)."""
+        """Получить эмбеддинг текста (doc или query) с мемоизацией."""
         normalized = _normalize_text(text)
         if len(normalized) > self.MAX_TEXT_LENGTH:
             normalized = _truncate_on_word_boundary(normalized, self.MAX_TEXT_LENGTH)
-        return await self._yandex.get_embedding(normalized, text_type=text_type)
+        if not normalized:
+            return None
+
+        key = EmbeddingCache.make_key(normalized, text_type)
+        cached = await self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        return await self._flight.do(key, self._fetch, key, normalized, text_type)
+
+    async def _fetch(self, key: str, normalized: str, text_type: str) -> list[float] | None:
+        """Запрос к Embeddings API (лидер single-flight) и запись в кэш."""
+        embedding = await self._yandex.get_embedding(normalized, text_type=text_type)
+        # Ошибки API (None) не кэшируем — следующий запрос попробует снова
+        if embedding:
+            await self._cache.set(key, embedding)
+        return embedding
 
 
 _embedding_service: EmbeddingService | None = None
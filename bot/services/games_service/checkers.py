@@ -168,10 +168,18 @@ class CheckersMixin:
 
     async def checkers_move(
         self, session_id: int, from_row: int, from_col: int, to_row: int, to_col: int
+    ) -> dict:
+        """Сделать ход в шашках (async-обёртка над checkers_apply_move)."""
+        return self.checkers_apply_move(session_id, from_row, from_col, to_row, to_col)
+
+    def checkers_apply_move(
+        self, session_id: int, from_row: int, from_col: int, to_row: int, to_col: int
     ) -> dict:
         """
         Сделать ход в шашках.
 
+        Синхронная реализация: вызывается в т.ч. через AsyncSession.run_sync.
+
         Args:
             session_id: ID сессии
             from_row: Начальная строка (0-7)
@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 
 from bot.models import GameSession, GameStats
 from bot.services.gamification_service import GamificationService
+from bot.services.user_stats_service import UserStatsService
 
 
 class GamesServiceBase:
@@ -124,7 +125,10 @@ class GamesServiceBase:
     def _update_game_stats(
         self, telegram_id: int, game_type: str, result: str, score: int | None = None
     ) -> None:
-        """Обновить статистику игры."""
+        """Обновить статистику игры и агрегат user_stats для достижений."""
+        # До изменения game_stats: при построении агрегата партия не учтётся дважды
+        UserStatsService(self.db).record_game(telegram_id, game_type, result, score)
+
         stmt = select(GameStats).where(
             and_(
                 GameStats.user_telegram_id == telegram_id,
@@ -8,9 +8,15 @@ class TicTacToeMixin:
     """Mixin: крестики-нолики."""
 
     async def tic_tac_toe_make_move(self, session_id: int, position: int) -> dict:
+        """Сделать ход в крестики-нолики (async-обёртка над tic_tac_toe_apply_move)."""
+        return self.tic_tac_toe_apply_move(session_id, position)
+
+    def tic_tac_toe_apply_move(self, session_id: int, position: int) -> dict:
         """
         Сделать ход в крестики-нолики.
 
+        Синхронная реализация: вызывается в т.ч. через AsyncSession.run_sync.
+
         Args:
             session_id: ID сессии
             position: Позиция (0-8)
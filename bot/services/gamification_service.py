@@ -9,15 +9,19 @@
 - Разблокировка достижений
 - Подсчет прогресса по различным метрикам
 - Система уровней
+
+AsyncGamificationService — асинхронная обёртка для aiohttp-обработчиков (AsyncSession).
 """
 
-from datetime import UTC, datetime, timedelta
+from datetime import UTC, datetime
 
 from loguru import logger
-from sqlalchemy import and_, func, select
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from bot.models import ChatHistory, UserProgress
+from bot.models import UserProgress
+from bot.services.user_stats_service import UserStatsService, streak_on
 
 
 class Achievement:
@@ -429,157 +433,41 @@ class GamificationService:
         """
         Получить статистику пользователя для проверки достижений.
 
+        Читает только строку агрегата user_stats (UserStatsService), которая
+        обновляется при каждой записи в историю и завершении игры.
+
         Args:
             telegram_id: Telegram ID пользователя
 
         Returns:
             Dict: Статистика пользователя
         """
-        # Подсчет сообщений
-        messages_stmt = select(func.count(ChatHistory.id)).where(
-            and_(
-                ChatHistory.user_telegram_id == telegram_id,
-                ChatHistory.message_type == "user",
-            )
-        )
-        total_messages = self.db.scalar(messages_stmt) or 0
-
-        # Подсчет вопросов (сообщения с "?")
-        questions_stmt = select(func.count(ChatHistory.id)).where(
-            and_(
-                ChatHistory.user_telegram_id == telegram_id,
-                ChatHistory.message_type == "user",
-                ChatHistory.message_text.like("%?%"),
-            )
-        )
-        total_questions = self.db.scalar(questions_stmt) or 0
-
-        # Подсчет дней подряд
-        consecutive_days = self._calculate_consecutive_days(telegram_id)
-
-        # Подсчет уникальных предметов (пока упрощенно - по ключевым словам)
-        unique_subjects = self._count_unique_subjects(telegram_id)
-
-        # Решенные задачи (пока 0, будет реализовано позже)
-        solved_tasks = 0
-
-        # Игровая статистика
-        from bot.models import GameStats
-
-        game_stats_stmt = select(GameStats).where(GameStats.user_telegram_id == telegram_id)
-        game_stats_list = self.db.scalars(game_stats_stmt).all()
-
-        total_game_wins = 0
-        total_game_sessions = 0
-        tic_tac_toe_wins = 0
-        checkers_wins = 0
-        game_2048_best_score = 0
-
-        for gs in game_stats_list:
-            total_game_wins += gs.wins
-            total_game_sessions += gs.total_games
-            if gs.game_type == "tic_tac_toe":
-                tic_tac_toe_wins = gs.wins
-            elif gs.game_type == "checkers":
-                checkers_wins = gs.wins
-            elif gs.game_type == "2048" and gs.best_score and gs.best_score > game_2048_best_score:
-                game_2048_best_score = gs.best_score
+        row = UserStatsService(self.db).get(telegram_id)
 
         stats = {
-            "total_messages": total_messages,
-            "total_questions": total_questions,
-            "consecutive_days": consecutive_days,
-            "unique_subjects": unique_subjects,
-            "solved_tasks": solved_tasks,
-            "total_game_wins": total_game_wins,
-            "total_game_sessions": total_game_sessions,
-            "tic_tac_toe_wins": tic_tac_toe_wins,
-            "checkers_wins": checkers_wins,
-            "2048_best_score": game_2048_best_score,
+            "total_messages": row.total_messages,
+            "total_questions": row.total_questions,
+            "consecutive_days": streak_on(row),
+            "unique_subjects": row.subjects_mask.bit_count(),
+            # Решенные задачи (пока 0, будет реализовано позже)
+            "solved_tasks": 0,
+            "total_game_wins": row.total_game_wins,
+            "total_game_sessions": row.total_game_sessions,
+            "tic_tac_toe_wins": row.tic_tac_toe_wins,
+            "checkers_wins": row.checkers_wins,
+            "2048_best_score": row.best_2048_score,
         }
         # Premium-метрики для отображения прогресса по эксклюзивным достижениям
         from bot.services.premium_features_service import PremiumFeaturesService
 
         premium_service = PremiumFeaturesService(self.db)
         if premium_service.is_premium_active(telegram_id):
-            stats["premium_requests"] = total_messages
-            stats["premium_subjects"] = unique_subjects
-            stats["premium_days"] = consecutive_days
+            stats["premium_requests"] = stats["total_messages"]
+            stats["premium_subjects"] = stats["unique_subjects"]
+            stats["premium_days"] = stats["consecutive_days"]
             stats["vip_status"] = 1
         return stats
 
-    def _calculate_consecutive_days(self, telegram_id: int) -> int:
-        """
-        Вычислить количество дней подряд активности.
-
-        Args:
-            telegram_id: Telegram ID пользователя
-
-        Returns:
-            int: Количество дней подряд
-        """
-        # Получаем все даты сообщений пользователя
-        stmt = (
-            select(func.date(ChatHistory.timestamp))
-            .where(ChatHistory.user_telegram_id == telegram_id)
-            .distinct()
-            .order_by(func.date(ChatHistory.timestamp).desc())
-        )
-
-        dates = [row[0] for row in self.db.execute(stmt).all()]
-
-        if not dates:
-            return 0
-
-        # Подсчитываем дни подряд
-        consecutive = 1
-        today = datetime.now(UTC).date()
-
-        # Если последнее сообщение не сегодня, начинаем с вчера
-        if dates[0] != today:
-            return 0
-
-        for i in range(1, len(dates)):
-            expected_date = today - timedelta(days=i)
-            if dates[i] == expected_date:
-                consecutive += 1
-            else:
-                break
-
-        return consecutive
-
-    def _count_unique_subjects(self, telegram_id: int) -> int:
-        """
-        Подсчитать количество уникальных предметов по ключевым словам.
-
-        Args:
-            telegram_id: Telegram ID пользователя
-
-        Returns:
-            int: Количество уникальных предметов
-        """
-        from bot.config.subjects import SUBJECT_KEYWORDS
-
-        # Получаем все сообщения пользователя
-        stmt = select(ChatHistory.message_text).where(
-            and_(
-                ChatHistory.user_telegram_id == telegram_id,
-                ChatHistory.message_type == "user",
-            )
-        )
-
-        messages = self.db.execute(stmt).scalars().all()
-        found_subjects: set[str] = set()
-
-        for message in messages:
-            message_lower = message.lower()
-            for subject, keywords in SUBJECT_KEYWORDS.items():
-                if any(keyword in message_lower for keyword in keywords):
-                    found_subjects.add(subject)
-                    break
-
-        return len(found_subjects)
-
     def get_achievements_with_progress(self, telegram_id: int) -> list[dict]:
         """
         Получить все достижения с прогрессом пользователя.
@@ -704,3 +592,43 @@ class GamificationService:
         if level <= 1:
             return 0
         return int(((level - 1) ** 2) * 100)
+
+
+class AsyncGamificationService:
+    """
+    Асинхронная обёртка над GamificationService для AsyncSession.
+
+    Логика XP и достижений остаётся в GamificationService; запросы выполняются
+    через AsyncSession.run_sync в транзакции вызывающего кода.
+    """
+
+    def __init__(self, db: AsyncSession):
+        """
+        Инициализация сервиса геймификации.
+
+        Args:
+            db (AsyncSession): Асинхронная сессия SQLAlchemy.
+        """
+        self.db = db
+
+    async def process_message(self, telegram_id: int, message_text: str) -> list[str]:
+        """Начислить XP за сообщение и вернуть ID новых достижений."""
+        return await self.db.run_sync(
+            lambda session: GamificationService(session).process_message(telegram_id, message_text)
+        )
+
+    async def check_and_unlock_achievements(
+        self, telegram_id: int, skip_game_achievements: bool = False
+    ) -> list[str]:
+        """Проверить и разблокировать достижения пользователя."""
+        return await self.db.run_sync(
+            lambda session: GamificationService(session).check_and_unlock_achievements(
+                telegram_id, skip_game_achievements=skip_game_achievements
+            )
+        )
+
+    async def get_user_progress_summary(self, telegram_id: int) -> dict:
+        """Сводка прогресса пользователя (уровень, XP, достижения)."""
+        return await self.db.run_sync(
+            lambda session: GamificationService(session).get_user_progress_summary(telegram_id)
+        )
@@ -8,18 +8,98 @@
 - Сохранение сообщений пользователей и AI
 - Получение истории чата с ограничениями
 - Очистка истории по требованию пользователя
-- Автоматическое управление размером истории
+- Необязательное ограничение размера истории (CHAT_HISTORY_RETENTION_MESSAGES)
+
+Все операции — set-based SQL с постоянной стоимостью относительно размера
+истории: COUNT(*) вместо загрузки строк, DELETE ... WHERE вместо удаления
+по одной, пара «вопрос + ответ» вставляется одним flush (add_exchange).
+Каждая запись обновляет агрегат статистики для достижений (user_stats)
+одним UPDATE — см. UserStatsService.
+
+AsyncChatHistoryService — асинхронная версия для aiohttp-обработчиков (AsyncSession).
 """
 
 from datetime import datetime
 from typing import Any
 
 from loguru import logger
-from sqlalchemy import desc, select
+from sqlalchemy import Delete, Row, Select, delete, desc, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from bot.config import settings
 from bot.models import ChatHistory
+from bot.services.user_stats_service import UserStatsService
+
+MESSAGE_TYPES = ("user", "ai", "system")
+
+# Колонки страницы истории для клиента: медиа-ссылки только по запросу
+_PAGE_COLUMNS = (
+    ChatHistory.id,
+    ChatHistory.timestamp,
+    ChatHistory.message_type,
+    ChatHistory.message_text,
+    ChatHistory.panda_reaction,
+)
+_MEDIA_COLUMNS = (ChatHistory.image_url, ChatHistory.video_url)
+
+
+def _new_message(
+    telegram_id: int,
+    message_text: str,
+    message_type: str,
+    image_url: str | None = None,
+    panda_reaction: str | None = None,
+    video_url: str | None = None,
+) -> ChatHistory:
+    """
+    Создать запись истории (без добавления в сессию).
+
+    Raises:
+        ValueError: Если message_type некорректен
+    """
+    if message_type not in MESSAGE_TYPES:
+        raise ValueError(f"Некорректный message_type: {message_type}")
+    return ChatHistory(
+        user_telegram_id=telegram_id,
+        message_text=message_text,
+        message_type=message_type,
+        image_url=image_url,
+        panda_reaction=panda_reaction,
+        video_url=video_url,
+    )
+
+
+def _message_count_stmt(telegram_id: int) -> Select:
+    return (
+        select(func.count())
+        .select_from(ChatHistory)
+        .where(ChatHistory.user_telegram_id == telegram_id)
+    )
+
+
+def _clear_history_stmt(telegram_id: int) -> Delete:
+    return delete(ChatHistory).where(ChatHistory.user_telegram_id == telegram_id)
+
+
+def _retention_stmt(telegram_id: int, keep: int) -> Delete:
+    """
+    DELETE всего, что старше последних keep сообщений пользователя.
+
+    Подзапрос идёт по индексу (user_telegram_id, timestamp) и читает
+    keep + лишние строки — стоимость не зависит от размера истории.
+    """
+    overflow = (
+        select(ChatHistory.id)
+        .where(ChatHistory.user_telegram_id == telegram_id)
+        .order_by(desc(ChatHistory.timestamp), desc(ChatHistory.id))
+        .offset(keep)
+    )
+    return (
+        delete(ChatHistory)
+        .where(ChatHistory.id.in_(overflow))
+        .execution_options(synchronize_session=False)
+    )
 
 
 class ChatHistoryService:
@@ -39,6 +119,8 @@ class ChatHistoryService:
         """
         self.db = db
         self.history_limit = settings.chat_history_limit  # Лимит сообщений для контекста
+        # Сколько сообщений хранить на пользователя (0 — всю историю)
+        self.retention_limit = settings.chat_history_retention_messages
 
     def add_message(
         self,
@@ -66,19 +148,10 @@ class ChatHistoryService:
         Raises:
             ValueError: Если message_type некорректен
         """
-        # Валидация типа сообщения
-        if message_type not in ["user", "ai", "system"]:
-            raise ValueError(f"Некорректный message_type: {message_type}")
-
-        # Создаём новое сообщение
-        message = ChatHistory(
-            user_telegram_id=telegram_id,
-            message_text=message_text,
-            message_type=message_type,
-            image_url=image_url,
-            panda_reaction=panda_reaction,
-            video_url=video_url,
+        message = _new_message(
+            telegram_id, message_text, message_type, image_url, panda_reaction, video_url
         )
+        UserStatsService(self.db).record_messages(telegram_id, [(message_type, message_text)])
 
         try:
             self.db.add(message)
@@ -90,14 +163,41 @@ class ChatHistoryService:
             logger.error(f"❌ Ошибка добавления сообщения в сессию: {e}", exc_info=True)
             raise
 
-        # Очищаем старые сообщения (храним только последние N)
-        self._cleanup_old_messages(telegram_id)
+        self._apply_retention(telegram_id)
+        return message
+
+    def add_exchange(
+        self,
+        telegram_id: int,
+        user_message: str,
+        ai_message: str,
+        image_url: str | None = None,
+        panda_reaction: str | None = None,
+        video_url: str | None = None,
+    ) -> tuple[ChatHistory, ChatHistory]:
+        """
+        Добавить пару «вопрос пользователя + ответ AI» одним flush.
+
+        Обе строки уходят в БД одним пакетным INSERT (порядок id сохраняется:
+        вопрос всегда перед ответом). Вложения относятся к ответу AI.
+
+        Returns:
+            tuple: (сообщение пользователя, ответ AI)
+        """
+        user_msg = _new_message(telegram_id, user_message, "user")
+        ai_msg = _new_message(telegram_id, ai_message, "ai", image_url, panda_reaction, video_url)
+        UserStatsService(self.db).record_messages(
+            telegram_id, [("user", user_message), ("ai", ai_message)]
+        )
 
+        self.db.add_all([user_msg, ai_msg])
+        self.db.flush()
         logger.info(
-            f"✅ Сообщение готово к коммиту: user={telegram_id}, type={message_type}, id={message.id}"
+            f"📝 Обмен добавлен в сессию: user={telegram_id}, ids={user_msg.id},{ai_msg.id}"
         )
 
-        return message
+        self._apply_retention(telegram_id)
+        return user_msg, ai_msg
 
     def get_recent_history(self, telegram_id: int, limit: int = None) -> list[ChatHistory]:
         """
@@ -128,6 +228,61 @@ class ChatHistoryService:
         # Возвращаем в хронологическом порядке (старые → новые)
         return list(reversed(messages))
 
+    def get_history_page(
+        self,
+        telegram_id: int,
+        limit: int,
+        before_id: int | None = None,
+        include_media: bool = False,
+    ) -> list[Row]:
+        """
+        Страница истории для клиента (keyset-пагинация, проекция колонок).
+
+        Курсор — id сообщения; граница (timestamp, id) берётся из самой строки
+        курсора, поэтому сравниваются хранимые значения, а не их текстовое
+        представление из запроса. Условие timestamp <= граница и сортировка идут
+        по индексу idx_chat_history_user_time: стоимость страницы не зависит
+        от её глубины (без OFFSET). Загружаются только нужные колонки,
+        ORM-объекты не создаются; image_url/video_url — только при include_media.
+
+        Args:
+            telegram_id: Telegram ID пользователя
+            limit: Размер страницы
+            before_id: Курсор — вернуть сообщения строго старше этого сообщения
+            include_media: Добавить колонки image_url и video_url
+
+        Returns:
+            List[Row]: Строки от старых к новым
+        """
+        columns = _PAGE_COLUMNS + _MEDIA_COLUMNS if include_media else _PAGE_COLUMNS
+        stmt = select(*columns).where(ChatHistory.user_telegram_id == telegram_id)
+        if before_id is not None:
+            cursor_timestamp = (
+                select(ChatHistory.timestamp).where(ChatHistory.id == before_id).scalar_subquery()
+            )
+            stmt = stmt.where(
+                ChatHistory.timestamp <= cursor_timestamp,
+                tuple_(ChatHistory.timestamp, ChatHistory.id) < tuple_(cursor_timestamp, before_id),
+            )
+        stmt = stmt.order_by(desc(ChatHistory.timestamp), desc(ChatHistory.id)).limit(limit)
+
+        return list(reversed(self.db.execute(stmt).all()))
+
+    def get_latest_message_marker(self, telegram_id: int) -> Row | None:
+        """
+        (id, timestamp, message_type) последнего сообщения — одна проба индекса.
+
+        Сообщения не изменяются после записи, поэтому маркер последнего
+        сообщения однозначно определяет версию истории (для ETag).
+        """
+        stmt = (
+            select(ChatHistory.id, ChatHistory.timestamp, ChatHistory.message_type)
+            .where(ChatHistory.user_telegram_id == telegram_id)
+            .order_by(desc(ChatHistory.timestamp), desc(ChatHistory.id))
+            .limit(1)
+        )
+        return self.db.execute(stmt).first()
+
     def get_last_user_message_timestamp(self, telegram_id: int) -> datetime | None:
         """
         Время последнего сообщения пользователя (message_type == "user").
@@ -209,54 +364,183 @@ class ChatHistoryService:
 
         return formatted
 
-    def _cleanup_old_messages(self, telegram_id: int) -> None:
+    def _apply_retention(self, telegram_id: int) -> None:
+        """Удалить сообщения сверх лимита хранения (если он задан)."""
+        if self.retention_limit:
+            self.db.execute(_retention_stmt(telegram_id, self.retention_limit))
+
+    def clear_history(self, telegram_id: int) -> int:
         """
-        Удаляет старые сообщения, оставляя только последние N.
+        Очистить всю историю пользователя одним DELETE.
 
-        Вызывается автоматически при добавлении нового сообщения.
+        Args:
+            telegram_id: Telegram ID пользователя
+
+        Returns:
+            int: Количество удалённых сообщений
+        """
+        count = self.db.execute(_clear_history_stmt(telegram_id)).rowcount
+
+        logger.info(f"🗑️ Очищена история для user={telegram_id}, удалено {count} сообщений")
+
+        return count
+
+    def get_message_count(self, telegram_id: int) -> int:
+        """
+        Получить количество сообщений в истории (COUNT без загрузки строк).
 
         Args:
             telegram_id: Telegram ID пользователя
+
+        Returns:
+            int: Количество сообщений
         """
-        # Подсчитываем количество сообщений
-        stmt = (
-            select(ChatHistory)
-            .where(ChatHistory.user_telegram_id == telegram_id)
-            .order_by(desc(ChatHistory.timestamp))
+        return self.db.execute(_message_count_stmt(telegram_id)).scalar() or 0
+
+
+class AsyncChatHistoryService:
+    """
+    Асинхронный сервис истории чата для AsyncSession.
+
+    Повторяет контракт ChatHistoryService для горячего пути Mini App
+    (контекст AI и сохранение ответа), не блокируя event loop.
+    """
+
+    def __init__(self, db: AsyncSession):
+        """
+        Инициализация сервиса истории чата.
+
+        Args:
+            db (AsyncSession): Асинхронная сессия SQLAlchemy.
+        """
+        self.db = db
+        self.history_limit = settings.chat_history_limit
+        self.retention_limit = settings.chat_history_retention_messages
+
+    async def add_message(
+        self,
+        telegram_id: int,
+        message_text: str,
+        message_type: str,
+        image_url: str | None = None,
+        panda_reaction: str | None = None,
+        video_url: str | None = None,
+    ) -> ChatHistory:
+        """
+        Добавить сообщение в историю (flush без commit).
+
+        Args:
+            telegram_id: Telegram ID пользователя
+            message_text: Текст сообщения
+            message_type: Тип сообщения ('user', 'ai', 'system')
+            image_url: URL изображения визуализации (опционально)
+            panda_reaction: Реакция панды на фидбек (опционально, только для ai)
+            video_url: URL видео перерыва на бамбук (опционально)
+
+        Returns:
+            ChatHistory: Созданная запись
+
+        Raises:
+            ValueError: Если message_type некорректен
+        """
+        message = _new_message(
+            telegram_id, message_text, message_type, image_url, panda_reaction, video_url
+        )
+        await self._record_stats(telegram_id, [(message_type, message_text)])
+        self.db.add(message)
+        await self.db.flush()
+        logger.info(
+            f"📝 Сообщение добавлено в сессию: user={telegram_id}, type={message_type}, id={message.id}"
         )
+        await self._apply_retention(telegram_id)
+        return message
+
+    async def add_exchange(
+        self,
+        telegram_id: int,
+        user_message: str,
+        ai_message: str,
+        image_url: str | None = None,
+        panda_reaction: str | None = None,
+        video_url: str | None = None,
+    ) -> tuple[ChatHistory, ChatHistory]:
+        """
+        Добавить пару «вопрос пользователя + ответ AI» одним flush.
 
-        all_messages = self.db.execute(stmt).scalars().all()
+        Returns:
+            tuple: (сообщение пользователя, ответ AI)
+        """
+        user_msg = _new_message(telegram_id, user_message, "user")
+        ai_msg = _new_message(telegram_id, ai_message, "ai", image_url, panda_reaction, video_url)
+        await self._record_stats(telegram_id, [("user", user_message), ("ai", ai_message)])
 
-        # Автоудаление отключено - храним всю историю
-        logger.debug(
-            f"💾 История сохранена для user={telegram_id} (всего сообщений: {len(all_messages)})"
+        self.db.add_all([user_msg, ai_msg])
+        await self.db.flush()
+        logger.info(
+            f"📝 Обмен добавлен в сессию: user={telegram_id}, ids={user_msg.id},{ai_msg.id}"
         )
+        await self._apply_retention(telegram_id)
+        return user_msg, ai_msg
 
-    def clear_history(self, telegram_id: int) -> int:
+    async def _record_stats(self, telegram_id: int, messages: list[tuple[str, str]]) -> None:
+        """Обновить агрегат user_stats до записи сообщений (см. UserStatsService)."""
+        await self.db.run_sync(
+            lambda session: UserStatsService(session).record_messages(telegram_id, messages)
+        )
+
+    async def _apply_retention(self, telegram_id: int) -> None:
+        """Удалить сообщения сверх лимита хранения (если он задан)."""
+        if self.retention_limit:
+            await self.db.execute(_retention_stmt(telegram_id, self.retention_limit))
+
+    async def get_recent_history(self, telegram_id: int, limit: int = None) -> list[ChatHistory]:
         """
-        Очистить всю историю пользователя.
+        Получить последние N сообщений пользователя (от старых к новым).
 
         Args:
             telegram_id: Telegram ID пользователя
+            limit: Количество сообщений (по умолчанию из settings)
 
         Returns:
-            int: Количество удалённых сообщений
+            List[ChatHistory]: Список сообщений
         """
-        stmt = select(ChatHistory).where(ChatHistory.user_telegram_id == telegram_id)
-
-        messages = self.db.execute(stmt).scalars().all()
-        count = len(messages)
+        if limit is None:
+            limit = self.history_limit
 
-        for msg in messages:
-            self.db.delete(msg)
+        stmt = (
+            select(ChatHistory)
+            .where(ChatHistory.user_telegram_id == telegram_id)
+            .order_by(desc(ChatHistory.timestamp), desc(ChatHistory.id))
+            .limit(limit)
+        )
+        messages = (await self.db.execute(stmt)).scalars().all()
+        return list(reversed(messages))
 
-        logger.info(f"🗑️ Очищена история для user={telegram_id}, удалено {count} сообщений")
+    async def get_formatted_history_for_ai(
+        self, telegram_id: int, limit: int = None
+    ) -> list[dict[str, Any]]:
+        """
+        Получить историю в формате для YandexGPT API.
 
-        return count
+        Args:
+            telegram_id: Telegram ID пользователя
+            limit: Количество сообщений (по умолчанию из settings)
 
-    def get_message_count(self, telegram_id: int) -> int:
+        Returns:
+            List[Dict[str, Any]]: История в формате [{'role': 'user', 'text': '...'}, ...]
         """
-        Получить количество сообщений в истории.
+        messages = await self.get_recent_history(telegram_id, limit=limit)
+        return [
+            {
+                "role": "user" if msg.message_type == "user" else "assistant",
+                "text": msg.message_text,
+            }
+            for msg in messages
+        ]
+
+    async def get_message_count(self, telegram_id: int) -> int:
+        """
+        Получить количество сообщений в истории (COUNT без загрузки строк).
 
         Args:
             telegram_id: Telegram ID пользователя
@@ -264,7 +548,20 @@ class ChatHistoryService:
         Returns:
             int: Количество сообщений
         """
-        stmt = select(ChatHistory).where(ChatHistory.user_telegram_id == telegram_id)
+        return (await self.db.execute(_message_count_stmt(telegram_id))).scalar() or 0
 
-        messages = self.db.execute(stmt).scalars().all()
-        return len(messages)
+    async def clear_history(self, telegram_id: int) -> int:
+        """
+        Очистить всю историю пользователя одним DELETE.
+
+        Args:
+            telegram_id: Telegram ID пользователя
+
+        Returns:
+            int: Количество удалённых сообщений
+        """
+        result = await self.db.execute(_clear_history_stmt(telegram_id))
+        logger.info(
+            f"🗑️ Очищена история для user={telegram_id}, удалено {result.rowcount} сообщений"
+        )
+        return result.rowcount
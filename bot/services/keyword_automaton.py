@@ -0,0 +1,180 @@
+"""
+Многошаблонный поиск ключевых слов за один проход (автомат Ахо–Корасик).
+
+Используется модерацией вместо цикла «один regex на паттерн»: все словари
+(мат, запрещённые паттерны, темы, учебные контексты, категории продвинутой
+модерации) компилируются в один автомат, и текст сканируется один раз за O(n).
+
+Правила границ слов повторяют семантику Python-regex ``\\b`` (символ слова —
+буква/цифра любого алфавита или «_»), поэтому кириллица и латиница
+обрабатываются одинаково:
+
+- SUBSTRING — подстрока без границ (как ``keyword in text``);
+- WORD — целое слово или фраза (как ``\\bkeyword\\b``);
+- WORD_PREFIX — начало слова, дальше допускаются окончания (как ``\\bkeyword\\w*\\b``).
+"""
+
+from collections import Counter, deque
+from collections.abc import Hashable, Iterable
+from dataclasses import dataclass
+from enum import Enum
+
+
+class BoundaryMode(Enum):
+    """Правило границ слова для ключевого слова"""
+
+    SUBSTRING = "substring"
+    WORD = "word"
+    WORD_PREFIX = "word_prefix"
+
+
+@dataclass(frozen=True)
+class KeywordMatch:
+    """Найденное вхождение ключевого слова"""
+
+    keyword: str
+    tag: Hashable
+    start: int
+    end: int
+
+
+def _is_word_char(text: str, index: int) -> bool:
+    """Символ слова в позиции index (за пределами строки — не символ слова)."""
+    if index < 0 or index >= len(text):
+        return False
+    char = text[index]
+    return char.isalnum() or char == "_"
+
+
+def _is_boundary(text: str, index: int) -> bool:
+    """Граница слова между text[index - 1] и text[index] (аналог regex ``\\b``)."""
+    return _is_word_char(text, index - 1) != _is_word_char(text, index)
+
+
+class KeywordAutomaton:
+    """
+    Неизменяемый после build() автомат Ахо–Корасик с тегами и границами слов.
+
+    Пример:
+        automaton = KeywordAutomaton()
+        automaton.add("бомба", tag="violence", mode=BoundaryMode.WORD)
+        automaton.build()
+        automaton.matched_tags("там бомба!")  # -> {"violence"}
+    """
+
+    def __init__(self) -> None:
+        """Пустой автомат: добавьте ключевые слова через add() и вызовите build()."""
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        # Выходы узла: (длина, ключевое слово, тег, режим) — включая выходы по fail-ссылкам
+        self._outputs: list[tuple[tuple[int, str, Hashable, BoundaryMode], ...]] = [()]
+        self._pending: list[list[tuple[int, str, Hashable, BoundaryMode]]] = [[]]
+        self._built = False
+        self._size = 0
+
+    def __len__(self) -> int:
+        """Количество добавленных ключевых слов."""
+        return self._size
+
+    def add(self, keyword: str, tag: Hashable, mode: BoundaryMode = BoundaryMode.SUBSTRING) -> None:
+        """
+        Добавить ключевое слово.
+
+        Args:
+            keyword: Слово или фраза (регистр не важен)
+            tag: Метка, возвращаемая при совпадении (категория, тема и т.д.)
+            mode: Правило границ слова
+        """
+        if self._built:
+            raise RuntimeError("KeywordAutomaton уже собран: add() после build() запрещён")
+        keyword = keyword.lower()
+        if not keyword:
+            return
+
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._pending.append([])
+            node = next_node
+        self._pending[node].append((len(keyword), keyword, tag, mode))
+        self._size += 1
+
+    def add_many(
+        self,
+        keywords: Iterable[str],
+        tag: Hashable,
+        mode: BoundaryMode = BoundaryMode.SUBSTRING,
+    ) -> None:
+        """Добавить несколько ключевых слов с одним тегом и режимом."""
+        for keyword in keywords:
+            self.add(keyword, tag, mode)
+
+    def build(self) -> "KeywordAutomaton":
+        """Построить fail-ссылки (BFS). После вызова автомат только для чтения."""
+        outputs: list[tuple] = [()] * len(self._goto)
+        outputs[0] = tuple(self._pending[0])
+        queue: deque[int] = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            outputs[child] = tuple(self._pending[child])
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                outputs[child] = tuple(self._pending[child]) + outputs[self._fail[child]]
+                queue.append(child)
+
+        self._outputs = outputs
+        self._pending = []
+        self._built = True
+        return self
+
+    def _iter_raw(self, text: str):
+        """Все вхождения (start, end, keyword, tag) с учётом границ слов."""
+        if not self._built:
+            raise RuntimeError("KeywordAutomaton не собран: вызовите build()")
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            node_outputs = outputs[node]
+            if not node_outputs:
+                continue
+            end = index + 1
+            for length, keyword, tag, mode in node_outputs:
+                start = end - length
+                if mode is BoundaryMode.SUBSTRING:
+                    yield start, end, keyword, tag
+                elif not _is_boundary(text, start):
+                    continue
+                elif mode is BoundaryMode.WORD_PREFIX or _is_boundary(text, end):
+                    yield start, end, keyword, tag
+
+    def find_all(self, text: str) -> list[KeywordMatch]:
+        """Все вхождения ключевых слов (текст приводится к нижнему регистру)."""
+        return [
+            KeywordMatch(keyword=keyword, tag=tag, start=start, end=end)
+            for start, end, keyword, tag in self._iter_raw(text.lower())
+        ]
+
+    def matched_tags(self, text: str) -> set[Hashable]:
+        """Множество тегов, ключевые слова которых встречаются в тексте."""
+        return {tag for _, _, _, tag in self._iter_raw(text.lower())}
+
+    def count_tags(self, text: str) -> Counter:
+        """Число вхождений по каждому тегу."""
+        return Counter(tag for _, _, _, tag in self._iter_raw(text.lower()))
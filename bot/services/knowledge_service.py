@@ -6,19 +6,25 @@
 Теперь с поддержкой Wikipedia API для получения проверенных данных.
 """
 
+import asyncio
 import json
 import os
 import re
+import time
+from collections.abc import Callable
 from datetime import datetime, timedelta
 from urllib.parse import quote
 
 import httpx
 from loguru import logger
 
-from bot.config import FORBIDDEN_PATTERNS
+from bot.config import settings
+from bot.services.cache import SingleFlight
 from bot.services.cache_service import cache_service
 from bot.services.rag import (
+    BulkIndexStats,
     ContextCompressor,
+    KeywordIndex,
     QueryExpander,
     ResultReranker,
     SemanticCache,
@@ -31,6 +37,8 @@ WIKIPEDIA_LANGUAGES = frozenset({"ru", "en", "de", "fr", "es"})
 
 # Query rewriting для RAG: короткое сообщение-продолжение диалога
 RAG_QUERY_SHORT_MESSAGE_MAX_LEN = 40
+# Общий дедлайн RAG-поиска до первого токена ответа (секунды)
+RAG_SEARCH_DEADLINE_SECONDS = 2.5
 RAG_QUERY_TOPIC_MAX_CHARS = 300
 RAG_QUERY_CONTINUATION_PHRASES = frozenset(
     {
@@ -71,15 +79,26 @@ class KnowledgeService:
         self.last_update: datetime | None = None
         self.update_interval = timedelta(days=7)  # Обновляем раз в неделю
         self.auto_update_enabled = os.getenv("KNOWLEDGE_AUTO_UPDATE", "false").lower() == "true"
+        # Обновление базы — одно на процесс: под локом, в фоне вне дедлайна поиска
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task | None = None
+        # Ссылки на фоновые задачи, чтобы их не собрал GC до завершения
+        self._background_tasks: set[asyncio.Task] = set()
 
         # Wikipedia API (БЕЗ ключа - открытый API); URL по языку в методах
         self.wikipedia_timeout = httpx.Timeout(10.0, connect=5.0)
+        self._wikipedia_flight = SingleFlight("wikipedia")
 
         # RAG компоненты
         self.query_expander = QueryExpander()
         self.reranker = ResultReranker()
-        self.semantic_cache = SemanticCache(ttl_hours=24)
+        self.semantic_cache = SemanticCache(
+            ttl_hours=24, memory_size=settings.semantic_cache_memory_size
+        )
         self.vector_search = VectorSearchService()
+        self.keyword_index = KeywordIndex()
+        self._keyword_index_source: dict[str, list[EducationalContent]] | None = None
+        self._subject_materials_by_length: dict[str, list[EducationalContent]] = {}
 
         # Запрещенные паттерны для детей (ТОЛЬКО опасный контент, НЕ образовательный)
         # "война", "смерть" и т.д. - это учебные темы истории, их НЕ блокируем
@@ -102,9 +121,6 @@ class KnowledgeService:
             }
         )
 
-        # Глобальные FORBIDDEN_PATTERNS (>5 символов, чтобы не ловить false positives)
-        self._critical_forbidden_patterns = frozenset(p for p in FORBIDDEN_PATTERNS if len(p) > 5)
-
         logger.info(
             f"📚 KnowledgeService инициализирован (RAG: ON, авто-обновление: {'ВКЛ' if self.auto_update_enabled else 'ВЫКЛ'})"
         )
@@ -133,8 +149,7 @@ class KnowledgeService:
             List[EducationalContent]: Список релевантных материалов.
         """
         # Проверяем, нужно ли обновить базу знаний
-        if self._should_update_knowledge_base():
-            await self.update_knowledge_base()
+        await self._refresh_if_needed()
 
         # Получаем материалы по предмету
         subject_materials = self.knowledge_base.get(subject, [])
@@ -188,57 +203,167 @@ class KnowledgeService:
         top_k: int = 3,
         use_wikipedia: bool = True,
         language_code: str | None = None,
+        deadline_seconds: float = RAG_SEARCH_DEADLINE_SECONDS,
     ) -> list[EducationalContent]:
         """
         Улучшенный поиск с RAG компонентами.
         При пустой базе и use_wikipedia=True подтягивает контекст из Wikipedia.
 
+        Независимые стадии выполняются параллельно под общим дедлайном:
+        keyword-поиск стартует сразу, semantic cache и векторный поиск —
+        как только готов эмбеддинг вопроса. Стадии, не успевшие к дедлайну,
+        отменяются; в результат идёт то, что успело.
+
         Args:
             user_question: Вопрос пользователя
             user_age: Возраст для адаптации
             top_k: Количество результатов
             use_wikipedia: Подтянуть Wikipedia при отсутствии результатов из базы
             language_code: Код языка для Wikipedia (ru, en, de, fr, es); по умолчанию ru
+            deadline_seconds: Общий дедлайн поиска (секунды)
 
         Returns:
             Топ-K переранжированных результатов
         """
-        cached_result = await self.semantic_cache.get(user_question)
-        if cached_result:
-            logger.debug(f"📚 Semantic cache hit: {user_question[:50]}")
-            return cached_result
+        # Обновление базы — в фоне и вне дедлайна: поиск идёт по текущей базе
+        self._schedule_refresh()
 
-        # 1. Векторный поиск (semantic)
-        vector_results = await self.vector_search.search(user_question, top_k=5)
+        deadline = time.monotonic() + deadline_seconds
+        timings: dict[str, float] = {}
 
-        # 2. Keyword поиск
-        expanded_query = self.query_expander.expand(user_question)
-        logger.debug(f"📚 Expanded query: {expanded_query}")
-        query_variations = self.query_expander.generate_variations(user_question)
-        keyword_results = []
-        for variation in query_variations:
-            results = await self.get_helpful_content(variation, user_age)
-            keyword_results.extend(results)
+        # Keyword поиск не зависит от эмбеддинга — стартует сразу
+        keyword_task = asyncio.create_task(
+            self._timed_stage(timings, "keyword", self._keyword_search(user_question, user_age))
+        )
+
+        # Вопрос эмбеддится один раз: вектор общий для semantic cache и векторного поиска
+        query_embedding = await self._await_until(
+            asyncio.ensure_future(
+                self._timed_stage(timings, "embedding", self._embed_question(user_question))
+            ),
+            deadline,
+        )
+
+        vector_results: list[EducationalContent] = []
+        if query_embedding:
+            cache_task = asyncio.create_task(
+                self._timed_stage(
+                    timings,
+                    "cache",
+                    self.semantic_cache.get(user_question, embedding=query_embedding),
+                )
+            )
+            vector_task = asyncio.create_task(
+                self._timed_stage(
+                    timings,
+                    "vector",
+                    self.vector_search.search(user_question, top_k=5, embedding=query_embedding),
+                )
+            )
+
+            cached_result = await self._await_until(cache_task, deadline)
+            if cached_result:
+                keyword_task.cancel()
+                vector_task.cancel()
+                logger.debug(f"📚 Semantic cache hit: {user_question[:50]}")
+                self._report_stage_timings(timings, deadline_seconds)
+                return cached_result
+
+            vector_results = await self._await_until(vector_task, deadline) or []
+
+        keyword_results = await self._await_until(keyword_task, deadline) or []
 
         all_results = vector_results + keyword_results
         unique_results = self._deduplicate_results(all_results)
 
-        # 3. Wikipedia fallback; при получении — индексируем для будущего семантического поиска
-        if not unique_results and use_wikipedia:
-            wiki_content = await self.get_wikipedia_educational(
-                user_question, user_age, language_code=language_code
+        # Wikipedia fallback (в пределах оставшегося дедлайна);
+        # при получении — индексируем в фоне для будущего семантического поиска
+        if not unique_results and use_wikipedia and time.monotonic() < deadline:
+            wiki_content = await self._await_until(
+                asyncio.ensure_future(
+                    self._timed_stage(
+                        timings,
+                        "wikipedia",
+                        self.get_wikipedia_educational(
+                            user_question, user_age, language_code=language_code
+                        ),
+                    )
+                ),
+                deadline,
             )
             if wiki_content:
                 unique_results = [wiki_content]
-                await self.vector_search.index_content(wiki_content)
+                self._spawn(self.vector_search.index_content(wiki_content))
 
         ranked_results = self.reranker.rerank(user_question, unique_results, user_age, top_k=top_k)
 
-        if ranked_results:
-            await self.semantic_cache.set(user_question, ranked_results)
+        if ranked_results and query_embedding:
+            await self.semantic_cache.set(user_question, ranked_results, embedding=query_embedding)
 
+        self._report_stage_timings(timings, deadline_seconds)
         return ranked_results
 
+    async def _keyword_search(
+        self, user_question: str, user_age: int | None
+    ) -> list[EducationalContent]:
+        """Keyword поиск по вариациям запроса."""
+        expanded_query = self.query_expander.expand(user_question)
+        logger.debug(f"📚 Expanded query: {expanded_query}")
+        query_variations = self.query_expander.generate_variations(user_question)
+        batches = await asyncio.gather(
+            *(self.get_helpful_content(variation, user_age) for variation in query_variations)
+        )
+        return [material for batch in batches for material in batch]
+
+    @staticmethod
+    async def _timed_stage(timings: dict[str, float], stage: str, coro):
+        """Выполнить стадию RAG и записать её длительность (мс) в timings."""
+        started = time.perf_counter()
+        result = await coro
+        timings[stage] = (time.perf_counter() - started) * 1000
+        return result
+
+    @staticmethod
+    async def _await_until(task: asyncio.Future, deadline: float):
+        """Результат задачи, если она успела до дедлайна; иначе отмена и None."""
+        remaining = deadline - time.monotonic()
+        if not task.done() and remaining <= 0:
+            task.cancel()
+            return None
+        try:
+            return await asyncio.wait_for(task, timeout=max(remaining, 0))
+        except TimeoutError:
+            return None
+        except Exception as e:
+            logger.debug(f"RAG stage error: {e}")
+            return None
+
+    @staticmethod
+    def _report_stage_timings(timings: dict[str, float], deadline_seconds: float) -> None:
+        """Залогировать длительности завершившихся стадий и записать их в метрики."""
+        summary = ", ".join(f"{stage}={elapsed:.0f}ms" for stage, elapsed in timings.items())
+        logger.debug(f"📚 RAG stages ({deadline_seconds:.1f}s deadline): {summary}")
+        try:
+            from bot.monitoring.prometheus_metrics import get_metrics
+
+            metrics = get_metrics()
+            for stage, elapsed_ms in timings.items():
+                metrics.record_histogram(
+                    "rag_stage_duration_seconds", elapsed_ms / 1000, {"stage": stage}
+                )
+        except Exception as e:
+            logger.debug(f"RAG stage metrics error: {e}")
+
+    async def _embed_question(self, user_question: str) -> list[float] | None:
+        """Эмбеддинг вопроса (мемоизирован в EmbeddingService); None если API недоступен."""
+        try:
+            from bot.services.embeddings_service import get_embedding_service
+
+            return await get_embedding_service().embed_query(user_question)
+        except Exception as e:
+            logger.debug(f"Embedding вопроса недоступен: {e}")
+            return None
+
     async def get_helpful_content(
         self,
         user_question: str,
@@ -252,30 +377,44 @@ class KnowledgeService:
             user_age: Возраст пользователя для адаптации.
 
         Returns:
-            List[EducationalContent]: Список релевантных материалов.
+            List[EducationalContent]: До 5 материалов: сначала по убыванию BM25,
+            затем материалы предметов, к которым относится вопрос.
         """
-        # Обновляем базу знаний если нужно
-        if self._should_update_knowledge_base():
-            await self.update_knowledge_base()
-
-        relevant_materials = []
-        question_lower = user_question.lower()
-
-        # Ищем релевантные материалы во всех предметах
-        for subject, materials in self.knowledge_base.items():
-            for material in materials:
-                # Проверяем релевантность по заголовку и содержанию
-                if (
-                    question_lower in material.title.lower()
-                    or question_lower in material.content.lower()
-                    or self._is_question_related_to_subject(question_lower, subject)
-                ):
-                    relevant_materials.append(material)
+        # Обновляем базу знаний если нужно (в фоне: запрос отвечает по текущей базе)
+        self._schedule_refresh()
+
+        # BM25 по инвертированному индексу (строится при обновлении базы)
+        self._ensure_keyword_index()
+        relevant_materials = self.keyword_index.search(user_question, limit=5)
+
+        # Добор материалами предметов, к которым относится вопрос (самые полные первыми)
+        if len(relevant_materials) < 5:
+            question_lower = user_question.lower()
+            seen = {id(material) for material in relevant_materials}
+            related = [
+                material
+                for subject, materials in self._subject_materials_by_length.items()
+                if self._is_question_related_to_subject(question_lower, subject)
+                for material in materials[:5]
+                if id(material) not in seen
+            ]
+            related.sort(key=lambda x: len(x.content), reverse=True)
+            relevant_materials.extend(related[: 5 - len(relevant_materials)])
 
-        # Сортируем по релевантности (простейший алгоритм)
-        relevant_materials.sort(key=lambda x: len(x.content), reverse=True)
+        return relevant_materials
 
-        return relevant_materials[:5]  # Возвращаем топ-5 релевантных материалов
+    def _ensure_keyword_index(self) -> None:
+        """Перестроить BM25-индекс, если knowledge_base была заменена."""
+        if self._keyword_index_source is self.knowledge_base:
+            return
+        self.keyword_index.build(
+            material for materials in self.knowledge_base.values() for material in materials
+        )
+        self._subject_materials_by_length = {
+            subject: sorted(materials, key=lambda x: len(x.content), reverse=True)
+            for subject, materials in self.knowledge_base.items()
+        }
+        self._keyword_index_source = self.knowledge_base
 
     def _is_question_related_to_subject(self, question: str, subject: str) -> bool:
         """
@@ -442,8 +581,45 @@ class KnowledgeService:
         time_diff = datetime.now() - self.last_update
         return bool(time_diff > self.update_interval)
 
-    async def update_knowledge_base(self):
-        """Обновить базу знаний из веб-источников."""
+    def _spawn(self, coro) -> asyncio.Task:
+        """Запустить фоновую задачу, сохранив на неё ссылку до завершения."""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    def _schedule_refresh(self) -> None:
+        """Запустить обновление базы в фоне, если оно нужно и ещё не идёт."""
+        if not self._should_update_knowledge_base():
+            return
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = self._spawn(self._refresh_if_needed())
+
+    async def _refresh_if_needed(self) -> None:
+        """Обновить базу под локом; параллельные вызовы дожидаются одного обновления."""
+        if not self._should_update_knowledge_base():
+            return
+        async with self._refresh_lock:
+            if self._should_update_knowledge_base():
+                await self.update_knowledge_base()
+
+    async def update_knowledge_base(
+        self,
+        concurrency: int = 8,
+        batch_size: int = 100,
+        progress: Callable[[int, int], None] | None = None,
+    ) -> BulkIndexStats | None:
+        """
+        Обновить базу знаний из веб-источников и проиндексировать материалы.
+
+        Args:
+            concurrency: Максимум одновременных запросов к Embeddings API.
+            batch_size: Размер пачки для вставки в knowledge_embeddings.
+            progress: Колбэк progress(готово, всего) для индексации.
+
+        Returns:
+            BulkIndexStats индексации или None при ошибке скрапинга.
+        """
         try:
             logger.info("🔄 Обновление базы знаний...")
 
@@ -466,6 +642,7 @@ class KnowledgeService:
                     self.knowledge_base[subject].append(material)
 
                 self.last_update = datetime.now()
+                self._ensure_keyword_index()
 
                 # Инвалидация semantic cache при обновлении базы: старый кэш может содержать устаревшие результаты
                 try:
@@ -478,22 +655,47 @@ class KnowledgeService:
                     f"✅ База знаний обновлена: {len(all_materials)} материалов по {len(self.knowledge_base)} предметам"
                 )
 
-                # Индексация в pgvector для семантического поиска
-                indexed = 0
-                for material in all_materials:
-                    try:
-                        if await self.vector_search.index_content(material):
-                            indexed += 1
-                    except Exception as idx_err:
-                        logger.warning(
-                            f"⚠️ Не удалось проиндексировать материал «{material.title[:50]}»: {idx_err}"
-                        )
-                if indexed:
-                    logger.info(f"📚 Проиндексировано в векторы: {indexed} материалов")
+                # Индексация в pgvector для семантического поиска (пакетно)
+                return await self.index_materials(
+                    all_materials,
+                    concurrency=concurrency,
+                    batch_size=batch_size,
+                    progress=progress,
+                )
 
         except Exception as e:
             logger.error(f"❌ Ошибка обновления базы знаний: {e}")
 
+    async def index_materials(
+        self,
+        materials: list[EducationalContent],
+        concurrency: int = 8,
+        batch_size: int = 100,
+        progress: Callable[[int, int], None] | None = None,
+    ) -> BulkIndexStats:
+        """
+        Проиндексировать материалы в knowledge_embeddings одним пакетом.
+
+        Args:
+            materials: Материалы для индексации.
+            concurrency: Максимум одновременных запросов к Embeddings API.
+            batch_size: Размер пачки для вставки в БД.
+            progress: Колбэк progress(готово, всего).
+
+        Returns:
+            BulkIndexStats со счётчиками.
+        """
+        try:
+            stats = await self.vector_search.index_many(
+                materials, concurrency=concurrency, batch_size=batch_size, progress=progress
+            )
+        except Exception as idx_err:
+            logger.warning(f"⚠️ Не удалось проиндексировать материалы: {idx_err}")
+            return BulkIndexStats(total=len(materials), failed=len(materials))
+        if stats.written:
+            logger.info(f"📚 Проиндексировано в векторы: {stats.written} материалов")
+        return stats
+
     def get_knowledge_stats(self) -> dict[str, int]:
         """
         Получить статистику базы знаний.
@@ -632,7 +834,6 @@ class KnowledgeService:
             return None
 
         lang = _normalize_wikipedia_lang(language_code)
-        api_url = self._wikipedia_api_url(lang)
         topic_normalized = topic.strip().lower()
         cache_key = f"wikipedia:{lang}:{topic_normalized}:{user_age or 'all'}"
 
@@ -645,6 +846,27 @@ class KnowledgeService:
             except (json.JSONDecodeError, KeyError):
                 pass
 
+        # Одинаковые одновременные вопросы (целый класс) — один запрос к Wikipedia
+        return await self._wikipedia_flight.do(
+            f"{cache_key}:{max_length}",
+            self._fetch_wikipedia_summary,
+            topic,
+            lang,
+            user_age,
+            max_length,
+            cache_key,
+        )
+
+    async def _fetch_wikipedia_summary(
+        self,
+        topic: str,
+        lang: str,
+        user_age: int | None,
+        max_length: int,
+        cache_key: str,
+    ) -> tuple[str, str] | None:
+        """Загрузить описание темы из Wikipedia API и положить в кэш (лидер single-flight)."""
+        api_url = self._wikipedia_api_url(lang)
         headers = {
             "User-Agent": "PandaPal/1.0 (Educational Bot; contact@pandapal.ru)",
             "Accept": "application/json",
@@ -768,7 +990,9 @@ class KnowledgeService:
         if any(pattern in text_lower for pattern in self.forbidden_topics):
             return True
         # Проверка по глобальным запрещённым паттернам (расширенный набор >5 символов)
-        return any(pattern in text_lower for pattern in self._critical_forbidden_patterns)
+        from bot.services.moderation_service import get_moderation_service
+
+        return get_moderation_service().contains_critical_pattern(text_lower)
 
     def _adapt_content_for_children(self, text: str, user_age: int | None = None) -> str:
         """
@@ -0,0 +1,203 @@
+"""
+Content-addressed хранилище картинок истории чата.
+
+Раньше визуализации сохранялись в ChatHistory.image_url целиком —
+data:image/png;base64,... (сотни КБ в строке таблицы): каждая выборка
+истории тянула их из БД, сериализовала в JSON и отдавала клиенту
+без кэширования. Теперь байты картинки лежат в хранилище под именем
+sha256(байты).<расширение>, а в image_url — только ссылка /media/<имя>.
+
+- Одинаковые картинки (таблица умножения, x**2) хранятся один раз.
+- Содержимое по имени никогда не меняется, поэтому маршрут /media
+  отдаёт его с Cache-Control: immutable и ETag = хэш.
+- Бэкенд подключаемый (MediaBackend): по умолчанию — каталог на диске
+  (MEDIA_STORE_DIR, на проде — смонтированный volume).
+
+Существующие data URL переносит scripts/migrate_chat_images_to_media_store.py.
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from loguru import logger
+
+MEDIA_URL_PREFIX = "/media/"
+MEDIA_CONTENT_TYPES: dict[str, str] = {"png": "image/png", "jpg": "image/jpeg"}
+MEDIA_NAME_RE = re.compile(r"^(?P<digest>[0-9a-f]{64})\.(?P<extension>png|jpg)$")
+
+_DATA_URL_RE = re.compile(r"^data:image/(?P<type>png|jpe?g);base64,", re.IGNORECASE)
+
+
+def normalize_extension(extension: str) -> str:
+    """Расширение файла по типу картинки: png, jpg (jpeg -> jpg)."""
+    extension = extension.lower().lstrip(".")
+    return "jpg" if extension == "jpeg" else extension
+
+
+def media_name(data: bytes, extension: str = "png") -> str:
+    """Имя объекта в хранилище: sha256 содержимого + расширение."""
+    return f"{hashlib.sha256(data).hexdigest()}.{normalize_extension(extension)}"
+
+
+def parse_data_url(data_url: str) -> tuple[bytes, str] | None:
+    """
+    Разобрать data:image/...;base64,... в (байты, расширение).
+
+    Returns:
+        tuple | None: None, если это не data URL картинки или base64 битый
+    """
+    match = _DATA_URL_RE.match(data_url)
+    if not match:
+        return None
+    try:
+        data = base64.b64decode(data_url[match.end() :], validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    return data, normalize_extension(match.group("type"))
+
+
+class MediaBackend(ABC):
+    """Бэкенд хранения объектов по имени (имя = хэш, объект неизменяем)."""
+
+    @abstractmethod
+    def exists(self, name: str) -> bool:
+        """Объект уже сохранён."""
+
+    @abstractmethod
+    def read(self, name: str) -> bytes | None:
+        """Байты объекта или None, если его нет."""
+
+    @abstractmethod
+    def write(self, name: str, data: bytes) -> None:
+        """Сохранить объект (вызывается только для отсутствующих имён)."""
+
+
+class DiskMediaBackend(MediaBackend):
+    """
+    Хранение в каталоге на диске: <root>/<первые 2 символа хэша>/<имя>.
+
+    Подкаталоги по префиксу хэша не дают одному каталогу разрастись
+    до сотен тысяч файлов.
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+
+    def _path(self, name: str) -> Path:
+        return self.root / name[:2] / name
+
+    def exists(self, name: str) -> bool:
+        return self._path(name).is_file()
+
+    def read(self, name: str) -> bytes | None:
+        try:
+            return self._path(name).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def write(self, name: str, data: bytes) -> None:
+        path = self._path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Атомарная запись: параллельный запрос не прочитает недописанный файл
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+
+class MediaStore:
+    """
+    Content-addressed хранилище картинок.
+
+    Attributes:
+        backend: Бэкенд хранения
+        url_prefix: Префикс ссылок (маршрут раздачи)
+    """
+
+    def __init__(self, backend: MediaBackend, url_prefix: str = MEDIA_URL_PREFIX):
+        self.backend = backend
+        self.url_prefix = url_prefix
+
+    @classmethod
+    def from_settings(cls) -> "MediaStore":
+        """Хранилище на диске в каталоге из настроек."""
+        from bot.config import settings
+
+        return cls(DiskMediaBackend(settings.media_store_dir))
+
+    def url_for(self, name: str) -> str:
+        """Ссылка на объект для image_url."""
+        return f"{self.url_prefix}{name}"
+
+    def put(self, data: bytes, extension: str = "png") -> str:
+        """
+        Сохранить картинку (синхронно) и вернуть ссылку на неё.
+
+        Повторное сохранение тех же байтов ничего не пишет.
+
+        Raises:
+            ValueError: Неподдерживаемый тип картинки
+            OSError: Ошибка бэкенда
+        """
+        extension = normalize_extension(extension)
+        if extension not in MEDIA_CONTENT_TYPES:
+            raise ValueError(f"Unsupported media type: {extension}")
+        name = media_name(data, extension)
+        if not self.backend.exists(name):
+            self.backend.write(name, data)
+        return self.url_for(name)
+
+    def get(self, name: str) -> bytes | None:
+        """Байты объекта по имени <sha256>.<расширение> (чужие имена — None)."""
+        if not MEDIA_NAME_RE.match(name):
+            return None
+        return self.backend.read(name)
+
+    def put_data_url(self, data_url: str) -> str | None:
+        """Перенести data URL в хранилище; None — если это не data URL картинки."""
+        parsed = parse_data_url(data_url)
+        if parsed is None:
+            return None
+        data, extension = parsed
+        return self.put(data, extension)
+
+    async def image_url(self, data: bytes, extension: str = "png") -> str:
+        """
+        Ссылка для ChatHistory.image_url на картинку из ответа.
+
+        Запись на диск выполняется в потоке, event loop не блокируется.
+        Если хранилище недоступно, возвращается data URL, как раньше, —
+        картинка в истории не теряется.
+        """
+        try:
+            return await asyncio.to_thread(self.put, data, extension)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Хранилище медиа недоступно, сохраняем data URL: {e}")
+            mime_type = MEDIA_CONTENT_TYPES.get(normalize_extension(extension), "image/png")
+            return f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+    async def image_url_from_base64(self, image_base64: str, extension: str = "png") -> str:
+        """То же, что image_url, для картинки в base64 (визуализации из стрима)."""
+        return await self.image_url(base64.b64decode(image_base64), extension)
+
+
+_media_store: MediaStore | None = None
+
+
+def get_media_store() -> MediaStore:
+    """Синглтон MediaStore (каталог из настроек)."""
+    global _media_store
+    if _media_store is None:
+        _media_store = MediaStore.from_settings()
+    return _media_store
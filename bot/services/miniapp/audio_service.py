@@ -30,7 +30,7 @@ class MiniappAudioService:
 
     async def process_audio(
         self,
-        audio_base64: str,
+        audio: bytes | str,
         telegram_id: int,
         response: web.StreamResponse,
         language_code: str | None = None,
@@ -39,7 +39,8 @@ class MiniappAudioService:
         Обрабатывает голосовое сообщение.
 
         Args:
-            audio_base64: Base64 строка аудио (может содержать префикс data:audio/...;base64,)
+            audio: Байты аудио (multipart) или base64 строка
+                (может содержать префикс data:audio/...;base64,)
             telegram_id: ID пользователя в Telegram
             response: SSE response для отправки событий
 
@@ -52,17 +53,19 @@ class MiniappAudioService:
             # Отправляем событие обработки аудио
             await response.write(b'event: status\ndata: {"status": "transcribing"}\n\n')
 
-            # Убираем data:audio/...;base64, префикс
-            if "base64," in audio_base64:
-                audio_base64 = audio_base64.split("base64,")[1]
+            if isinstance(audio, str):
+                # Убираем data:audio/...;base64, префикс
+                audio_base64 = audio.split("base64,")[1] if "base64," in audio else audio
 
-            # Валидация размера
-            if len(audio_base64) > self.MAX_AUDIO_BASE64_SIZE:
-                error_msg = 'event: error\ndata: {"error": "Аудио слишком большое"}\n\n'
-                await response.write(error_msg.encode("utf-8"))
-                return None
+                # Валидация размера
+                if len(audio_base64) > self.MAX_AUDIO_BASE64_SIZE:
+                    error_msg = 'event: error\ndata: {"error": "Аудио слишком большое"}\n\n'
+                    await response.write(error_msg.encode("utf-8"))
+                    return None
 
-            audio_bytes = base64.b64decode(audio_base64)
+                audio_bytes = base64.b64decode(audio_base64)
+            else:
+                audio_bytes = audio
 
             if len(audio_bytes) > self.MAX_AUDIO_BYTES_SIZE:
                 error_msg = 'event: error\ndata: {"error": "Аудио слишком большое"}\n\n'
@@ -12,6 +12,7 @@ from typing import Literal
 from loguru import logger
 
 from bot.config.response_rules import VISUALIZATION_TRIGGER_WORDS
+from bot.services.visualization.expression import is_valid_expression, normalize_expression
 
 
 @dataclass
@@ -178,18 +179,9 @@ class MiniappIntentService:
                                 part = part.strip()
                                 if not part:
                                     continue
-                                part = re.sub(r"^y\s*=\s*", "", part, flags=re.IGNORECASE)
-                                part = (
-                                    part.replace("²", "**2").replace("³", "**3").replace("^", "**")
-                                )
-                                if re.match(r"^[x\s+\-*/().\d\s]+$", part) or re.match(
-                                    r"^(sin|cos|tan|exp|log|sqrt|ln)\(x\)$", part, re.IGNORECASE
-                                ):
-                                    part = re.sub(r"^ln\(", "log(", part, flags=re.IGNORECASE)
-                                    graph_functions.append(part)
-                                elif re.match(r"^x[²³]$", part):
-                                    part = part.replace("²", "**2").replace("³", "**3")
-                                    graph_functions.append(part)
+                                # Разбор по белому списку (тот же, что при построении)
+                                if is_valid_expression(part):
+                                    graph_functions.append(normalize_expression(part))
 
         if graph_functions:
             intent.kind = "graph" if intent.kind is None else "both"
@@ -200,11 +192,7 @@ class MiniappIntentService:
             seen = set()
             for func in graph_functions:
                 # Пропускаем сырой текст типа "синуса и косинуса"
-                if not re.match(
-                    r"^(sin|cos|tan|exp|log|sqrt)\(x\)$|^x\*\*?\d+$|^[x\s+\-*/().\d\s]+$",
-                    func,
-                    re.IGNORECASE,
-                ):
+                if not is_valid_expression(func):
                     continue
                 if func not in seen:
                     seen.add(func)
@@ -8,6 +8,7 @@
 - Валидацию размера фото
 """
 
+import asyncio
 import base64
 import json
 
@@ -15,10 +16,10 @@ from aiohttp import web
 from loguru import logger
 
 from bot.api.miniapp.helpers import send_achievements_event
-from bot.database import get_db
-from bot.services import ChatHistoryService, UserService
-from bot.services.gamification_service import GamificationService
-from bot.services.premium_features_service import PremiumFeaturesService
+from bot.database import get_async_db
+from bot.services import AsyncChatHistoryService, AsyncPremiumFeaturesService, AsyncUserService
+from bot.services.gamification_service import AsyncGamificationService
+from bot.services.request_quota import get_request_quota
 from bot.services.vision_service import VisionService
 from bot.services.yandex_ai_response_generator import clean_ai_response
 
@@ -32,7 +33,7 @@ class MiniappPhotoService:
 
     async def process_photo(
         self,
-        photo_base64: str,
+        photo: bytes | str,
         telegram_id: int,
         message: str,
         response: web.StreamResponse,
@@ -41,7 +42,8 @@ class MiniappPhotoService:
         Обрабатывает фотографию.
 
         Args:
-            photo_base64: Base64 строка изображения (может содержать префикс data:image/...;base64,)
+            photo: Байты изображения (multipart) или base64 строка
+                (может содержать префикс data:image/...;base64,)
             telegram_id: ID пользователя в Telegram
             message: Текстовое сообщение пользователя (опционально)
             response: SSE response для отправки событий
@@ -57,140 +59,93 @@ class MiniappPhotoService:
             # Отправляем событие обработки фото
             await response.write(b'event: status\ndata: {"status": "analyzing_photo"}\n\n')
 
-            # Убираем data:image/...;base64, префикс
-            if "base64," in photo_base64:
-                photo_base64 = photo_base64.split("base64,")[1]
+            if isinstance(photo, str):
+                # Убираем data:image/...;base64, префикс
+                photo_base64 = photo.split("base64,")[1] if "base64," in photo else photo
+                photo_bytes = base64.b64decode(photo_base64)
+            else:
+                photo_bytes = photo
+
+            # Фаза чтения: короткая сессия только на загрузку пользователя,
+            # соединение возвращается в пул до вызова Vision API
+            async with get_async_db() as db:
+                user = await AsyncUserService(db).get_user_by_telegram_id(telegram_id)
+
+            if not user:
+                await response.write(b'event: error\ndata: {"error": "User not found"}\n\n')
+                return None, True
+
+            # КРИТИЧНО: Проверка лимита ДО вызова Vision API
+            # (в стриме квота уже зарезервирована — повторный вызов её не тратит)
+            quota = await get_request_quota().check_and_consume(telegram_id, username=user.username)
+            if not quota.allowed:
+                limit_reason = quota.reason
+                logger.warning(f"🚫 Stream (фото): AI запрос заблокирован для user={telegram_id}")
+                err_escaped = (limit_reason or "").replace('"', '\\"').replace("\n", " ")
+                await response.write(
+                    f'event: error\ndata: {{"error": "{err_escaped}", "error_code": "RATE_LIMIT_EXCEEDED"}}\n\n'.encode()
+                )
+                return None, True
 
-            photo_bytes = base64.b64decode(photo_base64)
+            # Анализ изображения через Vision API (без соединения с БД)
+            vision_result = await self.vision_service.analyze_image(
+                image_data=photo_bytes,
+                user_message=message or "Проанализируй это фото с заданием и реши задачу полностью",
+                user_age=user.age,
+            )
 
-            with get_db() as db:
-                user_service = UserService(db)
-                user = user_service.get_user_by_telegram_id(telegram_id)
+            logger.info("✅ Stream: Фото проанализировано")
+            await response.write(b'event: status\ndata: {"status": "photo_analyzed"}\n\n')
 
-                if not user:
-                    await response.write(b'event: error\ndata: {"error": "User not found"}\n\n')
-                    return None, True
+            # Проверяем, что анализ не является сообщением об ошибке
+            is_error_message = vision_result.analysis and (
+                "Не удалось проанализировать" in vision_result.analysis
+                or "Временная проблема с AI сервисом" in vision_result.analysis
+                or "Ошибка анализа" in vision_result.analysis
+            )
 
-                # КРИТИЧНО: Проверка лимита ДО вызова Vision API
-                premium_service = PremiumFeaturesService(db)
-                can_request, limit_reason = premium_service.can_make_ai_request(
-                    telegram_id, username=user.username
-                )
-                if not can_request:
-                    logger.warning(
-                        f"🚫 Stream (фото): AI запрос заблокирован для user={telegram_id}"
-                    )
-                    err_escaped = (limit_reason or "").replace('"', '\\"').replace("\n", " ")
-                    await response.write(
-                        f'event: error\ndata: {{"error": "{err_escaped}", "error_code": "RATE_LIMIT_EXCEEDED"}}\n\n'.encode()
-                    )
-                    return None, True
-
-                # Анализ изображения через Vision API
-                vision_result = await self.vision_service.analyze_image(
-                    image_data=photo_bytes,
-                    user_message=message
-                    or "Проанализируй это фото с заданием и реши задачу полностью",
-                    user_age=user.age,
-                )
+            # КРИТИЧЕСКИ ВАЖНО: Если Vision API дал готовый ответ - сразу отправляем его!
+            if vision_result.analysis and vision_result.analysis.strip() and not is_error_message:
+                # Vision API уже решил задачу - отправляем ответ напрямую
+                full_response = clean_ai_response(vision_result.analysis)
 
-                logger.info("✅ Stream: Фото проанализировано")
-                await response.write(b'event: status\ndata: {"status": "photo_analyzed"}\n\n')
+                # Отправляем ответ через streaming
+                chunk_data = json.dumps({"chunk": full_response}, ensure_ascii=False)
+                await response.write(f"event: chunk\ndata: {chunk_data}\n\n".encode())
 
-                # Проверяем, что анализ не является сообщением об ошибке
-                is_error_message = vision_result.analysis and (
-                    "Не удалось проанализировать" in vision_result.analysis
-                    or "Временная проблема с AI сервисом" in vision_result.analysis
-                    or "Ошибка анализа" in vision_result.analysis
+                limit_msg, unlocked_achievements = await self._save_ready_answer(
+                    telegram_id, message or "📷 Фото", full_response
                 )
 
-                # КРИТИЧЕСКИ ВАЖНО: Если Vision API дал готовый ответ - сразу отправляем его!
-                if (
-                    vision_result.analysis
-                    and vision_result.analysis.strip()
-                    and not is_error_message
-                ):
-                    # Vision API уже решил задачу - отправляем ответ напрямую
-                    full_response = clean_ai_response(vision_result.analysis)
-
-                    # Отправляем ответ через streaming
-                    chunk_data = json.dumps({"chunk": full_response}, ensure_ascii=False)
-                    await response.write(f"event: chunk\ndata: {chunk_data}\n\n".encode())
-
-                    # Сохраняем в историю
-                    try:
-                        premium_service = PremiumFeaturesService(db)
-                        history_service = ChatHistoryService(db)
-
-                        limit_reached, total_requests = premium_service.increment_request_count(
-                            telegram_id
-                        )
-
-                        # Проактивное уведомление от панды при достижении лимита (в чат + в Telegram)
-                        if limit_reached:
-                            import asyncio
-
-                            asyncio.create_task(
-                                premium_service.send_limit_reached_notification_async(telegram_id)
-                            )
-                            history_service.add_message(
-                                telegram_id,
-                                premium_service.get_limit_reached_message_text(),
-                                "ai",
-                            )
-                        user_msg_text = message or "📷 Фото"
-                        history_service.add_message(telegram_id, user_msg_text, "user")
-                        history_service.add_message(telegram_id, full_response, "ai")
-
-                        # Геймификация
-                        unlocked_achievements = []
-                        try:
-                            gamification_service = GamificationService(db)
-                            unlocked_achievements = gamification_service.process_message(
-                                telegram_id, user_msg_text
-                            )
-                        except Exception as e:
-                            logger.error(f"❌ Stream: Ошибка геймификации: {e}", exc_info=True)
-
-                        db.commit()
-
-                        # Отправляем информацию о достижениях если есть
-                        if unlocked_achievements:
-                            await send_achievements_event(response, unlocked_achievements)
-                    except Exception as save_error:
-                        logger.error(f"❌ Stream: Ошибка сохранения: {save_error}", exc_info=True)
-                        db.rollback()
-
-                    # Сообщение от панды при достижении лимита (в чат)
-                    if limit_reached:
-                        limit_data = json.dumps(
-                            {"content": premium_service.get_limit_reached_message_text()},
-                            ensure_ascii=False,
-                        )
-                        await response.write(f"event: message\ndata: {limit_data}\n\n".encode())
-
-                    # Отправляем событие завершения
-                    await response.write(b'event: done\ndata: {"status": "completed"}\n\n')
-                    logger.info(f"✅ Stream: Фото ответ отправлен напрямую для {telegram_id}")
-                    return None, True
-
-                # Если Vision API вернул ошибку - отправляем ошибку пользователю
-                if is_error_message:
-                    logger.error(f"❌ Stream: Vision API вернул ошибку для фото от {telegram_id}")
-                    error_msg = 'event: error\ndata: {"error": "Временная проблема с AI сервисом. Попробуйте позже."}\n\n'
-                    await response.write(error_msg.encode("utf-8"))
-                    return None, True
-
-                # Если Vision API не дал готовый ответ - используем распознанный текст
-                if vision_result.recognized_text:
-                    user_message = (
-                        f"На фото написано: {vision_result.recognized_text}\n\n"
-                        "Помоги решить эту задачу полностью."
-                    )
-                else:
-                    user_message = message or "Помоги мне разобраться с этой задачей"
+                # Достижения и сообщение о лимите — уже без соединения с БД
+                if unlocked_achievements:
+                    await send_achievements_event(response, unlocked_achievements)
+                if limit_msg:
+                    limit_data = json.dumps({"content": limit_msg}, ensure_ascii=False)
+                    await response.write(f"event: message\ndata: {limit_data}\n\n".encode())
+
+                # Отправляем событие завершения
+                await response.write(b'event: done\ndata: {"status": "completed"}\n\n')
+                logger.info(f"✅ Stream: Фото ответ отправлен напрямую для {telegram_id}")
+                return None, True
+
+            # Если Vision API вернул ошибку - отправляем ошибку пользователю
+            if is_error_message:
+                logger.error(f"❌ Stream: Vision API вернул ошибку для фото от {telegram_id}")
+                error_msg = 'event: error\ndata: {"error": "Временная проблема с AI сервисом. Попробуйте позже."}\n\n'
+                await response.write(error_msg.encode("utf-8"))
+                return None, True
+
+            # Если Vision API не дал готовый ответ - используем распознанный текст
+            if vision_result.recognized_text:
+                user_message = (
+                    f"На фото написано: {vision_result.recognized_text}\n\n"
+                    "Помоги решить эту задачу полностью."
+                )
+            else:
+                user_message = message or "Помоги мне разобраться с этой задачей"
 
-                return user_message, False
+            return user_message, False
 
         except Exception as e:
             logger.error(f"❌ Stream: Ошибка обработки фото: {e}", exc_info=True)
@@ -198,3 +153,44 @@ class MiniappPhotoService:
                 f'event: error\ndata: {{"error": "Ошибка обработки фото: {str(e)}"}}\n\n'.encode()
             )
             return None, True
+
+    async def _save_ready_answer(
+        self, telegram_id: int, user_msg_text: str, full_response: str
+    ) -> tuple[str | None, list]:
+        """
+        Фаза записи: короткая транзакция после ответа Vision API.
+
+        Учитывает запрос в лимите, сохраняет обмен в историю и проверяет
+        достижения. Возвращает (текст сообщения о лимите или None, достижения).
+        """
+        limit_msg = None
+        unlocked_achievements = []
+        try:
+            async with get_async_db() as db:
+                premium_service = AsyncPremiumFeaturesService(db)
+                history_service = AsyncChatHistoryService(db)
+
+                quota = await get_request_quota().settle(telegram_id)
+
+                # Проактивное уведомление от панды при достижении лимита (в чат + в Telegram)
+                if quota.limit_reached:
+                    asyncio.create_task(
+                        premium_service.send_limit_reached_notification_async(telegram_id)
+                    )
+                    limit_msg = premium_service.get_limit_reached_message_text()
+                    await history_service.add_message(telegram_id, limit_msg, "ai")
+
+                await history_service.add_exchange(telegram_id, user_msg_text, full_response)
+
+                # Геймификация
+                try:
+                    gamification_service = AsyncGamificationService(db)
+                    unlocked_achievements = await gamification_service.process_message(
+                        telegram_id, user_msg_text
+                    )
+                except Exception as e:
+                    logger.error(f"❌ Stream: Ошибка геймификации: {e}", exc_info=True)
+        except Exception as save_error:
+            logger.error(f"❌ Stream: Ошибка сохранения: {save_error}", exc_info=True)
+
+        return limit_msg, unlocked_achievements
@@ -12,6 +12,7 @@ import re
 from loguru import logger
 
 from bot.services.miniapp.intent_service import VisualizationIntent
+from bot.services.visualization.render_pool import detect_and_render, render_visualization
 from bot.services.visualization_service import get_visualization_service
 
 
@@ -21,8 +22,10 @@ class MiniappVisualizationService:
     def __init__(self):
         """Инициализация сервиса."""
         self.viz_service = get_visualization_service()
+        # Координаты карты из последней детекции (рендер идёт в отдельном процессе)
+        self.last_map_coordinates: dict | None = None
 
-    def detect_visualization_request(
+    async def detect_visualization_request(
         self, user_message: str, intent: VisualizationIntent
     ) -> tuple[bytes | None, int | None, bool, bool, str | None]:
         """
@@ -125,9 +128,11 @@ class MiniappVisualizationService:
         specific_visualization_image = None
         visualization_type = None
         try:
-            specific_visualization_image, visualization_type = (
-                self.viz_service.detect_visualization_request(user_message)
-            )
+            (
+                specific_visualization_image,
+                visualization_type,
+                self.last_map_coordinates,
+            ) = await detect_and_render(user_message)
 
             # Если IntentService определил несколько таблиц умножения, игнорируем одиночную
             # специфичную визуализацию и будем генерировать комбинированную картинку
@@ -193,7 +198,7 @@ class MiniappVisualizationService:
             visualization_type,  # Тип визуализации для пояснений
         )
 
-    def generate_visualization(
+    async def generate_visualization(
         self,
         user_message: str,
         full_response: str,
@@ -264,18 +269,16 @@ class MiniappVisualizationService:
                 if multiplication_numbers:
                     if len(multiplication_numbers) > 1:
                         # Несколько таблиц в одной картинке
-                        visualization_image = (
-                            self.viz_service.generate_multiple_multiplication_tables(
-                                multiplication_numbers
-                            )
+                        visualization_image = await render_visualization(
+                            "generate_multiple_multiplication_tables", multiplication_numbers
                         )
                         logger.info(
                             f"📊 Stream: Сгенерированы таблицы умножения на {multiplication_numbers}"
                         )
                     else:
                         # Одна таблица
-                        visualization_image = self.viz_service.generate_multiplication_table_image(
-                            multiplication_numbers[0]
+                        visualization_image = await render_visualization(
+                            "generate_multiplication_table_image", multiplication_numbers[0]
                         )
                         logger.info(
                             f"📊 Stream: Сгенерирована таблица умножения на {multiplication_numbers[0]}"
@@ -288,8 +291,8 @@ class MiniappVisualizationService:
 
             # Старая логика для обратной совместимости (если intent не сработал)
             elif multiplication_number:
-                visualization_image = self.viz_service.generate_multiplication_table_image(
-                    multiplication_number
+                visualization_image = await render_visualization(
+                    "generate_multiplication_table_image", multiplication_number
                 )
                 if visualization_image:
                     visualization_image_base64 = self.viz_service.image_to_base64(
@@ -306,7 +309,9 @@ class MiniappVisualizationService:
                 and not specific_visualization_image
             ):
                 # Генерируем полную таблицу умножения (1-10)
-                visualization_image = self.viz_service.generate_full_multiplication_table()
+                visualization_image = await render_visualization(
+                    "generate_full_multiplication_table"
+                )
                 if visualization_image:
                     visualization_image_base64 = self.viz_service.image_to_base64(
                         visualization_image
@@ -382,8 +387,8 @@ class MiniappVisualizationService:
 
                 # Генерируем комбинированную картинку
                 if table_num and graph_expr:
-                    visualization_image = self.viz_service.generate_combined_table_and_graph(
-                        table_num, graph_expr
+                    visualization_image = await render_visualization(
+                        "generate_combined_table_and_graph", table_num, graph_expr
                     )
                     if visualization_image:
                         visualization_image_base64 = self.viz_service.image_to_base64(
@@ -405,16 +410,16 @@ class MiniappVisualizationService:
                 if graph_expressions:
                     if len(graph_expressions) > 1:
                         # Несколько графиков в одной картинке
-                        visualization_image = self.viz_service.generate_multiple_function_graphs(
-                            graph_expressions
+                        visualization_image = await render_visualization(
+                            "generate_multiple_function_graphs", graph_expressions
                         )
                         logger.info(
                             f"📈 Stream: Сгенерированы графики функций: {graph_expressions}"
                         )
                     else:
                         # Один график
-                        visualization_image = self.viz_service.generate_function_graph(
-                            graph_expressions[0]
+                        visualization_image = await render_visualization(
+                            "generate_function_graph", graph_expressions[0]
                         )
                         logger.info(
                             f"📈 Stream: Сгенерирован график функции: {graph_expressions[0]}"
@@ -441,7 +446,9 @@ class MiniappVisualizationService:
                 if sin_match or (general_graph_request and not graph_match):
                     # Генерируем стандартный график синуса
                     logger.info("🔍 Stream: Вход в блок генерации графика синуса")
-                    visualization_image = self.viz_service.generate_function_graph("sin(x)")
+                    visualization_image = await render_visualization(
+                        "generate_function_graph", "sin(x)"
+                    )
                     logger.info(
                         f"🔍 Stream: generate_function_graph вернул: {type(visualization_image)}, "
                         f"size={len(visualization_image) if visualization_image else 0}"
@@ -456,14 +463,18 @@ class MiniappVisualizationService:
                     else:
                         logger.warning("⚠️ Stream: generate_function_graph вернул None для sin(x)")
                 elif re.search(r"(?:косинус|cos)", user_msg_lower):
-                    visualization_image = self.viz_service.generate_function_graph("cos(x)")
+                    visualization_image = await render_visualization(
+                        "generate_function_graph", "cos(x)"
+                    )
                     if visualization_image:
                         visualization_image_base64 = self.viz_service.image_to_base64(
                             visualization_image
                         )
                         logger.info("📈 Stream: Сгенерирован график косинуса")
                 elif re.search(r"(?:тангенс|tan|тангенсоид)", user_msg_lower):
-                    visualization_image = self.viz_service.generate_function_graph("tan(x)")
+                    visualization_image = await render_visualization(
+                        "generate_function_graph", "tan(x)"
+                    )
                     if visualization_image:
                         visualization_image_base64 = self.viz_service.image_to_base64(
                             visualization_image
@@ -471,7 +482,9 @@ class MiniappVisualizationService:
                         logger.info("📈 Stream: Сгенерирован график тангенса")
                 elif re.search(r"(?:парабол|порабол|парабола|порабола)", user_msg_lower):
                     # Парабола y = x^2
-                    visualization_image = self.viz_service.generate_function_graph("x**2")
+                    visualization_image = await render_visualization(
+                        "generate_function_graph", "x**2"
+                    )
                     if visualization_image:
                         visualization_image_base64 = self.viz_service.image_to_base64(
                             visualization_image
@@ -488,8 +501,8 @@ class MiniappVisualizationService:
                         )
                         # Проверяем безопасность выражения (после нормализации)
                         if re.match(r"^[x\s+\-*/().\d\s]+$", expression):
-                            visualization_image = self.viz_service.generate_function_graph(
-                                expression
+                            visualization_image = await render_visualization(
+                                "generate_function_graph", expression
                             )
                             if visualization_image:
                                 visualization_image_base64 = self.viz_service.image_to_base64(
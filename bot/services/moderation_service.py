@@ -6,6 +6,7 @@
 
 import re
 import secrets
+import threading
 from re import Pattern
 from typing import Any
 
@@ -14,6 +15,14 @@ from loguru import logger
 from bot.config import FORBIDDEN_PATTERNS, settings
 from bot.interfaces import IModerationService
 from bot.services.advanced_moderation import AdvancedModerationService, ModerationResult
+from bot.services.keyword_automaton import BoundaryMode, KeywordAutomaton
+
+# Теги ключевых слов в общем автомате модерации
+_TAG_PROFANITY = "profanity"
+_TAG_FORBIDDEN = "forbidden"
+_TAG_TOPIC = "topic"
+_TAG_CRITICAL = "critical"
+_TAG_EDUCATIONAL = "educational"
 
 
 class ContentModerationService(IModerationService):
@@ -262,24 +271,12 @@ class ContentModerationService(IModerationService):
 
     def __init__(self) -> None:
         """Инициализация сервиса модерации."""
-        # Список запрещённых тем из настроек -> компилируем в простой regex для кириллицы
-        topics: list[str] = settings.get_forbidden_topics_list()
-        self._topic_regexes: list[Pattern[str]] = [
-            re.compile(rf"{re.escape(topic)}", re.IGNORECASE) for topic in topics
-        ]
-
-        # Паттерны высокого уровня из конфигурации -> компилируем с границами слов
-        self._forbidden_regexes: list[Pattern[str]] = [
-            re.compile(rf"\b{re.escape(pattern)}\b", re.IGNORECASE)
-            for pattern in FORBIDDEN_PATTERNS
-        ]
-
         self.filter_level: int = settings.content_filter_level
 
         # Инициализируем продвинутый сервис модерации
         self.advanced_moderation = AdvancedModerationService()
 
-        # Базовый список нецензурных слов (русский) -> единый regex с word-boundaries
+        # Базовый список нецензурных слов (русский)
         profanity_words_ru = [
             "блять",
             "бля",
@@ -357,55 +354,67 @@ class ContentModerationService(IModerationService):
             + profanity_words_es
         )
 
-        # Специальная обработка для "hell" - только точное слово, чтобы не блокировать "Hello"
-        # Для остальных слов используем паттерн с \w* (позволяет окончания)
-        patterns = []
-        for word in all_profanity_words:
-            if word == "hell":
-                # Точное совпадение слова "hell", чтобы не блокировать "Hello"
-                patterns.append(rf"\b{re.escape(word)}\b")
-            else:
-                # Обычный паттерн с окончаниями
-                patterns.append(rf"\b{re.escape(word)}\w*\b")
-
-        self._profanity_regex: Pattern[str] = re.compile(
-            r"|".join(patterns),
-            re.IGNORECASE,
-        )
+        # Все словари компилируются в один автомат: текст сканируется один раз,
+        # а не отдельным regex на каждый паттерн и тему.
+        self._profanity_words: tuple[str, ...] = tuple(all_profanity_words)
+        matcher = KeywordAutomaton()
+        for word in self._profanity_words:
+            # "hell" — только целое слово, чтобы не блокировать "Hello";
+            # остальные слова — с любыми окончаниями (\bслово\w*)
+            mode = BoundaryMode.WORD if word == "hell" else BoundaryMode.WORD_PREFIX
+            matcher.add(word, _TAG_PROFANITY, mode)
+        # Паттерны высокого уровня из конфигурации — с границами слов
+        matcher.add_many(FORBIDDEN_PATTERNS, _TAG_FORBIDDEN, BoundaryMode.WORD)
+        # Список запрещённых тем из настроек — подстрокой
+        matcher.add_many(settings.get_forbidden_topics_list(), _TAG_TOPIC)
+        # Длинные (>5 символов) паттерны для внешнего контента — подстрокой
+        matcher.add_many((p for p in FORBIDDEN_PATTERNS if len(p) > 5), _TAG_CRITICAL)
+        # Учебные контексты (белый список для ответов AI) — подстрокой
+        matcher.add_many(self.EDUCATIONAL_CONTEXTS, _TAG_EDUCATIONAL)
+        self._matcher: KeywordAutomaton = matcher.build()
 
         # SQLi/XSS паттерны
-        self._sql_regexes: list[Pattern[str]] = [
+        self._sql_regexes: tuple[Pattern[str], ...] = (
             re.compile(r"'\s*OR\s*'1'\s*=\s*'1", re.IGNORECASE),
             re.compile(r";\s*DROP\s+TABLE", re.IGNORECASE),
             re.compile(r"UNION\s+SELECT", re.IGNORECASE),
-        ]
-        self._xss_regexes: list[Pattern[str]] = [
+        )
+        self._xss_regexes: tuple[Pattern[str], ...] = (
             re.compile(r"<script.*?>", re.IGNORECASE),
             re.compile(r"javascript:", re.IGNORECASE),
             re.compile(r"on\w+\s*=", re.IGNORECASE),  # onclick=, onerror=
-        ]
+        )
 
     def is_provocative_question(self, text: str) -> bool:  # noqa: ARG002
         """Проверяет, является ли вопрос провокационным. Отключено: свобода модели."""
         return False
 
+    @staticmethod
+    def _verdict(tags: set) -> tuple[bool, str | None]:
+        """Решение по набору найденных тегов (мат приоритетнее запрещённых тем)."""
+        if _TAG_PROFANITY in tags:
+            return False, "ненормативная лексика"
+        if _TAG_FORBIDDEN in tags or _TAG_TOPIC in tags:
+            return False, "запрещённая тема"
+        return True, None
+
     def is_safe_content(self, text: str) -> tuple[bool, str | None]:
         """Проверка, безопасен ли контент. Блокируем ненормативную лексику и запрещённые темы."""
         if not text or not text.strip():
             return True, None
-        normalized = text.strip().lower()
-        # Ненормативная лексика (русский, английский, немецкий, французский, испанский)
-        if self._profanity_regex.search(normalized):
-            return False, "ненормативная лексика"
-        # Запрещённые паттерны (наркотики, оружие, насилие и т.д.)
-        for pattern in self._forbidden_regexes:
-            if pattern.search(normalized):
-                return False, "запрещённая тема"
-        # Запрещённые темы из настроек
-        for regex in self._topic_regexes:
-            if regex.search(normalized):
-                return False, "запрещённая тема"
-        return True, None
+        # Ненормативная лексика (русский, английский, немецкий, французский, испанский),
+        # запрещённые паттерны и темы — за один проход по тексту
+        return self._verdict(self._matcher.matched_tags(text.strip()))
+
+    def contains_critical_pattern(self, text: str) -> bool:
+        """
+        Есть ли в тексте длинный запрещённый паттерн (поиск подстрокой, без границ слов).
+
+        Используется как дополнительный фильтр для внешнего контента (Wikipedia и т.п.).
+        """
+        if not text:
+            return False
+        return _TAG_CRITICAL in self._matcher.matched_tags(text)
 
     def sanitize_ai_response(self, response: str) -> str:
         """Очистка ответа AI от небезопасного контента.
@@ -414,12 +423,15 @@ class ContentModerationService(IModerationService):
         с образовательным контекстом (биология: 'кровь', история: 'война',
         русский: 'члены предложения', труд: 'нож' и т.д.).
         """
-        is_safe, reason = self.is_safe_content(response)
+        if not response or not response.strip():
+            return response
+        # Один проход: и запрещённые слова, и учебные контексты
+        tags = self._matcher.matched_tags(response.strip())
+        is_safe, reason = self._verdict(tags)
         if not is_safe:
             # Образовательный контекст: если AI ответ содержит учебные слова,
             # значит он отвечал на школьный вопрос — пропускаем
-            normalized = response.strip().lower()
-            has_educational_context = any(ctx in normalized for ctx in self.EDUCATIONAL_CONTEXTS)
+            has_educational_context = _TAG_EDUCATIONAL in tags
             if has_educational_context and reason != "ненормативная лексика":
                 logger.debug(
                     "✅ AI ответ содержит запрещённое слово, но в образовательном контексте — пропускаем"
@@ -494,3 +506,40 @@ class ContentModerationService(IModerationService):
     async def get_moderation_stats(self) -> dict[str, Any]:
         """Возвращает статистику модерации"""
         return await self.advanced_moderation.get_moderation_stats()
+
+
+# Общий экземпляр на процесс: паттерны компилируются один раз и пересобираются
+# только при изменении настроек модерации.
+_moderation_service: ContentModerationService | None = None
+_moderation_settings_key: tuple[str, int] | None = None
+_moderation_lock = threading.Lock()
+
+
+def _moderation_settings_fingerprint() -> tuple[str, int]:
+    """Настройки, от которых зависят скомпилированные паттерны."""
+    return (settings.forbidden_topics, settings.content_filter_level)
+
+
+def get_moderation_service() -> ContentModerationService:
+    """
+    Получить общий экземпляр ContentModerationService (singleton).
+
+    Экземпляр не изменяется после создания; при смене forbidden_topics или
+    content_filter_level в настройках создаётся новый.
+
+    Returns:
+        ContentModerationService: Экземпляр сервиса
+    """
+    global _moderation_service, _moderation_settings_key
+
+    fingerprint = _moderation_settings_fingerprint()
+    service = _moderation_service
+    if service is not None and _moderation_settings_key == fingerprint:
+        return service
+
+    with _moderation_lock:
+        if _moderation_service is None or _moderation_settings_key != fingerprint:
+            _moderation_service = ContentModerationService()
+            _moderation_settings_key = fingerprint
+            logger.info("🛡️ Модерация: паттерны скомпилированы")
+        return _moderation_service
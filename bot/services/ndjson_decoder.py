@@ -0,0 +1,89 @@
+"""
+Инкрементальный декодер NDJSON/SSE-потока на уровне байтов.
+
+Сетевые чанки дописываются в bytearray; строки ищутся курсором
+(``bytearray.find(b"\\n", pos)``) без копирования остатка буфера на каждую
+строку, а обработанный префикс удаляется один раз за чанк.
+
+Строка режется по байту ``\\n`` и только потом декодируется из UTF-8:
+в UTF-8 байт 0x0A никогда не встречается внутри многобайтового символа,
+поэтому кириллица, разрезанная границей сетевого чанка, не теряется
+(в отличие от ``chunk.decode(errors="ignore")`` на каждом чанке).
+
+Поддерживаются строки вида ``{...}`` и ``data: {...}`` (SSE), ``\\r\\n``
+и пустые строки; не-JSON строки пропускаются.
+"""
+
+import json
+from collections.abc import Iterator
+from typing import Any
+
+from loguru import logger
+
+_SSE_DATA_PREFIX = b"data:"
+_DEFAULT_MAX_LINE_BYTES = 4 * 1024 * 1024
+
+
+class NDJSONStreamDecoder:
+    """Потоковый декодер: bytes-чанки -> строки -> JSON-объекты."""
+
+    def __init__(self, max_line_bytes: int = _DEFAULT_MAX_LINE_BYTES):
+        self.max_line_bytes = max_line_bytes
+        self._buffer = bytearray()
+
+    def iter_lines(self, data: bytes) -> Iterator[str]:
+        """Добавить чанк и вернуть все завершённые непустые строки."""
+        buffer = self._buffer
+        buffer += data
+        pos = 0
+        try:
+            while True:
+                end = buffer.find(b"\n", pos)
+                if end < 0:
+                    break
+                line = self._decode_line(buffer, pos, end)
+                pos = end + 1
+                if line:
+                    yield line
+        finally:
+            # Один сдвиг на чанк: в буфере остаётся только незавершённая строка
+            if pos:
+                del buffer[:pos]
+
+        if len(buffer) > self.max_line_bytes:
+            logger.warning(f"⚠️ NDJSON: строка длиннее {self.max_line_bytes} байт отброшена")
+            buffer.clear()
+
+    def feed(self, data: bytes) -> Iterator[Any]:
+        """Добавить чанк и вернуть распарсенные JSON-события завершённых строк."""
+        for line in self.iter_lines(data):
+            event = self._parse(line)
+            if event is not None:
+                yield event
+
+    def close(self) -> Iterator[Any]:
+        """Разобрать последнюю строку без завершающего \\n (конец потока)."""
+        if not self._buffer:
+            return
+        line = self._decode_line(self._buffer, 0, len(self._buffer))
+        self._buffer.clear()
+        if line:
+            event = self._parse(line)
+            if event is not None:
+                yield event
+
+    @staticmethod
+    def _decode_line(buffer: bytearray, start: int, end: int) -> str:
+        with memoryview(buffer)[start:end] as view:
+            raw = bytes(view)
+        if raw.startswith(_SSE_DATA_PREFIX):
+            raw = raw[len(_SSE_DATA_PREFIX) :]
+        return raw.strip().decode("utf-8", errors="replace")
+
+    @staticmethod
+    def _parse(line: str) -> Any:
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            logger.debug(f"⚠️ Пропущен не-JSON chunk: {line[:100]}")
+            return None
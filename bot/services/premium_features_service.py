@@ -3,16 +3,37 @@
 
 Обеспечивает проверку premium статуса и применение ограничений
 для бесплатных пользователей согласно обещаниям на frontend.
+
+AsyncPremiumFeaturesService — асинхронная обёртка для aiohttp-обработчиков (AsyncSession).
 """
 
+import random
 from datetime import UTC
 
 from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from bot.config import settings
 from bot.services.subscription_service import SubscriptionService
 
+# Каноническое сообщение о лимите (сохраняется в историю чата)
+LIMIT_REACHED_MESSAGE_TEXT = (
+    "🐼 Привет! Ты использовал все 30 бесплатных вопросов.\n\n"
+    "💎 С Premium мы сможем общаться и играть каждый день — без ограничений по вопросам и играм!\n\n"
+    "✨ Узнай больше: /premium"
+)
+
+# Дружелюбные проактивные уведомления от панды: с Premium — общаться и играть каждый день
+LIMIT_REACHED_NOTIFICATIONS = (
+    "🐼 Привет! Ты использовал все 30 бесплатных вопросов.\n\n"
+    "💎 С Premium мы сможем общаться и играть каждый день — без ограничений!\n\n"
+    "✨ Узнай больше: /premium",
+    "🐼 Эй! Бесплатные вопросы закончились.\n\n"
+    "💎 С Premium мы сможем общаться и играть каждый день — столько, сколько захочешь!\n\n"
+    "🚀 Посмотри: /premium",
+)
+
 
 class PremiumFeaturesService:
     """
@@ -173,18 +194,8 @@ class PremiumFeaturesService:
             today_counter = self.db.execute(stmt).scalar_one_or_none()
             today_requests = today_counter.request_count if today_counter else 0
 
-            daily_limit = self.MONTH_PLAN_AI_REQUESTS_PER_DAY
-            if today_requests >= daily_limit:
-                return (
-                    False,
-                    f"🐼 Ой! Ты уже использовал все {daily_limit} запросов сегодня!\n\n"
-                    f"💎 Оформи Premium, чтобы получить больше запросов!\n\n"
-                    f"✨ С Premium ты сможешь:\n"
-                    f"• До 500 вопросов в день\n"
-                    f"• Помощь по всем предметам\n"
-                    f"• Игры без ограничений\n\n"
-                    f"Нажми /premium чтобы узнать больше! 🚀",
-                )
+            if today_requests >= self.MONTH_PLAN_AI_REQUESTS_PER_DAY:
+                return False, self.get_limit_exceeded_reason(plan)
         else:
             # Бесплатные пользователи - 30 запросов за последние 30 дней
             from datetime import datetime, timedelta
@@ -205,22 +216,71 @@ class PremiumFeaturesService:
 
             total_requests = self.db.execute(stmt).scalar() or 0
 
-            monthly_limit = self.FREE_AI_REQUESTS_PER_MONTH
-            if total_requests >= monthly_limit:
-                return (
-                    False,
-                    f"🐼 Ой! Ты уже использовал все {monthly_limit} бесплатных вопросов в этом месяце!\n\n"
-                    f"💎 Узнай больше о Premium и получи дополнительные возможности!\n\n"
-                    f"✨ С Premium ты сможешь:\n"
-                    f"• Задавать до {self.MONTH_PLAN_AI_REQUESTS_PER_DAY} вопросов в день (месячная подписка)\n"
-                    f"• Или без ограничений (Premium)\n"
-                    f"• Получать помощь по всем предметам\n"
-                    f"• Играть в игры без ограничений\n\n"
-                    f"Нажми /premium чтобы узнать больше! 🚀",
-                )
+            if total_requests >= self.FREE_AI_REQUESTS_PER_MONTH:
+                return False, self.get_limit_exceeded_reason(plan)
 
         return True, None
 
+    def get_request_limit(
+        self, telegram_id: int, username: str | None = None
+    ) -> tuple[str | None, int | None, int]:
+        """
+        Лимит AI запросов пользователя (те же правила, что в can_make_ai_request).
+
+        Используется RequestQuotaService: тариф определяется один раз и кэшируется,
+        а счётчики ведутся атомарно вне БД.
+
+        Args:
+            telegram_id: Telegram ID пользователя
+            username: Username пользователя (опционально, для проверки админа)
+
+        Returns:
+            tuple[Optional[str], Optional[int], int]: (план, лимит или None для админов,
+            окно в днях: 1 для Premium, 30 для бесплатных)
+        """
+        if self.is_admin(telegram_id, username):
+            return None, None, 1
+
+        plan = self.get_premium_plan(telegram_id)
+        if plan == "month":
+            return plan, self.MONTH_PLAN_AI_REQUESTS_PER_DAY, 1
+        return None, self.FREE_AI_REQUESTS_PER_MONTH, 30
+
+    @classmethod
+    def get_limit_exceeded_reason(cls, plan: str | None) -> str:
+        """
+        Текст отказа при исчерпанном лимите.
+
+        Args:
+            plan: Тип активной Premium подписки ('month') или None для бесплатных
+
+        Returns:
+            str: Сообщение для пользователя
+        """
+        if plan == "month":
+            daily_limit = cls.MONTH_PLAN_AI_REQUESTS_PER_DAY
+            return (
+                f"🐼 Ой! Ты уже использовал все {daily_limit} запросов сегодня!\n\n"
+                f"💎 Оформи Premium, чтобы получить больше запросов!\n\n"
+                f"✨ С Premium ты сможешь:\n"
+                f"• До 500 вопросов в день\n"
+                f"• Помощь по всем предметам\n"
+                f"• Игры без ограничений\n\n"
+                f"Нажми /premium чтобы узнать больше! 🚀"
+            )
+
+        monthly_limit = cls.FREE_AI_REQUESTS_PER_MONTH
+        return (
+            f"🐼 Ой! Ты уже использовал все {monthly_limit} бесплатных вопросов в этом месяце!\n\n"
+            f"💎 Узнай больше о Premium и получи дополнительные возможности!\n\n"
+            f"✨ С Premium ты сможешь:\n"
+            f"• Задавать до {cls.MONTH_PLAN_AI_REQUESTS_PER_DAY} вопросов в день (месячная подписка)\n"
+            f"• Или без ограничений (Premium)\n"
+            f"• Получать помощь по всем предметам\n"
+            f"• Играть в игры без ограничений\n\n"
+            f"Нажми /premium чтобы узнать больше! 🚀"
+        )
+
     def increment_request_count(self, telegram_id: int) -> tuple[bool, int]:
         """
         Увеличить счетчик запросов пользователя за сегодня.
@@ -272,6 +332,11 @@ class PremiumFeaturesService:
 
         self.db.flush()
 
+        # Счётчики RequestQuotaService должны видеть запросы, учтённые напрямую в БД
+        from bot.services.request_quota import get_request_quota
+
+        get_request_quota().record_external(telegram_id)
+
         # Проверяем, достигнут ли месячный лимит для бесплатных пользователей
         plan = self.get_premium_plan(telegram_id)
         if not plan and not self.is_admin(telegram_id):
@@ -294,11 +359,7 @@ class PremiumFeaturesService:
         Returns:
             str: Одно из сообщений о лимите (каноническое для истории).
         """
-        return (
-            "🐼 Привет! Ты использовал все 30 бесплатных вопросов.\n\n"
-            "💎 С Premium мы сможем общаться и играть каждый день — без ограничений по вопросам и играм!\n\n"
-            "✨ Узнай больше: /premium"
-        )
+        return LIMIT_REACHED_MESSAGE_TEXT
 
     async def send_limit_reached_notification(self, telegram_id: int, bot) -> None:
         """
@@ -314,19 +375,7 @@ class PremiumFeaturesService:
         if not user:
             return
 
-        # Дружелюбное сообщение от панды: с Premium — общаться и играть каждый день
-        messages = [
-            "🐼 Привет! Ты использовал все 30 бесплатных вопросов.\n\n"
-            "💎 С Premium мы сможем общаться и играть каждый день — без ограничений!\n\n"
-            "✨ Узнай больше: /premium",
-            "🐼 Эй! Бесплатные вопросы закончились.\n\n"
-            "💎 С Premium мы сможем общаться и играть каждый день — столько, сколько захочешь!\n\n"
-            "🚀 Посмотри: /premium",
-        ]
-
-        import random
-
-        message = random.choice(messages)
+        message = random.choice(LIMIT_REACHED_NOTIFICATIONS)
 
         try:
             await bot.send_message(chat_id=telegram_id, text=message, parse_mode="HTML")
@@ -455,3 +504,97 @@ class PremiumFeaturesService:
             "bonus_lessons": is_premium,
             "vip_status": is_premium,
         }
+
+
+class AsyncPremiumFeaturesService:
+    """
+    Асинхронная обёртка над PremiumFeaturesService для AsyncSession.
+
+    Правила лимитов остаются в PremiumFeaturesService; запросы выполняются
+    через AsyncSession.run_sync, поэтому event loop не блокируется.
+    """
+
+    FREE_AI_REQUESTS_PER_MONTH = PremiumFeaturesService.FREE_AI_REQUESTS_PER_MONTH
+    MONTH_PLAN_AI_REQUESTS_PER_DAY = PremiumFeaturesService.MONTH_PLAN_AI_REQUESTS_PER_DAY
+
+    def __init__(self, db: AsyncSession):
+        """
+        Инициализация сервиса.
+
+        Args:
+            db: Асинхронная сессия SQLAlchemy
+        """
+        self.db = db
+
+    async def _run(self, method_name: str, *args, **kwargs):
+        """Выполнить метод PremiumFeaturesService в транзакции текущей AsyncSession."""
+        return await self.db.run_sync(
+            lambda session: getattr(PremiumFeaturesService(session), method_name)(*args, **kwargs)
+        )
+
+    async def is_premium_active(self, telegram_id: int) -> bool:
+        """Проверка активной Premium подписки."""
+        return await self._run("is_premium_active", telegram_id)
+
+    async def get_premium_plan(self, telegram_id: int) -> str | None:
+        """Тип активной Premium подписки ('month') или None."""
+        return await self._run("get_premium_plan", telegram_id)
+
+    async def can_make_ai_request(
+        self, telegram_id: int, username: str | None = None
+    ) -> tuple[bool, str | None]:
+        """Проверка возможности сделать AI запрос (см. PremiumFeaturesService)."""
+        return await self._run("can_make_ai_request", telegram_id, username=username)
+
+    async def increment_request_count(self, telegram_id: int) -> tuple[bool, int]:
+        """Увеличить счетчик запросов за сегодня (см. PremiumFeaturesService)."""
+        return await self._run("increment_request_count", telegram_id)
+
+    async def get_request_limit(
+        self, telegram_id: int, username: str | None = None
+    ) -> tuple[str | None, int | None, int]:
+        """(план, лимит, окно в днях) для RequestQuotaService (см. PremiumFeaturesService)."""
+        return await self._run("get_request_limit", telegram_id, username=username)
+
+    def get_limit_exceeded_reason(self, plan: str | None) -> str:
+        """Текст отказа при исчерпанном лимите (см. PremiumFeaturesService)."""
+        return PremiumFeaturesService.get_limit_exceeded_reason(plan)
+
+    def get_limit_reached_message_text(self) -> str:
+        """Текст сообщения от панды при достижении лимита (для истории чата)."""
+        return LIMIT_REACHED_MESSAGE_TEXT
+
+    async def send_limit_reached_notification_async(self, telegram_id: int) -> None:
+        """
+        Асинхронная отправка проактивного уведомления (для фоновых задач).
+
+        Открывает собственную сессию: задача создаётся через create_task
+        и может выполняться после закрытия сессии запроса.
+
+        Args:
+            telegram_id: Telegram ID пользователя
+        """
+        try:
+            from aiogram import Bot
+
+            from bot.database import get_async_db
+            from bot.services.user_service import AsyncUserService
+
+            async with get_async_db() as db:
+                if not await AsyncUserService(db).is_registered(telegram_id):
+                    return
+
+            bot = Bot(token=settings.telegram_bot_token)
+            try:
+                await bot.send_message(
+                    chat_id=telegram_id,
+                    text=random.choice(LIMIT_REACHED_NOTIFICATIONS),
+                    parse_mode="HTML",
+                )
+                logger.info(
+                    f"✅ Проактивное уведомление о лимите отправлено пользователю {telegram_id}"
+                )
+            finally:
+                await bot.session.close()
+        except Exception as e:
+            logger.error(f"❌ Ошибка отправки проактивного уведомления (async): {e}")
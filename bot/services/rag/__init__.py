@@ -6,13 +6,15 @@ Enhanced RAG (Retrieval-Augmented Generation) система.
 - reranker: переранжирование результатов
 - query_expander: расширение запросов
 - compressor: сжатие контекста
+- keyword_index: BM25 инвертированный индекс для keyword-поиска
 """
 
 from .compressor import ContextCompressor
+from .keyword_index import KeywordIndex
 from .query_expander import QueryExpander
 from .reranker import ResultReranker
 from .semantic_cache import SemanticCache
-from .vector_search import VectorSearchService
+from .vector_search import BulkIndexStats, VectorSearchService
 
 __all__ = [
     "QueryExpander",
@@ -20,4 +22,6 @@ __all__ = [
     "SemanticCache",
     "ContextCompressor",
     "VectorSearchService",
+    "BulkIndexStats",
+    "KeywordIndex",
 ]
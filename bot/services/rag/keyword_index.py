@@ -0,0 +1,215 @@
+"""Инвертированный индекс BM25 для keyword-поиска по базе знаний.
+
+Строится один раз при обновлении базы знаний; запрос — проход по
+спискам вхождений только терминов запроса (без сканирования документов).
+Токены: нижний регистр, ё→е, облегчённый стемминг русских окончаний.
+"""
+
+import heapq
+import math
+import re
+from collections import Counter
+from collections.abc import Iterable
+
+from bot.services.web_scraper import EducationalContent
+
+_TOKEN_RE = re.compile(r"[a-zа-яё0-9]+")
+
+# Окончания по убыванию длины: отрезается самое длинное подходящее
+_RU_ENDINGS = (
+    "ется",
+    "ются",
+    "ение",
+    "ения",
+    "ений",
+    "ость",
+    "ости",
+    "ями",
+    "ами",
+    "ого",
+    "его",
+    "ому",
+    "ему",
+    "ыми",
+    "ими",
+    "ать",
+    "ять",
+    "ить",
+    "еть",
+    "ой",
+    "ей",
+    "ий",
+    "ый",
+    "ая",
+    "яя",
+    "ое",
+    "ее",
+    "ые",
+    "ие",
+    "ом",
+    "ем",
+    "ам",
+    "ям",
+    "ах",
+    "ях",
+    "ую",
+    "юю",
+    "ов",
+    "ев",
+    "ью",
+    "а",
+    "я",
+    "о",
+    "е",
+    "ы",
+    "и",
+    "у",
+    "ю",
+    "ь",
+    "й",
+)
+_MIN_STEM_LEN = 3
+
+_STOPWORDS = frozenset(
+    {
+        "и",
+        "в",
+        "во",
+        "на",
+        "с",
+        "со",
+        "по",
+        "к",
+        "ко",
+        "о",
+        "об",
+        "от",
+        "до",
+        "за",
+        "из",
+        "у",
+        "не",
+        "ни",
+        "а",
+        "но",
+        "что",
+        "как",
+        "это",
+        "то",
+        "ли",
+        "же",
+        "бы",
+        "для",
+        "при",
+        "про",
+        "такое",
+        "такой",
+        "какой",
+        "какая",
+        "какие",
+        "где",
+        "когда",
+        "почему",
+        "зачем",
+        "мне",
+        "меня",
+        "я",
+        "ты",
+        "он",
+        "она",
+        "они",
+        "мы",
+        "вы",
+        "помоги",
+        "объясни",
+        "расскажи",
+        "the",
+        "a",
+        "an",
+        "of",
+        "to",
+        "is",
+        "and",
+    }
+)
+
+
+def _stem(token: str) -> str:
+    """Облегчённый стемминг: отрезать окончание, если остаётся >= 3 символов."""
+    for ending in _RU_ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= _MIN_STEM_LEN:
+            return token[: -len(ending)]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    """Токены для индекса и запроса (нижний регистр, ё→е, стемминг, без стоп-слов)."""
+    tokens = _TOKEN_RE.findall(text.lower().replace("ё", "е"))
+    return [_stem(token) for token in tokens if token not in _STOPWORDS]
+
+
+class KeywordIndex:
+    """
+    BM25 по заголовку и тексту материалов.
+
+    Заголовок учитывается с весом title_boost (повтор токенов заголовка).
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, title_boost: int = 2):
+        self.k1 = k1
+        self.b = b
+        self.title_boost = title_boost
+        self._docs: list[EducationalContent] = []
+        self._doc_len: list[int] = []
+        self._avg_len = 0.0
+        self._postings: dict[str, list[tuple[int, int]]] = {}
+        self._idf: dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def build(self, materials: Iterable[EducationalContent]) -> None:
+        """Построить индекс заново по списку материалов."""
+        docs: list[EducationalContent] = []
+        doc_len: list[int] = []
+        postings: dict[str, list[tuple[int, int]]] = {}
+
+        for doc_id, material in enumerate(materials):
+            tokens = tokenize(material.title) * self.title_boost + tokenize(material.content)
+            docs.append(material)
+            doc_len.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        n_docs = len(docs)
+        self._docs = docs
+        self._doc_len = doc_len
+        self._avg_len = (sum(doc_len) / n_docs) if n_docs else 0.0
+        self._postings = postings
+        self._idf = {
+            term: math.log(1 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in postings.items()
+        }
+
+    def search_scored(self, query: str, limit: int = 5) -> list[tuple[EducationalContent, float]]:
+        """Топ-limit материалов с BM25-score по убыванию."""
+        if not self._docs or limit <= 0:
+            return []
+
+        scores: dict[int, float] = {}
+        k1, b, avg_len = self.k1, self.b, self._avg_len or 1.0
+        for term in set(tokenize(query)):
+            plist = self._postings.get(term)
+            if not plist:
+                continue
+            idf = self._idf[term]
+            for doc_id, tf in plist:
+                norm = k1 * (1 - b + b * self._doc_len[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(self._docs[doc_id], score) for doc_id, score in top]
+
+    def search(self, query: str, limit: int = 5) -> list[EducationalContent]:
+        """Топ-limit материалов по BM25 (готово для ResultReranker.rerank)."""
+        return [material for material, _score in self.search_scored(query, limit)]
@@ -1,17 +1,27 @@
 """Semantic cache для RAG системы.
 
-Векторный поиск через pgvector + Yandex Embeddings API.
+Два уровня:
+1. In-process: float32-матрица последних N эмбеддингов запросов, поиск ближайшего
+   соседа скалярным произведением нормированных векторов (LRU + TTL).
+2. pgvector (embedding_cache): общий для всех воркеров, переживает рестарт.
+
+Очистка устаревших записей в БД — фоновой задачей (run_eviction_loop),
+а не на пути записи.
 При недоступности embeddings — fallback: get возвращает None, set не пишет.
 """
 
+import asyncio
 import json
+import time
 from datetime import UTC, datetime, timedelta
 from typing import Any
 
+import numpy as np
 from loguru import logger
 
 from bot.database import get_db
 from bot.services.embeddings_service import get_embedding_service
+from bot.services.rag.vector_search import apply_ann_search_params
 from bot.services.web_scraper import EducationalContent
 
 
@@ -49,15 +59,106 @@ def _dict_to_content(data: dict[str, Any]) -> EducationalContent:
     )
 
 
+class NearestNeighbourCache:
+    """
+    In-process кэш ближайшего соседа по эмбеддингу запроса.
+
+    Векторы хранятся нормированными в предвыделенной float32-матрице
+    (capacity × dim), поэтому косинусное сходство — один matvec.
+    При переполнении перезаписывается слот, к которому дольше всего
+    не обращались; просроченные по TTL слоты не участвуют в поиске.
+    """
+
+    def __init__(self, capacity: int = 512, ttl_seconds: float = 86400):
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self._matrix: np.ndarray | None = None
+        self._expires_at = np.zeros(capacity, dtype=np.float64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._values: list[list[EducationalContent] | None] = [None] * capacity
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        now = time.monotonic()
+        return sum(
+            1
+            for slot, value in enumerate(self._values)
+            if value is not None and self._expires_at[slot] > now
+        )
+
+    @staticmethod
+    def _normalize(embedding: list[float]) -> np.ndarray | None:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+        return vector / norm
+
+    def get(self, embedding: list[float], threshold: float) -> list[EducationalContent] | None:
+        """Результат ближайшего запроса со сходством >= threshold или None."""
+        if self._matrix is None or self.capacity <= 0:
+            self.misses += 1
+            return None
+        query = self._normalize(embedding)
+        if query is None or query.shape[0] != self._matrix.shape[1]:
+            self.misses += 1
+            return None
+
+        now = time.monotonic()
+        sims = self._matrix @ query
+        sims[self._expires_at <= now] = -np.inf
+        slot = int(np.argmax(sims))
+        if sims[slot] < threshold:
+            self.misses += 1
+            return None
+
+        self._last_used[slot] = now
+        self.hits += 1
+        return self._values[slot]
+
+    def put(self, embedding: list[float], result: list[EducationalContent]) -> None:
+        """Сохранить результат; при переполнении вытесняется LRU-слот."""
+        if self.capacity <= 0:
+            return
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+        if self._matrix is None or self._matrix.shape[1] != vector.shape[0]:
+            self._matrix = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+            self._expires_at[:] = 0.0
+            self._values = [None] * self.capacity
+
+        now = time.monotonic()
+        # Свободный/просроченный слот имеет expires_at <= now; иначе — самый давний
+        free = np.flatnonzero(self._expires_at <= now)
+        slot = int(free[0]) if free.size else int(np.argmin(self._last_used))
+        self._matrix[slot] = vector
+        self._expires_at[slot] = now + self.ttl_seconds
+        self._last_used[slot] = now
+        self._values[slot] = result
+
+    def clear(self) -> None:
+        self._matrix = None
+        self._expires_at[:] = 0.0
+        self._values = [None] * self.capacity
+
+
 class SemanticCache:
     """
-    Кэш с векторным поиском через pgvector и Yandex Embeddings API.
+    Кэш с векторным поиском: in-process уровень + pgvector и Yandex Embeddings API.
     """
 
-    def __init__(self, ttl_hours: int = 24, threshold: float = 0.85):
+    def __init__(
+        self,
+        ttl_hours: int = 24,
+        threshold: float = 0.85,
+        memory_size: int = 512,
+    ):
         self.ttl_hours = ttl_hours
         self.threshold = threshold
         self._embedding_service = None
+        self._memory = NearestNeighbourCache(capacity=memory_size, ttl_seconds=ttl_hours * 3600)
 
     def _get_embedding_service(self):
         if self._embedding_service is None:
@@ -67,41 +168,84 @@ class SemanticCache:
                 logger.debug(f"EmbeddingService недоступен: {e}")
         return self._embedding_service
 
-    def _evict_expired(self, db) -> None:
-        """Удалить устаревшие записи (created_at старше ttl_hours)."""
+    async def _query_embedding(
+        self, query: str, embedding: list[float] | None
+    ) -> list[float] | None:
+        """Готовый вектор запроса или эмбеддинг через EmbeddingService."""
+        if embedding:
+            return embedding
+        svc = self._get_embedding_service()
+        if not svc:
+            return None
         try:
-            from sqlalchemy import text
+            return await svc.embed_query(query)
+        except Exception as e:
+            logger.debug(f"Embedding запроса недоступен: {e}")
+            return None
 
-            cutoff = datetime.now(UTC) - timedelta(hours=self.ttl_hours)
-            db.execute(
-                text("DELETE FROM embedding_cache WHERE created_at < :cutoff"),
-                {"cutoff": cutoff},
-            )
+    def evict_expired(self) -> int:
+        """Удалить из БД устаревшие записи (created_at старше ttl_hours)."""
+        try:
+            with get_db() as db:
+                from sqlalchemy import text
+
+                cutoff = datetime.now(UTC) - timedelta(hours=self.ttl_hours)
+                result = db.execute(
+                    text("DELETE FROM embedding_cache WHERE created_at < :cutoff"),
+                    {"cutoff": cutoff},
+                )
+                return result.rowcount or 0
         except Exception as e:
             logger.debug(f"Semantic cache evict_expired: {e}")
+            return 0
+
+    async def run_eviction_loop(self, interval_seconds: float = 3600) -> None:
+        """Фоновая очистка embedding_cache раз в interval_seconds (до отмены задачи)."""
+        while True:
+            try:
+                await asyncio.sleep(interval_seconds)
+                removed = await asyncio.to_thread(self.evict_expired)
+                if removed:
+                    logger.debug(f"Semantic cache: удалено устаревших записей: {removed}")
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.warning(f"⚠️ Semantic cache eviction error: {e}")
 
     async def get(
-        self, query: str, threshold: float | None = None
+        self,
+        query: str,
+        threshold: float | None = None,
+        embedding: list[float] | None = None,
     ) -> list[EducationalContent] | None:
         """
         Получить результат из кэша для семантически похожего запроса.
 
+        Args:
+            query: Текст запроса.
+            threshold: Порог косинусного сходства (по умолчанию self.threshold).
+            embedding: Уже посчитанный вектор запроса (без повторного вызова API).
+
         Returns:
             list[EducationalContent] или None
         """
-        svc = self._get_embedding_service()
-        if not svc:
-            return None
-        try:
-            embedding = await svc.embed_query(query)
-        except Exception as e:
-            logger.debug(f"Embedding запроса недоступен: {e}")
-            return None
-
+        embedding = await self._query_embedding(query, embedding)
         if not embedding or len(embedding) == 0:
             return None
 
         th = threshold if threshold is not None else self.threshold
+        cached = self._memory.get(embedding, th)
+        if cached is not None:
+            return cached
+
+        # Синхронный запрос к БД — в поток, чтобы не блокировать event loop
+        result = await asyncio.to_thread(self._db_lookup, embedding, th)
+        if result is not None:
+            self._memory.put(embedding, result)
+        return result
+
+    def _db_lookup(self, embedding: list[float], th: float) -> list[EducationalContent] | None:
+        """Ближайший запрос из embedding_cache со сходством >= th (синхронно)."""
         vec_str = "[" + ",".join(str(x) for x in embedding) + "]"
         cutoff = datetime.now(UTC) - timedelta(hours=self.ttl_hours)
 
@@ -109,17 +253,24 @@ class SemanticCache:
             with get_db() as db:
                 from sqlalchemy import text
 
+                apply_ann_search_params(db)
+                # Ближайший сосед по ANN-индексу, порог — во внешнем запросе
                 row = db.execute(
                     text(
                         """
-                        SELECT query_text, result_json, 1 - (embedding <=> CAST(:vec AS vector)) as sim
-                        FROM embedding_cache
-                        WHERE embedding IS NOT NULL AND created_at > :cutoff
-                        ORDER BY embedding <=> CAST(:vec AS vector)
-                        LIMIT 1
+                        SELECT query_text, result_json, 1 - dist AS sim
+                        FROM (
+                            SELECT query_text, result_json,
+                                   embedding <=> CAST(:vec AS vector) AS dist
+                            FROM embedding_cache
+                            WHERE embedding IS NOT NULL AND created_at > :cutoff
+                            ORDER BY embedding <=> CAST(:vec AS vector)
+                            LIMIT 1
+                        ) nearest
+                        WHERE 1 - dist >= :th
                         """
                     ),
-                    {"vec": vec_str, "cutoff": cutoff},
+                    {"vec": vec_str, "cutoff": cutoff, "th": th},
                 ).fetchone()
 
                 if not row:
@@ -144,30 +295,33 @@ class SemanticCache:
             logger.debug(f"Semantic cache get error: {e}")
             return None
 
-    async def set(self, query: str, result: list[EducationalContent]) -> None:
-        """Сохранить результат в кэш."""
-        svc = self._get_embedding_service()
-        if not svc:
-            return
-        try:
-            embedding = await svc.embed_query(query)
-        except Exception as e:
-            logger.debug(f"Embedding для set недоступен: {e}")
-            return
-
+    async def set(
+        self,
+        query: str,
+        result: list[EducationalContent],
+        embedding: list[float] | None = None,
+    ) -> None:
+        """Сохранить результат в кэш (embedding — уже посчитанный вектор запроса)."""
+        embedding = await self._query_embedding(query, embedding)
         if not embedding or len(embedding) == 0:
             return
 
-        vec_str = "[" + ",".join(str(x) for x in embedding) + "]"
-        result_json = json.dumps([_content_to_dict(item) for item in result])
+        self._memory.put(embedding, result)
+
+        # Синхронная запись в БД — в поток, чтобы не блокировать event loop
+        await asyncio.to_thread(self._db_insert, query, embedding, result)
 
+    def _db_insert(
+        self, query: str, embedding: list[float], result: list[EducationalContent]
+    ) -> None:
+        """Записать результат в embedding_cache (синхронно, ошибки не пробрасываются)."""
         try:
+            vec_str = "[" + ",".join(str(x) for x in embedding) + "]"
+            result_json = json.dumps([_content_to_dict(item) for item in result])
+
             with get_db() as db:
                 from sqlalchemy import text
 
-                self._evict_expired(db)
-                db.commit()
-
                 db.execute(
                     text(
                         """
@@ -187,6 +341,7 @@ class SemanticCache:
 
     def clear(self) -> None:
         """Очистить кэш (удалить все записи)."""
+        self._memory.clear()
         try:
             with get_db() as db:
                 from sqlalchemy import text
@@ -205,8 +360,18 @@ class SemanticCache:
                 count = db.execute(text("SELECT COUNT(*) FROM embedding_cache")).scalar()
                 return {
                     "size": count or 0,
+                    "memory_size": len(self._memory),
+                    "memory_hits": self._memory.hits,
+                    "memory_misses": self._memory.misses,
                     "ttl_hours": self.ttl_hours,
                     "threshold": self.threshold,
                 }
         except Exception:
-            return {"size": 0, "ttl_hours": self.ttl_hours, "threshold": self.threshold}
+            return {
+                "size": 0,
+                "memory_size": len(self._memory),
+                "memory_hits": self._memory.hits,
+                "memory_misses": self._memory.misses,
+                "ttl_hours": self.ttl_hours,
+                "threshold": self.threshold,
+            }
@@ -4,16 +4,48 @@
 по вопросу пользователя.
 """
 
+import asyncio
 import hashlib
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
 from datetime import UTC, datetime
 from typing import Any
 
 from loguru import logger
 
+from bot.config import settings
 from bot.database import get_db
 from bot.services.embeddings_service import get_embedding_service
 from bot.services.web_scraper import EducationalContent
 
+# Вставка с обновлением по source_hash (частичный уникальный индекс из миграции)
+_UPSERT_SQL = """
+    INSERT INTO knowledge_embeddings (title, content, subject, source_url, embedding, source_hash)
+    VALUES (:title, :content, :subject, :source_url, CAST(:vec AS vector), :source_hash)
+    ON CONFLICT (source_hash) WHERE source_hash IS NOT NULL DO UPDATE SET
+        content = EXCLUDED.content,
+        embedding = EXCLUDED.embedding,
+        created_at = now()
+"""
+
+# Fallback без ON CONFLICT (если уникальный индекс по source_hash не создан)
+_INSERT_SQL = """
+    INSERT INTO knowledge_embeddings (title, content, subject, source_url, embedding, source_hash)
+    VALUES (:title, :content, :subject, :source_url, CAST(:vec AS vector), :source_hash)
+"""
+
+
+@dataclass
+class BulkIndexStats:
+    """Итог пакетной индексации."""
+
+    total: int = 0
+    duplicates: int = 0  # повтор source_hash внутри пакета
+    unchanged: int = 0  # уже в индексе с тем же содержимым — эмбеддинг не запрашивался
+    embedded: int = 0
+    failed: int = 0  # эмбеддинг не получен после всех попыток
+    written: int = 0
+
 
 def _row_to_content(row: tuple) -> EducationalContent:
     """Преобразовать строку БД в EducationalContent."""
@@ -42,6 +74,53 @@ def _content_source_hash(title: str, source_url: str) -> str:
     return hashlib.sha256(raw.encode()).hexdigest()
 
 
+def _text_to_embed(content: EducationalContent) -> str:
+    """Текст документа для эмбеддинга (лимит API)."""
+    return f"{content.title}\n\n{content.content}"[:8000]
+
+
+def _vector_literal(embedding: list[float]) -> str:
+    """Вектор в текстовом формате pgvector."""
+    return "[" + ",".join(str(x) for x in embedding) + "]"
+
+
+def _row_params(content: EducationalContent, embedding: list[float], source_hash: str) -> dict:
+    """Параметры одной строки knowledge_embeddings."""
+    return {
+        "title": content.title,
+        "content": content.content,
+        "subject": content.subject,
+        "source_url": content.source_url,
+        "vec": _vector_literal(embedding),
+        "source_hash": source_hash,
+    }
+
+
+def apply_ann_search_params(db, ef_search: int | None = None, probes: int | None = None) -> None:
+    """
+    Выставить параметры ANN-поиска на текущую транзакцию (SET LOCAL).
+
+    hnsw.ef_search — ширина кандидатов HNSW (recall/задержка),
+    ivfflat.probes — число просматриваемых списков IVFFlat.
+    Значения не из settings передаются для отдельных запросов.
+
+    SET выполняются в SAVEPOINT: если параметр не поддерживается (нет
+    расширения, не PostgreSQL), откатывается только savepoint, а не вся
+    транзакция с последующим поисковым запросом.
+    """
+    from sqlalchemy import text
+
+    ef = int(ef_search if ef_search is not None else settings.vector_hnsw_ef_search)
+    pr = int(probes if probes is not None else settings.vector_ivfflat_probes)
+    try:
+        with db.begin_nested():
+            # SET не принимает bind-параметры; значения приведены к int выше
+            db.execute(text(f"SET LOCAL hnsw.ef_search = {ef}"))
+            db.execute(text(f"SET LOCAL ivfflat.probes = {pr}"))
+    except Exception as e:
+        logger.debug(f"ANN search params not applied: {e}")
+
+
 class VectorSearchService:
     """
     Семантический поиск по knowledge_embeddings.
@@ -73,6 +152,8 @@ class VectorSearchService:
         top_k: int | None = None,
         min_similarity: float | None = None,
         subject_filter: str | None = None,
+        embedding: list[float] | None = None,
+        ef_search: int | None = None,
     ) -> list[EducationalContent]:
         """
         Семантический поиск по вопросу.
@@ -82,39 +163,64 @@ class VectorSearchService:
             top_k: Максимум результатов.
             min_similarity: Минимальный порог косинусного сходства (0–1).
             subject_filter: Опциональный фильтр по предмету.
+            embedding: Уже посчитанный вектор запроса (без повторного вызова API).
+            ef_search: hnsw.ef_search для этого запроса (по умолчанию из settings).
 
         Returns:
             Список EducationalContent, отсортированных по релевантности.
         """
-        svc = self._get_embedding_service()
-        if not svc:
-            return []
+        if not embedding:
+            svc = self._get_embedding_service()
+            if not svc:
+                return []
 
-        try:
-            embedding = await svc.embed_query(query)
-        except Exception as e:
-            logger.debug(f"Embedding запроса недоступен: {e}")
-            return []
+            try:
+                embedding = await svc.embed_query(query)
+            except Exception as e:
+                logger.debug(f"Embedding запроса недоступен: {e}")
+                return []
 
         if not embedding or len(embedding) == 0:
             return []
 
         k = top_k if top_k is not None else self.default_top_k
         th = min_similarity if min_similarity is not None else self.min_similarity
-        vec_str = "[" + ",".join(str(x) for x in embedding) + "]"
 
+        # Синхронный запрос к БД — в поток, чтобы не блокировать event loop
+        # (enhanced_search выполняет поиск параллельно с другими стадиями RAG)
+        return await asyncio.to_thread(
+            self._search_rows, _vector_literal(embedding), k, th, subject_filter, ef_search
+        )
+
+    def _search_rows(
+        self,
+        vec_str: str,
+        k: int,
+        th: float,
+        subject_filter: str | None,
+        ef_search: int | None,
+    ) -> list[EducationalContent]:
+        """k ближайших материалов со сходством >= th (синхронно)."""
         try:
             with get_db() as db:
                 from sqlalchemy import text
 
+                apply_ann_search_params(db, ef_search=ef_search)
+                # ORDER BY + LIMIT во внутреннем запросе идут по ANN-индексу;
+                # порог сходства — во внешнем, чтобы не мешать index scan
                 sql = """
-                    SELECT id, title, content, subject, source_url, 1 - (embedding <=> CAST(:vec AS vector)) as sim, created_at
-                    FROM knowledge_embeddings
-                    WHERE embedding IS NOT NULL
-                    AND (1 - (embedding <=> CAST(:vec AS vector))) >= :th
-                    {subject_filter}
-                    ORDER BY embedding <=> CAST(:vec AS vector)
-                    LIMIT :limit
+                    SELECT id, title, content, subject, source_url, 1 - dist AS sim, created_at
+                    FROM (
+                        SELECT id, title, content, subject, source_url, created_at,
+                               embedding <=> CAST(:vec AS vector) AS dist
+                        FROM knowledge_embeddings
+                        WHERE embedding IS NOT NULL
+                        {subject_filter}
+                        ORDER BY embedding <=> CAST(:vec AS vector)
+                        LIMIT :limit
+                    ) nearest
+                    WHERE 1 - dist >= :th
+                    ORDER BY dist
                 """.format(subject_filter="AND subject = :subject" if subject_filter else "")
                 params: dict[str, Any] = {"vec": vec_str, "th": th, "limit": k}
                 if subject_filter:
@@ -141,10 +247,8 @@ class VectorSearchService:
         if not svc:
             return False
 
-        text_to_embed = f"{content.title}\n\n{content.content}"[:8000]
-
         try:
-            embedding = await svc.embed_document(text_to_embed)
+            embedding = await svc.embed_document(_text_to_embed(content))
         except Exception as e:
             logger.debug(f"Embedding документа недоступен: {e}")
             return False
@@ -153,32 +257,13 @@ class VectorSearchService:
             return False
 
         source_hash = _content_source_hash(content.title, content.source_url)
-        vec_str = "[" + ",".join(str(x) for x in embedding) + "]"
+        params = _row_params(content, embedding, source_hash)
 
         try:
             with get_db() as db:
                 from sqlalchemy import text
 
-                db.execute(
-                    text(
-                        """
-                        INSERT INTO knowledge_embeddings (title, content, subject, source_url, embedding, source_hash)
-                        VALUES (:title, :content, :subject, :source_url, CAST(:vec AS vector), :source_hash)
-                        ON CONFLICT (source_hash) WHERE source_hash IS NOT NULL DO UPDATE SET
-                            content = EXCLUDED.content,
-                            embedding = EXCLUDED.embedding,
-                            created_at = now()
-                        """
-                    ),
-                    {
-                        "title": content.title,
-                        "content": content.content,
-                        "subject": content.subject,
-                        "source_url": content.source_url,
-                        "vec": vec_str,
-                        "source_hash": source_hash,
-                    },
-                )
+                db.execute(text(_UPSERT_SQL), params)
                 db.commit()
             logger.debug(f"Indexed: {content.title[:50]}")
             return True
@@ -188,28 +273,160 @@ class VectorSearchService:
                 with get_db() as db:
                     from sqlalchemy import text
 
-                    db.execute(
-                        text(
-                            """
-                            INSERT INTO knowledge_embeddings (title, content, subject, source_url, embedding, source_hash)
-                            VALUES (:title, :content, :subject, :source_url, CAST(:vec AS vector), :source_hash)
-                            """
-                        ),
-                        {
-                            "title": content.title,
-                            "content": content.content,
-                            "subject": content.subject,
-                            "source_url": content.source_url,
-                            "vec": vec_str,
-                            "source_hash": source_hash,
-                        },
-                    )
+                    db.execute(text(_INSERT_SQL), params)
                     db.commit()
                 return True
             except Exception as e2:
                 logger.debug(f"Index insert fallback error: {e2}")
                 return False
 
+    async def index_many(
+        self,
+        contents: Sequence[EducationalContent],
+        concurrency: int = 8,
+        batch_size: int = 100,
+        max_retries: int = 3,
+        progress: Callable[[int, int], None] | None = None,
+    ) -> BulkIndexStats:
+        """
+        Пакетная индексация: дедупликация -> параллельные эмбеддинги -> multi-row upsert.
+
+        1. Повторы source_hash в пакете и материалы, уже проиндексированные с тем же
+           содержимым, отбрасываются до запроса эмбеддингов.
+        2. Эмбеддинги запрашиваются параллельно (не больше concurrency одновременно),
+           с повтором и экспоненциальной задержкой.
+        3. Строки пишутся пачками по batch_size: один executemany и одна транзакция
+           на пачку вместо транзакции на материал.
+
+        Args:
+            contents: Материалы для индексации.
+            concurrency: Максимум одновременных запросов к Embeddings API.
+            batch_size: Размер пачки для вставки в БД.
+            max_retries: Попыток получить эмбеддинг для одного материала.
+            progress: Колбэк progress(готово, всего) после каждого эмбеддинга.
+
+        Returns:
+            BulkIndexStats со счётчиками.
+        """
+        stats = BulkIndexStats(total=len(contents))
+        svc = self._get_embedding_service()
+        if not svc or not contents:
+            stats.failed = stats.total if contents else 0
+            return stats
+
+        # 1. Дедупликация по source_hash (внутри пакета и против уже сохранённого);
+        # запросы к БД через синхронную сессию выполняются в потоке
+        unique: dict[str, EducationalContent] = {}
+        for content in contents:
+            source_hash = _content_source_hash(content.title, content.source_url)
+            if source_hash in unique:
+                stats.duplicates += 1
+                continue
+            unique[source_hash] = content
+
+        existing = await asyncio.to_thread(self._existing_content_digests, list(unique))
+        pending = []
+        for source_hash, content in unique.items():
+            digest = hashlib.md5(content.content.encode(), usedforsecurity=False).hexdigest()
+            if existing.get(source_hash) == digest:
+                stats.unchanged += 1
+            else:
+                pending.append((source_hash, content))
+
+        # 2. Эмбеддинги с ограниченным параллелизмом
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+        done = 0
+
+        async def embed(content: EducationalContent) -> list[float] | None:
+            nonlocal done
+            async with semaphore:
+                embedding = await self._embed_with_retry(svc, content, max_retries)
+            done += 1
+            if progress:
+                progress(done, len(pending))
+            return embedding
+
+        embeddings = await asyncio.gather(*(embed(content) for _, content in pending))
+
+        rows = []
+        for (source_hash, content), embedding in zip(pending, embeddings, strict=True):
+            if embedding:
+                rows.append(_row_params(content, embedding, source_hash))
+            else:
+                stats.failed += 1
+        stats.embedded = len(rows)
+
+        # 3. Multi-row upsert пачками (синхронная сессия — в потоке, не на event loop)
+        for start in range(0, len(rows), max(batch_size, 1)):
+            stats.written += await asyncio.to_thread(
+                self._write_rows, rows[start : start + batch_size]
+            )
+
+        logger.info(
+            f"📚 Пакетная индексация: всего {stats.total}, дублей {stats.duplicates}, "
+            f"без изменений {stats.unchanged}, записано {stats.written}, ошибок {stats.failed}"
+        )
+        return stats
+
+    async def _embed_with_retry(
+        self, svc, content: EducationalContent, max_retries: int
+    ) -> list[float] | None:
+        """Эмбеддинг документа с повтором и экспоненциальной задержкой (0.5с, 1с, 2с…)."""
+        for attempt in range(max(max_retries, 1)):
+            try:
+                embedding = await svc.embed_document(_text_to_embed(content))
+                if embedding:
+                    return embedding
+            except Exception as e:
+                logger.debug(f"Embedding документа недоступен (попытка {attempt + 1}): {e}")
+            if attempt + 1 < max_retries:
+                await asyncio.sleep(0.5 * 2**attempt)
+        logger.warning(f"⚠️ Не удалось получить эмбеддинг «{content.title[:50]}»")
+        return None
+
+    def _existing_content_digests(self, source_hashes: list[str]) -> dict[str, str]:
+        """source_hash -> md5(content) уже проиндексированных материалов (один запрос)."""
+        if not source_hashes:
+            return {}
+        try:
+            with get_db() as db:
+                from sqlalchemy import bindparam, text
+
+                rows = db.execute(
+                    text(
+                        """
+                        SELECT source_hash, md5(content)
+                        FROM knowledge_embeddings
+                        WHERE source_hash IN :hashes AND embedding IS NOT NULL
+                        """
+                    ).bindparams(bindparam("hashes", expanding=True)),
+                    {"hashes": source_hashes},
+                ).fetchall()
+                return {row[0]: row[1] for row in rows}
+        except Exception as e:
+            logger.debug(f"Existing source_hash lookup error: {e}")
+            return {}
+
+    def _write_rows(self, rows: list[dict]) -> int:
+        """Записать пачку строк одним executemany (upsert, при ошибке — простой INSERT)."""
+        if not rows:
+            return 0
+        from sqlalchemy import text
+
+        try:
+            with get_db() as db:
+                db.execute(text(_UPSERT_SQL), rows)
+            return len(rows)
+        except Exception as e:
+            logger.debug(f"Bulk upsert error: {e}")
+        try:
+            with get_db() as db:
+                db.execute(text(_INSERT_SQL), rows)
+            return len(rows)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось записать пачку из {len(rows)} материалов: {e}")
+            return 0
+
     def stats(self) -> dict:
         """Статистика векторного хранилища."""
         try:
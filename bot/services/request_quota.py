@@ -0,0 +1,572 @@
+"""
+Квоты AI запросов: проверка лимита и учёт запроса одним атомарным вызовом.
+
+check_and_consume() заменяет пару can_make_ai_request + increment_request_count.
+Счётчики дневные, окно скользящее по дням: для бесплатных — 30 последних дней,
+для Premium — текущий день (UTC), как в PremiumFeaturesService.
+
+Где живут счётчики:
+- Redis (если задан REDIS_URL): проверка и инкремент — один Lua-скрипт,
+  общий для всех инстансов;
+- память процесса (fallback): между проверкой и инкрементом нет await,
+  поэтому конкурентные запросы не проскакивают лимит. Счётчики перечитываются
+  из DailyRequestCount раз в reseed_seconds (по умолчанию — интервал flush),
+  поэтому запросы, учтённые другими инстансами, видны после их сброса в БД.
+  После ошибки Redis счётчики живут в памяти, пока Redis на паузе (RedisTier).
+
+DailyRequestCount остаётся долговременным хранилищем и источником отчётов:
+счётчики пользователя загружаются из БД один раз, приращения копятся в памяти
+и периодически сбрасываются в БД (write-behind, run_flush_loop).
+
+Запрос сначала резервирует квоту, а учитывается при сохранении ответа (settle).
+Зарезервированный, но не учтённый запрос (ошибка AI, ветка без ответа модели)
+возвращается release() — как и раньше, такие запросы лимит не тратят.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import UTC, date, datetime, timedelta
+
+from loguru import logger
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from bot.config import settings
+from bot.services.cache.redis_tier import RedisTier
+
+try:
+    import redis.asyncio as aioredis
+
+    REDIS_AVAILABLE = True
+    # Таймауты и обрывы соединения redis-py оборачивает в RedisError
+    _REDIS_ERRORS: tuple[type[Exception], ...] = (aioredis.RedisError, OSError)
+except ImportError:
+    REDIS_AVAILABLE = False
+    _REDIS_ERRORS = ()
+
+QUOTA_KEY_PREFIX = "quota:v1"
+
+# Сколько дней счётчиков хранится и загружается из БД (окно бесплатного тарифа)
+QUOTA_WINDOW_DAYS = 30
+
+# Ключи одного пользователя в одном hash slot ({telegram_id}) — скрипт работает и в Redis Cluster
+_KEY_TTL_SECONDS = (QUOTA_WINDOW_DAYS + 1) * 86400
+_MEMORY_MAX_USERS = 10000
+
+# KEYS[1] — маркер «счётчики загружены из БД», KEYS[2..] — дневные счётчики от сегодня назад.
+# ARGV: лимит (-1 — без лимита), окно в днях, приращение, TTL, "1" если переданы значения
+# из БД, далее значения из БД для KEYS[2..]. Возвращает {1|0, использовано}; {-1, 0} —
+# счётчиков в Redis нет, нужно повторить вызов со значениями из БД.
+_CONSUME_SCRIPT = """
+local ttl = tonumber(ARGV[4])
+if redis.call("exists", KEYS[1]) == 0 then
+    if ARGV[5] ~= "1" then
+        return {-1, 0}
+    end
+    for i = 2, #KEYS do
+        local seed = tonumber(ARGV[4 + i])
+        if seed > 0 then
+            redis.call("set", KEYS[i], seed, "EX", ttl, "NX")
+        end
+    end
+end
+local used = 0
+for i = 2, tonumber(ARGV[2]) + 1 do
+    used = used + tonumber(redis.call("get", KEYS[i]) or "0")
+end
+local limit = tonumber(ARGV[1])
+local delta = tonumber(ARGV[3])
+if delta > 0 and limit >= 0 and used + delta > limit then
+    return {0, used}
+end
+if delta < 0 and tonumber(redis.call("get", KEYS[2]) or "0") + delta < 0 then
+    delta = 0
+end
+if delta ~= 0 then
+    redis.call("incrby", KEYS[2], delta)
+    redis.call("expire", KEYS[2], ttl)
+    used = used + delta
+end
+redis.call("set", KEYS[1], 1, "EX", ttl)
+return {1, used}
+"""
+
+# Запрос уже записан в БД синхронным кодом: учесть его, только если счётчики загружены
+_RECORD_SCRIPT = """
+if redis.call("exists", KEYS[1]) == 1 then
+    redis.call("incrby", KEYS[2], 1)
+    redis.call("expire", KEYS[2], ARGV[1])
+end
+return 0
+"""
+
+
+@dataclass(frozen=True)
+class QuotaPlan:
+    """Лимит пользователя: limit=None — без ограничений (админы)."""
+
+    plan: str | None
+    limit: int | None
+    window_days: int
+
+    @property
+    def is_free(self) -> bool:
+        return self.limit is not None and self.plan is None
+
+
+@dataclass(frozen=True)
+class QuotaDecision:
+    """Результат check_and_consume / settle."""
+
+    allowed: bool
+    used: int
+    limit: int | None
+    is_free: bool = False
+    reason: str | None = None
+
+    @property
+    def limit_reached(self) -> bool:
+        """Бесплатный лимит исчерпан (повод для уведомления панды)."""
+        return self.is_free and self.limit is not None and self.used >= self.limit
+
+    @property
+    def total_requests(self) -> int:
+        """Запросов за окно для бесплатных (0 для Premium и админов)."""
+        return self.used if self.is_free else 0
+
+
+class _Reservation:
+    """Квота, зарезервированная текущим запросом (задачей aiohttp / aiogram)."""
+
+    __slots__ = ("telegram_id", "day", "decision", "settled")
+
+    def __init__(self, telegram_id: int, day: date, decision: QuotaDecision):
+        self.telegram_id = telegram_id
+        self.day = day
+        self.decision = decision
+        self.settled = False
+
+
+_current_reservation: ContextVar[_Reservation | None] = ContextVar(
+    "request_quota_reservation", default=None
+)
+
+
+def _today() -> date:
+    return datetime.now(UTC).date()
+
+
+def _day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=UTC)
+
+
+class RequestQuotaService:
+    """
+    Атомарные счётчики AI запросов с write-behind в DailyRequestCount.
+
+    Ошибки Redis не ломают чат: Redis уходит на паузу, счётчики на это время
+    работают в памяти процесса (перечитываются из БД с учётом несброшенных приращений).
+    """
+
+    def __init__(
+        self,
+        redis_url: str = "",
+        plan_cache_seconds: float = 60.0,
+        reseed_seconds: float = 5.0,
+    ):
+        self.plan_cache_seconds = plan_cache_seconds
+        self.reseed_seconds = reseed_seconds
+        self._redis = RedisTier(
+            redis_url if REDIS_AVAILABLE else "", self._connect_redis, "квоты AI запросов"
+        )
+        self._consume_script = None
+        self._record_script = None
+        self._plans: OrderedDict[int, tuple[float, QuotaPlan]] = OrderedDict()
+        self._counters: OrderedDict[int, dict[date, int]] = OrderedDict()
+        # День засева счётчиков пользователя из БД и момент, до которого они актуальны
+        self._seeded: dict[int, tuple[date, float]] = {}
+        self._pending: dict[tuple[int, date], int] = {}
+        self._db_lock = asyncio.Lock()
+        self._background: set[asyncio.Task] = set()
+
+    @classmethod
+    def from_settings(cls) -> "RequestQuotaService":
+        """Сервис с Redis, TTL тарифа и интервалом перечитывания из настроек."""
+        return cls(
+            redis_url=settings.redis_url if settings.request_quota_redis_enabled else "",
+            plan_cache_seconds=settings.request_quota_plan_cache_seconds,
+            reseed_seconds=settings.request_quota_flush_interval_seconds,
+        )
+
+    # --- Публичный API ---
+
+    async def check_and_consume(
+        self, telegram_id: int, username: str | None = None
+    ) -> QuotaDecision:
+        """
+        Проверить лимит и учесть запрос одним атомарным шагом.
+
+        Разрешённый запрос резервируется за текущей задачей: повторный вызов
+        в той же задаче (проверка фото после общей проверки) не тратит квоту ещё раз.
+
+        Args:
+            telegram_id: Telegram ID пользователя
+            username: Username пользователя (опционально, для проверки админа)
+
+        Returns:
+            QuotaDecision: allowed=False и reason — текст отказа, если лимит исчерпан
+        """
+        reservation = _current_reservation.get()
+        if reservation is not None and reservation.telegram_id == telegram_id:
+            return reservation.decision
+
+        plan = await self._get_plan(telegram_id, username)
+        day = _today()
+        allowed, used = await self._apply(
+            telegram_id, day, delta=1, limit=plan.limit, window_days=plan.window_days
+        )
+        self._record("allowed" if allowed else "refused")
+        if not allowed:
+            from bot.services.premium_features_service import PremiumFeaturesService
+
+            return QuotaDecision(
+                allowed=False,
+                used=used,
+                limit=plan.limit,
+                is_free=plan.is_free,
+                reason=PremiumFeaturesService.get_limit_exceeded_reason(plan.plan),
+            )
+
+        self._add_pending(telegram_id, day, 1)
+        decision = QuotaDecision(allowed=True, used=used, limit=plan.limit, is_free=plan.is_free)
+        _current_reservation.set(_Reservation(telegram_id, day, decision))
+        return decision
+
+    async def settle(self, telegram_id: int) -> QuotaDecision:
+        """
+        Учесть запрос при сохранении ответа (замена increment_request_count).
+
+        Если текущая задача зарезервировала квоту, резерв становится окончательным
+        без обращения к счётчикам. Иначе запрос учитывается безусловно.
+        """
+        reservation = _current_reservation.get()
+        if (
+            reservation is not None
+            and reservation.telegram_id == telegram_id
+            and not reservation.settled
+        ):
+            reservation.settled = True
+            return reservation.decision
+
+        plan = await self._get_plan(telegram_id)
+        day = _today()
+        _, used = await self._apply(
+            telegram_id, day, delta=1, limit=None, window_days=plan.window_days
+        )
+        self._add_pending(telegram_id, day, 1)
+        return QuotaDecision(allowed=True, used=used, limit=plan.limit, is_free=plan.is_free)
+
+    async def release(self, telegram_id: int) -> None:
+        """Вернуть квоту, если зарезервированный запрос так и не был учтён (settle)."""
+        reservation = _current_reservation.get()
+        if reservation is None or reservation.telegram_id != telegram_id:
+            return
+        _current_reservation.set(None)
+        if reservation.settled:
+            return
+
+        try:
+            await self._apply(telegram_id, reservation.day, delta=-1, limit=None, window_days=1)
+            self._add_pending(telegram_id, reservation.day, -1)
+        except Exception as e:
+            logger.warning(f"⚠️ Quota: не удалось вернуть квоту user={telegram_id}: {e}")
+
+    def record_external(self, telegram_id: int) -> None:
+        """
+        Учесть запрос, уже записанный в DailyRequestCount синхронным кодом
+        (PremiumFeaturesService.increment_request_count), без повторного write-behind.
+        """
+        day = _today()
+        counters = self._counters.get(telegram_id)
+        if counters is not None:
+            counters[day] = counters.get(day, 0) + 1
+
+        if self._redis.available:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            task = loop.create_task(self._record_external_redis(telegram_id, day))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    def forget_plan(self, telegram_id: int) -> None:
+        """Сбросить кэш тарифа (после активации подписки)."""
+        self._plans.pop(telegram_id, None)
+
+    async def flush(self) -> int:
+        """
+        Сбросить накопленные приращения в DailyRequestCount.
+
+        Returns:
+            int: Количество обновлённых пар (пользователь, день)
+        """
+        async with self._db_lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+
+            from bot.database import get_async_db
+
+            try:
+                async with get_async_db() as db:
+                    for (telegram_id, day), delta in pending.items():
+                        if delta == 0:
+                            continue
+                        try:
+                            async with db.begin_nested():
+                                await self._write_delta(db, telegram_id, day, delta)
+                        except IntegrityError:
+                            # Пользователь удалён: его счётчики больше не нужны
+                            logger.debug(f"Quota: пропущен счётчик удалённого user={telegram_id}")
+            except Exception as e:
+                for key, delta in pending.items():
+                    self._pending[key] = self._pending.get(key, 0) + delta
+                logger.warning(f"⚠️ Quota: ошибка сброса счётчиков в БД: {e}")
+                return 0
+
+            return len(pending)
+
+    async def run_flush_loop(self, interval_seconds: float = 5.0) -> None:
+        """Фоновый write-behind раз в interval_seconds (до отмены задачи)."""
+        while True:
+            try:
+                await asyncio.sleep(interval_seconds)
+                flushed = await self.flush()
+                if flushed:
+                    logger.debug(f"Quota: сброшено счётчиков в БД: {flushed}")
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.warning(f"⚠️ Quota flush error: {e}")
+
+    # --- Тариф ---
+
+    async def _get_plan(self, telegram_id: int, username: str | None = None) -> QuotaPlan:
+        entry = self._plans.get(telegram_id)
+        if entry is not None and time.monotonic() < entry[0]:
+            return entry[1]
+
+        from bot.database import get_async_db
+        from bot.services.premium_features_service import AsyncPremiumFeaturesService
+
+        async with get_async_db() as db:
+            plan, limit, window_days = await AsyncPremiumFeaturesService(db).get_request_limit(
+                telegram_id, username=username
+            )
+        quota_plan = QuotaPlan(plan=plan, limit=limit, window_days=window_days)
+
+        if self.plan_cache_seconds > 0:
+            self._plans[telegram_id] = (time.monotonic() + self.plan_cache_seconds, quota_plan)
+            self._plans.move_to_end(telegram_id)
+            while len(self._plans) > _MEMORY_MAX_USERS:
+                self._plans.popitem(last=False)
+        return quota_plan
+
+    # --- Счётчики ---
+
+    async def _apply(
+        self, telegram_id: int, day: date, delta: int, limit: int | None, window_days: int
+    ) -> tuple[bool, int]:
+        """Атомарно: сумма за окно, проверка лимита (для delta > 0), приращение за day."""
+        if self._redis.client() is not None:
+            seed = None
+            for _attempt in range(2):
+                try:
+                    result = await self._apply_redis(
+                        telegram_id, day, delta, limit, window_days, seed
+                    )
+                except _REDIS_ERRORS as e:
+                    self._redis.fail(e)
+                    break
+                if result is not None:
+                    return result
+                # Счётчиков в Redis нет: засеять из БД (ошибка БД — не сбой Redis)
+                seed = await self._read_db_counts(telegram_id, day)
+
+        counters = await self._memory_counters(telegram_id, day)
+        used = sum(counters.get(day - timedelta(days=i), 0) for i in range(window_days))
+        if delta > 0 and limit is not None and used + delta > limit:
+            return False, used
+        if delta < 0 and counters.get(day, 0) + delta < 0:
+            return True, used
+        counters[day] = counters.get(day, 0) + delta
+        return True, used + delta
+
+    async def _apply_redis(
+        self,
+        telegram_id: int,
+        day: date,
+        delta: int,
+        limit: int | None,
+        window_days: int,
+        seed: dict[date, int] | None = None,
+    ) -> tuple[bool, int] | None:
+        """Lua-скрипт в Redis; None — счётчики не загружены, нужен seed из БД."""
+        days = [day - timedelta(days=i) for i in range(QUOTA_WINDOW_DAYS)]
+        keys = [self._marker_key(telegram_id)] + [self._day_key(telegram_id, d) for d in days]
+        args = [-1 if limit is None else limit, window_days, delta, _KEY_TTL_SECONDS, 0]
+        if seed is not None:
+            args[4] = 1
+            args.extend(seed.get(d, 0) for d in days)
+
+        status, used = await self._consume_script(keys=keys, args=args)
+        if int(status) == -1:
+            return None
+        return int(status) == 1, int(used)
+
+    async def _record_external_redis(self, telegram_id: int, day: date) -> None:
+        try:
+            await self._record_script(
+                keys=[self._marker_key(telegram_id), self._day_key(telegram_id, day)],
+                args=[_KEY_TTL_SECONDS],
+            )
+        except _REDIS_ERRORS as e:
+            self._redis.fail(e)
+
+    async def _memory_counters(self, telegram_id: int, day: date) -> dict[date, int]:
+        """
+        Счётчики пользователя в памяти.
+
+        Засеваются из БД + несброшенные приращения (сброшенные flush уже в БД,
+        остальные — в _pending) при первом обращении, в новом дне и раз в
+        reseed_seconds: так видны запросы, сброшенные в БД другими инстансами.
+        """
+        counters = self._counters.get(telegram_id)
+        if counters is None or self._needs_reseed(telegram_id, day):
+            async with self._db_lock:
+                counters = self._counters.get(telegram_id)
+                if counters is None or self._needs_reseed(telegram_id, day):
+                    counters = await self._read_db_counts(telegram_id, day)
+                    for (pending_id, pending_day), delta in self._pending.items():
+                        if pending_id == telegram_id:
+                            counters[pending_day] = counters.get(pending_day, 0) + delta
+                    self._counters[telegram_id] = counters
+                    self._seeded[telegram_id] = (day, time.monotonic() + self.reseed_seconds)
+
+        self._counters.move_to_end(telegram_id)
+        while len(self._counters) > _MEMORY_MAX_USERS:
+            evicted, _ = self._counters.popitem(last=False)
+            self._seeded.pop(evicted, None)
+
+        oldest = day - timedelta(days=QUOTA_WINDOW_DAYS - 1)
+        for stale in [d for d in counters if d < oldest]:
+            del counters[stale]
+        return counters
+
+    def _needs_reseed(self, telegram_id: int, day: date) -> bool:
+        seeded = self._seeded.get(telegram_id)
+        return seeded is None or seeded[0] != day or time.monotonic() >= seeded[1]
+
+    @staticmethod
+    async def _read_db_counts(telegram_id: int, day: date) -> dict[date, int]:
+        """Запросы пользователя по дням за окно QUOTA_WINDOW_DAYS (один SELECT)."""
+        from bot.database import get_async_db
+        from bot.models import DailyRequestCount
+
+        window_start = _day_start(day - timedelta(days=QUOTA_WINDOW_DAYS - 1))
+        stmt = (
+            select(DailyRequestCount.date, DailyRequestCount.request_count)
+            .where(DailyRequestCount.user_telegram_id == telegram_id)
+            .where(DailyRequestCount.date >= window_start)
+        )
+        counts: dict[date, int] = {}
+        async with get_async_db() as db:
+            for row_date, request_count in (await db.execute(stmt)).all():
+                if row_date.tzinfo is not None:
+                    row_date = row_date.astimezone(UTC)
+                row_day = row_date.date()
+                counts[row_day] = counts.get(row_day, 0) + (request_count or 0)
+        return counts
+
+    @staticmethod
+    async def _write_delta(db, telegram_id: int, day: date, delta: int) -> None:
+        """Прибавить delta к записи DailyRequestCount за day (UPDATE без чтения) или создать её."""
+        from bot.models import DailyRequestCount
+
+        day_start = _day_start(day)
+        now = datetime.now(UTC)
+        row_id = (
+            select(DailyRequestCount.id)
+            .where(DailyRequestCount.user_telegram_id == telegram_id)
+            .where(DailyRequestCount.date >= day_start)
+            .where(DailyRequestCount.date < day_start + timedelta(days=1))
+            .order_by(DailyRequestCount.date.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            update(DailyRequestCount)
+            .where(DailyRequestCount.id == row_id)
+            .values(request_count=DailyRequestCount.request_count + delta, last_request_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0 and delta > 0:
+            db.add(
+                DailyRequestCount(
+                    user_telegram_id=telegram_id,
+                    date=day_start,
+                    request_count=delta,
+                    last_request_at=now,
+                )
+            )
+            await db.flush()
+
+    def _add_pending(self, telegram_id: int, day: date, delta: int) -> None:
+        key = (telegram_id, day)
+        self._pending[key] = self._pending.get(key, 0) + delta
+
+    # --- Redis ---
+
+    def _connect_redis(self, url: str):
+        """Клиент Redis и регистрация скриптов (лениво, через RedisTier)."""
+        client = aioredis.from_url(
+            url,
+            decode_responses=True,
+            socket_connect_timeout=2,
+            socket_timeout=2,
+        )
+        self._consume_script = client.register_script(_CONSUME_SCRIPT)
+        self._record_script = client.register_script(_RECORD_SCRIPT)
+        return client
+
+    @staticmethod
+    def _marker_key(telegram_id: int) -> str:
+        return f"{QUOTA_KEY_PREFIX}:{{{telegram_id}}}:loaded"
+
+    @staticmethod
+    def _day_key(telegram_id: int, day: date) -> str:
+        return f"{QUOTA_KEY_PREFIX}:{{{telegram_id}}}:{day:%Y%m%d}"
+
+    @staticmethod
+    def _record(result: str) -> None:
+        try:
+            from bot.monitoring.prometheus_metrics import get_metrics
+
+            get_metrics().increment_counter("ai_request_quota_total", {"result": result})
+        except Exception as e:
+            logger.debug(f"Request quota metrics error: {e}")
+
+
+_request_quota: RequestQuotaService | None = None
+
+
+def get_request_quota() -> RequestQuotaService:
+    """Синглтон RequestQuotaService (Redis и TTL тарифа из настроек)."""
+    global _request_quota
+    if _request_quota is None:
+        _request_quota = RequestQuotaService.from_settings()
+    return _request_quota
@@ -35,9 +35,9 @@ def finalize_ai_response(raw_text: str, user_message: str = "") -> str:
     if not cleaned:
         return cleaned
     # Модерация ответа: блокируем запрещённый контент, который модель могла сгенерировать
-    from bot.services.moderation_service import ContentModerationService
+    from bot.services.moderation_service import get_moderation_service
 
-    cleaned = ContentModerationService().sanitize_ai_response(cleaned)
+    cleaned = get_moderation_service().sanitize_ai_response(cleaned)
     if _is_farewell_message(user_message):
         return cleaned
     if not _is_probably_russian_message(user_message):
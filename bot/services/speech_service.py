@@ -4,12 +4,9 @@
 Поддерживает русский и английский языки.
 """
 
-import subprocess
-import tempfile
-from pathlib import Path
-
 from loguru import logger
 
+from bot.services.audio_transcoder import get_audio_transcoder
 from bot.services.yandex_cloud_service import get_yandex_cloud_service
 
 # Коды языков Yandex SpeechKit (ru-RU, en-US)
@@ -69,76 +66,15 @@ class SpeechRecognitionService:
             if audio_bytes[:4] == b"\x1a\x45\xdf\xa3":  # WebM signature
                 logger.info("🔄 Конвертация WebM -> OGG Opus через ffmpeg...")
 
-                # Создаем временные файлы
-                with tempfile.NamedTemporaryFile(suffix=".webm", delete=False) as input_file:
-                    input_file.write(audio_bytes)
-                    input_path = input_file.name
-
-                with tempfile.NamedTemporaryFile(suffix=".ogg", delete=False) as output_file:
-                    output_path = output_file.name
-
-                try:
-                    # Конвертируем через ffmpeg
-                    # -i input.webm -acodec libopus -ar 48000 -ac 1 output.ogg
-                    subprocess.run(
-                        [
-                            "ffmpeg",
-                            "-i",
-                            input_path,
-                            "-acodec",
-                            "libopus",
-                            "-ar",
-                            "48000",
-                            "-ac",
-                            "1",
-                            "-y",  # Перезаписать выходной файл
-                            output_path,
-                        ],
-                        capture_output=True,
-                        timeout=10,
-                        check=True,
-                    )
-
-                    # Читаем конвертированный файл потоково с ограничением размера
-                    max_converted_size = 20 * 1024 * 1024  # 20MB лимит
-                    converted_bytes = b""
-                    total_read = 0
-                    chunk_size = 64 * 1024  # 64KB chunks
-
-                    with open(output_path, "rb") as f:
-                        while True:
-                            chunk = f.read(chunk_size)
-                            if not chunk:
-                                break
-                            converted_bytes += chunk
-                            total_read += len(chunk)
-                            if total_read > max_converted_size:
-                                logger.error(
-                                    f"❌ Конвертированный файл слишком большой: "
-                                    f"{total_read} байт > {max_converted_size} байт"
-                                )
-                                # Возвращаем исходные байты в случае ошибки
-                                return audio_bytes
-
-                    logger.info(
-                        f"✅ Конвертация успешна: {len(audio_bytes)} -> {len(converted_bytes)} байт"
-                    )
-                    return converted_bytes
-
-                except subprocess.CalledProcessError as e:
-                    logger.error(f"❌ Ошибка ffmpeg: {e.stderr.decode() if e.stderr else str(e)}")
+                converted_bytes = await get_audio_transcoder().webm_to_ogg_opus(audio_bytes)
+                if converted_bytes is None:
                     # Возвращаем исходные байты, попробуем отправить как есть
                     return audio_bytes
-                except subprocess.TimeoutExpired:
-                    logger.error("❌ ffmpeg timeout - конвертация заняла слишком много времени")
-                    return audio_bytes
-                finally:
-                    # Удаляем временные файлы
-                    try:
-                        Path(input_path).unlink(missing_ok=True)
-                        Path(output_path).unlink(missing_ok=True)
-                    except Exception:
-                        pass
+
+                logger.info(
+                    f"✅ Конвертация успешна: {len(audio_bytes)} -> {len(converted_bytes)} байт"
+                )
+                return converted_bytes
 
             # Проверяем, является ли это ogg (первые байты: OggS)
             if audio_bytes[:4] == b"OggS":
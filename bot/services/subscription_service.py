@@ -165,6 +165,11 @@ class SubscriptionService:
                 user.premium_until = expires_at
             self.db.flush()
 
+        # Новый лимит (500 в день) действует сразу, а не после истечения кэша тарифа
+        from bot.services.request_quota import get_request_quota
+
+        get_request_quota().forget_plan(telegram_id)
+
         logger.info(
             f"✅ Premium активирован: user={telegram_id}, plan={plan_id}, "
             f"expires={expires_at.strftime('%Y-%m-%d %H:%M:%S')}"
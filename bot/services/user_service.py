@@ -3,12 +3,15 @@
 
 Обеспечивает CRUD операции для управления пользователями:
 регистрация, обновление профиля, получение данных пользователя.
+
+AsyncUserService — асинхронная версия для aiohttp-обработчиков (AsyncSession).
 """
 
 from datetime import UTC, datetime
 
 from loguru import logger
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from bot.config import MAX_AGE, MAX_GRADE, MIN_AGE, MIN_GRADE
@@ -277,3 +280,47 @@ class UserService(IUserService):
             logger.error(f"❌ Ошибка обновления счетчика для {telegram_id}: {e}")
             self.db.rollback()
             return False
+
+
+class AsyncUserService:
+    """
+    Асинхронный сервис пользователей для AsyncSession.
+
+    Используется в aiohttp-обработчиках Mini App, чтобы запросы к БД
+    не блокировали event loop (SSE-стримы, webhook).
+    """
+
+    def __init__(self, db: AsyncSession):
+        """
+        Инициализация сервиса
+
+        Args:
+            db: Асинхронная сессия SQLAlchemy
+        """
+        self.db = db
+
+    async def get_user_by_telegram_id(self, telegram_id: int) -> User | None:
+        """
+        Получить пользователя по Telegram ID
+
+        Args:
+            telegram_id: Telegram ID
+
+        Returns:
+            User: Пользователь или None
+        """
+        stmt = select(User).where(User.telegram_id == telegram_id)
+        return (await self.db.execute(stmt)).scalar_one_or_none()
+
+    async def is_registered(self, telegram_id: int) -> bool:
+        """
+        Проверить, зарегистрирован ли пользователь
+
+        Args:
+            telegram_id: Telegram ID
+
+        Returns:
+            bool: True если пользователь существует
+        """
+        stmt = select(User.telegram_id).where(User.telegram_id == telegram_id)
+        return (await self.db.execute(stmt)).first() is not None
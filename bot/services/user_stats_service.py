@@ -0,0 +1,272 @@
+"""
+Агрегат статистики пользователя для достижений (таблица user_stats).
+
+Раньше каждая проверка достижений считала COUNT по chat_history, выбирала
+distinct-даты и сканировала тексты всех сообщений пользователя — стоимость
+росла с историей. Теперь каждая запись в историю и завершение игры обновляют
+строку пользователя одним атомарным UPDATE: инкременты счётчиков, OR битовой
+маски предметов и серия дней через CASE по last_active_date. Параллельные
+записи не теряют инкременты, стоимость не зависит от размера истории.
+
+Если строки ещё нет, она строится из chat_history и game_stats при первом
+обращении (один раз на пользователя); массово — scripts/backfill_user_stats.py.
+Очистка истории агрегат не сбрасывает: прогресс достижений сохраняется.
+"""
+
+from collections.abc import Iterable
+from datetime import UTC, date, datetime, timedelta
+
+from loguru import logger
+from sqlalchemy import Update, case, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from bot.config.subjects import SUBJECT_BITS, detect_subject
+from bot.models import ChatHistory, GameStats, UserStats
+
+# Сколько текстов сообщений читать за раз при построении из истории
+_BUILD_BATCH_SIZE = 1000
+
+
+def subjects_mask(text: str) -> int:
+    """Бит предмета сообщения (0, если предмет не определён)."""
+    subject = detect_subject(text)
+    return SUBJECT_BITS[subject] if subject else 0
+
+
+def streak_on(stats: UserStats, today: date | None = None) -> int:
+    """Текущая серия дней: 0, если сегодня пользователь ещё не писал."""
+    today = today or datetime.now(UTC).date()
+    return stats.current_streak if stats.last_active_date == today else 0
+
+
+def _messages_stmt(
+    telegram_id: int, messages: int, questions: int, mask: int, today: date
+) -> Update:
+    """
+    UPDATE агрегата на новые сообщения.
+
+    Все выражения вычисляются от старых значений строки, поэтому серия
+    (тот же день — без изменений, вчера — +1, иначе — 1) и last_active_date
+    обновляются в одном операторе.
+    """
+    streak = case(
+        (UserStats.last_active_date == today, UserStats.current_streak),
+        (UserStats.last_active_date == today - timedelta(days=1), UserStats.current_streak + 1),
+        else_=1,
+    )
+    return (
+        update(UserStats)
+        .where(UserStats.user_telegram_id == telegram_id)
+        .values(
+            total_messages=UserStats.total_messages + messages,
+            total_questions=UserStats.total_questions + questions,
+            subjects_mask=UserStats.subjects_mask.op("|")(mask),
+            current_streak=streak,
+            last_active_date=today,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _game_stmt(telegram_id: int, game_type: str, result: str, score: int | None) -> Update:
+    """UPDATE агрегата на завершённую партию."""
+    values = {"total_game_sessions": UserStats.total_game_sessions + 1}
+    if result == "win":
+        values["total_game_wins"] = UserStats.total_game_wins + 1
+        if game_type == "tic_tac_toe":
+            values["tic_tac_toe_wins"] = UserStats.tic_tac_toe_wins + 1
+        elif game_type == "checkers":
+            values["checkers_wins"] = UserStats.checkers_wins + 1
+    if game_type == "2048" and score is not None:
+        values["best_2048_score"] = case(
+            (UserStats.best_2048_score < score, score), else_=UserStats.best_2048_score
+        )
+    return (
+        update(UserStats)
+        .where(UserStats.user_telegram_id == telegram_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+class UserStatsService:
+    """
+    Сервис агрегата статистики пользователя.
+
+    Методы record_* вызываются ДО записи самих сообщений/результатов игры:
+    если строки ещё нет, она строится из текущего состояния БД, и новые
+    данные не учитываются дважды.
+    """
+
+    def __init__(self, db: Session):
+        """
+        Инициализация сервиса.
+
+        Args:
+            db (Session): Сессия SQLAlchemy для работы с базой данных.
+        """
+        self.db = db
+
+    def record_messages(
+        self, telegram_id: int, messages: Iterable[tuple[str, str]], today: date | None = None
+    ) -> None:
+        """
+        Учесть новые сообщения в агрегате.
+
+        Args:
+            telegram_id: Telegram ID пользователя
+            messages: Пары (message_type, message_text); считаются только 'user',
+                остальные лишь продлевают серию дней
+            today: Дата активности (по умолчанию сегодня, UTC)
+        """
+        total = questions = mask = 0
+        for message_type, text in messages:
+            if message_type != "user":
+                continue
+            total += 1
+            questions += "?" in text
+            mask |= subjects_mask(text)
+
+        stmt = _messages_stmt(
+            telegram_id, total, questions, mask, today or datetime.now(UTC).date()
+        )
+        self._apply(telegram_id, stmt)
+
+    def record_game(
+        self, telegram_id: int, game_type: str, result: str, score: int | None = None
+    ) -> None:
+        """
+        Учесть завершённую партию в агрегате.
+
+        Args:
+            telegram_id: Telegram ID пользователя
+            game_type: Тип игры ('tic_tac_toe', 'checkers', '2048', ...)
+            result: Результат ('win', 'loss', 'draw')
+            score: Финальный счёт (для 2048)
+        """
+        self._apply(telegram_id, _game_stmt(telegram_id, game_type, result, score))
+
+    def get(self, telegram_id: int) -> UserStats:
+        """
+        Получить агрегат пользователя (при отсутствии — построить из истории).
+
+        Args:
+            telegram_id: Telegram ID пользователя
+
+        Returns:
+            UserStats: Строка агрегата (актуальные значения из БД)
+        """
+        stmt = (
+            select(UserStats)
+            .where(UserStats.user_telegram_id == telegram_id)
+            .execution_options(populate_existing=True)
+        )
+        stats = self.db.scalar(stmt)
+        if stats is not None:
+            return stats
+
+        stats = self.build_from_history(telegram_id)
+        try:
+            with self.db.begin_nested():
+                self.db.add(stats)
+        except IntegrityError:
+            # Строку успела создать параллельная запись (или пользователя нет в users)
+            existing = self.db.scalar(stmt)
+            if existing is not None:
+                return existing
+            logger.warning(f"⚠️ Не удалось сохранить user_stats для user={telegram_id}")
+            return stats
+
+        logger.info(
+            f"📊 user_stats построен из истории: user={telegram_id}, "
+            f"messages={stats.total_messages}"
+        )
+        return stats
+
+    def rebuild(self, telegram_id: int) -> UserStats:
+        """
+        Пересчитать агрегат из истории и перезаписать строку (для backfill).
+
+        Args:
+            telegram_id: Telegram ID пользователя
+
+        Returns:
+            UserStats: Сохранённая строка агрегата
+        """
+        return self.db.merge(self.build_from_history(telegram_id))
+
+    def build_from_history(self, telegram_id: int) -> UserStats:
+        """
+        Построить агрегат из chat_history и game_stats (без сохранения).
+
+        Полный проход по истории пользователя — только для первичного
+        заполнения; дальше строка обновляется инкрементально.
+        """
+        user_filter = (
+            ChatHistory.user_telegram_id == telegram_id,
+            ChatHistory.message_type == "user",
+        )
+        counts = self.db.execute(
+            select(
+                func.count(ChatHistory.id),
+                func.count(case((ChatHistory.message_text.like("%?%"), ChatHistory.id))),
+            ).where(*user_filter)
+        ).one()
+
+        mask = 0
+        texts = self.db.execute(
+            select(ChatHistory.message_text)
+            .where(*user_filter)
+            .execution_options(yield_per=_BUILD_BATCH_SIZE)
+        ).scalars()
+        for text in texts:
+            mask |= subjects_mask(text)
+
+        day = func.date(ChatHistory.timestamp)
+        dates = self.db.scalars(
+            select(day)
+            .where(ChatHistory.user_telegram_id == telegram_id)
+            .distinct()
+            .order_by(day.desc())
+        ).all()
+        dates = [d if isinstance(d, date) else date.fromisoformat(d) for d in dates]
+        streak = 0
+        for index, active_date in enumerate(dates):
+            if active_date != dates[0] - timedelta(days=index):
+                break
+            streak += 1
+
+        stats = UserStats(
+            user_telegram_id=telegram_id,
+            total_messages=counts[0],
+            total_questions=counts[1],
+            subjects_mask=mask,
+            current_streak=streak,
+            last_active_date=dates[0] if dates else None,
+            total_game_wins=0,
+            total_game_sessions=0,
+            tic_tac_toe_wins=0,
+            checkers_wins=0,
+            best_2048_score=0,
+        )
+        game_stats = self.db.scalars(
+            select(GameStats).where(GameStats.user_telegram_id == telegram_id)
+        ).all()
+        for gs in game_stats:
+            stats.total_game_wins += gs.wins
+            stats.total_game_sessions += gs.total_games
+            if gs.game_type == "tic_tac_toe":
+                stats.tic_tac_toe_wins = gs.wins
+            elif gs.game_type == "checkers":
+                stats.checkers_wins = gs.wins
+            elif gs.game_type == "2048" and gs.best_score:
+                stats.best_2048_score = max(stats.best_2048_score, gs.best_score)
+        return stats
+
+    def _apply(self, telegram_id: int, stmt: Update) -> None:
+        """Выполнить UPDATE; если строки нет — построить её из истории и повторить."""
+        if self.db.execute(stmt).rowcount:
+            return
+        self.get(telegram_id)
+        self.db.execute(stmt)
@@ -5,6 +5,7 @@
 - base.py: Базовый класс с общими методами (SOLID: SRP, DIP)
 - schemes.py: Методы генерации специализированных схем (SOLID: SRP)
 - detector.py: Логика детекции запросов (SOLID: SRP)
+- expression.py: Разбор и компиляция выражений для графиков функций
 - math/: Математика, алгебра, геометрия
 - languages/: Русский и английский языки
 - sciences/: Физика и химия
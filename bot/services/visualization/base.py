@@ -21,6 +21,13 @@ except ImportError:
     MATPLOTLIB_AVAILABLE = False
     logger.warning("⚠️ matplotlib недоступен - визуализация отключена")
 
+from bot.services.visualization.expression import (
+    ExpressionError,
+    SampledCurve,
+    compile_expression,
+    normalize_expression,
+    sample_function,
+)
 from bot.services.visualization.schemes import BaseSchemeMixin
 
 
@@ -36,6 +43,28 @@ class BaseVisualizationService(BaseSchemeMixin):
         if not MATPLOTLIB_AVAILABLE:
             logger.warning("⚠️ BaseVisualizationService недоступен - matplotlib не установлен")
 
+    @staticmethod
+    def _sample_expression(expression: str, x_range: tuple) -> SampledCurve | None:
+        """
+        Скомпилировать выражение и получить точки графика (адаптивная выборка).
+
+        Для функций с log и sqrt используется диапазон x (0.01, 10).
+
+        Raises:
+            ExpressionError: Выражение не разобрано или недопустимо
+        """
+        compiled = compile_expression(expression)
+        if compiled.positive_domain:
+            x_range = (0.01, 10)
+        return sample_function(compiled, float(x_range[0]), float(x_range[1]))
+
+    @staticmethod
+    def _plot_curve(ax, curve: SampledCurve, color: str, linewidth: float = 2.5) -> None:
+        """Нарисовать кривую (NaN — разрывы) и ограничить ось y «телом» графика."""
+        ax.plot(curve.x, curve.y, linewidth=linewidth, color=color)
+        if curve.y_limits is not None:
+            ax.set_ylim(*curve.y_limits)
+
     def generate_table(
         self, headers: list[str], rows: list[list[str]], title: str = "Таблица"
     ) -> bytes | None:
@@ -141,67 +170,19 @@ class BaseVisualizationService(BaseSchemeMixin):
             return None
 
         try:
-            # Для логарифмических и sqrt функций используем
-            # только положительные значения x
-            if (
-                "log" in expression.lower()
-                or "ln" in expression.lower()
-                or "sqrt" in expression.lower()
-            ):
-                x_range = (0.01, 10)
-
-            x = np.linspace(x_range[0], x_range[1], 1000)
-
-            # Безопасное вычисление функции
-            safe_globals = {
-                "x": x,
-                "sin": np.sin,
-                "cos": np.cos,
-                "tan": np.tan,
-                "exp": np.exp,
-                "log": np.log,
-                "log10": np.log10,
-                "log2": np.log2,
-                "ln": np.log,
-                "sqrt": np.sqrt,
-                "abs": np.abs,
-                "pi": np.pi,
-            }
-
             try:
-                # Нормализуем выражение: поддержка степеней через символы ² и ³ и ^
-                expression = expression.replace("²", "**2").replace("³", "**3").replace("^", "**")
-
-                # Заменяем np.func на func для безопасности
-                replacements_np = [
-                    ("np.sqrt(", "sqrt("),
-                    ("np.log10(", "log10("),
-                    ("np.log2(", "log2("),
-                    ("np.log(", "log("),
-                    ("np.sin(", "sin("),
-                    ("np.cos(", "cos("),
-                    ("np.tan(", "tan("),
-                    ("np.exp(", "exp("),
-                    ("np.abs(", "abs("),
-                ]
-                for old, new in replacements_np:
-                    expression = expression.replace(old, new)
-
-                y = eval(expression, {"__builtins__": {}}, safe_globals)
-                mask = np.isfinite(y)
-                x = x[mask]
-                y = y[mask]
-            except Exception as e:
+                curve = self._sample_expression(expression, x_range)
+            except ExpressionError as e:
                 logger.warning(f"⚠️ Не удалось вычислить функцию: {expression}, ошибка: {e}")
                 return None
 
-            if len(x) == 0:
+            if curve is None:
                 logger.warning(f"⚠️ Нет валидных точек для функции: {expression}")
                 return None
 
             fig, ax = plt.subplots(figsize=(10, 7))
             fig.patch.set_facecolor("white")
-            ax.plot(x, y, linewidth=2.5, color="#4A90E2")
+            self._plot_curve(ax, curve, color="#4A90E2")
             ax.grid(True, alpha=0.3, linestyle="--")
             ax.set_xlabel("x", fontsize=13, fontweight="bold")
             ax.set_ylabel("y", fontsize=13, fontweight="bold")
@@ -210,7 +191,8 @@ class BaseVisualizationService(BaseSchemeMixin):
             if title:
                 graph_title = title
             else:
-                display_expr = expression.replace("**", "^").replace("*", "·")
+                display_expr = normalize_expression(expression)
+                display_expr = display_expr.replace("**", "^").replace("*", "·")
                 graph_title = f"График функции: y = {display_expr}"
 
             ax.set_title(graph_title, fontsize=15, fontweight="bold", pad=15)
@@ -283,64 +265,17 @@ class BaseVisualizationService(BaseSchemeMixin):
             for idx, expression in enumerate(expressions):
                 ax = axes_list[idx]
 
-                # Для логарифмических и sqrt функций используем только положительные значения
-                current_range = x_range
-                if (
-                    "log" in expression.lower()
-                    or "ln" in expression.lower()
-                    or "sqrt" in expression.lower()
-                ):
-                    current_range = (0.01, 10)
-
-                x = np.linspace(current_range[0], current_range[1], 1000)
-
-                safe_globals = {
-                    "x": x,
-                    "sin": np.sin,
-                    "cos": np.cos,
-                    "tan": np.tan,
-                    "exp": np.exp,
-                    "log": np.log,
-                    "log10": np.log10,
-                    "log2": np.log2,
-                    "ln": np.log,
-                    "sqrt": np.sqrt,
-                    "abs": np.abs,
-                    "pi": np.pi,
-                }
-
                 try:
-                    # Нормализуем выражение
-                    normalized_expr = (
-                        expression.replace("²", "**2").replace("³", "**3").replace("^", "**")
-                    )
+                    curve = self._sample_expression(expression, x_range)
 
-                    replacements_np = [
-                        ("np.sqrt(", "sqrt("),
-                        ("np.log10(", "log10("),
-                        ("np.log2(", "log2("),
-                        ("np.log(", "log("),
-                        ("np.sin(", "sin("),
-                        ("np.cos(", "cos("),
-                        ("np.tan(", "tan("),
-                        ("np.exp(", "exp("),
-                        ("np.abs(", "abs("),
-                    ]
-                    for old, new in replacements_np:
-                        normalized_expr = normalized_expr.replace(old, new)
-
-                    y = eval(normalized_expr, {"__builtins__": {}}, safe_globals)
-                    mask = np.isfinite(y)
-                    x_plot = x[mask]
-                    y_plot = y[mask]
-
-                    if len(x_plot) > 0:
-                        ax.plot(x_plot, y_plot, linewidth=2.5, color=colors[idx % len(colors)])
+                    if curve is not None:
+                        self._plot_curve(ax, curve, color=colors[idx % len(colors)])
                         ax.grid(True, alpha=0.3, linestyle="--")
                         ax.set_xlabel("x", fontsize=11, fontweight="bold")
                         ax.set_ylabel("y", fontsize=11, fontweight="bold")
 
-                        display_expr = normalized_expr.replace("**", "^").replace("*", "·")
+                        display_expr = normalize_expression(expression)
+                        display_expr = display_expr.replace("**", "^").replace("*", "·")
                         ax.set_title(f"y = {display_expr}", fontsize=12, fontweight="bold", pad=10)
                         ax.axhline(y=0, color="k", linewidth=0.8, linestyle="-")
                         ax.axvline(x=0, color="k", linewidth=0.8, linestyle="-")
@@ -0,0 +1,350 @@
+"""
+Компилятор выражений для графиков функций.
+
+Вместо eval строки на каждый запрос:
+1. Нормализация записи школьника: x² → x**2, x^3 → x**3, 2x → 2*x,
+   ln → log, np.sin → sin, «·», «×», «−».
+2. Разбор через ast и проверка по белому списку узлов (числа, x, pi, e,
+   + - * / ** %, унарный минус, вызовы разрешённых функций с одним
+   аргументом). Всё остальное — ExpressionError.
+3. Компиляция дерева в векторизованное замыкание NumPy; результат
+   кэшируется по канонической форме (ast.unparse), поэтому «x^2»,
+   «x²» и «x ** 2» компилируются один раз.
+4. Адаптивная выборка точек: отрезки, где кривая отклоняется от
+   прямой или пересекает границу области определения, делятся
+   пополам; на неразрешённых скачках (асимптоты tan(x), 1/x) линия
+   разрывается (NaN), а пределы оси y считаются по «телу» графика.
+"""
+
+import ast
+import re
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import NamedTuple
+
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+MAX_EXPRESSION_LENGTH = 120
+MAX_EXPRESSION_NODES = 60
+
+_INITIAL_POINTS = 201
+_MAX_POINTS = 4000
+_MAX_DEPTH = 10
+# Допустимое отклонение от прямой на отрезке (доля высоты видимой части графика)
+_CURVATURE_TOLERANCE = 0.002
+# Скачок больше этой доли высоты на неразрешённом отрезке — разрыв
+_JUMP_FRACTION = 0.25
+
+# Функции с областью определения x > 0 (для них график строится на (0.01, 10))
+POSITIVE_DOMAIN_FUNCTIONS = frozenset({"log", "log10", "log2", "sqrt"})
+_FUNCTION_NAMES = frozenset(
+    {"sin", "cos", "tan", "cot", "exp", "log", "log10", "log2", "sqrt", "abs"}
+)
+_CONSTANT_NAMES = frozenset({"pi", "e"})
+
+
+class ExpressionError(ValueError):
+    """Выражение не разобрано или содержит недопустимые конструкции."""
+
+
+def normalize_expression(text: str) -> str:
+    """
+    Привести запись выражения к синтаксису Python.
+
+    Args:
+        text: Выражение в записи пользователя ("2x² + 3", "y = sin x")
+
+    Returns:
+        str: Нормализованное выражение ("2*x**2 + 3")
+    """
+    expr = text.strip().lower()
+    expr = re.sub(r"^y\s*=\s*", "", expr)
+    expr = expr.replace("²", "**2").replace("³", "**3").replace("^", "**")
+    expr = expr.replace("·", "*").replace("×", "*").replace("÷", "/").replace("−", "-")
+    expr = re.sub(r"\bnp\.", "", expr)
+    expr = re.sub(r"\bln\b", "log", expr)
+    # Неявное умножение: 2x → 2*x, 3(x+1) → 3*(x+1), (x+1)(x-1) → (x+1)*(x-1)
+    expr = re.sub(r"(?<![a-z_\d.])(\d+(?:\.\d+)?)\s*(?=[a-z(])", r"\1*", expr)
+    expr = re.sub(r"\)\s*(?=[a-z(\d])", ")*", expr)
+    return " ".join(expr.split())
+
+
+_ALLOWED_BINOPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod)
+_ALLOWED_UNARYOPS = (ast.UAdd, ast.USub)
+
+
+def _check_node(node: ast.AST) -> None:
+    if isinstance(node, ast.Expression):
+        _check_node(node.body)
+    elif isinstance(node, ast.BinOp):
+        if not isinstance(node.op, _ALLOWED_BINOPS):
+            raise ExpressionError(f"Недопустимая операция: {type(node.op).__name__}")
+        _check_node(node.left)
+        _check_node(node.right)
+    elif isinstance(node, ast.UnaryOp):
+        if not isinstance(node.op, _ALLOWED_UNARYOPS):
+            raise ExpressionError(f"Недопустимая операция: {type(node.op).__name__}")
+        _check_node(node.operand)
+    elif isinstance(node, ast.Call):
+        if (
+            not isinstance(node.func, ast.Name)
+            or node.func.id not in _FUNCTION_NAMES
+            or len(node.args) != 1
+            or node.keywords
+        ):
+            raise ExpressionError("Недопустимый вызов функции")
+        _check_node(node.args[0])
+    elif isinstance(node, ast.Name):
+        if node.id != "x" and node.id not in _CONSTANT_NAMES:
+            raise ExpressionError(f"Неизвестное имя: {node.id}")
+    elif isinstance(node, ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, int | float):
+            raise ExpressionError("Допустимы только числовые константы")
+    else:
+        raise ExpressionError(f"Недопустимая конструкция: {type(node).__name__}")
+
+
+@lru_cache(maxsize=512)
+def _parse_normalized(expr: str) -> ast.Expression:
+    if not expr or len(expr) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError("Пустое или слишком длинное выражение")
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"Не удалось разобрать выражение: {expr}") from e
+    if sum(1 for _ in ast.walk(tree)) > MAX_EXPRESSION_NODES:
+        raise ExpressionError("Слишком сложное выражение")
+    _check_node(tree)
+    return tree
+
+
+def canonical_expression(text: str) -> str:
+    """
+    Каноническая форма выражения (ключ кэша компиляции).
+
+    Raises:
+        ExpressionError: Выражение недопустимо
+    """
+    return ast.unparse(_parse_normalized(normalize_expression(text)))
+
+
+def is_valid_expression(text: str) -> bool:
+    """Проверка выражения без вычисления (для парсинга намерений)."""
+    try:
+        canonical_expression(text)
+    except ExpressionError:
+        return False
+    return True
+
+
+@dataclass(frozen=True)
+class CompiledExpression:
+    """
+    Скомпилированное выражение y = f(x).
+
+    Attributes:
+        canonical: Каноническая форма выражения
+        func: Векторизованная функция ndarray -> ndarray
+        positive_domain: В выражении есть log/sqrt (область x > 0)
+    """
+
+    canonical: str
+    func: Callable
+    positive_domain: bool
+
+    def __call__(self, x):
+        with np.errstate(all="ignore"):
+            y = self.func(x)
+        return np.broadcast_to(np.asarray(y, dtype=float), np.shape(x)).copy()
+
+
+def _build(node: ast.AST) -> Callable:
+    """Дерево (уже проверенное) -> замыкание над NumPy."""
+    if isinstance(node, ast.Expression):
+        return _build(node.body)
+    if isinstance(node, ast.Constant):
+        value = float(node.value)
+        return lambda _x: value
+    if isinstance(node, ast.Name):
+        if node.id == "x":
+            return lambda x: x
+        value = np.pi if node.id == "pi" else np.e
+        return lambda _x: value
+    if isinstance(node, ast.UnaryOp):
+        operand = _build(node.operand)
+        if isinstance(node.op, ast.USub):
+            return lambda x: np.negative(operand(x))
+        return operand
+    if isinstance(node, ast.BinOp):
+        left, right = _build(node.left), _build(node.right)
+        op = _BINARY_UFUNCS[type(node.op)]
+        return lambda x: op(left(x), right(x))
+    if isinstance(node, ast.Call):
+        argument = _build(node.args[0])
+        func = _FUNCTIONS[node.func.id]
+        return lambda x: func(argument(x))
+    raise ExpressionError(f"Недопустимая конструкция: {type(node).__name__}")
+
+
+if NUMPY_AVAILABLE:
+    _BINARY_UFUNCS = {
+        ast.Add: np.add,
+        ast.Sub: np.subtract,
+        ast.Mult: np.multiply,
+        ast.Div: np.true_divide,
+        ast.Pow: np.power,
+        ast.Mod: np.mod,
+    }
+    _FUNCTIONS = {
+        "sin": np.sin,
+        "cos": np.cos,
+        "tan": np.tan,
+        "cot": lambda v: 1.0 / np.tan(v),
+        "exp": np.exp,
+        "log": np.log,
+        "log10": np.log10,
+        "log2": np.log2,
+        "sqrt": np.sqrt,
+        "abs": np.abs,
+    }
+
+
+@lru_cache(maxsize=256)
+def _compile_canonical(canonical: str) -> CompiledExpression:
+    tree = _parse_normalized(canonical)
+    used = {
+        node.func.id
+        for node in ast.walk(tree)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+    }
+    return CompiledExpression(
+        canonical=canonical,
+        func=_build(tree),
+        positive_domain=bool(used & POSITIVE_DOMAIN_FUNCTIONS),
+    )
+
+
+def compile_expression(text: str) -> CompiledExpression:
+    """
+    Скомпилировать выражение (с кэшем по канонической форме).
+
+    Args:
+        text: Выражение в записи пользователя
+
+    Returns:
+        CompiledExpression: Векторизованная функция
+
+    Raises:
+        ExpressionError: Выражение недопустимо
+    """
+    if not NUMPY_AVAILABLE:
+        raise ExpressionError("NumPy недоступен")
+    return _compile_canonical(canonical_expression(text))
+
+
+class SampledCurve(NamedTuple):
+    """Точки графика: NaN в y — разрыв линии; y_limits — пределы оси или None."""
+
+    x: "np.ndarray"
+    y: "np.ndarray"
+    y_limits: tuple[float, float] | None
+
+
+def _robust_span(y: "np.ndarray") -> tuple[float, float]:
+    """Пределы «тела» графика (2–98 перцентиль конечных значений)."""
+    finite = y[np.isfinite(y)]
+    if finite.size == 0:
+        return -1.0, 1.0
+    low, high = np.percentile(finite, [2, 98])
+    if high - low < 1e-12:
+        low, high = low - 1.0, high + 1.0
+    return float(low), float(high)
+
+
+def sample_function(
+    compiled: CompiledExpression,
+    x_min: float,
+    x_max: float,
+    initial_points: int = _INITIAL_POINTS,
+    max_points: int = _MAX_POINTS,
+) -> SampledCurve | None:
+    """
+    Адаптивная выборка точек графика.
+
+    Начальная сетка сгущается только там, где середина отрезка заметно
+    отклоняется от прямой или где проходит граница области определения;
+    ровные участки остаются редкими.
+
+    Returns:
+        SampledCurve или None, если на отрезке нет ни одной конечной точки
+    """
+    x = np.linspace(x_min, x_max, initial_points)
+    y = compiled(x)
+    # «Тело» графика считаем по равномерной сетке: сгущённые у асимптот точки
+    # не должны растягивать масштаб
+    low, high = _robust_span(y)
+    span = high - low
+    tolerance = _CURVATURE_TOLERANCE * span
+    top, bottom = high + span, low - span
+    refine = np.ones(len(x) - 1, dtype=bool)
+
+    for _ in range(_MAX_DEPTH):
+        budget = max_points - len(x)
+        if budget <= 0 or not refine.any():
+            break
+        idx = np.flatnonzero(refine)[:budget]
+        x_mid = (x[idx] + x[idx + 1]) / 2
+        y_mid = compiled(x_mid)
+        y_left, y_right = y[idx], y[idx + 1]
+
+        finite_left, finite_mid, finite_right = (
+            np.isfinite(y_left),
+            np.isfinite(y_mid),
+            np.isfinite(y_right),
+        )
+        all_finite = finite_left & finite_mid & finite_right
+        domain_edge = ~all_finite & (finite_left | finite_mid | finite_right)
+        with np.errstate(all="ignore"):
+            deviation = np.abs(y_mid - (y_left + y_right) / 2)
+            # Все три точки выше или ниже видимой области — уточнять незачем
+            hidden = ((y_left > top) & (y_mid > top) & (y_right > top)) | (
+                (y_left < bottom) & (y_mid < bottom) & (y_right < bottom)
+            )
+        split = domain_edge | (all_finite & ~hidden & (deviation > tolerance))
+
+        # Середины ровных отрезков не вставляем — они ничего не меняют на картинке
+        idx, x_mid, y_mid = idx[split], x_mid[split], y_mid[split]
+        x = np.insert(x, idx + 1, x_mid)
+        y = np.insert(y, idx + 1, y_mid)
+        positions = idx + np.arange(len(idx))
+        refine = np.zeros(len(x) - 1, dtype=bool)
+        refine[positions] = True
+        refine[positions + 1] = True
+
+    y = np.where(np.isfinite(y), y, np.nan)
+    if not np.isfinite(y).any():
+        return None
+
+    # Разрывы: отрезки, которые так и не сошлись, с большим скачком по y.
+    # Отрезки целиком выше или ниже видимой области не трогаем — их не видно
+    margin = 0.1 * span
+    with np.errstate(invalid="ignore"):
+        above, below = y > high + margin, y < low - margin
+        hidden = (above[:-1] & above[1:]) | (below[:-1] & below[1:])
+        jumps = refine & ~hidden & (np.abs(np.diff(y)) > _JUMP_FRACTION * span)
+    if jumps.any():
+        breaks = np.flatnonzero(jumps) + 1
+        x = np.insert(x, breaks, (x[breaks - 1] + x[breaks]) / 2)
+        y = np.insert(y, breaks, np.nan)
+
+    finite = y[np.isfinite(y)]
+    y_limits = None
+    if finite.max() - finite.min() > 4 * span:
+        y_limits = (low - margin, high + margin)
+    return SampledCurve(x=x, y=y, y_limits=y_limits)
@@ -19,6 +19,7 @@ except ImportError:
     MATPLOTLIB_AVAILABLE = False
 
 from bot.services.visualization.base import BaseVisualizationService
+from bot.services.visualization.expression import ExpressionError, normalize_expression
 
 
 class ArithmeticVisualization(BaseVisualizationService):
@@ -363,8 +364,6 @@ class ArithmeticVisualization(BaseVisualizationService):
             return None
 
         try:
-            import numpy as np
-
             # Создаем фигуру с двумя subplots: таблица сверху, график снизу
             fig = plt.figure(figsize=(10, 12))
             fig.patch.set_facecolor("white")
@@ -410,51 +409,27 @@ class ArithmeticVisualization(BaseVisualizationService):
             # Нижний subplot для графика
             ax_graph = plt.subplot(2, 1, 2)
 
-            # Нормализуем выражение
-            normalized_expr = (
-                graph_expression.replace("²", "**2").replace("³", "**3").replace("^", "**")
-            )
-
-            # Генерируем данные для графика
-            x = np.linspace(-10, 10, 1000)
-            safe_globals = {
-                "x": x,
-                "sin": np.sin,
-                "cos": np.cos,
-                "tan": np.tan,
-                "exp": np.exp,
-                "log": np.log,
-                "log10": np.log10,
-                "log2": np.log2,
-                "ln": np.log,
-                "sqrt": np.sqrt,
-                "abs": np.abs,
-                "pi": np.pi,
-            }
-
             try:
-                y = eval(normalized_expr, {"__builtins__": {}}, safe_globals)
-                mask = np.isfinite(y)
-                x = x[mask]
-                y = y[mask]
-            except Exception as e:
+                curve = self._sample_expression(graph_expression, (-10, 10))
+            except ExpressionError as e:
                 logger.warning(f"⚠️ Не удалось вычислить функцию: {graph_expression}, ошибка: {e}")
                 plt.close(fig)
                 return None
 
-            if len(x) == 0:
+            if curve is None:
                 logger.warning(f"⚠️ Нет валидных точек для функции: {graph_expression}")
                 plt.close(fig)
                 return None
 
             # Рисуем график
-            ax_graph.plot(x, y, linewidth=2.5, color="#4A90E2")
+            self._plot_curve(ax_graph, curve, color="#4A90E2")
             ax_graph.grid(True, alpha=0.3, linestyle="--")
             ax_graph.set_xlabel("x", fontsize=13, fontweight="bold")
             ax_graph.set_ylabel("y", fontsize=13, fontweight="bold")
 
             # Формируем заголовок графика
-            display_expr = graph_expression.replace("**", "^").replace("*", "·")
+            display_expr = normalize_expression(graph_expression)
+            display_expr = display_expr.replace("**", "^").replace("*", "·")
             graph_title = f"График функции: y = {display_expr}"
             ax_graph.set_title(graph_title, fontsize=15, fontweight="bold", pad=15)
             ax_graph.axhline(y=0, color="k", linewidth=0.8, linestyle="-")
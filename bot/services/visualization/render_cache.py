@@ -0,0 +1,313 @@
+"""
+Content-addressed кэш PNG визуализаций.
+
+Одинаковые картинки (таблицы умножения 1–10, часовые пояса, природные
+зоны, климатограммы, графики x**2 и sin(x)) рендерятся байт-в-байт
+одинаково, поэтому результат generate_* кэшируется по ключу:
+sha256(имя метода + канонические аргументы + версия стиля).
+Аргументы приводятся к именованному виду по сигнатуре метода
+с подстановкой значений по умолчанию: generate_climatogram() и
+generate_climatogram(zone="тайга") — один ключ.
+
+Кэш работает внутри воркеров пула рендера (render_pool): там
+выполняются все generate_*, в том числе вызванные детектором.
+Уровни:
+1. In-process LRU, ограниченный по суммарному размеру PNG.
+2. Redis (если задан REDIS_URL) — общий для воркеров и инстансов.
+3. Диск (каталог VISUALIZATION_RENDER_CACHE_DIR или временный) —
+   общий для воркеров одного инстанса, переживает перезапуск пула.
+
+Воркер не обслуживает event loop, поэтому уровни 2–3 синхронные.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from functools import wraps
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from bot.services.cache.redis_tier import RedisTier
+
+try:
+    import redis
+
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# Увеличить при изменении оформления графиков/таблиц (цвета, шрифты, dpi)
+RENDER_STYLE_VERSION = 2
+RENDER_CACHE_KEY_PREFIX = f"viz:v{RENDER_STYLE_VERSION}"
+
+# Методы с побочными эффектами или внешними данными (карта: координаты, тайлы)
+UNCACHEABLE_RENDERS = frozenset({"generate_country_map"})
+
+# Самые частые визуализации — рендерятся заранее при старте сервера
+TOP_RENDER_SPECS: tuple[tuple[str, tuple], ...] = (
+    ("generate_full_multiplication_table", ()),
+    *(("generate_multiplication_table_image", (number,)) for number in range(1, 11)),
+    ("generate_function_graph", ("x**2",)),
+    ("generate_function_graph", ("sin(x)",)),
+    ("generate_function_graph", ("cos(x)",)),
+    ("generate_time_zones_table", ()),
+    ("generate_countries_table", ()),
+    ("generate_natural_zones_table", ()),
+    ("generate_climatogram", ()),
+    ("generate_function_graph", ("tan(x)",)),
+)
+
+_DISK_PRUNE_EVERY = 100
+
+
+def _canonical_arguments(method: Callable | None, args: tuple, kwargs: dict) -> dict[str, Any]:
+    """Аргументы вызова в именованном виде с подставленными значениями по умолчанию."""
+    if method is not None:
+        try:
+            bound = inspect.signature(method).bind(*args, **kwargs)
+            bound.apply_defaults()
+            return dict(bound.arguments)
+        except (TypeError, ValueError):
+            pass
+    return {"args": list(args), "kwargs": kwargs}
+
+
+def render_cache_key(
+    kind: str, args: tuple = (), kwargs: dict | None = None, method: Callable | None = None
+) -> str:
+    """
+    Ключ кэша визуализации.
+
+    Args:
+        kind: Имя метода generate_*
+        args: Позиционные аргументы
+        kwargs: Именованные аргументы
+        method: Связанный метод (для приведения аргументов по сигнатуре)
+
+    Returns:
+        str: Ключ вида viz:v<стиль>:<sha256>
+    """
+    payload = json.dumps(
+        {"kind": kind, "arguments": _canonical_arguments(method, args, kwargs or {})},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=repr,
+    )
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return f"{RENDER_CACHE_KEY_PREFIX}:{digest}"
+
+
+class RenderCache:
+    """
+    Трёхуровневый кэш PNG: LRU по байтам, Redis, диск.
+
+    Ошибки Redis и диска не ломают рендер: уровень уходит на паузу
+    (Redis) или пропускается (диск), картинка рисуется заново.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: int = 7 * 86400,
+        redis_url: str = "",
+        disk_dir: str | None = None,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self._redis = RedisTier(
+            redis_url if REDIS_AVAILABLE else "", self._connect_redis, "кэш визуализаций"
+        )
+        self._disk_dir = Path(disk_dir) if disk_dir else None
+        self._disk_writes = 0
+        self.hits = 0
+        self.redis_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls) -> "RenderCache":
+        """Кэш с параметрами из настроек."""
+        from bot.config import settings
+
+        disk_dir = settings.visualization_render_cache_dir or str(
+            Path(tempfile.gettempdir()) / "pandapal-render-cache"
+        )
+        return cls(
+            max_bytes=settings.visualization_render_cache_mb * 1024 * 1024,
+            ttl_seconds=settings.visualization_render_cache_ttl_seconds,
+            redis_url=settings.redis_url,
+            disk_dir=disk_dir,
+        )
+
+    # --- LRU ---
+
+    def _get_local(self, key: str) -> bytes | None:
+        image = self._entries.get(key)
+        if image is not None:
+            self._entries.move_to_end(key)
+        return image
+
+    def _set_local(self, key: str, image: bytes) -> None:
+        if len(image) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+        self._entries[key] = image
+        self._size += len(image)
+        while self._size > self.max_bytes:
+            _key, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    # --- Redis ---
+
+    @staticmethod
+    def _connect_redis(url: str):
+        return redis.Redis.from_url(
+            url,
+            decode_responses=False,
+            socket_connect_timeout=2,
+            socket_timeout=2,
+        )
+
+    # --- Диск ---
+
+    def _disk_path(self, key: str) -> Path | None:
+        if self._disk_dir is None:
+            return None
+        return self._disk_dir / f"{key.replace(':', '_')}.png"
+
+    def _read_disk(self, key: str) -> bytes | None:
+        path = self._disk_path(key)
+        if path is None:
+            return None
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                return None
+            return path.read_bytes()
+        except OSError:
+            return None
+
+    def _write_disk(self, key: str, image: bytes) -> None:
+        path = self._disk_path(key)
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Атомарная запись: другой воркер не прочитает недописанный файл
+            fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(image)
+            os.replace(tmp_name, path)
+        except OSError as e:
+            logger.debug(f"Render cache disk write error: {e}")
+            return
+        self._disk_writes += 1
+        if self._disk_writes % _DISK_PRUNE_EVERY == 0:
+            self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        """Удалить с диска записи старше TTL."""
+        deadline = time.time() - self.ttl_seconds
+        try:
+            for path in self._disk_dir.glob("*.png"):
+                if path.stat().st_mtime < deadline:
+                    path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.debug(f"Render cache disk prune error: {e}")
+
+    # --- API ---
+
+    def get(self, key: str) -> bytes | None:
+        """PNG из LRU, Redis или с диска (найденное поднимается в LRU)."""
+        image = self._get_local(key)
+        if image is not None:
+            self.hits += 1
+            return image
+
+        client = self._redis.client()
+        if client is not None:
+            try:
+                image = client.get(key)
+            except Exception as e:
+                self._redis.fail(e)
+                image = None
+            if image:
+                self._set_local(key, image)
+                self.redis_hits += 1
+                return image
+
+        image = self._read_disk(key)
+        if image:
+            self._set_local(key, image)
+            self.disk_hits += 1
+            return image
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, image: bytes) -> None:
+        """Сохранить PNG во все доступные уровни."""
+        self._set_local(key, image)
+        client = self._redis.client()
+        if client is not None:
+            try:
+                client.setex(key, self.ttl_seconds, image)
+            except Exception as e:
+                self._redis.fail(e)
+        self._write_disk(key, image)
+
+    def stats(self) -> dict:
+        """Статистика кэша (по текущему процессу)."""
+        return {
+            "size": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "redis_enabled": self._redis.available,
+            "disk_dir": str(self._disk_dir) if self._disk_dir else None,
+        }
+
+
+def install_render_cache(service: Any, cache: RenderCache) -> None:
+    """
+    Обернуть методы generate_* экземпляра сервиса кэшем.
+
+    Обёртки ставятся атрибутами экземпляра, поэтому через кэш идут и прямые
+    вызовы из пула, и вызовы детектора (self.viz_service.generate_*).
+    """
+    for name in dir(type(service)):
+        if not name.startswith("generate_") or name in UNCACHEABLE_RENDERS:
+            continue
+        method = getattr(service, name)
+        if callable(method):
+            setattr(service, name, _cached_render(name, method, cache))
+
+
+def _cached_render(name: str, method: Callable, cache: RenderCache) -> Callable:
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        key = render_cache_key(name, args, kwargs, method=method)
+        image = cache.get(key)
+        if image is not None:
+            return image
+        image = method(*args, **kwargs)
+        if isinstance(image, bytes) and image:
+            cache.set(key, image)
+        return image
+
+    return wrapper
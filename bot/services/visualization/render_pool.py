@@ -0,0 +1,281 @@
+"""
+Рендеринг визуализаций вне event loop.
+
+Отрисовка PNG через matplotlib занимает 300–800 мс CPU и блокирует
+все корутины процесса, а глобальное состояние pyplot небезопасно
+делить между потоками. Поэтому рендер выполняется в пуле процессов
+(ProcessPoolExecutor, spawn): каждый воркер при старте импортирует
+matplotlib и создаёт свой VisualizationService («прогретый» воркер).
+
+Запрос — сериализуемый RenderSpec (имя метода generate_* + аргументы),
+результат — PNG bytes. Async-точки входа (SSE-стрим Mini App, handlers
+бота) ждут render_visualization()/detect_and_render(); event loop
+никогда не рисует фигуры сам.
+
+VISUALIZATION_RENDER_WORKERS=0 — один выделенный поток вместо пула
+процессов (для окружений без fork/spawn); pyplot при этом всё равно
+используется только из одного потока.
+
+Методы generate_* в воркере обёрнуты кэшем PNG (render_cache), при
+старте сервера частые визуализации рендерятся заранее (warm_up).
+"""
+
+import asyncio
+import multiprocessing
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+
+DEFAULT_RENDER_WORKERS = 2
+DEFAULT_RENDER_TIMEOUT_SECONDS = 15.0
+
+
+@dataclass(frozen=True)
+class RenderSpec:
+    """
+    Сериализуемое описание рендера.
+
+    Attributes:
+        kind: Имя метода VisualizationService (generate_*)
+        args: Позиционные аргументы метода (picklable)
+        kwargs: Именованные аргументы метода (picklable)
+    """
+
+    kind: str
+    args: tuple = ()
+    kwargs: dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        if not self.kind.startswith("generate_"):
+            raise ValueError(f"Недопустимый тип рендера: {self.kind}")
+
+
+# --- Код воркера (выполняется в процессе пула) ---
+
+
+def _init_worker() -> None:
+    """Прогрев воркера: matplotlib (Agg), шрифты и сервис визуализации."""
+    try:
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
+        fig, _ax = plt.subplots(figsize=(1, 1))
+        fig.canvas.draw()
+        plt.close(fig)
+    except ImportError:
+        pass
+
+    from bot.services.visualization.render_cache import RenderCache, install_render_cache
+    from bot.services.visualization_service import get_visualization_service
+
+    install_render_cache(get_visualization_service(), RenderCache.from_settings())
+
+
+def _render_in_worker(spec: RenderSpec) -> bytes | None:
+    from bot.services.visualization_service import get_visualization_service
+
+    method = getattr(get_visualization_service(), spec.kind)
+    return method(*spec.args, **spec.kwargs)
+
+
+def _detect_in_worker(text: str) -> tuple[bytes | None, str | None, dict | None]:
+    from bot.services.visualization_service import get_visualization_service
+
+    service = get_visualization_service()
+    image, visualization_type = service.detect_visualization_request(text)
+    # Координаты карты — состояние воркера, возвращаем их вместе с картинкой
+    map_coords = service.get_last_map_coordinates()
+    return image, visualization_type, map_coords
+
+
+def _ping() -> bool:
+    return True
+
+
+# --- Сторона event loop ---
+
+
+class RenderExecutor:
+    """
+    Пул прогретых воркеров для рендера визуализаций.
+
+    Attributes:
+        max_workers: Количество процессов (0 — один выделенный поток)
+        timeout_seconds: Максимальное время ожидания одного рендера
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_RENDER_WORKERS,
+        timeout_seconds: float = DEFAULT_RENDER_TIMEOUT_SECONDS,
+    ):
+        self.max_workers = max_workers
+        self.timeout_seconds = timeout_seconds
+        self._pool: Executor | None = None
+        self._closed = False
+
+    def _get_pool(self) -> Executor:
+        if self._closed:
+            raise RuntimeError("пул рендера остановлен")
+        if self._pool is None:
+            if self.max_workers > 0:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+                logger.info(f"🎨 Пул рендера визуализаций: {self.max_workers} процесс(а)")
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="viz-render", initializer=_init_worker
+                )
+                logger.info("🎨 Пул рендера визуализаций: выделенный поток")
+        return self._pool
+
+    async def start(self) -> None:
+        """Запустить и прогреть воркеры заранее (при старте сервера)."""
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        await asyncio.gather(
+            *(loop.run_in_executor(pool, _ping) for _ in range(max(self.max_workers, 1)))
+        )
+
+    async def warm_up(self, top_n: int) -> int:
+        """
+        Заранее отрисовать top_n самых частых визуализаций (наполняет кэш PNG).
+
+        Returns:
+            int: Сколько визуализаций готово
+        """
+        from bot.services.visualization.render_cache import TOP_RENDER_SPECS
+
+        specs = [RenderSpec(kind, args) for kind, args in TOP_RENDER_SPECS[:top_n]]
+        results = await asyncio.gather(*(self.render(spec) for spec in specs))
+        ready = sum(1 for image in results if image)
+        logger.info(f"🎨 Прогрев кэша визуализаций: {ready}/{len(specs)}")
+        return ready
+
+    def shutdown(self) -> None:
+        """Остановить воркеры (при остановке сервера); пул больше не создаётся."""
+        self._closed = True
+        self._discard_pool()
+
+    def _discard_pool(self) -> None:
+        """Остановить текущий пул; следующий рендер создаст новый."""
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def render(self, spec: RenderSpec) -> bytes | None:
+        """
+        Отрисовать визуализацию в воркере.
+
+        Args:
+            spec: Описание рендера
+
+        Returns:
+            PNG bytes или None (ошибка, таймаут, метод ничего не вернул)
+        """
+        return await self._submit(spec.kind, _render_in_worker, spec, default=None)
+
+    async def detect(self, text: str) -> tuple[bytes | None, str | None, dict | None]:
+        """
+        Детекция запроса на визуализацию с рендером в воркере.
+
+        Args:
+            text: Текст сообщения
+
+        Returns:
+            tuple: (PNG bytes или None, тип визуализации, координаты карты)
+        """
+        return await self._submit("detect", _detect_in_worker, text, default=(None, None, None))
+
+    async def _submit(self, kind: str, func: Callable[..., T], arg: Any, default: T) -> T:
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._get_pool(), func, arg), timeout=self.timeout_seconds
+            )
+        except TimeoutError:
+            # Воркер дорисует и выбросит результат; запрос не ждёт дольше таймаута
+            logger.warning(f"⏱️ Рендер {kind} не уложился в {self.timeout_seconds}с")
+            self._record_timeout(kind)
+            return default
+        except BrokenProcessPool as e:
+            logger.error(f"❌ Пул рендера упал ({e}), будет пересоздан")
+            self._discard_pool()
+            return default
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка рендера {kind}: {e}")
+            return default
+        finally:
+            self._record_duration(kind, time.perf_counter() - start)
+
+    @staticmethod
+    def _record_duration(kind: str, seconds: float) -> None:
+        try:
+            from bot.monitoring.prometheus_metrics import get_metrics
+
+            get_metrics().record_histogram("visualization_render_seconds", seconds, {"kind": kind})
+        except Exception as e:
+            logger.debug(f"Render pool metrics error: {e}")
+
+    @staticmethod
+    def _record_timeout(kind: str) -> None:
+        try:
+            from bot.monitoring.prometheus_metrics import get_metrics
+
+            get_metrics().increment_counter("visualization_render_timeouts_total", {"kind": kind})
+        except Exception as e:
+            logger.debug(f"Render pool metrics error: {e}")
+
+
+_render_executor: RenderExecutor | None = None
+
+
+def get_render_executor() -> RenderExecutor:
+    """Синглтон RenderExecutor (размер пула и таймаут из настроек)."""
+    global _render_executor
+    if _render_executor is None:
+        from bot.config import settings
+
+        _render_executor = RenderExecutor(
+            max_workers=settings.visualization_render_workers,
+            timeout_seconds=settings.visualization_render_timeout_seconds,
+        )
+    return _render_executor
+
+
+async def render_visualization(kind: str, *args, **kwargs) -> bytes | None:
+    """
+    Отрисовать визуализацию вне event loop.
+
+    Args:
+        kind: Имя метода VisualizationService (generate_*)
+        *args: Позиционные аргументы метода
+        **kwargs: Именованные аргументы метода
+
+    Returns:
+        PNG bytes или None
+    """
+    return await get_render_executor().render(RenderSpec(kind, args, kwargs))
+
+
+async def detect_and_render(text: str) -> tuple[bytes | None, str | None, dict | None]:
+    """
+    Async-аналог VisualizationService.detect_visualization_request.
+
+    Returns:
+        tuple: (PNG bytes или None, тип визуализации, координаты карты для type="map")
+    """
+    return await get_render_executor().detect(text)
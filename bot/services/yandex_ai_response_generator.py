@@ -11,6 +11,7 @@ from abc import ABC, abstractmethod
 from loguru import logger
 
 from bot.config import settings
+from bot.services.answer_cache import get_answer_cache
 from bot.services.knowledge_service import get_knowledge_service
 from bot.services.prompt_builder import get_prompt_builder
 
@@ -30,7 +31,7 @@ from bot.services.response_cleaner import (  # noqa: F401 — re-export для 
     normalize_bold_spacing,
     remove_duplicate_text,
 )
-from bot.services.yandex_cloud_service import get_yandex_cloud_service
+from bot.services.yandex_cloud_service import SERVICE_OVERLOADED_MESSAGE, get_yandex_cloud_service
 
 
 class IModerator(ABC):
@@ -245,9 +246,9 @@ class YandexAIResponseGenerator:
             # Модерация: блокируем запрещённые темы до вызова API
             is_safe, block_reason = self.moderator.moderate(user_message)
             if not is_safe:
-                from bot.services.moderation_service import ContentModerationService
+                from bot.services.moderation_service import get_moderation_service
 
-                return ContentModerationService().get_safe_response_alternative(block_reason)
+                return get_moderation_service().get_safe_response_alternative(block_reason)
 
             if self._should_ask_clarification(user_message, chat_history):
                 return _CLARIFICATION_RESPONSE
@@ -259,6 +260,21 @@ class YandexAIResponseGenerator:
                     else settings.chat_history_messages_for_api_free
                 )
 
+            # Кэш точных ответов: одинаковый учебный вопрос — без RAG и вызова YandexGPT
+            answer_cache = get_answer_cache()
+            answer_fingerprint = answer_cache.fingerprint(
+                user_message,
+                model=settings.yandex_gpt_model,
+                temperature=settings.ai_temperature,
+                user_age=user_age,
+                user_grade=user_grade,
+                user_gender=user_gender,
+                emoji_in_chat=emoji_in_chat,
+            )
+            cached_answer = await answer_cache.get(answer_fingerprint)
+            if cached_answer is not None:
+                return finalize_ai_response(cached_answer, user_message=user_message)
+
             # RAG: запрос с учётом контекста диалога для коротких продолжений («а ещё?», «а почему?»)
             rag_query = self.knowledge_service.build_rag_query(user_message, chat_history)
             relevant_materials = await self.knowledge_service.enhanced_search(
@@ -355,6 +371,8 @@ class YandexAIResponseGenerator:
             )
 
             if response:
+                if response != SERVICE_OVERLOADED_MESSAGE:
+                    await answer_cache.store(answer_fingerprint, response, user_name=user_name)
                 return finalize_ai_response(response, user_message=user_message)
             else:
                 return "Извините, не смог сгенерировать ответ. Попробуйте переформулировать вопрос."
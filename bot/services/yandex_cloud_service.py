@@ -20,13 +20,22 @@ from tenacity import (
 )
 
 from bot.config import settings
-from bot.services.ai_request_queue import get_ai_request_queue
+from bot.services.ai_request_queue import (
+    AIQueueTimeoutError,
+    RequestPriority,
+    ai_request_context,
+    get_ai_request_queue,
+)
 from bot.services.circuit_breaker import (
     CircuitOpenError,
     yandex_gpt_circuit,
     yandex_stt_circuit,
     yandex_vision_circuit,
 )
+from bot.services.ndjson_decoder import NDJSONStreamDecoder
+
+# Ответ пользователю, когда YandexGPT недоступен (circuit breaker / очередь AI)
+SERVICE_OVERLOADED_MESSAGE = "Сервис временно перегружен. Попробуй через минуту 🐼"
 
 
 class YandexCloudService:
@@ -58,10 +67,13 @@ class YandexCloudService:
         self._client = httpx.AsyncClient(timeout=self.timeout)
         self._stt_client = httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=10.0))
 
-        # Очередь для управления одновременными запросами
-        # Максимум 12 одновременных запросов для баланса между производительностью
-        # и защитой от rate limiting Yandex Cloud API
-        self.request_queue = get_ai_request_queue(max_concurrent=12)
+        # Планировщик одновременных запросов: приоритеты (stream > чат > vision > фон),
+        # round-robin по пользователям и быстрый отказ после max_wait
+        self.request_queue = get_ai_request_queue(
+            max_concurrent=settings.ai_queue_max_concurrent,
+            max_wait_seconds=settings.ai_queue_max_wait_seconds,
+            batch_max_wait_seconds=settings.ai_queue_batch_max_wait_seconds,
+        )
 
         logger.info(f"✅ YandexCloudService инициализирован: модель {self.gpt_model}")
 
@@ -105,28 +117,23 @@ class YandexCloudService:
 
         return ""
 
-    def _parse_streaming_chunk(self, line: str):
+    def _parse_streaming_chunk(self, chunk_data: Any):
         """
-        Парсинг одного chunk из streaming ответа YandexGPT.
+        Извлечь текст из одного события streaming ответа YandexGPT.
 
         Args:
-            line: Строка из streaming ответа
+            chunk_data: Распарсенный JSON строки (NDJSONStreamDecoder)
 
         Yields:
             str: Извлеченный текст из chunk
         """
-        # YandexGPT streaming может возвращать в разных форматах
-        # Вариант 1: JSON chunk напрямую
-        # Вариант 2: SSE формат "data: {...}"
         try:
-            # Убираем префикс "data: " если есть (SSE формат)
-            json_line = line[6:] if line.startswith("data: ") else line
-            chunk_data = json.loads(json_line)
-
             # Извлекаем текст из chunk
             # Формат может быть:
             # {"result": {"alternatives": [{"message": {"text": "chunk"}}]}}
             # или {"alternatives": [{"message": {"text": "chunk"}}]}
+            if not isinstance(chunk_data, dict):
+                return
             result = chunk_data.get("result", chunk_data)
             if not isinstance(result, dict):
                 return
@@ -147,10 +154,8 @@ class YandexCloudService:
                 if text and isinstance(text, str):
                     yield text
 
-        except json.JSONDecodeError:
-            logger.debug(f"⚠️ Пропущен не-JSON chunk: {line[:100]}")
         except Exception as e:
-            logger.debug(f"⚠️ Ошибка парсинга chunk: {e}, line: {line[:100]}")
+            logger.debug(f"⚠️ Ошибка парсинга chunk: {e}")
 
     def _extract_text_from_vision_result(self, vision_result: dict[str, Any]) -> str:
         """
@@ -304,11 +309,11 @@ class YandexCloudService:
                 result = response.json()
                 return result
 
-            # Выполняем запрос через Circuit Breaker + очередь
+            # Очередь снаружи Circuit Breaker: отказ по max_wait не считается сбоем API
             async def _cb_request():
-                return await self.request_queue.process(_execute_request)
+                return await yandex_gpt_circuit.call(_execute_request)
 
-            result = await yandex_gpt_circuit.call(_cb_request)
+            result = await self.request_queue.process(_cb_request, priority=RequestPriority.CHAT)
 
             # Извлекаем ответ
             ai_response = result["result"]["alternatives"][0]["message"]["text"]
@@ -318,7 +323,10 @@ class YandexCloudService:
 
         except CircuitOpenError as e:
             logger.warning(f"⚡ YandexGPT Circuit Breaker: {e}")
-            return "Сервис временно перегружен. Попробуй через минуту 🐼"
+            return SERVICE_OVERLOADED_MESSAGE
+        except AIQueueTimeoutError as e:
+            logger.warning(f"⏳ YandexGPT: {e}")
+            return SERVICE_OVERLOADED_MESSAGE
         except httpx.HTTPStatusError as e:
             logger.error(f"❌ Ошибка YandexGPT API (HTTP {e.response.status_code}): {e}")
             if e.response is not None:
@@ -443,32 +451,28 @@ class YandexCloudService:
                         response.raise_for_status()
                         return  # Не должно достичь сюда, но на всякий случай
 
-                    buffer = ""
+                    # Строки режутся по байтам, UTF-8 декодируется целыми строками:
+                    # символы на границе сетевых чанков не теряются
+                    decoder = NDJSONStreamDecoder()
                     async for chunk_bytes in response.aiter_bytes():
-                        # Декодируем байты в строку
-                        try:
-                            buffer += chunk_bytes.decode("utf-8", errors="ignore")
-                        except UnicodeDecodeError:
-                            continue
-
-                        # Обрабатываем все полные строки из буфера
-                        while "\n" in buffer:
-                            line, buffer = buffer.split("\n", 1)
-                            line = line.strip()
-
-                            if not line:
-                                continue
-
-                            # Обрабатываем chunk через отдельный метод
-                            for text_chunk in self._parse_streaming_chunk(line):
+                        for event in decoder.feed(chunk_bytes):
+                            for text_chunk in self._parse_streaming_chunk(event):
                                 yield text_chunk
+                    for event in decoder.close():
+                        for text_chunk in self._parse_streaming_chunk(event):
+                            yield text_chunk
 
-            # Выполняем streaming запрос через очередь
-            async for chunk in self.request_queue.process_stream(_execute_streaming_request):
+            # Выполняем streaming запрос через очередь (высший приоритет — живой чат)
+            async for chunk in self.request_queue.process_stream(
+                _execute_streaming_request, priority=RequestPriority.INTERACTIVE_STREAM
+            ):
                 yield chunk
 
             logger.info("✅ YandexGPT streaming завершен")
 
+        except AIQueueTimeoutError as e:
+            logger.warning(f"⏳ YandexGPT streaming: {e}")
+            raise
         except httpx.HTTPStatusError as e:
             logger.error(f"❌ Ошибка YandexGPT streaming API (HTTP {e.response.status_code}): {e}")
             # Для streaming response нельзя просто так читать .text
@@ -537,11 +541,11 @@ class YandexCloudService:
                 response.raise_for_status()
                 return response.json()
 
-            # Выполняем запрос через Circuit Breaker + очередь
+            # Очередь снаружи Circuit Breaker: отказ по max_wait не считается сбоем API
             async def _cb_request():
-                return await self.request_queue.process(_execute_request)
+                return await yandex_stt_circuit.call(_execute_request)
 
-            result = await yandex_stt_circuit.call(_cb_request)
+            result = await self.request_queue.process(_cb_request, priority=RequestPriority.CHAT)
 
             # Извлекаем текст
             recognized_text = result.get("result", "")
@@ -552,6 +556,9 @@ class YandexCloudService:
         except CircuitOpenError as e:
             logger.warning(f"⚡ SpeechKit Circuit Breaker: {e}")
             raise
+        except AIQueueTimeoutError as e:
+            logger.warning(f"⏳ SpeechKit: {e}")
+            raise
         except httpx.HTTPStatusError as e:
             logger.error(f"❌ Ошибка SpeechKit STT (HTTP {e.response.status_code}): {e}")
             raise
@@ -583,14 +590,25 @@ class YandexCloudService:
         model = "text-search-query/latest" if text_type == "query" else "text-search-doc/latest"
         model_uri = f"emb://{self.folder_id}/{model}"
         payload = {"modelUri": model_uri, "text": text[:8000]}  # лимит API
-        try:
+
+        async def _execute_request():
             response = await self._client.post(
                 self.embedding_url,
                 headers=self.headers,
                 json=payload,
             )
             response.raise_for_status()
-            data = response.json()
+            return response.json()
+
+        try:
+            if text_type == "query":
+                # Эмбеддинг вопроса — на критическом пути RAG, мимо очереди
+                data = await _execute_request()
+            else:
+                # Индексация документов — фоновая задача, уступает слоты чату
+                data = await self.request_queue.process(
+                    _execute_request, priority=RequestPriority.BATCH
+                )
             embedding = data.get("embedding")
             if embedding and isinstance(embedding, list):
                 return [float(x) for x in embedding]
@@ -638,9 +656,11 @@ class YandexCloudService:
                 return response.json()
 
             async def _cb_request():
-                return await self.request_queue.process(_execute_request)
+                return await yandex_vision_circuit.call(_execute_request)
 
-            vision_result = await yandex_vision_circuit.call(_cb_request)
+            vision_result = await self.request_queue.process(
+                _cb_request, priority=RequestPriority.VISION
+            )
             return self._extract_text_from_vision_result(vision_result)
         except Exception as e:
             logger.warning(f"⚠️ Vision OCR (recognize_text) не удалось: {e}")
@@ -705,11 +725,13 @@ class YandexCloudService:
                 response.raise_for_status()
                 return response.json()
 
-            # Выполняем запрос через Circuit Breaker + очередь
+            # Очередь снаружи Circuit Breaker: отказ по max_wait не считается сбоем API
             async def _cb_request():
-                return await self.request_queue.process(_execute_request)
+                return await yandex_vision_circuit.call(_execute_request)
 
-            vision_result = await yandex_vision_circuit.call(_cb_request)
+            vision_result = await self.request_queue.process(
+                _cb_request, priority=RequestPriority.VISION
+            )
 
             logger.debug(f"📊 Vision API response keys: {list(vision_result.keys())}")
 
@@ -842,11 +864,13 @@ class YandexCloudService:
 Вопрос ученика: {user_question or "Помоги решить эти задачи"}
 """
 
-            gpt_analysis = await self.generate_text_response(
-                user_message=analysis_prompt,
-                system_prompt=system_prompt,
-                temperature=0.3,
-            )
+            # Разбор ДЗ по фото идёт классом vision, а не как обычный чат
+            with ai_request_context(priority=RequestPriority.VISION):
+                gpt_analysis = await self.generate_text_response(
+                    user_message=analysis_prompt,
+                    system_prompt=system_prompt,
+                    temperature=0.3,
+                )
 
             return {
                 "recognized_text": recognized_text,
@@ -13,6 +13,8 @@ import { queryKeys } from '../lib/queryClient';
 import { useQueryClient } from '@tanstack/react-query';
 import { telegram } from '../services/telegram';
 import { logger } from '../utils/logger';
+import { buildMediaForm } from '../utils/mediaUpload';
+import { DeltaStreamAssembler } from '../utils/streamDelta';
 import type { ChatMessage } from './useChat';
 
 interface UseChatStreamOptions {
@@ -76,19 +78,31 @@ export function useChatStream({ telegramId, limit = 20, onError }: UseChatStream
         // Отправляем запрос на streaming endpoint через POST (OWASP A01: initData обязателен)
         const languageCode = telegram.getUser()?.languageCode;
         const initData = telegram.getInitData();
-        const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+        const headers: Record<string, string> = {};
         if (initData) headers['X-Telegram-Init-Data'] = initData;
 
+        const fields = {
+          telegram_id: telegramId,
+          message,
+          language_code: languageCode || undefined,
+          // Только новый суффикс текста (event: delta) вместо кумулятивных chunk
+          stream_delta: true,
+        };
+
+        // С медиа — multipart с бинарными частями photo/audio (Content-Type с boundary
+        // выставляет браузер); текстовые сообщения — JSON
+        let body: BodyInit;
+        if (photoBase64 || audioBase64) {
+          body = buildMediaForm(fields, { photo: photoBase64, audio: audioBase64 });
+        } else {
+          headers['Content-Type'] = 'application/json';
+          body = JSON.stringify(fields);
+        }
+
         const response = await fetch(`${API_BASE_URL}/miniapp/ai/chat-stream`, {
           method: 'POST',
           headers,
-          body: JSON.stringify({
-            telegram_id: telegramId,
-            message,
-            photo_base64: photoBase64,
-            audio_base64: audioBase64,
-            ...(languageCode ? { language_code: languageCode } : {}),
-          }),
+          body,
         });
 
         if (!response.ok) {
@@ -105,6 +119,37 @@ export function useChatStream({ telegramId, limit = 20, onError }: UseChatStream
         }
 
         let buffer = '';
+        const deltaAssembler = new DeltaStreamAssembler();
+
+        // Показать накопленный текст ответа AI в последнем сообщении
+        const showStreamingText = (text: string) => {
+          currentResponseRef.current = text;
+          queryClient.setQueryData<ChatMessage[]>(
+            queryKeys.chatHistory(telegramId, limit),
+            (old) => {
+              if (!old) return old;
+              const updated = [...old];
+              const lastMessage = updated[updated.length - 1];
+
+              if (lastMessage && lastMessage.role === 'user') {
+                // Добавляем новое сообщение AI с накопленным текстом
+                updated.push({
+                  role: 'ai',
+                  content: text,
+                  timestamp: new Date().toISOString(),
+                });
+              } else if (lastMessage && lastMessage.role === 'ai') {
+                // Обновляем существующее сообщение AI
+                updated[updated.length - 1] = {
+                  ...lastMessage,
+                  content: text,
+                };
+              }
+
+              return updated;
+            }
+          );
+        };
 
         while (true) {
           const { done, value } = await reader.read();
@@ -154,38 +199,20 @@ export function useChatStream({ telegramId, limit = 20, onError }: UseChatStream
                   // Если текущий накопленный текст уже содержит начало chunk, значит это накопленный формат
                   if (currentResponseRef.current && chunkText.startsWith(currentResponseRef.current)) {
                     // Это накопленный текст - используем его напрямую
-                    currentResponseRef.current = chunkText;
+                    showStreamingText(chunkText);
                   } else {
                     // Это инкрементальный chunk - добавляем к накопленному
-                    currentResponseRef.current += chunkText;
+                    showStreamingText(currentResponseRef.current + chunkText);
                   }
-
-                  // Обновляем сообщение AI в кэше
-                  queryClient.setQueryData<ChatMessage[]>(
-                    queryKeys.chatHistory(telegramId, limit),
-                    (old) => {
-                      if (!old) return old;
-                      const updated = [...old];
-                      const lastMessage = updated[updated.length - 1];
-
-                      if (lastMessage && lastMessage.role === 'user') {
-                        // Добавляем новое сообщение AI с накопленным текстом
-                        updated.push({
-                          role: 'ai',
-                          content: currentResponseRef.current,
-                          timestamp: new Date().toISOString(),
-                        });
-                      } else if (lastMessage && lastMessage.role === 'ai') {
-                        // Обновляем существующее сообщение AI
-                        updated[updated.length - 1] = {
-                          ...lastMessage,
-                          content: currentResponseRef.current,
-                        };
-                      }
-
-                      return updated;
-                    }
-                  );
+                } else if (eventType === 'delta' && typeof data.d === 'string') {
+                  if (deltaAssembler.applyDelta(data)) {
+                    showStreamingText(deltaAssembler.text);
+                  }
+                } else if (eventType === 'resync' && typeof data.text === 'string') {
+                  deltaAssembler.applyResync(data);
+                  showStreamingText(deltaAssembler.text);
+                } else if (eventType === 'checksum') {
+                  deltaAssembler.verify(data);
                 } else if (eventType === 'video' && data.videoUrl) {
                   // Перерыв на бамбук: видео приходит первым, затем event: message с текстом «Продолжим?»
                   const videoUrl = data.videoUrl as string;
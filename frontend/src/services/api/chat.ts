@@ -74,7 +74,7 @@ export async function getChatHistory(
   }>
 > {
   const response = await fetch(
-    `${API_BASE_URL}/miniapp/chat/history/${telegramId}?limit=${limit}`,
+    `${API_BASE_URL}/miniapp/chat/history/${telegramId}?limit=${limit}&include=media`,
     { headers: getAuthHeaders() }
   );
 
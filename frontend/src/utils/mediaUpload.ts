@@ -0,0 +1,39 @@
+/**
+ * Бинарная отправка медиа (multipart/form-data) вместо base64 в JSON.
+ *
+ * Фото и голосовые приходят из FileReader как data URL. В JSON они уходят
+ * строкой, раздутой base64 в 1.33 раза, и сервер буферизует тело целиком.
+ * В multipart части photo/audio передаются исходными байтами.
+ */
+
+/** Data URL (или «голая» base64-строка) → Blob */
+export function dataUrlToBlob(dataUrl: string, fallbackType: string): Blob {
+  const commaIndex = dataUrl.indexOf(',');
+  const header = dataUrl.startsWith('data:') && commaIndex > 0 ? dataUrl.slice(5, commaIndex) : '';
+  const base64 = header ? dataUrl.slice(commaIndex + 1) : dataUrl;
+  const type = header.split(';')[0] || fallbackType;
+
+  const binary = atob(base64);
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  return new Blob([bytes], { type });
+}
+
+/**
+ * Тело запроса к AI чату: FormData с частями photo/audio, если приложено медиа.
+ * Текстовые поля передаются строками; undefined пропускаются.
+ */
+export function buildMediaForm(
+  fields: Record<string, string | number | boolean | undefined>,
+  media: { photo?: string; audio?: string }
+): FormData {
+  const form = new FormData();
+  for (const [name, value] of Object.entries(fields)) {
+    if (value !== undefined) form.append(name, String(value));
+  }
+  if (media.photo) form.append('photo', dataUrlToBlob(media.photo, 'image/jpeg'), 'photo');
+  if (media.audio) form.append('audio', dataUrlToBlob(media.audio, 'audio/webm'), 'audio');
+  return form;
+}
@@ -0,0 +1,67 @@
+/**
+ * Сборка текста ответа AI из delta-событий SSE (stream_delta=true).
+ *
+ * Сервер шлёт только новый суффикс (event: delta) с порядковым номером seq,
+ * периодически — контрольную сумму (event: checksum), а при расхождении —
+ * весь текст (event: resync). При пропуске seq или несовпадении checksum
+ * дельты игнорируются до resync / event: final.
+ */
+
+let crcTable: Uint32Array | null = null;
+
+function getCrcTable(): Uint32Array {
+  if (crcTable) return crcTable;
+  crcTable = new Uint32Array(256);
+  for (let n = 0; n < 256; n++) {
+    let c = n;
+    for (let k = 0; k < 8; k++) {
+      c = c & 1 ? 0xedb88320 ^ (c >>> 1) : c >>> 1;
+    }
+    crcTable[n] = c >>> 0;
+  }
+  return crcTable;
+}
+
+/** CRC32 от UTF-8 байтов строки (как zlib.crc32 на сервере) */
+export function crc32(text: string): number {
+  const table = getCrcTable();
+  const bytes = new TextEncoder().encode(text);
+  let crc = 0xffffffff;
+  for (let i = 0; i < bytes.length; i++) {
+    crc = table[(crc ^ bytes[i]) & 0xff] ^ (crc >>> 8);
+  }
+  return (crc ^ 0xffffffff) >>> 0;
+}
+
+export class DeltaStreamAssembler {
+  text = '';
+  private seq = 0;
+  private inSync = true;
+
+  /** Применить delta-событие; возвращает true, если текст изменился */
+  applyDelta(data: { seq: number; d: string }): boolean {
+    if (!this.inSync || data.seq !== this.seq + 1) {
+      this.inSync = false;
+      return false;
+    }
+    this.seq = data.seq;
+    this.text += data.d;
+    return true;
+  }
+
+  /** Полная замена текста (event: resync) */
+  applyResync(data: { seq: number; text: string }): boolean {
+    this.seq = data.seq;
+    this.text = data.text;
+    this.inSync = true;
+    return true;
+  }
+
+  /** Проверка контрольной суммы (event: checksum) */
+  verify(data: { seq: number; len: number; crc32: number }): void {
+    if (!this.inSync || data.seq !== this.seq) return;
+    if (this.text.length !== data.len || crc32(this.text) !== data.crc32) {
+      this.inSync = false;
+    }
+  }
+}
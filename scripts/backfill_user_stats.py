@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Заполнение агрегата user_stats (статистика для достижений) из истории.
+
+Для каждого пользователя без строки user_stats она строится из chat_history
+и game_stats; дальше агрегат обновляется инкрементально при каждой записи.
+Без скрипта строки создаются лениво при первом обращении, скрипт снимает
+полный проход по истории с горячего пути. Повторный запуск безопасен.
+
+--rebuild пересчитывает и существующие строки (после ручных правок истории);
+запускать вне пиковой нагрузки: запись, пришедшая во время пересчёта
+пользователя, может не попасть в агрегат.
+
+Запуск:
+    python scripts/backfill_user_stats.py [--batch-size 200] [--rebuild] [--dry-run]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import select  # noqa: E402
+
+from bot.database import get_db  # noqa: E402
+from bot.models import User, UserStats  # noqa: E402
+from bot.services.user_stats_service import UserStatsService  # noqa: E402
+
+
+def backfill(batch_size: int, rebuild: bool, dry_run: bool) -> int:
+    """
+    Построить агрегаты пачками пользователей по telegram_id (keyset, без OFFSET).
+
+    Каждая пачка — отдельная транзакция: прерванный запуск можно повторить.
+
+    Returns:
+        int: Сколько строк построено (или было бы построено при --dry-run)
+    """
+    processed = 0
+    last_id = 0
+
+    while True:
+        with get_db() as db:
+            stmt = (
+                select(User.telegram_id)
+                .where(User.telegram_id > last_id)
+                .order_by(User.telegram_id)
+                .limit(batch_size)
+            )
+            if not rebuild:
+                stmt = stmt.outerjoin(
+                    UserStats, UserStats.user_telegram_id == User.telegram_id
+                ).where(UserStats.user_telegram_id.is_(None))
+            telegram_ids = db.scalars(stmt).all()
+            if not telegram_ids:
+                break
+
+            service = UserStatsService(db)
+            for telegram_id in telegram_ids:
+                if not dry_run:
+                    if rebuild:
+                        service.rebuild(telegram_id)
+                    else:
+                        service.get(telegram_id)
+                processed += 1
+            last_id = telegram_ids[-1]
+
+        print(f"📊 Обработано до telegram_id={last_id}: {processed}")
+
+    return processed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=200, help="Пользователей за транзакцию")
+    parser.add_argument(
+        "--rebuild", action="store_true", help="Пересчитать и уже существующие строки"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Только посчитать пользователей, ничего не менять"
+    )
+    args = parser.parse_args()
+
+    processed = backfill(args.batch_size, args.rebuild, args.dry_run)
+    action = "Найдено для заполнения" if args.dry_run else "Заполнено"
+    print(f"✅ {action}: {processed}")
+
+
+if __name__ == "__main__":
+    main()
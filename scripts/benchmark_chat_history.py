@@ -0,0 +1,145 @@
+"""
+Бенчмарк ChatHistoryService на пользователе с большой историей.
+
+Сравнивает прежнюю реализацию (после каждого add_message выборка всех
+сообщений пользователя, подсчёт через len() загруженных строк, очистка
+удалением по одной) с set-based SQL: add_exchange одним flush,
+COUNT(*), DELETE ... WHERE. Работает на временной SQLite-БД.
+
+Пример:
+    python scripts/benchmark_chat_history.py --messages 50000 --turns 20
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy import create_engine, desc, insert, select  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from bot.models import Base, ChatHistory, User  # noqa: E402
+from bot.services.history_service import ChatHistoryService  # noqa: E402
+
+TELEGRAM_ID = 123456
+
+
+def _seed(session: Session, messages: int) -> None:
+    """Пользователь с messages сообщениями (пакетные INSERT)."""
+    session.add(User(telegram_id=TELEGRAM_ID, username="bench", first_name="Bench"))
+    session.flush()
+    batch = 5000
+    for start in range(0, messages, batch):
+        session.execute(
+            insert(ChatHistory),
+            [
+                {
+                    "user_telegram_id": TELEGRAM_ID,
+                    "message_text": f"Сообщение {i}: объясни, как решать уравнения",
+                    "message_type": "user" if i % 2 == 0 else "ai",
+                }
+                for i in range(start, min(start + batch, messages))
+            ],
+        )
+    session.commit()
+
+
+def _legacy_add_message(session: Session, text: str, message_type: str) -> None:
+    """Прежний add_message: INSERT + выборка всей истории (_cleanup_old_messages)."""
+    session.add(
+        ChatHistory(user_telegram_id=TELEGRAM_ID, message_text=text, message_type=message_type)
+    )
+    session.flush()
+    stmt = (
+        select(ChatHistory)
+        .where(ChatHistory.user_telegram_id == TELEGRAM_ID)
+        .order_by(desc(ChatHistory.timestamp))
+    )
+    len(session.execute(stmt).scalars().all())
+
+
+def _legacy_turn(session: Session) -> None:
+    _legacy_add_message(session, "Вопрос", "user")
+    _legacy_add_message(session, "Ответ", "ai")
+    session.commit()
+    session.expunge_all()
+
+
+def _new_turn(session: Session) -> None:
+    ChatHistoryService(session).add_exchange(TELEGRAM_ID, "Вопрос", "Ответ")
+    session.commit()
+    session.expunge_all()
+
+
+def _legacy_count(session: Session) -> int:
+    stmt = select(ChatHistory).where(ChatHistory.user_telegram_id == TELEGRAM_ID)
+    count = len(session.execute(stmt).scalars().all())
+    session.expunge_all()
+    return count
+
+
+def _new_count(session: Session) -> int:
+    return ChatHistoryService(session).get_message_count(TELEGRAM_ID)
+
+
+def _measure(fn, session: Session, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn(session)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def _measure_clear(session: Session, legacy: bool) -> float:
+    started = time.perf_counter()
+    if legacy:
+        stmt = select(ChatHistory).where(ChatHistory.user_telegram_id == TELEGRAM_ID)
+        for msg in session.execute(stmt).scalars().all():
+            session.delete(msg)
+    else:
+        ChatHistoryService(session).clear_history(TELEGRAM_ID)
+    session.flush()
+    elapsed = (time.perf_counter() - started) * 1000
+    session.rollback()
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк ChatHistoryService")
+    parser.add_argument("--messages", type=int, default=50000, help="сообщений у пользователя")
+    parser.add_argument("--turns", type=int, default=20, help="замеров обмена вопрос/ответ")
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    try:
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            _seed(session, args.messages)
+            print(f"История пользователя: {args.messages} сообщений")
+
+            legacy_turn = _measure(_legacy_turn, session, args.turns)
+            new_turn = _measure(_new_turn, session, args.turns)
+            legacy_count = _measure(_legacy_count, session, args.turns)
+            new_count = _measure(_new_count, session, args.turns)
+            legacy_clear = _measure_clear(session, legacy=True)
+            new_clear = _measure_clear(session, legacy=False)
+
+        print(f"обмен (2 сообщения):  legacy {legacy_turn:9.2f} мс   new {new_turn:8.2f} мс")
+        print(f"подсчёт сообщений:    legacy {legacy_count:9.2f} мс   new {new_count:8.2f} мс")
+        print(f"очистка истории:      legacy {legacy_clear:9.2f} мс   new {new_clear:8.2f} мс")
+    finally:
+        engine.dispose()
+        os.close(db_fd)
+        os.unlink(db_path)
+
+
+if __name__ == "__main__":
+    main()
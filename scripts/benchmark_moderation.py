@@ -0,0 +1,178 @@
+"""
+Микро-бенчмарк стоимости модерации одного ответа AI.
+
+Сравнивает:
+- «до»: новый ContentModerationService() на каждый ответ (компиляция паттернов
+  и создание AdvancedModerationService при каждом вызове);
+- «после»: общий экземпляр из get_moderation_service().
+
+Второй замер — пропускная способность на потоке сообщений: прежний цикл
+«один regex на паттерн/тему + проверка учебных контекстов» против одного
+прохода KeywordAutomaton (вердикты обязаны совпадать).
+
+Пример:
+    python scripts/benchmark_moderation.py --iterations 200 --messages 10000
+"""
+
+import argparse
+import random
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from bot.config import FORBIDDEN_PATTERNS, settings  # noqa: E402
+from bot.services.moderation_service import (  # noqa: E402
+    ContentModerationService,
+    get_moderation_service,
+)
+
+SAMPLE_RESPONSES = [
+    "Площадь прямоугольника равна произведению длины на ширину: 5 × 3 = 15 см².",
+    "Волга — самая длинная река Европы, она впадает в Каспийское море.",
+    "Фотосинтез — процесс, при котором растение на свету превращает "
+    "углекислый газ и воду в глюкозу и кислород.",
+    "Великая Отечественная война началась 22 июня 1941 года.",
+    "Present Simple используется для регулярных действий: I go to school every day.",
+]
+
+# Фрагменты для потока «реальных» сообщений школьников (вопросы + ответы AI)
+MESSAGE_FRAGMENTS = SAMPLE_RESPONSES + [
+    "Помоги решить задачу: поезд ехал 3 часа со скоростью 60 км/ч.",
+    "Что такое кровеносная система и зачем нужна кровь?",
+    "Расскажи про Куликовскую битву, почему началась война?",
+    "Как правильно писать: «в течение» или «в течении»?",
+    "Hello! Can you explain the difference between much and many?",
+    "Объясни, как нож используют на уроке труда безопасно.",
+    "Почему небо голубое? Это связано с рассеянием света.",
+    "Сколько будет 2^10? Ответ: 1024.",
+]
+
+
+def _legacy_sanitize(service: ContentModerationService):
+    """Прежняя реализация sanitize_ai_response: отдельный regex на каждый паттерн и тему."""
+    profanity = re.compile(
+        "|".join(
+            rf"\b{re.escape(word)}\b" if word == "hell" else rf"\b{re.escape(word)}\w*\b"
+            for word in service._profanity_words
+        ),
+        re.IGNORECASE,
+    )
+    forbidden = [re.compile(rf"\b{re.escape(p)}\b", re.IGNORECASE) for p in FORBIDDEN_PATTERNS]
+    topics = [
+        re.compile(re.escape(topic), re.IGNORECASE)
+        for topic in settings.get_forbidden_topics_list()
+    ]
+
+    def sanitize(text: str) -> bool:
+        normalized = text.strip().lower()
+        if profanity.search(normalized):
+            return False
+        if any(r.search(normalized) for r in forbidden) or any(
+            r.search(normalized) for r in topics
+        ):
+            return any(ctx in normalized for ctx in service.EDUCATIONAL_CONTEXTS)
+        return True
+
+    return sanitize
+
+
+def _make_messages(count: int) -> list[str]:
+    """Поток сообщений: 1–4 фрагмента, изредка с запрещённым паттерном."""
+    rng = random.Random(42)
+    patterns = sorted(FORBIDDEN_PATTERNS)
+    messages = []
+    for _ in range(count):
+        parts = rng.sample(MESSAGE_FRAGMENTS, rng.randint(1, 4))
+        if rng.random() < 0.05:
+            parts.insert(rng.randrange(len(parts) + 1), rng.choice(patterns))
+        messages.append(" ".join(parts))
+    return messages
+
+
+def _throughput(label: str, is_allowed, messages: list[str]) -> tuple[float, list[bool]]:
+    """Прогнать поток сообщений, вернуть время (с) и вердикты."""
+    started = time.perf_counter()
+    verdicts = [is_allowed(text) for text in messages]
+    elapsed = time.perf_counter() - started
+    print(
+        f"{label:<40} total={elapsed * 1000:>10.1f} мс  "
+        f"per_msg={elapsed / len(messages) * 1_000_000:>8.1f} мкс"
+    )
+    return elapsed, verdicts
+
+
+def _measure(label: str, moderate_once, iterations: int) -> list[float]:
+    """Замерить время модерации одного ответа (мкс)."""
+    timings = []
+    for i in range(iterations):
+        text = SAMPLE_RESPONSES[i % len(SAMPLE_RESPONSES)]
+        started = time.perf_counter()
+        moderate_once(text)
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    print(
+        f"{label:<40} median={statistics.median(timings):>10.1f} мкс  "
+        f"p95={sorted(timings)[int(len(timings) * 0.95) - 1]:>10.1f} мкс"
+    )
+    return timings
+
+
+def main() -> int:
+    """Запустить бенчмарк и вывести ускорение."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200, help="Число ответов")
+    parser.add_argument("--messages", type=int, default=10_000, help="Размер потока сообщений")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("МОДЕРАЦИЯ ОДНОГО ОТВЕТА AI (sanitize_ai_response)")
+    print("=" * 80)
+
+    before = _measure(
+        "новый экземпляр на каждый ответ",
+        lambda text: ContentModerationService().sanitize_ai_response(text),
+        args.iterations,
+    )
+    get_moderation_service()  # прогрев: компиляция один раз при старте
+    after = _measure(
+        "общий экземпляр get_moderation_service()",
+        lambda text: get_moderation_service().sanitize_ai_response(text),
+        args.iterations,
+    )
+
+    speedup = statistics.median(before) / max(statistics.median(after), 1e-9)
+    print("-" * 80)
+    print(f"Ускорение (по медиане): x{speedup:.1f}")
+
+    print()
+    print("=" * 80)
+    print(f"ПОТОК ИЗ {args.messages} СООБЩЕНИЙ: regex-цикл vs KeywordAutomaton")
+    print("=" * 80)
+
+    service = get_moderation_service()
+    messages = _make_messages(args.messages)
+    legacy_time, legacy_verdicts = _throughput(
+        "regex на каждый паттерн", _legacy_sanitize(service), messages
+    )
+    automaton_time, automaton_verdicts = _throughput(
+        "один проход KeywordAutomaton",
+        lambda text: service.sanitize_ai_response(text) == text,
+        messages,
+    )
+
+    print("-" * 80)
+    if legacy_verdicts != automaton_verdicts:
+        print("❌ Вердикты регекс-цикла и автомата расходятся")
+        return 1
+    blocked = automaton_verdicts.count(False)
+    print(f"Вердикты совпадают (заблокировано: {blocked})")
+    print(f"Ускорение: x{legacy_time / max(automaton_time, 1e-9):.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
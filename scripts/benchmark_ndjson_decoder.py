@@ -0,0 +1,107 @@
+"""
+Бенчмарк разбора streaming-ответа YandexGPT.
+
+Сравнивает прежний цикл (``chunk.decode(errors="ignore")`` +
+``buffer.split("\\n", 1)`` на каждую строку) с NDJSONStreamDecoder на
+синтетическом кумулятивном ответе, нарезанном на случайные сетевые чанки.
+Заодно проверяет, что новый декодер не теряет символы на границах чанков.
+
+Пример:
+    python scripts/benchmark_ndjson_decoder.py --chars 8000 --runs 20
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from bot.services.ndjson_decoder import NDJSONStreamDecoder  # noqa: E402
+
+WORDS = "Фотосинтез — процесс, при котором растение на свету превращает углекислый газ".split()
+
+
+def _build_stream(chars: int, rng: random.Random) -> tuple[bytes, str]:
+    """Кумулятивный NDJSON-ответ (как у YandexGPT) и итоговый текст."""
+    text = ""
+    lines = []
+    while len(text) < chars:
+        text += rng.choice(WORDS) + " "
+        event = {"result": {"alternatives": [{"message": {"text": text}}]}}
+        lines.append(json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n")
+    return b"".join(lines), text
+
+
+def _chunks(data: bytes, rng: random.Random) -> list[bytes]:
+    chunks, pos = [], 0
+    while pos < len(data):
+        size = rng.randint(512, 4096)
+        chunks.append(data[pos : pos + size])
+        pos += size
+    return chunks
+
+
+def _legacy(chunks: list[bytes]) -> str:
+    last = ""
+    buffer = ""
+    for chunk_bytes in chunks:
+        buffer += chunk_bytes.decode("utf-8", errors="ignore")
+        while "\n" in buffer:
+            line, buffer = buffer.split("\n", 1)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                last = json.loads(line)["result"]["alternatives"][0]["message"]["text"]
+            except (json.JSONDecodeError, KeyError):
+                continue
+    return last
+
+
+def _decoder(chunks: list[bytes]) -> str:
+    last = ""
+    decoder = NDJSONStreamDecoder()
+    for chunk_bytes in chunks:
+        for event in decoder.feed(chunk_bytes):
+            last = event["result"]["alternatives"][0]["message"]["text"]
+    return last
+
+
+def _measure(fn, chunks: list[bytes], runs: int) -> tuple[float, str]:
+    timings, result = [], ""
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn(chunks)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора NDJSON-стрима YandexGPT")
+    parser.add_argument("--chars", type=int, default=8000, help="длина итогового ответа")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    data, expected = _build_stream(args.chars, rng)
+    chunks = _chunks(data, rng)
+    print(f"Поток: {len(data) / 1024:.0f} KiB, {len(chunks)} сетевых чанков")
+
+    legacy_ms, legacy_text = _measure(_legacy, chunks, args.runs)
+    decoder_ms, decoder_text = _measure(_decoder, chunks, args.runs)
+
+    mb = len(data) / 1024 / 1024
+    print(f"legacy split:  {legacy_ms:8.2f} мс  ({mb / legacy_ms * 1000:7.1f} MiB/s)")
+    print(f"bytearray:     {decoder_ms:8.2f} мс  ({mb / decoder_ms * 1000:7.1f} MiB/s)")
+    print(f"legacy потерял символов:  {len(expected) - len(legacy_text)}")
+    print(f"decoder совпал с эталоном: {decoder_text == expected}")
+
+
+if __name__ == "__main__":
+    main()
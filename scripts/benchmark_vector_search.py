@@ -0,0 +1,135 @@
+"""
+Бенчмарк recall/задержки ANN-поиска pgvector на синтетической таблице.
+
+Создаёт временную таблицу vector_bench (по умолчанию 100k строк vector(256),
+как knowledge_embeddings), строит HNSW-индекс и сравнивает:
+- точный поиск (seq scan, эталон для recall);
+- HNSW при нескольких значениях hnsw.ef_search.
+
+Запрос тот же, что в VectorSearchService.search: ORDER BY + LIMIT внутри,
+порог сходства во внешнем запросе. Таблица удаляется после замера.
+
+Пример:
+    python scripts/benchmark_vector_search.py --rows 100000 --queries 50 --ef 20 40 100 200
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy import text  # noqa: E402
+
+from bot.database import engine  # noqa: E402
+
+DIM = 256
+
+_KNN_SQL = """
+    SELECT id FROM (
+        SELECT id, embedding <=> CAST(:vec AS vector) AS dist
+        FROM vector_bench
+        ORDER BY embedding <=> CAST(:vec AS vector)
+        LIMIT :limit
+    ) nearest
+    WHERE 1 - dist >= :th
+    ORDER BY dist
+"""
+
+
+def _random_vector(rng: random.Random) -> str:
+    return "[" + ",".join(f"{rng.uniform(-1, 1):.5f}" for _ in range(DIM)) + "]"
+
+
+def _create_table(conn, rows: int) -> None:
+    """Синтетическая таблица со случайными векторами и HNSW-индексом."""
+    conn.execute(text("DROP TABLE IF EXISTS vector_bench"))
+    conn.execute(text(f"CREATE TABLE vector_bench (id SERIAL PRIMARY KEY, embedding vector({DIM}))"))
+    conn.execute(
+        text(
+            f"""
+            INSERT INTO vector_bench (embedding)
+            SELECT (
+                SELECT array_agg(random() * 2 - 1)
+                FROM generate_series(1, {DIM})
+                WHERE g.i > 0
+            )::vector
+            FROM generate_series(1, :rows) AS g(i)
+            """
+        ),
+        {"rows": rows},
+    )
+    started = time.perf_counter()
+    conn.execute(
+        text(
+            """
+            CREATE INDEX vector_bench_hnsw_idx ON vector_bench
+            USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64)
+            """
+        )
+    )
+    conn.execute(text("ANALYZE vector_bench"))
+    print(f"HNSW build: {time.perf_counter() - started:.1f} с")
+
+
+def _run(conn, queries: list[str], top_k: int, exact: bool, ef_search: int = 40):
+    """Прогнать запросы; вернуть (id-результаты, задержки в мс)."""
+    results, latencies = [], []
+    for vec in queries:
+        with conn.begin():
+            if exact:
+                conn.execute(text("SET LOCAL enable_indexscan = off"))
+            else:
+                conn.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+            started = time.perf_counter()
+            rows = conn.execute(text(_KNN_SQL), {"vec": vec, "limit": top_k, "th": -1.0})
+            ids = [row[0] for row in rows]
+            latencies.append((time.perf_counter() - started) * 1000)
+        results.append(ids)
+    return results, latencies
+
+
+def _report(label: str, latencies: list[float], recall: float | None = None) -> None:
+    p95 = sorted(latencies)[int(len(latencies) * 0.95) - 1] if latencies else 0.0
+    recall_str = f"  recall@k={recall:.3f}" if recall is not None else ""
+    print(f"{label:<20} p50={statistics.median(latencies):7.2f} мс  p95={p95:7.2f} мс{recall_str}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк ANN-поиска pgvector")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--ef", type=int, nargs="+", default=[20, 40, 100, 200])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="не удалять vector_bench")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    queries = [_random_vector(rng) for _ in range(args.queries)]
+
+    with engine.connect() as conn:
+        with conn.begin():
+            print(f"Создаю vector_bench: {args.rows} строк × {DIM}...")
+            _create_table(conn, args.rows)
+        try:
+            exact, exact_latencies = _run(conn, queries, args.top_k, exact=True)
+            _report("exact (seq scan)", exact_latencies)
+
+            for ef in args.ef:
+                approx, latencies = _run(conn, queries, args.top_k, exact=False, ef_search=ef)
+                hits = sum(len(set(a) & set(e)) for a, e in zip(approx, exact, strict=True))
+                total = sum(len(e) for e in exact) or 1
+                _report(f"hnsw ef_search={ef}", latencies, hits / total)
+        finally:
+            if not args.keep:
+                with conn.begin():
+                    conn.execute(text("DROP TABLE IF EXISTS vector_bench"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Перенос картинок истории чата из data URL в content-addressed хранилище.
+
+Строки chat_history с image_url = "data:image/...;base64,..." переписываются:
+байты картинки сохраняются в MEDIA_STORE_DIR, в image_url остаётся ссылка
+/media/<sha256>.<png|jpg>. Скрипт идемпотентен: уже перенесённые строки
+не выбираются, повторная запись одинаковых байтов ничего не пишет.
+
+Запуск (тот же MEDIA_STORE_DIR, что у веб-сервера):
+    python scripts/migrate_chat_images_to_media_store.py [--batch-size 200] [--dry-run]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import select, update  # noqa: E402
+
+from bot.database import get_db  # noqa: E402
+from bot.models import ChatHistory  # noqa: E402
+from bot.services.media_store import get_media_store  # noqa: E402
+
+
+def migrate(batch_size: int, dry_run: bool) -> tuple[int, int]:
+    """
+    Переписать data URL пачками по id (keyset, без OFFSET).
+
+    Каждая пачка — отдельная транзакция: прерванный запуск можно повторить.
+
+    Returns:
+        tuple: (перенесено строк, пропущено битых data URL)
+    """
+    store = get_media_store()
+    migrated = skipped = 0
+    last_id = 0
+
+    while True:
+        with get_db() as db:
+            rows = db.execute(
+                select(ChatHistory.id, ChatHistory.image_url)
+                .where(ChatHistory.id > last_id, ChatHistory.image_url.like("data:%"))
+                .order_by(ChatHistory.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+
+            for row_id, data_url in rows:
+                if dry_run:
+                    migrated += 1
+                    continue
+                media_url = store.put_data_url(data_url)
+                if media_url is None:
+                    skipped += 1
+                    print(f"⚠️ id={row_id}: не удалось разобрать data URL, строка пропущена")
+                    continue
+                db.execute(
+                    update(ChatHistory).where(ChatHistory.id == row_id).values(image_url=media_url)
+                )
+                migrated += 1
+            last_id = rows[-1].id
+
+        print(f"📦 Обработано до id={last_id}: перенесено {migrated}, пропущено {skipped}")
+
+    return migrated, skipped
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=200, help="Строк за транзакцию")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Только посчитать строки, ничего не менять"
+    )
+    args = parser.parse_args()
+
+    migrated, skipped = migrate(args.batch_size, args.dry_run)
+    action = "Найдено для переноса" if args.dry_run else "Перенесено"
+    print(f"✅ {action}: {migrated}, пропущено: {skipped}")
+
+
+if __name__ == "__main__":
+    main()
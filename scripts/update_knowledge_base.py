@@ -10,8 +10,10 @@
 
 Пример:
     python scripts/update_knowledge_base.py
+    python scripts/update_knowledge_base.py --concurrency 16 --batch-size 200
 """
 
+import argparse
 import asyncio
 import sys
 from pathlib import Path
@@ -24,12 +26,32 @@ from loguru import logger
 from bot.services.knowledge_service import get_knowledge_service
 
 
-async def main():
+def _progress_reporter(step_percent: int = 10):
+    """Колбэк progress(готово, всего): пишет в лог каждые step_percent процентов."""
+    last_logged = -1
+
+    def report(done: int, total: int) -> None:
+        nonlocal last_logged
+        percent = done * 100 // total if total else 100
+        bucket = percent // step_percent
+        if bucket != last_logged or done == total:
+            last_logged = bucket
+            logger.info(f"  📐 Эмбеддинги: {done}/{total} ({percent}%)")
+
+    return report
+
+
+async def main(concurrency: int = 8, batch_size: int = 100):
     """
     Обновить базу знаний из веб-источников и наполнить knowledge_embeddings.
 
     Загружает материалы с nsportal.ru и school203.spb.ru,
-    индексирует в pgvector для RAG.
+    индексирует в pgvector для RAG пакетно: параллельные эмбеддинги
+    и multi-row upsert.
+
+    Args:
+        concurrency: Максимум одновременных запросов к Embeddings API.
+        batch_size: Размер пачки для вставки в knowledge_embeddings.
     """
     logger.info("=" * 60)
     logger.info("🔄 ОБНОВЛЕНИЕ БАЗЫ ЗНАНИЙ + ИНДЕКСАЦИЯ В knowledge_embeddings")
@@ -39,7 +61,11 @@ async def main():
         knowledge_service = get_knowledge_service()
         knowledge_service.auto_update_enabled = True
 
-        await knowledge_service.update_knowledge_base()
+        index_stats = await knowledge_service.update_knowledge_base(
+            concurrency=concurrency,
+            batch_size=batch_size,
+            progress=_progress_reporter(),
+        )
         stats = knowledge_service.get_knowledge_stats()
 
         logger.info("\n📊 Скраплено:")
@@ -48,6 +74,12 @@ async def main():
 
         # update_knowledge_base() уже выполняет индексацию в knowledge_embeddings.
         # Здесь только показываем итоговую статистику, чтобы избежать двойной индексации.
+        if index_stats is not None:
+            logger.info(
+                f"\n📚 Индексация: всего {index_stats.total}, дублей {index_stats.duplicates}, "
+                f"без изменений {index_stats.unchanged}, записано {index_stats.written}, "
+                f"ошибок {index_stats.failed}"
+            )
         vec_stats = knowledge_service.vector_search.stats()
         logger.info(f"\n📐 Индексация в knowledge_embeddings: {vec_stats.get('indexed_count', 0)} записей")
 
@@ -61,4 +93,12 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Обновление базы знаний и индексация в pgvector")
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="параллельных запросов к Embeddings API"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=100, help="строк в одной пачке INSERT"
+    )
+    args = parser.parse_args()
+    asyncio.run(main(concurrency=args.concurrency, batch_size=args.batch_size))
@@ -29,6 +29,7 @@ def setup_api_routes(app: web.Application) -> None:
         ("bot.api.panda_pet_endpoints", "setup_panda_pet_routes", "🐼 Panda Pet API"),
         ("bot.api.premium_endpoints", "setup_premium_routes", "💰 Premium API"),
         ("bot.api.auth_endpoints", "setup_auth_routes", "🔐 Auth API"),
+        ("bot.api.media_endpoints", "setup_media_routes", "🖼️ Media"),
     ]
     for module_path, setup_func, route_name in route_configs:
         _register_api_route(app, module_path, setup_func, route_name)
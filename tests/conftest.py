@@ -39,6 +39,8 @@ if not os.environ.get("YOOKASSA_RETURN_URL"):
     os.environ.setdefault("YOOKASSA_RETURN_URL", "https://test.example.com/return")
 if not os.environ.get("YOOKASSA_INN"):
     os.environ.setdefault("YOOKASSA_INN", "123456789012")
+# Кэш ответов AI выключен: тесты с моками GPT проверяют промпт каждого вызова
+os.environ.setdefault("AI_ANSWER_CACHE_ENABLED", "false")
 
 # Добавляем корневую директорию в путь
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -190,3 +192,48 @@ def user_service(test_db):
     service.is_registered = Mock()
     service.deactivate_user = Mock()
     return service
+
+
+@pytest.fixture
+def async_db_for(monkeypatch):
+    """
+    Фабрика подмены get_async_db для тестов с синхронной SQLite-сессией.
+
+    Async-сессии открываются поверх того же файла БД (aiosqlite), поэтому
+    закоммиченные тестом данные видны обработчику, а его записи — тесту.
+    Сервисы, берущие сессию из bot.database (квоты AI запросов), получают
+    последнюю созданную подмену; синглтон квот пересоздаётся на каждый тест.
+    """
+    from contextlib import asynccontextmanager
+
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    import bot.database
+
+    original_get_async_db = bot.database.get_async_db
+    created = []
+
+    def factory(db):
+        url = db.get_bind().url.set(drivername="sqlite+aiosqlite")
+        engine = create_async_engine(url, poolclass=NullPool)
+
+        @asynccontextmanager
+        async def fake_get_async_db():
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                try:
+                    yield session
+                    await session.commit()
+                except Exception:
+                    await session.rollback()
+                    raise
+
+        created.append(fake_get_async_db)
+        return fake_get_async_db
+
+    def shared_get_async_db():
+        return (created[-1] if created else original_get_async_db)()
+
+    monkeypatch.setattr(bot.database, "get_async_db", shared_get_async_db)
+    monkeypatch.setattr("bot.services.request_quota._request_quota", None)
+    return factory
@@ -69,7 +69,7 @@ class TestCompleteUserJourney:
     @pytest.mark.e2e
     @pytest.mark.asyncio
     async def test_complete_user_journey_from_website_to_achievements(
-        self, real_db_session, has_yandex_keys
+        self, real_db_session, has_yandex_keys, async_db_for
     ):
         """
         КРИТИЧНО: Полный путь пользователя от сайта до получения достижений
@@ -227,10 +227,7 @@ class TestCompleteUserJourney:
                 ai_patch.start()
 
             # РЕАЛЬНАЯ БД, РЕАЛЬНАЯ геймификация
-            with patch("bot.api.miniapp.chat.get_db") as mock_get_db:
-                mock_get_db.return_value.__enter__.return_value = real_db_session
-                mock_get_db.return_value.__exit__.return_value = None
-
+            with patch("bot.api.miniapp.chat.get_async_db", async_db_for(real_db_session)):
                 # РЕАЛЬНАЯ модерация (используется автоматически в miniapp_ai_chat)
                 text_chat_response = await miniapp_ai_chat(text_chat_request)
                 assert text_chat_response.status == 200
@@ -295,15 +292,11 @@ class TestCompleteUserJourney:
                 ai_patch2.start()
 
             try:
+                async_db = async_db_for(real_db_session)
                 with (
-                    patch("bot.api.miniapp.chat.get_db") as mock_get_db,
-                    patch("bot.api.miniapp.helpers.get_db") as mock_helpers_db,
+                    patch("bot.api.miniapp.chat.get_async_db", async_db),
+                    patch("bot.api.miniapp.helpers.get_async_db", async_db),
                 ):
-                    mock_get_db.return_value.__enter__.return_value = real_db_session
-                    mock_get_db.return_value.__exit__.return_value = None
-                    mock_helpers_db.return_value.__enter__.return_value = real_db_session
-                    mock_helpers_db.return_value.__exit__.return_value = None
-
                     # РЕАЛЬНАЯ модерация (используется автоматически)
                     photo_chat_response = await miniapp_ai_chat(photo_chat_request)
                     assert photo_chat_response.status == 200
@@ -361,15 +354,11 @@ class TestCompleteUserJourney:
                 ai_patch3.start()
 
             try:
+                async_db = async_db_for(real_db_session)
                 with (
-                    patch("bot.api.miniapp.chat.get_db") as mock_get_db,
-                    patch("bot.api.miniapp.helpers.get_db") as mock_helpers_db,
+                    patch("bot.api.miniapp.chat.get_async_db", async_db),
+                    patch("bot.api.miniapp.helpers.get_async_db", async_db),
                 ):
-                    mock_get_db.return_value.__enter__.return_value = real_db_session
-                    mock_get_db.return_value.__exit__.return_value = None
-                    mock_helpers_db.return_value.__enter__.return_value = real_db_session
-                    mock_helpers_db.return_value.__exit__.return_value = None
-
                     # РЕАЛЬНАЯ модерация (используется автоматически)
                     audio_chat_response = await miniapp_ai_chat(audio_chat_request)
                     # Может быть 200 (успех) или 500 (ошибка API без ключей) - оба варианта OK для теста
@@ -180,7 +180,7 @@ class TestComprehensivePandaE2E:
     @pytest.mark.asyncio
     @pytest.mark.skipif(not REAL_API_KEY_AVAILABLE, reason="Требуется реальный Yandex API ключ")
     async def test_moderation_not_blocks_school_questions_e2e(
-        self, real_db_session, e2e_auth_patches
+        self, real_db_session, e2e_auth_patches, async_db_for
     ):
         """КРИТИЧНО: Модерация НЕ блокирует школьные вопросы через E2E."""
         telegram_id = 888999000
@@ -213,10 +213,7 @@ class TestComprehensivePandaE2E:
             # Также проверяем через E2E запрос (мокаем БД, но используем реальную модерацию)
             request = self.create_request({"telegram_id": telegram_id, "message": question})
 
-            with patch("bot.api.miniapp.chat.get_db") as mock_get_db:
-                mock_get_db.return_value.__enter__.return_value = real_db_session
-                mock_get_db.return_value.__exit__.return_value = None
-
+            with patch("bot.api.miniapp.chat.get_async_db", async_db_for(real_db_session)):
                 # Если нет ключей - мокаем AI, но модерация РЕАЛЬНАЯ
                 ai_patch = None
                 if not REAL_API_KEY_AVAILABLE:
@@ -253,7 +250,7 @@ class TestComprehensivePandaE2E:
     @pytest.mark.asyncio
     @pytest.mark.skipif(not REAL_API_KEY_AVAILABLE, reason="Требуется реальный Yandex API ключ")
     async def test_text_responses_all_subjects_detailed_e2e(
-        self, real_db_session, has_yandex_keys, e2e_auth_patches
+        self, real_db_session, has_yandex_keys, e2e_auth_patches, async_db_for
     ):
         """E2E: Текстовые ответы по ВСЕМ предметам должны быть развернутыми и подробными."""
         telegram_id = 777888999
@@ -300,10 +297,7 @@ class TestComprehensivePandaE2E:
 
             request = self.create_request({"telegram_id": telegram_id, "message": question})
 
-            with patch("bot.api.miniapp.chat.get_db") as mock_get_db:
-                mock_get_db.return_value.__enter__.return_value = real_db_session
-                mock_get_db.return_value.__exit__.return_value = None
-
+            with patch("bot.api.miniapp.chat.get_async_db", async_db_for(real_db_session)):
                 response = await miniapp_ai_chat(request)
                 assert response.status == 200, f"Запрос по {subject} должен быть успешным"
 
@@ -350,7 +344,7 @@ class TestComprehensivePandaE2E:
     @pytest.mark.asyncio
     @pytest.mark.skipif(not REAL_API_KEY_AVAILABLE, reason="Требуется реальный Yandex API ключ")
     async def test_visualizations_with_detailed_explanations_e2e(
-        self, real_db_session, has_yandex_keys, e2e_auth_patches
+        self, real_db_session, has_yandex_keys, e2e_auth_patches, async_db_for
     ):
         """E2E: Визуализации должны генерироваться + подробное пояснение."""
         telegram_id = 666777888
@@ -374,10 +368,7 @@ class TestComprehensivePandaE2E:
         for viz_type, question in test_cases:
             request = self.create_request({"telegram_id": telegram_id, "message": question})
 
-            with patch("bot.api.miniapp.chat.get_db") as mock_get_db:
-                mock_get_db.return_value.__enter__.return_value = real_db_session
-                mock_get_db.return_value.__exit__.return_value = None
-
+            with patch("bot.api.miniapp.chat.get_async_db", async_db_for(real_db_session)):
                 response = await miniapp_ai_chat(request)
                 assert response.status == 200, f"Запрос {viz_type} должен быть успешным"
 
@@ -427,7 +418,7 @@ class TestComprehensivePandaE2E:
     @pytest.mark.asyncio
     @pytest.mark.skipif(not REAL_API_KEY_AVAILABLE, reason="Требуется реальный Yandex API ключ")
     async def test_photo_processing_all_subjects_e2e(
-        self, real_db_session, has_yandex_keys, e2e_auth_patches
+        self, real_db_session, has_yandex_keys, e2e_auth_patches, async_db_for
     ):
         """E2E: Обработка фото по всем предметам - полная обработка."""
         telegram_id = 555666777
@@ -447,20 +438,12 @@ class TestComprehensivePandaE2E:
         ]
 
         results = {}
-        # Мокаем get_db везде где используется (helpers импортирует из bot.database, но используется внутри модуля)
-        # Нужно мокировать и bot.database.get_db (для helpers), и bot.api.miniapp.chat.get_db (для chat)
+        # chat и helpers открывают async-сессии: подменяем get_async_db в обоих модулях
+        async_db = async_db_for(real_db_session)
         with (
-            patch("bot.database.get_db") as mock_get_db_database,
-            patch("bot.api.miniapp.helpers.get_db") as mock_get_db_helpers,
-            patch("bot.api.miniapp.chat.get_db") as mock_get_db_chat,
+            patch("bot.api.miniapp.helpers.get_async_db", async_db),
+            patch("bot.api.miniapp.chat.get_async_db", async_db),
         ):
-            # Настраиваем моки - все должны возвращать нашу тестовую БД
-            mock_get_db_database.return_value.__enter__.return_value = real_db_session
-            mock_get_db_database.return_value.__exit__.return_value = None
-            mock_get_db_helpers.return_value.__enter__.return_value = real_db_session
-            mock_get_db_helpers.return_value.__exit__.return_value = None
-            mock_get_db_chat.return_value.__enter__.return_value = real_db_session
-            mock_get_db_chat.return_value.__exit__.return_value = None
 
             for subject, image_text in test_cases:
                 photo_base64 = self.create_image_with_text(image_text)
@@ -566,7 +549,7 @@ class TestComprehensivePandaE2E:
     @pytest.mark.asyncio
     @pytest.mark.skipif(not REAL_API_KEY_AVAILABLE, reason="Требуется реальный Yandex API ключ")
     async def test_complete_user_journey_with_all_features_e2e(
-        self, real_db_session, has_yandex_keys, e2e_auth_patches
+        self, real_db_session, has_yandex_keys, e2e_auth_patches, async_db_for
     ):
         """E2E: Полный путь пользователя со ВСЕМИ функциями - текст, фото, визуализации, ДЗ."""
         telegram_id = 333444555
@@ -586,10 +569,7 @@ class TestComprehensivePandaE2E:
             }
         )
 
-        with patch("bot.api.miniapp.chat.get_db") as mock_get_db:
-            mock_get_db.return_value.__enter__.return_value = real_db_session
-            mock_get_db.return_value.__exit__.return_value = None
-
+        with patch("bot.api.miniapp.chat.get_async_db", async_db_for(real_db_session)):
             text_response = await miniapp_ai_chat(text_request)
             assert text_response.status == 200
 
@@ -613,10 +593,7 @@ class TestComprehensivePandaE2E:
             }
         )
 
-        with patch("bot.api.miniapp.chat.get_db") as mock_get_db:
-            mock_get_db.return_value.__enter__.return_value = real_db_session
-            mock_get_db.return_value.__exit__.return_value = None
-
+        with patch("bot.api.miniapp.chat.get_async_db", async_db_for(real_db_session)):
             viz_response = await miniapp_ai_chat(viz_request)
             assert viz_response.status == 200
 
@@ -636,19 +613,12 @@ class TestComprehensivePandaE2E:
             }
         )
 
-        # Мокаем get_db везде где используется (chat, helpers, database)
+        # chat и helpers открывают async-сессии: подменяем get_async_db в обоих модулях
+        async_db = async_db_for(real_db_session)
         with (
-            patch("bot.database.get_db") as mock_get_db_database,
-            patch("bot.api.miniapp.helpers.get_db") as mock_get_db_helpers,
-            patch("bot.api.miniapp.chat.get_db") as mock_get_db_chat,
+            patch("bot.api.miniapp.helpers.get_async_db", async_db),
+            patch("bot.api.miniapp.chat.get_async_db", async_db),
         ):
-            mock_get_db_database.return_value.__enter__.return_value = real_db_session
-            mock_get_db_database.return_value.__exit__.return_value = None
-            mock_get_db_helpers.return_value.__enter__.return_value = real_db_session
-            mock_get_db_helpers.return_value.__exit__.return_value = None
-            mock_get_db_chat.return_value.__enter__.return_value = real_db_session
-            mock_get_db_chat.return_value.__exit__.return_value = None
-
             photo_response = await miniapp_ai_chat(photo_request)
             assert photo_response.status == 200
 
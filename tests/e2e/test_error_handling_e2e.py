@@ -84,7 +84,7 @@ class TestErrorHandlingE2E:
 
     @pytest.mark.e2e
     @pytest.mark.asyncio
-    async def test_yandex_gpt_error_handling(self, real_db_session, test_user):
+    async def test_yandex_gpt_error_handling(self, real_db_session, test_user, async_db_for):
         """
         КРИТИЧНО: Тест обработки ошибки YandexGPT
         Использует РЕАЛЬНУЮ БД, РЕАЛЬНУЮ модерацию
@@ -109,10 +109,7 @@ class TestErrorHandlingE2E:
 
         # Патчим проверку владельца (E2E без реального initData)
         with patch("bot.api.miniapp.chat.require_owner", return_value=None):
-            with patch("bot.api.miniapp.chat.get_db") as mock_get_db:
-                mock_get_db.return_value.__enter__.return_value = real_db_session
-                mock_get_db.return_value.__exit__.return_value = None
-
+            with patch("bot.api.miniapp.chat.get_async_db", async_db_for(real_db_session)):
                 with patch("bot.api.miniapp.chat.get_ai_service") as mock_ai_service:
                     mock_service = AsyncMock()
                     mock_service.generate_response = AsyncMock(
@@ -138,7 +135,7 @@ class TestErrorHandlingE2E:
 
     @pytest.mark.e2e
     @pytest.mark.asyncio
-    async def test_speechkit_error_fallback_to_text(self, real_db_session, test_user):
+    async def test_speechkit_error_fallback_to_text(self, real_db_session, test_user, async_db_for):
         """
         КРИТИЧНО: Тест обработки ошибки SpeechKit
         Использует РЕАЛЬНУЮ БД, РЕАЛЬНУЮ модерацию
@@ -160,10 +157,7 @@ class TestErrorHandlingE2E:
         )
 
         with patch("bot.api.miniapp.chat.require_owner", return_value=None):
-            with patch("bot.api.miniapp.chat.get_db") as mock_get_db:
-                mock_get_db.return_value.__enter__.return_value = real_db_session
-                mock_get_db.return_value.__exit__.return_value = None
-
+            with patch("bot.api.miniapp.chat.get_async_db", async_db_for(real_db_session)):
                 with patch("bot.api.miniapp.helpers.get_speech_service") as mock_get_speech:
                     mock_speech_service = AsyncMock()
                     mock_speech_service.transcribe_voice = AsyncMock(
@@ -184,7 +178,7 @@ class TestErrorHandlingE2E:
 
     @pytest.mark.e2e
     @pytest.mark.asyncio
-    async def test_vision_error_fallback_to_text(self, real_db_session, test_user):
+    async def test_vision_error_fallback_to_text(self, real_db_session, test_user, async_db_for):
         """
         КРИТИЧНО: Тест обработки ошибки Vision API
         Использует РЕАЛЬНУЮ БД, РЕАЛЬНУЮ модерацию
@@ -209,10 +203,7 @@ class TestErrorHandlingE2E:
         )
 
         with patch("bot.api.miniapp.chat.require_owner", return_value=None):
-            with patch("bot.api.miniapp.chat.get_db") as mock_get_db:
-                mock_get_db.return_value.__enter__.return_value = real_db_session
-                mock_get_db.return_value.__exit__.return_value = None
-
+            with patch("bot.api.miniapp.chat.get_async_db", async_db_for(real_db_session)):
                 with patch("bot.api.miniapp.helpers.VisionService") as mock_vision:
                     mock_vision_service = AsyncMock()
                     mock_vision_service.analyze_image = AsyncMock(
@@ -233,7 +224,7 @@ class TestErrorHandlingE2E:
 
     @pytest.mark.e2e
     @pytest.mark.asyncio
-    async def test_network_error_retry_and_message(self, real_db_session, test_user):
+    async def test_network_error_retry_and_message(self, real_db_session, test_user, async_db_for):
         """
         КРИТИЧНО: Тест обработки сетевых ошибок
         Использует РЕАЛЬНУЮ БД, РЕАЛЬНУЮ модерацию
@@ -257,10 +248,7 @@ class TestErrorHandlingE2E:
         )
 
         with patch("bot.api.miniapp.chat.require_owner", return_value=None):
-            with patch("bot.api.miniapp.chat.get_db") as mock_get_db:
-                mock_get_db.return_value.__enter__.return_value = real_db_session
-                mock_get_db.return_value.__exit__.return_value = None
-
+            with patch("bot.api.miniapp.chat.get_async_db", async_db_for(real_db_session)):
                 with patch("bot.api.miniapp.chat.get_ai_service") as mock_ai_service:
                     mock_service = AsyncMock()
                     import asyncio
@@ -287,7 +275,9 @@ class TestErrorHandlingE2E:
 
     @pytest.mark.e2e
     @pytest.mark.asyncio
-    async def test_multiple_errors_graceful_degradation(self, real_db_session, test_user):
+    async def test_multiple_errors_graceful_degradation(
+        self, real_db_session, test_user, async_db_for
+    ):
         """
         КРИТИЧНО: Тест graceful degradation при множественных ошибках
         Использует РЕАЛЬНУЮ БД, РЕАЛЬНУЮ модерацию
@@ -311,10 +301,7 @@ class TestErrorHandlingE2E:
         )
 
         with patch("bot.api.miniapp.chat.require_owner", return_value=None):
-            with patch("bot.api.miniapp.chat.get_db") as mock_get_db:
-                mock_get_db.return_value.__enter__.return_value = real_db_session
-                mock_get_db.return_value.__exit__.return_value = None
-
+            with patch("bot.api.miniapp.chat.get_async_db", async_db_for(real_db_session)):
                 with patch("bot.api.miniapp.chat.get_ai_service") as mock_ai_service:
                     mock_service = AsyncMock()
                     mock_service.generate_response = AsyncMock(
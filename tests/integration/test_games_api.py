@@ -5,14 +5,16 @@ Integration тесты для API игр
 
 import os
 import tempfile
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
 from unittest.mock import patch
 
 import pytest
 from aiohttp import web
 from aiohttp.test_utils import AioHTTPTestCase, unittest_run_loop
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 from bot.api.games_endpoints import setup_games_routes
 from bot.models import Base, User
@@ -28,6 +30,9 @@ class TestGamesAPI(AioHTTPTestCase):
         cls.engine = create_engine(f"sqlite:///{cls.db_path}", echo=False)
         Base.metadata.create_all(cls.engine)
         cls.SessionLocal = sessionmaker(bind=cls.engine)
+        cls.async_engine = create_async_engine(
+            f"sqlite+aiosqlite:///{cls.db_path}", poolclass=NullPool
+        )
 
     @classmethod
     def tearDownClass(cls):
@@ -41,7 +46,7 @@ class TestGamesAPI(AioHTTPTestCase):
 
     @contextmanager
     def mock_get_db(self):
-        """Мок для get_db() чтобы использовать тестовую БД"""
+        """Синхронная сессия тестовой БД (подготовка и очистка данных)"""
         db = self.SessionLocal()
         try:
             yield db
@@ -52,6 +57,17 @@ class TestGamesAPI(AioHTTPTestCase):
         finally:
             db.close()
 
+    @asynccontextmanager
+    async def mock_get_async_db(self):
+        """Мок для get_async_db() чтобы эндпоинты работали с тестовой БД"""
+        async with AsyncSession(self.async_engine, expire_on_commit=False) as db:
+            try:
+                yield db
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
     async def get_application(self):
         """Создать aiohttp приложение для тестов"""
         app = web.Application()
@@ -61,8 +77,10 @@ class TestGamesAPI(AioHTTPTestCase):
     async def setUpAsync(self):
         """Настройка перед каждым тестом"""
         await super().setUpAsync()
-        # Патчим get_db для использования тестовой БД
-        self.get_db_patcher = patch("bot.api.games_endpoints.get_db", self.mock_get_db)
+        # Патчим get_async_db для использования тестовой БД
+        self.get_db_patcher = patch(
+            "bot.api.games_endpoints.get_async_db", self.mock_get_async_db
+        )
         self.get_db_patcher.start()
         # A01: в этих тестах проверяем логику игр; владелец считается авторизованным
         self.require_owner_patcher = patch(
@@ -74,23 +74,16 @@ class TestPandaLazyMiniappReal:
         type(request).remote = property(lambda self: "127.0.0.1")
         return request
 
+    @pytest.fixture(autouse=True)
+    def _use_async_db_for(self, async_db_for):
+        """Фабрика подмены get_async_db (см. conftest)."""
+        self._async_db_for = async_db_for
+
     @contextmanager
     def _patch_db_and_auth(self, real_db_session):
-        """Патч get_db и require_owner для вызова реального handler с тестовой БД."""
-
-        def fake_get_db():
-            class Ctx:
-                def __enter__(self):
-                    return real_db_session
-
-                def __exit__(self, *args):
-                    real_db_session.commit()
-                    return None
-
-            return Ctx()
-
+        """Патч get_async_db и require_owner для вызова реального handler с тестовой БД."""
         with (
-            patch("bot.api.miniapp.chat.get_db", fake_get_db),
+            patch("bot.api.miniapp.chat.get_async_db", self._async_db_for(real_db_session)),
             patch("bot.api.miniapp.chat.require_owner", return_value=None),
         ):
             yield
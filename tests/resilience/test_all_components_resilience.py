@@ -204,9 +204,8 @@ class TestAllComponentsResilience:
     # Rate Limiting Resilience
 
     @pytest.mark.asyncio
-    async def test_rate_limiting_under_attack(self, real_db_session):
+    async def test_rate_limiting_under_attack(self, real_db_session, async_db_for):
         """Тест: Rate limiting при DDoS атаке"""
-        from contextlib import contextmanager
         from unittest.mock import patch
 
         from bot.services import UserService
@@ -219,11 +218,7 @@ class TestAllComponentsResilience:
         )
         real_db_session.commit()
 
-        @contextmanager
-        def mock_get_db():
-            yield real_db_session
-
-        with patch("bot.api.miniapp.chat.get_db", mock_get_db):
+        with patch("bot.api.miniapp.chat.get_async_db", async_db_for(real_db_session)):
             with patch("bot.api.miniapp.chat.require_owner", return_value=None):
                 class MockRequest:
                     method = "POST"
@@ -281,16 +276,11 @@ class TestAllComponentsResilience:
             )
 
     @pytest.mark.asyncio
-    async def test_malformed_api_request(self, real_db_session):
+    async def test_malformed_api_request(self, real_db_session, async_db_for):
         """Тест: Обработка некорректного API запроса"""
-        from contextlib import contextmanager
         from unittest.mock import patch
 
-        @contextmanager
-        def mock_get_db():
-            yield real_db_session
-
-        with patch("bot.api.miniapp.chat.get_db", mock_get_db):
+        with patch("bot.api.miniapp.chat.get_async_db", async_db_for(real_db_session)):
             with patch("bot.api.miniapp.chat.require_owner", return_value=None):
                 class MockRequest:
                     method = "POST"
@@ -325,9 +315,8 @@ class TestAllComponentsResilience:
                 # Не должно быть необработанных исключений
 
     @pytest.mark.asyncio
-    async def test_partial_service_failure(self, real_db_session):
+    async def test_partial_service_failure(self, real_db_session, async_db_for):
         """Тест: Частичный отказ сервиса (БД работает, AI нет)"""
-        from contextlib import contextmanager
         from unittest.mock import patch
 
         from bot.services import UserService
@@ -340,11 +329,7 @@ class TestAllComponentsResilience:
         )
         real_db_session.commit()
 
-        @contextmanager
-        def mock_get_db():
-            yield real_db_session
-
-        with patch("bot.api.miniapp.chat.get_db", mock_get_db):
+        with patch("bot.api.miniapp.chat.get_async_db", async_db_for(real_db_session)):
             with patch("bot.api.miniapp.chat.require_owner", return_value=None):
                 # AI сервис недоступен
                 with patch(
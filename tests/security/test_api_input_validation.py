@@ -107,7 +107,7 @@ class TestAPIInputValidation:
                 assert response.status == 400, f"Должна быть ошибка 400 для {invalid_data}"
 
     @pytest.mark.asyncio
-    async def test_special_characters_in_message(self, real_db_session, test_user):
+    async def test_special_characters_in_message(self, real_db_session, test_user, async_db_for):
         """Тест: специальные символы в сообщении должны обрабатываться корректно"""
         from unittest.mock import patch
 
@@ -131,10 +131,7 @@ class TestAPIInputValidation:
 
             mock_request = MockRequest()
 
-            with patch("bot.api.miniapp.chat.get_db") as mock_get_db:
-                mock_get_db.return_value.__enter__.return_value = real_db_session
-                mock_get_db.return_value.__exit__.return_value = None
-
+            with patch("bot.api.miniapp.chat.get_async_db", async_db_for(real_db_session)):
                 with patch("bot.api.miniapp.chat.require_owner", return_value=None):
                     with patch("bot.api.miniapp.chat.get_ai_service") as mock_ai:
                         from unittest.mock import AsyncMock
@@ -7,14 +7,16 @@ A01: тесты контроля доступа к игровым сессиям
 
 import os
 import tempfile
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
 from unittest.mock import patch
 
 import pytest
 from aiohttp import web
 from aiohttp.test_utils import TestClient, TestServer
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 from bot.api.games_endpoints import setup_games_routes
 from bot.models import Base, GameSession, User
@@ -57,6 +59,20 @@ def _temp_db_with_game_session():
         os.unlink(db_path)
 
 
+def _async_db_for(db):
+    """Подмена get_async_db: async-сессия поверх той же временной SQLite-БД."""
+    url = db.get_bind().url.set(drivername="sqlite+aiosqlite")
+    engine = create_async_engine(url, poolclass=NullPool)
+
+    @asynccontextmanager
+    async def mock_get_async_db():
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+            await session.commit()
+
+    return mock_get_async_db
+
+
 class TestGamesA01:
     """A01: доступ к игровым сессиям только владельцу."""
 
@@ -67,11 +83,7 @@ class TestGamesA01:
             app = web.Application()
             setup_games_routes(app)
 
-            @contextmanager
-            def mock_get_db():
-                yield db
-
-            with patch("bot.api.games_endpoints.get_db", mock_get_db):
+            with patch("bot.api.games_endpoints.get_async_db", _async_db_for(db)):
                 async with TestClient(TestServer(app)) as client:
                     resp = await client.get(
                         f"/api/miniapp/games/session/{session_id}",
@@ -90,11 +102,7 @@ class TestGamesA01:
             app = web.Application()
             setup_games_routes(app)
 
-            @contextmanager
-            def mock_get_db():
-                yield db
-
-            with patch("bot.api.games_endpoints.get_db", mock_get_db):
+            with patch("bot.api.games_endpoints.get_async_db", _async_db_for(db)):
                 async with TestClient(TestServer(app)) as client:
                     resp = await client.post(
                         f"/api/miniapp/games/tic-tac-toe/{session_id}/move",
@@ -114,11 +122,7 @@ class TestGamesA01:
             app = web.Application()
             setup_games_routes(app)
 
-            @contextmanager
-            def mock_get_db():
-                yield db
-
-            with patch("bot.api.games_endpoints.get_db", mock_get_db):
+            with patch("bot.api.games_endpoints.get_async_db", _async_db_for(db)):
                 async with TestClient(TestServer(app)) as client:
                     resp = await client.get(
                         f"/api/miniapp/games/checkers/{session_id}/valid-moves",
@@ -137,11 +141,7 @@ class TestGamesA01:
             app = web.Application()
             setup_games_routes(app)
 
-            @contextmanager
-            def mock_get_db():
-                yield db
-
-            with patch("bot.api.games_endpoints.get_db", mock_get_db):
+            with patch("bot.api.games_endpoints.get_async_db", _async_db_for(db)):
                 async with TestClient(TestServer(app)) as client:
                     resp = await client.get(
                         "/api/miniapp/games/session/999999",
@@ -0,0 +1,175 @@
+"""
+Unit тесты для AIRequestQueue (приоритеты, справедливость, max_wait)
+
+"""
+
+import asyncio
+
+import pytest
+
+from bot.services.ai_request_queue import (
+    AIQueueTimeoutError,
+    AIRequestQueue,
+    RequestPriority,
+    ai_request_context,
+)
+
+
+async def _hold(queue: AIRequestQueue, release: asyncio.Event) -> None:
+    async def _work():
+        await release.wait()
+
+    await queue.process(_work)
+
+
+async def _tracked(
+    queue: AIRequestQueue,
+    order: list[str],
+    label: str,
+    user_key: str | None = None,
+    priority: RequestPriority = RequestPriority.CHAT,
+) -> None:
+    async def _work():
+        order.append(label)
+
+    with ai_request_context(user_key=user_key):
+        await queue.process(_work, priority=priority)
+
+
+async def _run_behind_busy_slot(queue: AIRequestQueue, submit) -> None:
+    """Занять единственный слот, поставить запросы в очередь и освободить слот."""
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(queue, release))
+    await asyncio.sleep(0)
+    tasks = submit()
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holder, *tasks)
+
+
+class TestAIRequestQueue:
+    """Тесты для AIRequestQueue"""
+
+    async def test_priority_classes_order(self):
+        """Слот получает старший класс, независимо от порядка постановки"""
+        queue = AIRequestQueue(max_concurrent=1)
+        order: list[str] = []
+
+        def submit():
+            return [
+                asyncio.create_task(
+                    _tracked(queue, order, "batch", priority=RequestPriority.BATCH)
+                ),
+                asyncio.create_task(
+                    _tracked(queue, order, "vision", priority=RequestPriority.VISION)
+                ),
+                asyncio.create_task(_tracked(queue, order, "chat", priority=RequestPriority.CHAT)),
+                asyncio.create_task(
+                    _tracked(queue, order, "stream", priority=RequestPriority.INTERACTIVE_STREAM)
+                ),
+            ]
+
+        await _run_behind_busy_slot(queue, submit)
+
+        assert order == ["stream", "chat", "vision", "batch"]
+
+    async def test_round_robin_between_users(self):
+        """Серия запросов одного пользователя не вытесняет остальных"""
+        queue = AIRequestQueue(max_concurrent=1)
+        order: list[str] = []
+
+        def submit():
+            tasks = [
+                asyncio.create_task(_tracked(queue, order, f"a{i}", user_key="a"))
+                for i in range(3)
+            ]
+            tasks.append(asyncio.create_task(_tracked(queue, order, "b0", user_key="b")))
+            tasks.append(asyncio.create_task(_tracked(queue, order, "c0", user_key="c")))
+            return tasks
+
+        await _run_behind_busy_slot(queue, submit)
+
+        assert order == ["a0", "b0", "c0", "a1", "a2"]
+
+    async def test_context_priority_only_demotes(self):
+        """Контекст понижает приоритет, но не повышает"""
+        queue = AIRequestQueue(max_concurrent=1)
+        order: list[str] = []
+
+        async def _background():
+            with ai_request_context(priority=RequestPriority.BATCH):
+                await _tracked(queue, order, "background", priority=RequestPriority.CHAT)
+
+        def submit():
+            return [
+                asyncio.create_task(_background()),
+                asyncio.create_task(
+                    _tracked(queue, order, "vision", priority=RequestPriority.VISION)
+                ),
+            ]
+
+        await _run_behind_busy_slot(queue, submit)
+
+        assert order == ["vision", "background"]
+
+    async def test_max_wait_rejects_fast(self):
+        """После max_wait запрос получает AIQueueTimeoutError и уходит из очереди"""
+        queue = AIRequestQueue(max_concurrent=1, max_wait_seconds=0.05)
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(queue, release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AIQueueTimeoutError) as exc_info:
+            await _tracked(queue, [], "late")
+
+        assert exc_info.value.priority == RequestPriority.CHAT
+        assert queue.get_queue_depth() == 0
+        release.set()
+        await holder
+        assert queue.get_active_count() == 0
+        assert queue.get_available_slots() == 1
+
+    async def test_cancelled_waiter_frees_queue(self):
+        """Отменённый ожидающий запрос не занимает очередь и слот"""
+        queue = AIRequestQueue(max_concurrent=1)
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(queue, release))
+        await asyncio.sleep(0)
+
+        waiter = asyncio.create_task(_tracked(queue, [], "cancelled"))
+        await asyncio.sleep(0)
+        assert queue.get_queue_depth(RequestPriority.CHAT) == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert queue.get_queue_depth() == 0
+        release.set()
+        await holder
+        assert queue.get_active_count() == 0
+
+    async def test_stream_releases_slot(self):
+        """process_stream держит слот до конца генератора и освобождает его"""
+        queue = AIRequestQueue(max_concurrent=2)
+
+        async def _chunks():
+            for chunk in ("При", "Привет"):
+                yield chunk
+
+        chunks = [chunk async for chunk in queue.process_stream(_chunks)]
+
+        assert chunks == ["При", "Привет"]
+        assert queue.get_active_count() == 0
+        assert queue.get_available_slots() == 2
+
+    async def test_error_releases_slot(self):
+        """Ошибка в запросе пробрасывается и не теряет слот"""
+        queue = AIRequestQueue(max_concurrent=1)
+
+        async def _fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            await queue.process(_fail)
+
+        assert queue.get_active_count() == 0
@@ -0,0 +1,151 @@
+"""
+Unit тесты для AnswerCache (кэш точных ответов AI)
+
+"""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from bot.services.answer_cache import AnswerCache, normalize_question
+
+
+@pytest.fixture
+def enabled_settings():
+    """Настройки с включённым кэшем ответов"""
+    fake_settings = MagicMock()
+    fake_settings.ai_answer_cache_enabled = True
+    fake_settings.ai_answer_cache_ttl_seconds = 3600
+    with patch("bot.services.answer_cache.settings", fake_settings):
+        yield fake_settings
+
+
+@pytest.fixture
+def cache(enabled_settings):  # noqa: ARG001
+    return AnswerCache()
+
+
+def _fingerprint(cache: AnswerCache, message: str, **overrides) -> str | None:
+    params = {
+        "model": "yandexgpt-lite",
+        "temperature": 0.3,
+        "user_age": 11,
+        "user_grade": 5,
+        "user_gender": "female",
+        "emoji_in_chat": True,
+    }
+    params.update(overrides)
+    return cache.fingerprint(message, **params)
+
+
+class TestAnswerCacheRules:
+    """Тесты правил кэширования"""
+
+    @pytest.mark.parametrize(
+        "message",
+        [
+            "Что такое фотосинтез?",
+            "что значит гипотенуза",
+            "Формула площади круга",
+            "таблица умножения на 7",
+            "Как найти периметр прямоугольника",
+            "12 * 7 =",
+        ],
+    )
+    def test_deterministic_questions_cacheable(self, message):
+        """Определения, формулы и вычисления кэшируются"""
+        assert AnswerCache.is_cacheable_question(message)
+
+    @pytest.mark.parametrize(
+        "message",
+        [
+            "а почему это так",
+            "помоги мне с задачей",
+            "что такое моя оценка",
+            "Привет!",
+            "расскажи подробнее",
+        ],
+    )
+    def test_contextual_questions_bypassed(self, message):
+        """Вопросы со ссылкой на диалог или личные детали не кэшируются"""
+        assert not AnswerCache.is_cacheable_question(message)
+
+    def test_answer_with_user_name_rejected(self):
+        """Ответ с именем ученика не кэшируется"""
+        answer = "Маша, фотосинтез — это процесс образования веществ в листьях."
+
+        assert not AnswerCache.is_cacheable_answer(answer, user_name="Маша")
+
+
+class TestAnswerCacheFingerprint:
+    """Тесты ключа кэша"""
+
+    def test_normalization(self, cache):
+        """Регистр, ё, пробелы и пунктуация не меняют ключ"""
+        assert normalize_question("  Что  такое ЁЖ?! ") == "что такое еж"
+        assert _fingerprint(cache, "Что такое ёж?") == _fingerprint(cache, "что  такое еж")
+
+    @pytest.mark.parametrize(
+        "override",
+        [
+            {"user_grade": 9},
+            {"model": "yandexgpt"},
+            {"temperature": 0.7},
+            {"emoji_in_chat": False},
+            {"user_gender": "male"},
+        ],
+    )
+    def test_parts_change_key(self, cache, override):
+        """Класс, модель, температура, пол и эмодзи входят в ключ"""
+        assert _fingerprint(cache, "что такое дробь") != _fingerprint(
+            cache, "что такое дробь", **override
+        )
+
+    def test_media_and_disabled_bypass(self, cache, enabled_settings):
+        """Фото в запросе и выключатель отключают кэш"""
+        assert _fingerprint(cache, "что такое дробь", has_media=True) is None
+        enabled_settings.ai_answer_cache_enabled = False
+        assert _fingerprint(cache, "что такое дробь") is None
+
+
+class TestAnswerCacheStorage:
+    """Тесты чтения, записи и воспроизведения"""
+
+    async def test_store_and_get_round_trip(self, cache):
+        """Сохранённый ответ возвращается по тому же ключу"""
+        storage: dict[str, str] = {}
+        answer = "Дробь — это часть целого, например одна вторая."
+
+        async def _set(key, value, ttl):  # noqa: ARG001
+            storage[key] = value
+            return True
+
+        fp = _fingerprint(cache, "что такое дробь")
+        with (
+            patch(
+                "bot.services.answer_cache.AIResponseCache.get_response",
+                new=AsyncMock(side_effect=lambda key: storage.get(key)),
+            ),
+            patch(
+                "bot.services.answer_cache.AIResponseCache.set_response",
+                new=AsyncMock(side_effect=_set),
+            ),
+        ):
+            assert await cache.get(fp) is None
+            assert await cache.store(fp, answer, user_name="Петя")
+            assert await cache.get(fp) == answer
+
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+        assert cache.hit_rate == 0.5
+
+    async def test_replay_cumulative_chunks(self):
+        """Воспроизведение отдаёт кумулятивные chunks по границам слов"""
+        answer = " ".join(f"слово{i}" for i in range(60))
+
+        chunks = [chunk async for chunk in AnswerCache.replay(answer)]
+
+        assert len(chunks) > 1
+        assert chunks[-1] == answer
+        assert all(later.startswith(earlier) for earlier, later in zip(chunks, chunks[1:]))
+        assert all(not chunk.endswith("слово") for chunk in chunks)
@@ -0,0 +1,136 @@
+"""
+Unit тесты для async-слоя БД: AsyncUserService, AsyncChatHistoryService,
+AsyncPremiumFeaturesService (через AsyncSession + aiosqlite) и метрика пула.
+"""
+
+import os
+import tempfile
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from bot.database.async_engine import to_async_database_url
+from bot.models import Base, User
+from bot.services import AsyncChatHistoryService, AsyncPremiumFeaturesService, AsyncUserService
+
+
+@pytest.fixture
+async def async_db():
+    """Временная SQLite-БД с async-сессией"""
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", poolclass=NullPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        session.add(User(telegram_id=123456, username="test", first_name="Test"))
+        await session.commit()
+        yield session
+
+    await engine.dispose()
+    os.close(db_fd)
+    os.unlink(db_path)
+
+
+class TestAsyncDatabaseUrl:
+    """Тесты выбора async-драйвера"""
+
+    def test_sqlite_gets_aiosqlite(self):
+        assert to_async_database_url("sqlite:///./x.db") == "sqlite+aiosqlite:///./x.db"
+
+    def test_psycopg_url_unchanged(self):
+        url = "postgresql+psycopg://u:p@localhost/db"
+        assert to_async_database_url(url) == url
+
+
+class TestAsyncUserService:
+    """Тесты для AsyncUserService"""
+
+    async def test_get_user_by_telegram_id(self, async_db):
+        service = AsyncUserService(async_db)
+
+        user = await service.get_user_by_telegram_id(123456)
+
+        assert user is not None
+        assert user.first_name == "Test"
+        assert await service.get_user_by_telegram_id(999) is None
+
+    async def test_is_registered(self, async_db):
+        service = AsyncUserService(async_db)
+
+        assert await service.is_registered(123456) is True
+        assert await service.is_registered(999) is False
+
+
+class TestAsyncChatHistoryService:
+    """Тесты для AsyncChatHistoryService"""
+
+    async def test_add_and_read_history(self, async_db):
+        service = AsyncChatHistoryService(async_db)
+
+        await service.add_message(123456, "Привет!", "user")
+        await service.add_message(123456, "Привет, друг!", "ai")
+        await async_db.commit()
+
+        history = await service.get_formatted_history_for_ai(123456, limit=10)
+        assert history == [
+            {"role": "user", "text": "Привет!"},
+            {"role": "assistant", "text": "Привет, друг!"},
+        ]
+        assert await service.get_message_count(123456) == 2
+
+    async def test_add_exchange_and_clear(self, async_db):
+        service = AsyncChatHistoryService(async_db)
+
+        await service.add_exchange(123456, "Вопрос", "Ответ", panda_reaction="happy")
+        await async_db.commit()
+
+        history = await service.get_recent_history(123456, limit=10)
+        assert [m.message_type for m in history] == ["user", "ai"]
+        assert history[1].panda_reaction == "happy"
+        assert await service.clear_history(123456) == 2
+        assert await service.get_message_count(123456) == 0
+
+    async def test_add_message_invalid_type(self, async_db):
+        service = AsyncChatHistoryService(async_db)
+
+        with pytest.raises(ValueError):
+            await service.add_message(123456, "text", "unknown")
+
+
+class TestAsyncPremiumFeaturesService:
+    """Тесты для AsyncPremiumFeaturesService (делегирование через run_sync)"""
+
+    async def test_free_user_can_request_and_counter_grows(self, async_db):
+        service = AsyncPremiumFeaturesService(async_db)
+
+        assert await service.is_premium_active(123456) is False
+        can_request, _ = await service.can_make_ai_request(123456)
+        assert can_request is True
+
+        _, first_total = await service.increment_request_count(123456)
+        _, second_total = await service.increment_request_count(123456)
+        assert second_total == first_total + 1
+
+
+class TestPoolCheckoutMetric:
+    """Тесты метрики удержания соединения из пула"""
+
+    def test_checkout_duration_recorded(self, tmp_path):
+        from sqlalchemy import create_engine, text
+
+        from bot.database.engine import track_pool_checkout_duration
+        from bot.monitoring.prometheus_metrics import get_metrics
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+        track_pool_checkout_duration(engine, "test")
+
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+        samples = get_metrics().get_metrics()["db_pool_checkout_duration_seconds"]
+        test_samples = [s for s in samples if s["labels"] == {"pool": "test"}]
+        assert test_samples
+        assert test_samples[-1]["value"] >= 0
+        engine.dispose()
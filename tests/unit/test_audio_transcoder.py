@@ -0,0 +1,86 @@
+"""
+Unit тесты для AudioTranscoder (асинхронная перекодировка через ffmpeg)
+
+"""
+
+import asyncio
+import os
+import stat
+import sys
+
+import pytest
+
+from bot.services.audio_transcoder import AudioTranscoder
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="Fake ffmpeg — shell скрипт")
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path):
+    """Фабрика fake ffmpeg: shell скрипт, игнорирующий аргументы"""
+
+    def _make(body: str) -> str:
+        path = tmp_path / "ffmpeg"
+        path.write_text(f"#!/bin/sh\n{body}\n")
+        path.chmod(path.stat().st_mode | stat.S_IXUSR)
+        return str(path)
+
+    return _make
+
+
+class TestAudioTranscoder:
+    """Тесты для AudioTranscoder"""
+
+    async def test_stdin_to_stdout(self, fake_ffmpeg):
+        """Вход идёт через stdin, результат читается из stdout без временных файлов"""
+        transcoder = AudioTranscoder(ffmpeg_binary=fake_ffmpeg("cat"))
+        audio = os.urandom(300 * 1024)
+
+        assert await transcoder.webm_to_ogg_opus(audio) == audio
+
+    async def test_ffmpeg_error_returns_none(self, fake_ffmpeg):
+        """Ненулевой код возврата — None"""
+        transcoder = AudioTranscoder(ffmpeg_binary=fake_ffmpeg("echo broken >&2; exit 1"))
+
+        assert await transcoder.webm_to_ogg_opus(b"webm") is None
+
+    async def test_output_limit(self, fake_ffmpeg):
+        """Результат больше лимита не собирается целиком"""
+        transcoder = AudioTranscoder(ffmpeg_binary=fake_ffmpeg("cat"), max_output_bytes=1024)
+
+        assert await transcoder.webm_to_ogg_opus(b"x" * 4096) is None
+
+    async def test_missing_binary(self, tmp_path):
+        """Нет ffmpeg — None, а не исключение"""
+        transcoder = AudioTranscoder(ffmpeg_binary=str(tmp_path / "missing"))
+
+        assert await transcoder.webm_to_ogg_opus(b"webm") is None
+
+    async def test_timeout_kills_process(self, fake_ffmpeg, tmp_path):
+        """По таймауту процесс ffmpeg убивается"""
+        pid_file = tmp_path / "pid"
+        transcoder = AudioTranscoder(
+            ffmpeg_binary=fake_ffmpeg(f"echo $$ > {pid_file}; exec sleep 30"),
+            timeout_seconds=0.3,
+        )
+
+        assert await transcoder.webm_to_ogg_opus(b"webm") is None
+        with pytest.raises(ProcessLookupError):
+            os.kill(int(pid_file.read_text()), 0)
+
+    async def test_concurrency_bounded(self, fake_ffmpeg, tmp_path):
+        """Одновременно работает не больше max_concurrency процессов"""
+        log = tmp_path / "log"
+        transcoder = AudioTranscoder(
+            ffmpeg_binary=fake_ffmpeg(f"echo start >> {log}; sleep 0.2; echo stop >> {log}; cat"),
+            max_concurrency=2,
+        )
+
+        results = await asyncio.gather(*(transcoder.webm_to_ogg_opus(b"a") for _ in range(4)))
+
+        assert results == [b"a"] * 4
+        running = peak = 0
+        for event in log.read_text().split():
+            running += 1 if event == "start" else -1
+            peak = max(peak, running)
+        assert peak == 2
@@ -0,0 +1,106 @@
+"""
+Unit тесты для GET /api/miniapp/chat/history: keyset-пагинация,
+проекция колонок и ETag/If-None-Match
+"""
+
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+import pytest
+from aiohttp.test_utils import make_mocked_request
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from bot.api.miniapp.other import miniapp_get_chat_history
+from bot.models import Base, User
+from bot.services.history_service import ChatHistoryService
+
+TELEGRAM_ID = 123456
+
+
+@pytest.fixture
+def db_session():
+    """SQLite с пользователем и 6 обменами (последний — с картинкой)"""
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    engine = create_engine(f"sqlite:///{db_path}", echo=False)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(User(telegram_id=TELEGRAM_ID, username="test", first_name="Test"))
+    service = ChatHistoryService(session)
+    for i in range(6):
+        image_url = "/media/graph.png" if i == 5 else None
+        service.add_exchange(TELEGRAM_ID, f"Вопрос {i}", f"Ответ {i}", image_url=image_url)
+    session.commit()
+
+    yield session
+
+    session.close()
+    engine.dispose()
+    os.close(db_fd)
+    os.unlink(db_path)
+
+
+async def _get_history(db_session, query: str = "", headers: dict | None = None):
+    request = make_mocked_request(
+        "GET",
+        f"/api/miniapp/chat/history/{TELEGRAM_ID}{query}",
+        headers=headers or {},
+        match_info={"telegram_id": str(TELEGRAM_ID)},
+    )
+    with patch("bot.api.miniapp.other.get_db") as mock_get_db:
+        mock_get_db.return_value.__enter__.return_value = db_session
+        mock_get_db.return_value.__exit__.return_value = None
+        with patch("bot.api.miniapp.other.require_owner", return_value=None):
+            return await miniapp_get_chat_history(request)
+
+
+def _body(response) -> dict:
+    return json.loads(response.body.decode("utf-8"))
+
+
+class TestChatHistoryPagination:
+    """Тесты страниц истории чата"""
+
+    async def test_pages_by_cursor(self, db_session):
+        """nextCursor ведёт к более старым сообщениям без повторов"""
+        first = _body(await _get_history(db_session, "?limit=8"))
+        second = _body(await _get_history(db_session, f"?limit=8&before={first['nextCursor']}"))
+
+        assert [m["content"] for m in first["history"]][-2:] == ["Вопрос 5", "Ответ 5"]
+        assert [m["content"] for m in second["history"]] == [
+            "Вопрос 0",
+            "Ответ 0",
+            "Вопрос 1",
+            "Ответ 1",
+        ]
+        assert second["nextCursor"] is None
+
+    async def test_media_only_on_request(self, db_session):
+        """imageUrl/videoUrl отдаются только с include=media"""
+        preview = _body(await _get_history(db_session, "?limit=2"))
+        full = _body(await _get_history(db_session, "?limit=2&include=media"))
+
+        assert "imageUrl" not in preview["history"][-1]
+        assert full["history"][-1]["imageUrl"] == "/media/graph.png"
+
+    async def test_invalid_cursor(self, db_session):
+        """Нечисловой курсор — 400"""
+        response = await _get_history(db_session, "?before=abc")
+
+        assert response.status == 400
+
+    async def test_etag_not_modified(self, db_session):
+        """Без новых сообщений повторный запрос с ETag — 304, после нового — 200"""
+        response = await _get_history(db_session)
+        etag = response.headers["ETag"]
+
+        cached = await _get_history(db_session, headers={"If-None-Match": etag})
+        assert cached.status == 304
+
+        ChatHistoryService(db_session).add_exchange(TELEGRAM_ID, "Новый вопрос", "Новый ответ")
+        db_session.commit()
+        refreshed = await _get_history(db_session, headers={"If-None-Match": etag})
+        assert refreshed.status == 200
+        assert refreshed.headers["ETag"] != etag
@@ -0,0 +1,145 @@
+"""
+Unit тесты для мемоизации эмбеддингов (EmbeddingCache, EmbeddingService)
+
+"""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from bot.services.embeddings_service import (
+    EmbeddingCache,
+    EmbeddingService,
+    _pack_vector,
+    _unpack_vector,
+)
+
+
+def _service_with_cache(cache: EmbeddingCache) -> tuple[EmbeddingService, AsyncMock]:
+    """EmbeddingService с подменённым Yandex API."""
+    yandex = MagicMock()
+    yandex.get_embedding = AsyncMock(return_value=[0.5, -0.25, 1.0])
+    with patch("bot.services.embeddings_service.get_yandex_cloud_service", return_value=yandex):
+        service = EmbeddingService(cache=cache)
+    return service, yandex.get_embedding
+
+
+class TestEmbeddingCache:
+    """Тесты для EmbeddingCache"""
+
+    def test_float32_roundtrip(self):
+        """Вектор упаковывается в 4 байта на компоненту"""
+        data = _pack_vector([0.5, -0.25, 1.0])
+
+        assert len(data) == 12
+        assert _unpack_vector(data) == [0.5, -0.25, 1.0]
+
+    async def test_lru_eviction(self):
+        """При переполнении вытесняется самый давно использованный ключ"""
+        cache = EmbeddingCache(max_size=2)
+        await cache.set("a", [1.0])
+        await cache.set("b", [2.0])
+        assert await cache.get("a") == [1.0]  # "a" становится свежим
+
+        await cache.set("c", [3.0])
+
+        assert await cache.get("b") is None
+        assert await cache.get("a") == [1.0]
+        assert await cache.get("c") == [3.0]
+
+    async def test_ttl_expiry(self):
+        """Просроченная запись не возвращается"""
+        cache = EmbeddingCache(max_size=10, ttl_seconds=60)
+        with patch("bot.services.embeddings_service.time.monotonic", return_value=1000.0):
+            await cache.set("k", [1.0])
+        with patch("bot.services.embeddings_service.time.monotonic", return_value=1061.0):
+            assert await cache.get("k") is None
+
+    async def test_redis_tier_shared_between_instances(self):
+        """Вектор из Redis (float32) виден другому процессу/экземпляру"""
+        fakeredis = pytest.importorskip("fakeredis")
+        server = fakeredis.FakeServer()
+        first = EmbeddingCache(max_size=10, redis_url="redis://fake")
+        second = EmbeddingCache(max_size=10, redis_url="redis://fake")
+        first._redis._client = fakeredis.FakeAsyncRedis(server=server)
+        second._redis._client = fakeredis.FakeAsyncRedis(server=server)
+
+        await first.set("k", [0.5, 0.25])
+
+        assert await second.get("k") == [0.5, 0.25]
+        assert second.redis_hits == 1
+
+    async def test_redis_retried_after_cooldown(self):
+        """Сбой Redis ставит уровень на паузу, а не отключает его до перезапуска"""
+        cache = EmbeddingCache(max_size=0, redis_url="redis://fake")
+        client = MagicMock(
+            get=AsyncMock(side_effect=[TimeoutError("timeout"), _pack_vector([1.0])])
+        )
+        cache._redis._client = client
+        clock = "bot.services.cache.redis_tier.time.monotonic"
+
+        with patch(clock, return_value=100.0):
+            assert await cache.get("k") is None
+            assert await cache.get("k") is None
+            assert cache.stats()["redis_enabled"] is False
+        with patch(clock, return_value=100.0 + cache._redis.cooldown_seconds):
+            assert await cache.get("k") == [1.0]
+
+        assert client.get.await_count == 2
+
+
+class TestEmbeddingServiceMemoization:
+    """Тесты мемоизации в EmbeddingService"""
+
+    async def test_repeated_text_embedded_once(self):
+        """Одинаковый (после нормализации) текст не уходит в API повторно"""
+        service, api = _service_with_cache(EmbeddingCache(max_size=10))
+
+        first = await service.embed_query("что  такое\nфотосинтез")
+        second = await service.embed_query("что такое фотосинтез")
+
+        assert first == second == [0.5, -0.25, 1.0]
+        api.assert_awaited_once_with("что такое фотосинтез", text_type="query")
+
+    async def test_text_type_is_part_of_key(self):
+        """query и doc эмбеддинги кэшируются раздельно"""
+        service, api = _service_with_cache(EmbeddingCache(max_size=10))
+
+        await service.embed_query("фотосинтез")
+        await service.embed_document("фотосинтез")
+
+        assert api.await_count == 2
+
+    async def test_api_failure_not_cached(self):
+        """None от API не кэшируется"""
+        service, api = _service_with_cache(EmbeddingCache(max_size=10))
+        api.return_value = None
+
+        assert await service.embed_query("вопрос") is None
+        assert await service.embed_query("вопрос") is None
+        assert api.await_count == 2
+
+
+class TestEnhancedSearchEmbedsOnce:
+    """enhanced_search передаёт один вектор в semantic cache и векторный поиск"""
+
+    async def test_single_embedding_per_question(self):
+        from bot.services.knowledge_service import KnowledgeService
+
+        service = KnowledgeService()
+        service.semantic_cache.get = AsyncMock(return_value=None)
+        service.semantic_cache.set = AsyncMock()
+        service.vector_search.search = AsyncMock(return_value=[])
+        service.get_helpful_content = AsyncMock(return_value=[])
+        embedding_service = MagicMock()
+        embedding_service.embed_query = AsyncMock(return_value=[0.1, 0.2])
+
+        with patch(
+            "bot.services.embeddings_service.get_embedding_service",
+            return_value=embedding_service,
+        ):
+            await service.enhanced_search("что такое умножение", use_wikipedia=False)
+
+        embedding_service.embed_query.assert_awaited_once()
+        assert service.semantic_cache.get.await_args.kwargs["embedding"] == [0.1, 0.2]
+        assert service.vector_search.search.await_args.kwargs["embedding"] == [0.1, 0.2]
@@ -0,0 +1,121 @@
+"""
+Unit тесты для компилятора выражений графиков функций
+
+"""
+
+import pytest
+
+from bot.services.visualization.expression import (
+    ExpressionError,
+    canonical_expression,
+    compile_expression,
+    is_valid_expression,
+    normalize_expression,
+    sample_function,
+)
+
+
+@pytest.fixture
+def np():
+    """NumPy нужен только для вычисления и выборки точек"""
+    return pytest.importorskip("numpy")
+
+
+class TestNormalizeExpression:
+    """Тесты нормализации записи школьника"""
+
+    @pytest.mark.parametrize(
+        ("text", "expected"),
+        [
+            ("x²", "x**2"),
+            ("x^3 - 1", "x**3 - 1"),
+            ("y = 2x + 3", "2*x + 3"),
+            ("3(x+1)", "3*(x+1)"),
+            ("(x+1)(x-1)", "(x+1)*(x-1)"),
+            ("ln(x)", "log(x)"),
+            ("np.sin(x)", "sin(x)"),
+            ("log10(x)", "log10(x)"),
+        ],
+    )
+    def test_normalize(self, text, expected):
+        """Степени, неявное умножение и синонимы функций"""
+        assert normalize_expression(text) == expected
+
+
+class TestExpressionValidation:
+    """Тесты белого списка"""
+
+    @pytest.mark.parametrize("text", ["x**2", "sin(x) + cos(2x)", "1/x", "sqrt(abs(x))", "pi*x"])
+    def test_valid(self, text):
+        """Школьные функции проходят проверку"""
+        assert is_valid_expression(text)
+
+    @pytest.mark.parametrize(
+        "text",
+        [
+            "синуса и косинуса",
+            "__import__('os')",
+            "x.__class__",
+            "(lambda: 1)()",
+            "y",
+            "sin(x, 2)",
+            "x if x else 1",
+            "'x'",
+            "x" + "+x" * 100,
+        ],
+    )
+    def test_rejected(self, text):
+        """Имена, атрибуты, вызовы вне списка и сырой текст отклоняются"""
+        assert not is_valid_expression(text)
+        with pytest.raises(ExpressionError):
+            canonical_expression(text)
+
+    def test_equivalent_forms_share_canonical(self):
+        """x^2, x² и x ** 2 дают одну каноническую форму"""
+        assert canonical_expression("x^2") == canonical_expression("x²")
+        assert canonical_expression("x ** 2") == canonical_expression("x²")
+
+
+class TestCompileExpression:
+    """Тесты компиляции в векторизованную функцию"""
+
+    def test_compiled_once_per_canonical_form(self, np):
+        """Эквивалентные записи используют один скомпилированный объект"""
+        assert compile_expression("x^2") is compile_expression("x²")
+
+    def test_vectorized_values(self, np):
+        """Значения совпадают с NumPy, константа растягивается по x"""
+        x = np.linspace(-3, 3, 7)
+
+        assert np.allclose(compile_expression("2x^2 - sin(x)")(x), 2 * x**2 - np.sin(x))
+        assert compile_expression("5")(x).shape == x.shape
+
+    def test_positive_domain(self, np):
+        """log и sqrt помечают выражение как определённое при x > 0"""
+        assert compile_expression("ln(x)").positive_domain
+        assert not compile_expression("x**2").positive_domain
+
+
+class TestSampleFunction:
+    """Тесты адаптивной выборки"""
+
+    def test_smooth_function_not_oversampled(self, np):
+        """Прямая не сгущается, у тангенса точки добавляются у асимптот"""
+        line = sample_function(compile_expression("2x + 1"), -10, 10)
+        tangent = sample_function(compile_expression("tan(x)"), -10, 10)
+
+        assert len(line.x) < 300
+        assert len(tangent.x) > len(line.x)
+
+    def test_asymptote_breaks_line(self, np):
+        """Через асимптоту линия не соединяется, ось y ограничена телом графика"""
+        curve = sample_function(compile_expression("tan(x)"), -3, 3)
+
+        segment = (curve.x > 1.5) & (curve.x < 1.65)
+        assert np.isnan(curve.y[segment]).any()
+        assert curve.y_limits is not None
+        assert curve.y_limits[1] < 100
+
+    def test_outside_domain(self, np):
+        """Нет конечных точек — None"""
+        assert sample_function(compile_expression("sqrt(x)"), -10, -1) is None
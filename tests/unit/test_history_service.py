@@ -157,3 +157,70 @@ class TestHistoryService:
         assert len(history) == 2
         assert history[0].message_type == "user" and history[0].message_text == "Вопрос?"
         assert history[1].message_type == "ai" and history[1].message_text == "Ответ."
+
+    def test_add_exchange_order(self, real_db_session, test_user):
+        """Пара вопрос + ответ вставляется одним flush, вопрос перед ответом"""
+        service = ChatHistoryService(real_db_session)
+
+        user_msg, ai_msg = service.add_exchange(
+            123456, "Сколько будет 2+2?", "4", image_url="/media/abc.png"
+        )
+        real_db_session.commit()
+
+        assert user_msg.id < ai_msg.id
+        assert ai_msg.image_url == "/media/abc.png" and user_msg.image_url is None
+        history = service.get_recent_history(123456, limit=10)
+        assert [m.message_type for m in history] == ["user", "ai"]
+
+    def test_get_message_count(self, real_db_session, test_user):
+        """Подсчёт сообщений через COUNT"""
+        service = ChatHistoryService(real_db_session)
+        for i in range(3):
+            service.add_exchange(123456, f"Вопрос {i}", f"Ответ {i}")
+        real_db_session.commit()
+
+        assert service.get_message_count(123456) == 6
+        assert service.get_message_count(999) == 0
+
+    def test_retention_keeps_latest_messages(self, real_db_session, test_user):
+        """Лимит хранения удаляет старые сообщения одним DELETE"""
+        service = ChatHistoryService(real_db_session)
+        service.retention_limit = 4
+
+        for i in range(5):
+            service.add_exchange(123456, f"Вопрос {i}", f"Ответ {i}")
+        real_db_session.commit()
+
+        history = service.get_recent_history(123456, limit=10)
+        assert [m.message_text for m in history] == ["Вопрос 3", "Ответ 3", "Вопрос 4", "Ответ 4"]
+        assert service.get_message_count(123456) == 4
+
+    def test_history_page_keyset(self, real_db_session, test_user):
+        """Страницы по курсору (timestamp, id) идут назад без пропусков и повторов"""
+        service = ChatHistoryService(real_db_session)
+        for i in range(5):
+            service.add_exchange(123456, f"Вопрос {i}", f"Ответ {i}")
+        real_db_session.commit()
+
+        seen = []
+        before_id = None
+        while page := service.get_history_page(123456, limit=4, before_id=before_id):
+            seen = [row.message_text for row in page] + seen
+            before_id = page[0].id
+
+        assert len(seen) == 10
+        assert seen[:2] == ["Вопрос 0", "Ответ 0"] and seen[-2:] == ["Вопрос 4", "Ответ 4"]
+
+    def test_history_page_projection(self, real_db_session, test_user):
+        """Медиа-колонки загружаются только по запросу"""
+        service = ChatHistoryService(real_db_session)
+        service.add_exchange(123456, "Нарисуй график", "Вот график", image_url="/media/a.png")
+        real_db_session.commit()
+
+        preview = service.get_history_page(123456, limit=10)
+        full = service.get_history_page(123456, limit=10, include_media=True)
+
+        assert "image_url" not in preview[1]._fields
+        assert full[1].image_url == "/media/a.png"
+        marker = service.get_latest_message_marker(123456)
+        assert (marker.id, marker.message_type) == (full[1].id, "ai")
@@ -0,0 +1,96 @@
+"""
+Unit тесты для KeywordAutomaton (многошаблонный поиск Ахо–Корасик)
+
+"""
+
+import re
+
+import pytest
+
+from bot.services.keyword_automaton import BoundaryMode, KeywordAutomaton
+
+SAMPLE_TEXTS = [
+    "Hello, world! Hell is a place.",
+    "Война и мир — роман Толстого; войнами называют вооружённые конфликты.",
+    "резать бумагу ножницами, резаться в карты",
+    "убил бы за пятёрку — убил бывшего злодея",
+    "наркотики_и_химия: наркотик, наркотики",
+    "Ёжик-ёжик 18+ 18+1 x18+",
+    "",
+    "   ",
+]
+
+
+def _build(keywords, mode):
+    automaton = KeywordAutomaton()
+    automaton.add_many(keywords, "tag", mode)
+    return automaton.build()
+
+
+class TestKeywordAutomaton:
+    """Тесты для KeywordAutomaton"""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize(
+        ("mode", "template"),
+        [
+            (BoundaryMode.SUBSTRING, "{}"),
+            (BoundaryMode.WORD, r"\b{}\b"),
+            (BoundaryMode.WORD_PREFIX, r"\b{}\w*\b"),
+        ],
+    )
+    def test_matches_regex_semantics(self, mode, template):
+        """Совпадения по каждому ключевому слову совпадают с эквивалентным regex"""
+        keywords = ["hell", "война", "резать", "убил бы", "наркотик", "ёжик", "18+", "мир"]
+        for keyword in keywords:
+            automaton = _build([keyword], mode)
+            regex = re.compile(template.format(re.escape(keyword)), re.IGNORECASE)
+            for text in SAMPLE_TEXTS:
+                expected = regex.search(text.lower()) is not None
+                assert bool(automaton.matched_tags(text)) == expected, (keyword, text)
+
+    @pytest.mark.unit
+    def test_overlapping_keywords_and_tags(self):
+        """Перекрывающиеся ключевые слова находятся одним проходом"""
+        automaton = KeywordAutomaton()
+        automaton.add("he", "short")
+        automaton.add("she", "long")
+        automaton.add("hers", "hers")
+        automaton.build()
+
+        matches = automaton.find_all("USHERS")
+
+        assert {(m.keyword, m.start, m.end) for m in matches} == {
+            ("she", 1, 4),
+            ("he", 2, 4),
+            ("hers", 2, 6),
+        }
+        assert automaton.matched_tags("ushers") == {"short", "long", "hers"}
+
+    @pytest.mark.unit
+    def test_count_tags_counts_duplicates(self):
+        """Одно слово в двух группах считается дважды (как два findall)"""
+        automaton = KeywordAutomaton()
+        automaton.add("скидка", "scam", BoundaryMode.WORD)
+        automaton.add("скидка", "scam", BoundaryMode.WORD)
+        automaton.add("акция", "scam", BoundaryMode.WORD)
+        automaton.build()
+
+        assert automaton.count_tags("Скидка! Акция! скидками")["scam"] == 3
+
+    @pytest.mark.unit
+    def test_add_after_build_fails(self):
+        """После build() автомат только для чтения"""
+        automaton = _build(["x"], BoundaryMode.SUBSTRING)
+
+        with pytest.raises(RuntimeError):
+            automaton.add("y", "tag")
+
+    @pytest.mark.unit
+    def test_search_before_build_fails(self):
+        """Поиск без build() запрещён"""
+        automaton = KeywordAutomaton()
+        automaton.add("x", "tag")
+
+        with pytest.raises(RuntimeError):
+            automaton.matched_tags("x")
@@ -0,0 +1,93 @@
+"""
+Unit тесты для BM25 KeywordIndex и keyword-поиска KnowledgeService
+
+"""
+
+from datetime import datetime
+
+import pytest
+
+from bot.services.rag.keyword_index import KeywordIndex, tokenize
+from bot.services.web_scraper import EducationalContent
+
+
+def _material(title: str, content: str, subject: str = "matematika") -> EducationalContent:
+    return EducationalContent(
+        title=title,
+        content=content,
+        subject=subject,
+        difficulty="средний",
+        source_url=f"https://example.com/{title}",
+        extracted_at=datetime.now(),
+        tags=[],
+    )
+
+
+MATERIALS = [
+    _material("Таблица умножения", "Учим таблицу умножения на 7 и на 8."),
+    _material("Дроби", "Числитель и знаменатель дроби. Сложение дробей."),
+    _material("Уравнения", "Как решить линейное уравнение с одной переменной."),
+    _material("Фотосинтез", "Растения на свету образуют кислород.", subject="biologiya"),
+]
+
+
+class TestTokenize:
+    """Тесты для tokenize"""
+
+    def test_word_forms_share_stem(self):
+        """Формы слова сводятся к одному токену, стоп-слова отбрасываются"""
+        assert tokenize("уравнение") == tokenize("уравнения") == tokenize("уравнений")
+        assert tokenize("Как решить уравнение?") == tokenize("решить уравнение")
+
+    def test_yo_normalized(self):
+        assert tokenize("ёжик") == tokenize("ежик")
+
+
+class TestKeywordIndex:
+    """Тесты для KeywordIndex"""
+
+    def test_ranked_by_bm25(self):
+        """Лучшее совпадение — первым; несвязанные материалы не возвращаются"""
+        index = KeywordIndex()
+        index.build(MATERIALS)
+
+        hits = index.search_scored("решить уравнения", limit=5)
+
+        assert [material.title for material, _ in hits] == ["Уравнения"]
+        assert hits[0][1] > 0
+
+    def test_title_boost(self):
+        """Совпадение в заголовке весит больше, чем в тексте"""
+        index = KeywordIndex()
+        index.build(
+            [
+                _material("Дроби", "Сложение и вычитание."),
+                _material("Сложение", "Сложение чисел и дроби."),
+            ]
+        )
+
+        assert index.search("дроби")[0].title == "Дроби"
+
+    def test_empty_index(self):
+        assert KeywordIndex().search("что угодно") == []
+
+
+class TestKnowledgeServiceKeywordSearch:
+    """get_helpful_content использует индекс вместо перебора"""
+
+    @pytest.mark.asyncio
+    async def test_bm25_hits_then_related_subject(self):
+        from bot.services.knowledge_service import KnowledgeService
+
+        service = KnowledgeService()
+        service.auto_update_enabled = False
+        service.knowledge_base = {
+            "matematika": MATERIALS[:3],
+            "biologiya": MATERIALS[3:],
+        }
+
+        results = await service.get_helpful_content("задача: таблица умножения на 7")
+
+        assert results[0].title == "Таблица умножения"
+        # Добор материалами предмета «математика» («задача» — ключевое слово предмета)
+        assert {m.title for m in results} == {"Таблица умножения", "Дроби", "Уравнения"}
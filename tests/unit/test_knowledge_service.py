@@ -33,6 +33,34 @@ class TestKnowledgeService:
         materials = await service.get_helpful_content("Как решить уравнение?", user_age=10)
         assert isinstance(materials, list)
 
+    @pytest.mark.asyncio
+    async def test_refresh_runs_once_in_background(self):
+        """Параллельные вариации запроса запускают одно фоновое обновление базы"""
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        service = KnowledgeService()
+        service.auto_update_enabled = True
+        service._embed_question = AsyncMock(return_value=None)
+        refresh_started = asyncio.Event()
+
+        async def slow_update():
+            refresh_started.set()
+            await asyncio.sleep(0.5)
+
+        service.update_knowledge_base = AsyncMock(side_effect=slow_update)
+
+        results = await service.enhanced_search(
+            "как решить уравнение", use_wikipedia=False, deadline_seconds=0.1
+        )
+        await refresh_started.wait()
+
+        assert results == []
+        assert service.update_knowledge_base.await_count == 1
+        assert service._refresh_task in service._background_tasks
+        await service._refresh_task
+        assert not service._background_tasks
+
     def test_get_knowledge_stats(self):
         """Тест получения статистики базы знаний"""
         service = KnowledgeService()
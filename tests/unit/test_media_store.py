@@ -0,0 +1,103 @@
+"""
+Unit тесты для content-addressed хранилища картинок и маршрута /media
+
+"""
+
+import base64
+import hashlib
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from bot.api.media_endpoints import setup_media_routes
+from bot.services import media_store
+from bot.services.media_store import DiskMediaBackend, MediaStore, parse_data_url
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 16
+DIGEST = hashlib.sha256(PNG).hexdigest()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Хранилище во временном каталоге, подставленное в синглтон"""
+    store = MediaStore(DiskMediaBackend(tmp_path))
+    monkeypatch.setattr(media_store, "_media_store", store)
+    return store
+
+
+@pytest.fixture
+async def client(store):
+    """HTTP клиент к приложению с маршрутом /media"""
+    app = web.Application()
+    setup_media_routes(app)
+    async with TestClient(TestServer(app)) as test_client:
+        yield test_client
+
+
+class TestMediaStore:
+    """Тесты для MediaStore"""
+
+    def test_put_is_content_addressed(self, store, tmp_path):
+        """Имя — sha256 содержимого, повторное сохранение не создаёт копий"""
+        url = store.put(PNG)
+
+        assert url == f"/media/{DIGEST}.png"
+        assert store.put(PNG) == url
+        assert store.get(f"{DIGEST}.png") == PNG
+        assert [p.name for p in tmp_path.rglob("*") if p.is_file()] == [f"{DIGEST}.png"]
+
+    def test_get_rejects_foreign_names(self, store):
+        """Имена не вида <sha256>.<png|jpg> не читаются с диска"""
+        store.put(PNG)
+
+        assert store.get(f"../{DIGEST}.png") is None
+        assert store.get(f"{DIGEST}.exe") is None
+
+    def test_data_url_roundtrip(self, store):
+        """data URL переносится в хранилище, jpeg сохраняется как .jpg"""
+        encoded = base64.b64encode(PNG).decode()
+
+        assert parse_data_url(f"data:image/png;base64,{encoded}") == (PNG, "png")
+        assert store.put_data_url(f"data:image/jpeg;base64,{encoded}").endswith(".jpg")
+        assert store.put_data_url("data:image/png;base64,@@@") is None
+        assert store.put_data_url(f"/media/{DIGEST}.png") is None
+
+    async def test_image_url_falls_back_to_data_url(self, tmp_path):
+        """Недоступное хранилище не теряет картинку: в историю идёт data URL"""
+        (tmp_path / "file").write_text("not a directory")
+        store = MediaStore(DiskMediaBackend(tmp_path / "file"))
+        encoded = base64.b64encode(PNG).decode()
+
+        assert await store.image_url_from_base64(encoded) == f"data:image/png;base64,{encoded}"
+
+
+class TestMediaRoute:
+    """Тесты для маршрута /media/{name}"""
+
+    async def test_serves_immutable_with_etag(self, client, store):
+        """Картинка отдаётся с immutable кэшированием и ETag = хэш"""
+        store.put(PNG)
+
+        response = await client.get(f"/media/{DIGEST}.png")
+
+        assert response.status == 200
+        assert response.content_type == "image/png"
+        assert await response.read() == PNG
+        assert response.headers["ETag"] == f'"{DIGEST}"'
+        assert "immutable" in response.headers["Cache-Control"]
+
+    async def test_if_none_match_returns_304(self, client, store):
+        """Повторный запрос с ETag — 304 без тела"""
+        store.put(PNG)
+
+        response = await client.get(
+            f"/media/{DIGEST}.png", headers={"If-None-Match": f'"{DIGEST}"'}
+        )
+
+        assert response.status == 304
+
+    async def test_unknown_media_404(self, client, store):
+        """Отсутствующий объект и неверное имя — 404"""
+        assert (await client.get(f"/media/{DIGEST}.png")).status == 404
+        assert (await client.get("/media/logo.png")).status == 404
@@ -0,0 +1,105 @@
+"""
+Unit тесты для бинарной загрузки медиа в Mini App (multipart/form-data)
+
+"""
+
+import pytest
+from aiohttp import FormData, web
+from aiohttp.test_utils import TestClient, TestServer
+from pydantic import ValidationError
+
+from bot.api.miniapp import media_upload
+from bot.api.miniapp.media_upload import MediaUploadError, read_media_upload
+from bot.api.validators import AIChatRequest, HomeworkCheckRequest
+
+PHOTO = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 64
+AUDIO = b"\x1a\x45\xdf\xa3" + b"\x00webm" * 1000
+
+
+async def _echo_upload(request: web.Request) -> web.Response:
+    try:
+        upload = await read_media_upload(request)
+    except MediaUploadError as e:
+        return e.to_response()
+    return web.json_response(
+        {
+            "fields": upload.fields,
+            "photo": upload.photo.hex() if upload.photo else None,
+            "audio_size": len(upload.audio) if upload.audio else 0,
+        }
+    )
+
+
+@pytest.fixture
+async def client():
+    """HTTP клиент к приложению с echo-обработчиком multipart"""
+    app = web.Application()
+    app.router.add_post("/upload", _echo_upload)
+    async with TestClient(TestServer(app)) as test_client:
+        yield test_client
+
+
+def _form(**files: bytes) -> FormData:
+    form = FormData()
+    form.add_field("telegram_id", "123")
+    form.add_field("message", "Реши задачу")
+    form.add_field("unknown", "ignored")
+    for name, content in files.items():
+        form.add_field(
+            name, content, filename=f"{name}.bin", content_type="application/octet-stream"
+        )
+    return form
+
+
+class TestReadMediaUpload:
+    """Тесты потокового чтения multipart"""
+
+    async def test_fields_and_files(self, client):
+        """Текстовые поля и бинарные файлы читаются без base64"""
+        response = await client.post("/upload", data=_form(photo=PHOTO, audio=AUDIO))
+
+        assert response.status == 200
+        body = await response.json()
+        assert body["fields"] == {"telegram_id": "123", "message": "Реши задачу"}
+        assert bytes.fromhex(body["photo"]) == PHOTO
+        assert body["audio_size"] == len(AUDIO)
+
+    async def test_part_limit_enforced_while_reading(self, client, monkeypatch):
+        """Файл больше лимита — 413"""
+        monkeypatch.setitem(media_upload.MEDIA_PARTS, "photo", 1024)
+
+        response = await client.post("/upload", data=_form(photo=PHOTO))
+
+        assert response.status == 413
+
+    async def test_content_length_limit(self, client, monkeypatch):
+        """Тело больше общего лимита отклоняется до чтения частей"""
+        monkeypatch.setattr(media_upload, "MAX_MULTIPART_BYTES", 1024)
+
+        response = await client.post("/upload", data=_form(photo=PHOTO))
+
+        assert response.status == 413
+
+
+class TestMediaRequestModels:
+    """Тесты моделей запроса в бинарном режиме"""
+
+    def test_chat_request_accepts_bytes(self):
+        """Байты из multipart проходят валидацию, photo/audio отдают их без копий"""
+        validated = AIChatRequest(telegram_id="123", photo_bytes=PHOTO, audio_bytes=AUDIO)
+
+        assert validated.telegram_id == 123
+        assert validated.photo is PHOTO
+        assert validated.audio is AUDIO
+
+    def test_bytes_fields_not_accepted_from_json(self):
+        """Строка в photo_bytes (JSON) не принимается за бинарное фото"""
+        with pytest.raises(ValidationError):
+            AIChatRequest(telegram_id=123, photo_bytes="aGVsbG8=")
+
+    def test_homework_requires_photo(self):
+        """Проверка ДЗ требует фото в одном из режимов"""
+        assert HomeworkCheckRequest(telegram_id=1, photo_bytes=PHOTO).photo is PHOTO
+        assert HomeworkCheckRequest(telegram_id=1, photo_base64="aGVsbG8=").photo == "aGVsbG8="
+        with pytest.raises(ValidationError):
+            HomeworkCheckRequest(telegram_id=1)
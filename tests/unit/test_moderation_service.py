@@ -24,8 +24,7 @@ class TestContentModerationService:
         service = ContentModerationService()
         assert service is not None
         assert service.filter_level >= 1  # Может быть любой уровень
-        assert len(service._topic_regexes) > 0
-        assert len(service._forbidden_regexes) > 0
+        assert len(service._matcher) > 0
 
     @pytest.mark.unit
     @pytest.mark.moderation
@@ -302,3 +301,42 @@ class TestContentModerationService:
 
         # Восстанавливаем оригинальный уровень
         self.moderation_service.filter_level = original_level
+
+
+class TestSharedModerationService:
+    """Тесты общего экземпляра get_moderation_service()"""
+
+    @pytest.mark.unit
+    @pytest.mark.moderation
+    def test_returns_same_instance(self):
+        """Паттерны компилируются один раз на процесс"""
+        from bot.services.moderation_service import get_moderation_service
+
+        assert get_moderation_service() is get_moderation_service()
+
+    @pytest.mark.unit
+    @pytest.mark.moderation
+    def test_rebuilds_when_settings_change(self, monkeypatch):
+        """Смена forbidden_topics пересобирает экземпляр"""
+        from bot.config import settings
+        from bot.services.moderation_service import get_moderation_service
+
+        first = get_moderation_service()
+        monkeypatch.setattr(
+            settings, "forbidden_topics", settings.forbidden_topics + ",тестоваятема"
+        )
+        second = get_moderation_service()
+
+        assert second is not first
+        assert second.is_safe_content("тут тестоваятема")[0] is False
+
+    @pytest.mark.unit
+    @pytest.mark.moderation
+    def test_contains_critical_pattern(self):
+        """Проверка длинных паттернов подстрокой для внешнего контента"""
+        from bot.services.moderation_service import get_moderation_service
+
+        service = get_moderation_service()
+        assert service.contains_critical_pattern("статья про терроризм") is True
+        assert service.contains_critical_pattern("математика для школьников") is False
+        assert service.contains_critical_pattern("") is False
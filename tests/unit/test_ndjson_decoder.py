@@ -0,0 +1,75 @@
+"""
+Unit тесты для NDJSONStreamDecoder (инкрементальный разбор streaming YandexGPT)
+
+"""
+
+import json
+import random
+
+from bot.services.ndjson_decoder import NDJSONStreamDecoder
+
+EVENTS = [
+    {"result": {"alternatives": [{"message": {"text": "Привет"}}]}},
+    {"result": {"alternatives": [{"message": {"text": "Привет, ученик! 🐼"}}]}},
+    {"result": {"alternatives": [{"message": {"text": "Привет, ученик! 🐼 Ёж — ёлка."}}]}},
+]
+
+
+def _stream(events: list[dict], sse: bool = False, newline: bytes = b"\n") -> bytes:
+    prefix = b"data: " if sse else b""
+    return b"".join(
+        prefix + json.dumps(event, ensure_ascii=False).encode("utf-8") + newline
+        for event in events
+    )
+
+
+def _decode_fragmented(data: bytes, rng: random.Random) -> list:
+    decoder = NDJSONStreamDecoder()
+    result = []
+    pos = 0
+    while pos < len(data):
+        size = rng.randint(1, 17)
+        result.extend(decoder.feed(data[pos : pos + size]))
+        pos += size
+    result.extend(decoder.close())
+    return result
+
+
+class TestNDJSONStreamDecoder:
+    """Тесты для NDJSONStreamDecoder"""
+
+    def test_random_fragmentation(self):
+        """Любое разбиение на чанки (в т.ч. посреди кириллицы) даёт те же события"""
+        data = _stream(EVENTS)
+        for seed in range(200):
+            assert _decode_fragmented(data, random.Random(seed)) == EVENTS
+
+    def test_byte_by_byte_sse_crlf(self):
+        """SSE-префикс data: и \\r\\n, подача по одному байту"""
+        data = _stream(EVENTS, sse=True, newline=b"\r\n\r\n")
+        decoder = NDJSONStreamDecoder()
+        result = []
+        for i in range(len(data)):
+            result.extend(decoder.feed(data[i : i + 1]))
+
+        assert result == EVENTS
+
+    def test_last_line_without_newline(self):
+        """Последняя строка без \\n разбирается в close()"""
+        data = _stream(EVENTS).rstrip(b"\n")
+        decoder = NDJSONStreamDecoder()
+
+        assert list(decoder.feed(data)) == EVENTS[:2]
+        assert list(decoder.close()) == EVENTS[2:]
+
+    def test_skips_non_json(self):
+        decoder = NDJSONStreamDecoder()
+
+        assert list(decoder.feed(b"[DONE]\n\n{\"a\": 1}\n")) == [{"a": 1}]
+
+    def test_oversized_line_dropped(self):
+        """Незавершённая строка сверх лимита отбрасывается, поток продолжается"""
+        decoder = NDJSONStreamDecoder(max_line_bytes=16)
+        assert list(decoder.feed(b"x" * 32)) == []
+
+        assert list(decoder.feed(b"\n{\"ok\": true}\n")) == [{"ok": True}]
@@ -0,0 +1,86 @@
+"""
+Unit тесты для обработки фото в Mini App: соединение с БД не удерживается
+на время вызова Vision API
+"""
+
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from bot.services.miniapp import photo_service
+from bot.services.miniapp.photo_service import MiniappPhotoService
+
+
+@pytest.fixture
+def sessions():
+    """Подмена get_async_db, отслеживающая открытые сессии"""
+    state = SimpleNamespace(open=0, opened=0)
+
+    @asynccontextmanager
+    async def fake_get_async_db():
+        state.open += 1
+        state.opened += 1
+        try:
+            yield MagicMock()
+        finally:
+            state.open -= 1
+
+    user = SimpleNamespace(username="kid", age=10)
+    quota = SimpleNamespace(
+        check_and_consume=AsyncMock(return_value=SimpleNamespace(allowed=True, reason=None)),
+        settle=AsyncMock(return_value=SimpleNamespace(limit_reached=False, total_requests=1)),
+    )
+    with (
+        patch.object(photo_service, "get_async_db", fake_get_async_db),
+        patch.object(photo_service, "AsyncUserService") as user_service,
+        patch.object(photo_service, "AsyncChatHistoryService") as history_service,
+        patch.object(photo_service, "AsyncGamificationService") as gamification,
+        patch.object(photo_service, "get_request_quota", return_value=quota),
+        patch("bot.services.miniapp.photo_service.VisionService"),
+    ):
+        user_service.return_value.get_user_by_telegram_id = AsyncMock(return_value=user)
+        history_service.return_value.add_exchange = AsyncMock()
+        gamification.return_value.process_message = AsyncMock(return_value=[])
+        state.history = history_service.return_value
+        yield state
+
+
+def _service(sessions, analysis: str | None, recognized_text: str | None = None):
+    service = MiniappPhotoService()
+
+    async def analyze_image(**_kwargs):
+        sessions.open_during_vision = sessions.open
+        return SimpleNamespace(analysis=analysis, recognized_text=recognized_text)
+
+    service.vision_service.analyze_image = analyze_image
+    return service
+
+
+class TestProcessPhoto:
+    """Тесты фаз чтения и записи вокруг Vision API"""
+
+    async def test_ready_answer_saved_in_separate_session(self, sessions):
+        """Vision вызывается без открытой сессии, ответ пишется отдельной транзакцией"""
+        response = MagicMock(write=AsyncMock())
+        service = _service(sessions, "Ответ: 42")
+
+        user_message, completed = await service.process_photo(b"img", 1, "", response)
+
+        assert (user_message, completed) == (None, True)
+        assert sessions.open_during_vision == 0
+        assert sessions.opened == 2
+        sessions.history.add_exchange.assert_awaited_once_with(1, "📷 Фото", "Ответ: 42")
+
+    async def test_recognized_text_passed_to_ai(self, sessions):
+        """Без готового ответа возвращается распознанный текст, запись не открывается"""
+        response = MagicMock(write=AsyncMock())
+        service = _service(sessions, None, recognized_text="2 + 2")
+
+        user_message, completed = await service.process_photo(b"img", 1, "", response)
+
+        assert completed is False
+        assert "2 + 2" in user_message
+        assert sessions.open_during_vision == 0
+        assert sessions.opened == 1
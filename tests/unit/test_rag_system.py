@@ -415,6 +415,50 @@ class TestRAGIntegration:
 
         assert isinstance(results2, list)
 
+    async def test_enhanced_search_keeps_results_within_deadline(self):
+        """Стадия, не успевшая к дедлайну, отбрасывается; остальные результаты остаются."""
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        from bot.services.knowledge_service import KnowledgeService
+
+        async def slow_search(*_args, **_kwargs):
+            await asyncio.sleep(5)
+            return [MockResult("Медленно", "Контент", None, "http://example.com/slow")]
+
+        service = KnowledgeService()
+        service._embed_question = AsyncMock(return_value=[0.1, 0.2])
+        service.semantic_cache.get = AsyncMock(return_value=None)
+        service.semantic_cache.set = AsyncMock()
+        service.vector_search.search = slow_search
+        service.get_helpful_content = AsyncMock(
+            return_value=[MockResult("Умножение", "Контент", None, "http://example.com/fast")]
+        )
+        service.reranker.rerank = lambda _q, results, _age, top_k: results[:top_k]
+
+        started = asyncio.get_running_loop().time()
+        results = await service.enhanced_search(
+            "что такое умножение", use_wikipedia=False, deadline_seconds=0.2
+        )
+
+        assert asyncio.get_running_loop().time() - started < 1
+        assert [r.source_url for r in results] == ["http://example.com/fast"]
+
+    async def test_enhanced_search_cache_hit_cancels_other_stages(self):
+        """Попадание в semantic cache возвращается сразу."""
+        from unittest.mock import AsyncMock
+
+        from bot.services.knowledge_service import KnowledgeService
+
+        cached = [MockResult("Из кэша", "Контент", None, "http://example.com/cached")]
+        service = KnowledgeService()
+        service._embed_question = AsyncMock(return_value=[0.1, 0.2])
+        service.semantic_cache.get = AsyncMock(return_value=cached)
+        service.vector_search.search = AsyncMock(return_value=[])
+        service.get_helpful_content = AsyncMock(return_value=[])
+
+        assert await service.enhanced_search("что такое умножение") == cached
+
     async def test_wikipedia_integration(self):
         """Проверка интеграции с Wikipedia."""
         from bot.services.knowledge_service import KnowledgeService
@@ -0,0 +1,163 @@
+"""
+Unit тесты для RenderCache (content-addressed кэш PNG визуализаций)
+
+"""
+
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from bot.services.visualization.render_cache import (
+    TOP_RENDER_SPECS,
+    RenderCache,
+    install_render_cache,
+    render_cache_key,
+)
+from bot.services.visualization.render_pool import RenderExecutor
+
+
+class _FakeVisualizationService:
+    """Сервис-заглушка: считает реальные рендеры"""
+
+    def __init__(self):
+        self.renders = 0
+
+    def generate_climatogram(self, zone: str = "тайга") -> bytes | None:
+        self.renders += 1
+        return f"png:{zone}".encode()
+
+    def generate_country_map(self, country_name: str) -> bytes | None:
+        self.renders += 1
+        return f"map:{country_name}".encode()
+
+    def generate_empty(self) -> bytes | None:
+        self.renders += 1
+        return None
+
+
+class TestRenderCacheKey:
+    """Тесты ключа кэша"""
+
+    def test_arguments_canonicalized_by_signature(self):
+        """Позиционные, именованные и значения по умолчанию дают один ключ"""
+        method = _FakeVisualizationService().generate_climatogram
+
+        default_key = render_cache_key("generate_climatogram", (), {}, method=method)
+
+        assert default_key == render_cache_key("generate_climatogram", ("тайга",), method=method)
+        assert default_key == render_cache_key(
+            "generate_climatogram", (), {"zone": "тайга"}, method=method
+        )
+        assert default_key != render_cache_key("generate_climatogram", ("тундра",), method=method)
+
+    def test_kind_and_style_in_key(self):
+        """Имя метода и версия стиля входят в ключ"""
+        key = render_cache_key("generate_function_graph", ("x**2",))
+
+        assert key.startswith("viz:v")
+        assert key != render_cache_key("generate_histogram", ("x**2",))
+
+
+class TestRenderCache:
+    """Тесты уровней кэша"""
+
+    def test_lru_bounded_by_bytes(self):
+        """LRU вытесняет самые давние записи по суммарному размеру"""
+        cache = RenderCache(max_bytes=10)
+        cache.set("a", b"12345")
+        cache.set("b", b"12345")
+        assert cache.get("a") == b"12345"
+
+        cache.set("c", b"12345")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == b"12345"
+        assert cache.stats()["bytes"] == 10
+
+    def test_disk_tier_shared_between_instances(self, tmp_path):
+        """PNG с диска доступен новому воркеру (новому экземпляру кэша)"""
+        RenderCache(disk_dir=str(tmp_path)).set("viz:v1:abc", b"png")
+
+        fresh = RenderCache(disk_dir=str(tmp_path))
+
+        assert fresh.get("viz:v1:abc") == b"png"
+        assert fresh.stats()["disk_hits"] == 1
+
+    def test_disk_entry_expires(self, tmp_path):
+        """Запись на диске старше TTL не используется"""
+        cache = RenderCache(ttl_seconds=60, disk_dir=str(tmp_path))
+        cache.set("viz:v1:old", b"png")
+        path = next(tmp_path.glob("*.png"))
+        old = time.time() - 120
+        os.utime(path, (old, old))
+
+        assert RenderCache(ttl_seconds=60, disk_dir=str(tmp_path)).get("viz:v1:old") is None
+        assert not path.exists()
+
+    def test_redis_tier(self):
+        """PNG из Redis поднимается в LRU"""
+        fakeredis = pytest.importorskip("fakeredis")
+        client = fakeredis.FakeRedis()
+        writer = RenderCache()
+        writer._redis.url = "redis://fake"
+        writer._redis._client = client
+        writer.set("viz:v1:r", b"png")
+
+        reader = RenderCache()
+        reader._redis.url = "redis://fake"
+        reader._redis._client = client
+
+        assert reader.get("viz:v1:r") == b"png"
+        assert reader.stats()["redis_hits"] == 1
+
+
+class TestInstallRenderCache:
+    """Тесты обёртки методов generate_*"""
+
+    def test_repeated_render_served_from_cache(self):
+        """Повторный вызов с теми же аргументами не рендерит заново"""
+        service = _FakeVisualizationService()
+        install_render_cache(service, RenderCache())
+
+        assert service.generate_climatogram() == "png:тайга".encode()
+        assert service.generate_climatogram(zone="тайга") == service.generate_climatogram()
+        assert service.renders == 1
+
+    def test_map_and_empty_results_not_cached(self):
+        """Карта (побочные эффекты) и пустой результат не кэшируются"""
+        service = _FakeVisualizationService()
+        install_render_cache(service, RenderCache())
+
+        service.generate_country_map("россия")
+        service.generate_country_map("россия")
+        service.generate_empty()
+        service.generate_empty()
+
+        assert service.renders == 4
+
+
+class TestRenderWarmUp:
+    """Тесты прогрева кэша"""
+
+    async def test_warm_up_renders_top_specs(self):
+        """Прогрев отправляет в пул top_n частых визуализаций"""
+        rendered: list[str] = []
+
+        def _fake_render(spec):
+            rendered.append(spec.kind)
+            return b"png"
+
+        with (
+            patch("bot.services.visualization.render_pool._init_worker"),
+            patch("bot.services.visualization.render_pool._render_in_worker", _fake_render),
+        ):
+            executor = RenderExecutor(max_workers=0)
+            try:
+                ready = await executor.warm_up(top_n=3)
+            finally:
+                executor.shutdown()
+
+        assert ready == 3
+        assert rendered == [kind for kind, _args in TOP_RENDER_SPECS[:3]]
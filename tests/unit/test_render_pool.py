@@ -0,0 +1,102 @@
+"""
+Unit тесты для RenderExecutor (рендер визуализаций вне event loop)
+
+"""
+
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from bot.services.visualization.render_pool import RenderExecutor, RenderSpec
+
+PNG_MAGIC = b"\x89PNG"
+
+
+@pytest.fixture
+def thread_executor():
+    """Executor в режиме одного выделенного потока без прогрева matplotlib"""
+    with patch("bot.services.visualization.render_pool._init_worker"):
+        executor = RenderExecutor(max_workers=0, timeout_seconds=1.0)
+        yield executor
+        executor.shutdown()
+
+
+class TestRenderSpec:
+    """Тесты для RenderSpec"""
+
+    def test_only_generate_methods_allowed(self):
+        """Разрешены только методы generate_*"""
+        assert RenderSpec("generate_function_graph", ("x**2",)).kind == "generate_function_graph"
+        with pytest.raises(ValueError):
+            RenderSpec("image_to_base64")
+
+
+class TestRenderExecutor:
+    """Тесты для RenderExecutor"""
+
+    async def test_render_runs_off_event_loop(self, thread_executor):
+        """Рендер выполняется не в потоке event loop"""
+        loop_thread = threading.current_thread().name
+        render_threads: list[str] = []
+
+        def _fake_render(spec):
+            render_threads.append(threading.current_thread().name)
+            return PNG_MAGIC + spec.args[0].encode()
+
+        with patch("bot.services.visualization.render_pool._render_in_worker", _fake_render):
+            result = await thread_executor.render(RenderSpec("generate_function_graph", ("x",)))
+
+        assert result == PNG_MAGIC + b"x"
+        assert render_threads and render_threads[0] != loop_thread
+
+    async def test_timeout_returns_none(self, thread_executor):
+        """Рендер дольше таймаута не задерживает запрос"""
+        thread_executor.timeout_seconds = 0.05
+
+        def _slow_render(spec):  # noqa: ARG001
+            time.sleep(0.3)
+            return PNG_MAGIC
+
+        with patch("bot.services.visualization.render_pool._render_in_worker", _slow_render):
+            started = time.perf_counter()
+            result = await thread_executor.render(RenderSpec("generate_pie_chart"))
+
+        assert result is None
+        assert time.perf_counter() - started < 0.25
+
+    async def test_worker_error_returns_default(self, thread_executor):
+        """Ошибка в воркере превращается в None / пустую детекцию"""
+
+        def _fail(_arg):
+            raise RuntimeError("render failed")
+
+        with (
+            patch("bot.services.visualization.render_pool._render_in_worker", _fail),
+            patch("bot.services.visualization.render_pool._detect_in_worker", _fail),
+        ):
+            assert await thread_executor.render(RenderSpec("generate_bar_chart")) is None
+            assert await thread_executor.detect("покажи график") == (None, None, None)
+
+    async def test_no_pool_after_shutdown(self, thread_executor):
+        """После shutdown() рендер не пересоздаёт пул"""
+        with patch("bot.services.visualization.render_pool._render_in_worker", return_value=b"x"):
+            assert await thread_executor.render(RenderSpec("generate_bar_chart")) == b"x"
+            thread_executor.shutdown()
+
+            assert await thread_executor.render(RenderSpec("generate_bar_chart")) is None
+        assert thread_executor._pool is None
+
+    async def test_process_pool_renders_png(self):
+        """Прогретый процесс-воркер возвращает PNG bytes"""
+        pytest.importorskip("matplotlib")
+        executor = RenderExecutor(max_workers=1, timeout_seconds=60.0)
+        try:
+            await executor.start()
+            result = await executor.render(RenderSpec("generate_function_graph", ("x**2",)))
+        finally:
+            executor.shutdown()
+
+        assert result is not None
+        assert result.startswith(PNG_MAGIC)
@@ -0,0 +1,231 @@
+"""
+Unit тесты для RequestQuotaService: атомарная проверка лимита с инкрементом,
+резерв квоты запроса и write-behind в daily_request_counts (счётчики в памяти)
+"""
+
+import asyncio
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from bot.models import Base, DailyRequestCount, User
+from bot.services.request_quota import RequestQuotaService
+
+TELEGRAM_ID = 123456
+
+
+@pytest.fixture
+async def session_factory():
+    """SQLite с бесплатным пользователем; get_async_db указывает на неё"""
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", poolclass=NullPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with factory() as session:
+        session.add(User(telegram_id=TELEGRAM_ID, username="test", first_name="Test"))
+        await session.commit()
+
+    @asynccontextmanager
+    async def fake_get_async_db():
+        async with factory() as session:
+            yield session
+            await session.commit()
+
+    with patch("bot.database.get_async_db", fake_get_async_db):
+        yield factory
+
+    await engine.dispose()
+    os.close(db_fd)
+    os.unlink(db_path)
+
+
+async def _add_counter(factory, days_ago: int, count: int) -> None:
+    day = datetime.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0)
+    async with factory() as session:
+        session.add(
+            DailyRequestCount(
+                user_telegram_id=TELEGRAM_ID,
+                date=day - timedelta(days=days_ago),
+                request_count=count,
+            )
+        )
+        await session.commit()
+
+
+async def _db_total(factory) -> int:
+    async with factory() as session:
+        stmt = select(func.sum(DailyRequestCount.request_count)).where(
+            DailyRequestCount.user_telegram_id == TELEGRAM_ID
+        )
+        return (await session.execute(stmt)).scalar() or 0
+
+
+def _in_new_request(coro):
+    """Каждый HTTP запрос — своя задача со своим резервом квоты"""
+    return asyncio.create_task(coro)
+
+
+class TestCheckAndConsume:
+    """Тесты атомарной проверки лимита"""
+
+    async def test_sliding_window_from_db(self, session_factory):
+        """Запросы за прошлые дни окна учитываются, за пределами окна — нет"""
+        await _add_counter(session_factory, days_ago=3, count=29)
+        await _add_counter(session_factory, days_ago=40, count=100)
+        quota = RequestQuotaService()
+
+        last = await _in_new_request(quota.check_and_consume(TELEGRAM_ID))
+        refused = await _in_new_request(quota.check_and_consume(TELEGRAM_ID))
+
+        assert last.allowed and last.used == 30 and last.limit_reached
+        assert not refused.allowed
+        assert "30 бесплатных вопросов" in refused.reason
+
+    async def test_concurrent_requests_do_not_exceed_limit(self, session_factory):
+        """Одновременные запросы не проскакивают лимит"""
+        quota = RequestQuotaService()
+
+        decisions = await asyncio.gather(
+            *(_in_new_request(quota.check_and_consume(TELEGRAM_ID)) for _ in range(40))
+        )
+
+        assert sum(d.allowed for d in decisions) == 30
+
+
+class TestReservation:
+    """Тесты резерва квоты в рамках одного запроса"""
+
+    async def test_repeated_check_and_settle_count_once(self, session_factory):
+        """Повторная проверка и settle в том же запросе не тратят квоту ещё раз"""
+        quota = RequestQuotaService()
+
+        async def request():
+            await quota.check_and_consume(TELEGRAM_ID)
+            await quota.check_and_consume(TELEGRAM_ID)
+            settled = await quota.settle(TELEGRAM_ID)
+            await quota.release(TELEGRAM_ID)
+            return settled
+
+        settled = await _in_new_request(request())
+        after = await _in_new_request(quota.check_and_consume(TELEGRAM_ID))
+
+        assert settled.used == 1
+        assert after.used == 2
+
+    async def test_release_returns_unsettled_quota(self, session_factory):
+        """Запрос без ответа модели (release без settle) лимит не тратит"""
+        quota = RequestQuotaService()
+
+        async def request_without_answer():
+            await quota.check_and_consume(TELEGRAM_ID)
+            await quota.release(TELEGRAM_ID)
+
+        await _in_new_request(request_without_answer())
+        decision = await _in_new_request(quota.check_and_consume(TELEGRAM_ID))
+
+        assert decision.used == 1
+
+
+class TestWriteBehind:
+    """Тесты сброса счётчиков в daily_request_counts"""
+
+    async def test_flush_persists_and_new_instance_loads(self, session_factory):
+        """После flush счётчики в БД, новый экземпляр (рестарт) продолжает с них"""
+        await _add_counter(session_factory, days_ago=0, count=5)
+        quota = RequestQuotaService()
+        for _ in range(3):
+            await _in_new_request(quota.check_and_consume(TELEGRAM_ID))
+
+        assert await _db_total(session_factory) == 5
+        assert await quota.flush() == 1
+        assert await quota.flush() == 0
+        assert await _db_total(session_factory) == 8
+
+        restarted = await _in_new_request(RequestQuotaService().check_and_consume(TELEGRAM_ID))
+        assert restarted.used == 9
+
+    async def test_record_external_is_not_flushed_again(self, session_factory):
+        """Запрос, записанный в БД синхронным кодом, виден счётчикам без повторной записи"""
+        quota = RequestQuotaService()
+        await _in_new_request(quota.check_and_consume(TELEGRAM_ID))
+
+        quota.record_external(TELEGRAM_ID)
+        decision = await _in_new_request(quota.check_and_consume(TELEGRAM_ID))
+        await quota.flush()
+
+        assert decision.used == 3
+        assert await _db_total(session_factory) == 2
+
+    async def test_reseed_from_db_in_new_window(self, session_factory):
+        """В новом дне счётчики перечитываются из БД вместе с несброшенными приращениями"""
+        today = datetime.now(UTC).date()
+        quota = RequestQuotaService()
+        with patch("bot.services.request_quota._today", return_value=today - timedelta(days=1)):
+            await _in_new_request(quota.check_and_consume(TELEGRAM_ID))
+
+        # Другой процесс записал запросы в БД; своё приращение ещё не сброшено
+        await _add_counter(session_factory, days_ago=0, count=4)
+        decision = await _in_new_request(quota.check_and_consume(TELEGRAM_ID))
+
+        assert decision.used == 6
+
+    async def test_reseed_after_interval(self, session_factory):
+        """В памяти запросы, сброшенные в БД другим инстансом, видны через reseed_seconds"""
+        quota = RequestQuotaService(reseed_seconds=5.0)
+        clock = "bot.services.request_quota.time.monotonic"
+        with patch(clock, return_value=100.0):
+            await _in_new_request(quota.check_and_consume(TELEGRAM_ID))
+            await _add_counter(session_factory, days_ago=0, count=4)
+            assert (await _in_new_request(quota.check_and_consume(TELEGRAM_ID))).used == 2
+
+        with patch(clock, return_value=105.0):
+            decision = await _in_new_request(quota.check_and_consume(TELEGRAM_ID))
+
+        assert decision.used == 7
+
+
+class TestRedisFailures:
+    """Ошибки Redis и БД на пути Redis"""
+
+    @staticmethod
+    def _redis_quota(consume) -> RequestQuotaService:
+        quota = RequestQuotaService(redis_url="redis://fake")
+        quota._redis._client = MagicMock()
+        quota._consume_script = consume
+        return quota
+
+    async def test_db_error_while_seeding_keeps_redis(self, session_factory):
+        """Ошибка чтения БД при засеве Redis не переводит квоты в память"""
+        quota = self._redis_quota(AsyncMock(return_value=[-1, 0]))
+
+        with (
+            patch.object(quota, "_read_db_counts", AsyncMock(side_effect=OSError("db down"))),
+            pytest.raises(OSError),
+        ):
+            await _in_new_request(quota.check_and_consume(TELEGRAM_ID))
+
+        assert quota._redis.available
+
+    async def test_redis_error_pauses_then_retries(self, session_factory):
+        """Сбой Redis — счётчики в памяти на время паузы, затем снова Redis"""
+        redis_exceptions = pytest.importorskip("redis.exceptions")
+        consume = AsyncMock(side_effect=[redis_exceptions.TimeoutError("timeout"), [1, 1]])
+        quota = self._redis_quota(consume)
+        clock = "bot.services.cache.redis_tier.time.monotonic"
+
+        with patch(clock, return_value=100.0):
+            first = await _in_new_request(quota.check_and_consume(TELEGRAM_ID))
+            assert not quota._redis.available
+        with patch(clock, return_value=100.0 + quota._redis.cooldown_seconds):
+            second = await _in_new_request(quota.check_and_consume(TELEGRAM_ID))
+
+        assert (first.used, second.used) == (1, 1)
+        assert consume.await_count == 2
@@ -0,0 +1,71 @@
+"""
+Unit тесты для in-process уровня семантического кэша (NearestNeighbourCache)
+
+"""
+
+from datetime import UTC, datetime
+from unittest.mock import patch
+
+from bot.services.rag.semantic_cache import NearestNeighbourCache, SemanticCache
+from bot.services.web_scraper import EducationalContent
+
+
+class TestNearestNeighbourCache:
+    """Тесты для NearestNeighbourCache"""
+
+    def test_hit_on_similar_vector(self):
+        """Похожий (не идентичный) вектор находит сохранённый результат"""
+        cache = NearestNeighbourCache(capacity=4)
+        cache.put([1.0, 0.0, 0.0], ["таблица умножения на 7"])
+
+        assert cache.get([0.99, 0.05, 0.0], threshold=0.95) == ["таблица умножения на 7"]
+        assert cache.get([0.0, 1.0, 0.0], threshold=0.95) is None
+
+    def test_lru_eviction(self):
+        """При переполнении перезаписывается давно не использованный слот"""
+        cache = NearestNeighbourCache(capacity=2)
+        clock = iter([1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+        with patch("bot.services.rag.semantic_cache.time.monotonic", side_effect=clock):
+            cache.put([1.0, 0.0], ["a"])
+            cache.put([0.0, 1.0], ["b"])
+            assert cache.get([1.0, 0.0], threshold=0.9) == ["a"]  # "a" становится свежим
+            cache.put([-1.0, 0.0], ["c"])
+
+            assert cache.get([0.0, 1.0], threshold=0.9) is None
+            assert cache.get([1.0, 0.0], threshold=0.9) == ["a"]
+
+    def test_ttl_expiry(self):
+        """Просроченный слот не участвует в поиске"""
+        cache = NearestNeighbourCache(capacity=2, ttl_seconds=60)
+        with patch("bot.services.rag.semantic_cache.time.monotonic", return_value=1000.0):
+            cache.put([1.0, 0.0], ["a"])
+        with patch("bot.services.rag.semantic_cache.time.monotonic", return_value=1061.0):
+            assert cache.get([1.0, 0.0], threshold=0.5) is None
+
+
+class TestSemanticCacheTiers:
+    """Тесты двухуровневого SemanticCache"""
+
+    async def test_memory_hit_skips_db(self):
+        """Повторный запрос отвечает из памяти без обращения к БД"""
+        cache = SemanticCache(memory_size=8)
+        answer = [
+            EducationalContent(
+                title="Таблица умножения на 7",
+                content="7 × 8 = 56",
+                subject="математика",
+                difficulty="начальный",
+                source_url="https://example.com/7",
+                extracted_at=datetime.now(UTC),
+                tags=["умножение"],
+            )
+        ]
+        with patch("bot.services.rag.semantic_cache.get_db") as get_db:
+            await cache.set("таблица умножения на 7", answer, embedding=[0.3, 0.4])
+            get_db.assert_called_once()
+            get_db.reset_mock()
+
+            result = await cache.get("таблица умножения на 7", embedding=[0.3, 0.4])
+
+        assert result == answer
+        get_db.assert_not_called()
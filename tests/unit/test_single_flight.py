@@ -0,0 +1,170 @@
+"""
+Unit тесты для SingleFlight и схлопывания промахов кэша
+
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from bot.services.cache.single_flight import SingleFlight
+from bot.services.cache_service import CacheService
+from bot.services.embeddings_service import EmbeddingCache, EmbeddingService
+
+
+class TestSingleFlight:
+    """Тесты для SingleFlight"""
+
+    async def test_concurrent_calls_share_one_execution(self):
+        """N одновременных вызовов одного ключа выполняют функцию один раз"""
+        flight = SingleFlight("test")
+        calls = 0
+
+        async def _fetch(value):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return value * 2
+
+        results = await asyncio.gather(*(flight.do("k", _fetch, 21) for _ in range(10)))
+
+        assert results == [42] * 10
+        assert calls == 1
+        assert flight.stats() == {"leaders": 1, "coalesced": 9, "in_flight": 0}
+
+    async def test_different_keys_not_coalesced(self):
+        """Разные ключи выполняются независимо"""
+        flight = SingleFlight("test")
+        fetch = AsyncMock(side_effect=lambda key: key.upper())
+
+        results = await asyncio.gather(flight.do("a", fetch, "a"), flight.do("b", fetch, "b"))
+
+        assert results == ["A", "B"]
+        assert fetch.await_count == 2
+
+    async def test_error_shared_and_key_released(self):
+        """Исключение получают все ожидающие; следующий вызов выполняется заново"""
+        flight = SingleFlight("test")
+
+        async def _fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("api down")
+
+        results = await asyncio.gather(
+            flight.do("k", _fail), flight.do("k", _fail), return_exceptions=True
+        )
+
+        assert all(isinstance(result, ValueError) for result in results)
+        assert flight.in_flight() == 0
+        assert await flight.do("k", AsyncMock(return_value="ok")) == "ok"
+
+    async def test_cancelled_leader_hands_over(self):
+        """Отмена лидера не отменяет ожидающих: один из них загружает сам"""
+        flight = SingleFlight("test")
+        started = asyncio.Event()
+
+        async def _slow():
+            started.set()
+            await asyncio.sleep(10)
+
+        leader = asyncio.create_task(flight.do("k", _slow))
+        await started.wait()
+        follower = asyncio.create_task(flight.do("k", AsyncMock(return_value="fresh")))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert await follower == "fresh"
+
+    async def test_sync_function_supported(self):
+        """Sync функция тоже выполняется через single-flight"""
+        flight = SingleFlight("test")
+
+        assert await flight.do("k", lambda: 7) == 7
+
+
+class TestCacheServiceCoalescing:
+    """Тесты для get_or_set / Redis lease"""
+
+    @pytest.fixture
+    def service(self):
+        service = CacheService()
+        service._redis_client = None
+        service._use_redis = False
+        return service
+
+    async def test_get_or_set_fetches_once(self, service):
+        """Одновременные промахи get_or_set вызывают fetch_func один раз"""
+        calls = 0
+
+        async def _fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"answer": 42}
+
+        results = await asyncio.gather(
+            *(service.get_or_set("sf:key", _fetch, 60) for _ in range(5))
+        )
+
+        assert results == [{"answer": 42}] * 5
+        assert calls == 1
+        assert await service.get("sf:key") == {"answer": 42}
+        assert (await service.get_stats())["single_flight"]["coalesced"] == 4
+
+    async def test_lease_held_elsewhere_waits_for_value(self, service):
+        """Если lease у другого инстанса, значение берётся из кэша без fetch"""
+        redis = MagicMock()
+        redis.set = AsyncMock(return_value=None)
+        redis.get = AsyncMock(side_effect=[None, None, '"from-other-instance"'])
+        redis.exists = AsyncMock(return_value=1)
+        service._redis_client = redis
+        service._use_redis = True
+        service.lease_seconds = 1.0
+        fetch = AsyncMock(return_value="local")
+
+        result = await service.get_or_set("sf:lease", fetch, 60)
+
+        assert result == "from-other-instance"
+        fetch.assert_not_awaited()
+        assert redis.set.await_args.kwargs["nx"] is True
+
+    async def test_lease_acquired_and_released(self, service):
+        """Лидер берёт lease, загружает значение и снимает lease своим токеном"""
+        redis = MagicMock()
+        redis.get = AsyncMock(return_value=None)
+        redis.set = AsyncMock(return_value=True)
+        redis.setex = AsyncMock()
+        redis.eval = AsyncMock(return_value=1)
+        service._redis_client = redis
+        service._use_redis = True
+        service.lease_seconds = 1.0
+
+        result = await service.get_or_set("sf:leader", AsyncMock(return_value="v"), 60)
+
+        assert result == "v"
+        lease_token = redis.set.await_args.args[1]
+        assert redis.eval.await_args.args[2:] == ("lock:sf:leader", lease_token)
+
+
+class TestEmbeddingCoalescing:
+    """Тесты для схлопывания эмбеддингов"""
+
+    async def test_same_question_embedded_once(self):
+        """Один и тот же вопрос от нескольких учеников — один запрос к API"""
+
+        async def _embed(text, text_type):  # noqa: ARG001
+            await asyncio.sleep(0.01)
+            return [0.1, 0.2]
+
+        yandex = MagicMock()
+        yandex.get_embedding = AsyncMock(side_effect=_embed)
+        with patch("bot.services.embeddings_service.get_yandex_cloud_service", return_value=yandex):
+            service = EmbeddingService(cache=EmbeddingCache(max_size=10))
+
+        results = await asyncio.gather(*(service.embed_query("что такое  дробь") for _ in range(6)))
+
+        assert results == [[0.1, 0.2]] * 6
+        assert yandex.get_embedding.await_count == 1
@@ -0,0 +1,72 @@
+"""
+Unit тесты для delta-кодирования SSE-чанков (DeltaChunkEncoder)
+
+"""
+
+import json
+
+from bot.api.miniapp.stream_handlers._delta import (
+    DeltaChunkEncoder,
+    text_checksum,
+    utf16_length,
+)
+
+
+def _events(raw: bytes) -> list[tuple[str, dict]]:
+    events = []
+    for block in raw.decode().split("\n\n"):
+        if not block:
+            continue
+        event_line, data_line = block.split("\n")
+        events.append((event_line.removeprefix("event: "), json.loads(data_line[6:])))
+    return events
+
+
+class TestDeltaChunkEncoder:
+    """Тесты для DeltaChunkEncoder"""
+
+    def test_sends_only_suffix(self):
+        """Кумулятивный текст превращается в суффиксы с последовательными seq"""
+        encoder = DeltaChunkEncoder()
+
+        first = _events(encoder.encode("Привет"))
+        second = _events(encoder.encode("Привет, мир"))
+
+        assert first == [("delta", {"seq": 1, "d": "Привет"})]
+        assert second == [("delta", {"seq": 2, "d": ", мир"})]
+
+    def test_unchanged_text_sends_nothing(self):
+        encoder = DeltaChunkEncoder()
+        encoder.encode("abc")
+
+        assert encoder.encode("abc") == b""
+
+    def test_resync_when_prefix_changes(self):
+        """Если модель переписала начало — весь текст одним resync"""
+        encoder = DeltaChunkEncoder()
+        encoder.encode("Ответ: 5")
+
+        assert _events(encoder.encode("Ответ: 6")) == [("resync", {"seq": 2, "text": "Ответ: 6"})]
+
+    def test_periodic_checksum(self):
+        """Каждые checksum_every дельт — длина (UTF-16) и CRC32 всего текста"""
+        encoder = DeltaChunkEncoder(checksum_every=2)
+        encoder.encode("a")
+        events = _events(encoder.encode("a🐼"))
+
+        assert events[1] == (
+            "checksum",
+            {"seq": 2, "len": utf16_length("a🐼"), "crc32": text_checksum("a🐼")},
+        )
+        assert utf16_length("a🐼") == 3
+
+    def test_wire_size_linear(self):
+        """Суммарный объём растёт линейно, а не квадратично"""
+        encoder = DeltaChunkEncoder()
+        text = ""
+        total = 0
+        for _ in range(500):
+            text += "слово "
+            total += len(encoder.encode(text))
+
+        assert total < len(text.encode()) * 5
@@ -0,0 +1,133 @@
+"""
+Unit тесты для агрегата user_stats: инкрементальное обновление при записи
+в историю, построение из истории и чтение статистики достижений одной строкой
+"""
+
+import os
+import tempfile
+from datetime import UTC, date, datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from bot.models import Base, ChatHistory, GameStats, User
+from bot.services.gamification_service import GamificationService
+from bot.services.history_service import ChatHistoryService
+from bot.services.user_stats_service import UserStatsService
+
+TELEGRAM_ID = 123456
+
+
+@pytest.fixture
+def db_session():
+    """SQLite с одним пользователем"""
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    engine = create_engine(f"sqlite:///{db_path}", echo=False)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(User(telegram_id=TELEGRAM_ID, username="test", first_name="Test"))
+    session.commit()
+
+    yield session
+
+    session.close()
+    engine.dispose()
+    os.close(db_fd)
+    os.unlink(db_path)
+
+
+class TestIncrementalStats:
+    """Тесты обновления агрегата при записи в историю"""
+
+    def test_exchange_updates_counters_and_subjects(self, db_session):
+        """Считаются только сообщения пользователя, предметы — битами маски"""
+        history = ChatHistoryService(db_session)
+        history.add_exchange(TELEGRAM_ID, "Реши уравнение?", "Ответ")
+        history.add_exchange(TELEGRAM_ID, "Расскажи про химию", "Ответ")
+        history.add_exchange(TELEGRAM_ID, "Ещё уравнение", "Ответ")
+        db_session.commit()
+
+        stats = GamificationService(db_session).get_user_stats(TELEGRAM_ID)
+
+        assert stats["total_messages"] == 3
+        assert stats["total_questions"] == 1
+        assert stats["unique_subjects"] == 2
+        assert stats["consecutive_days"] == 1
+
+    def test_streak_transitions(self, db_session):
+        """Тот же день — без изменений, следующий — +1, пропуск — сброс до 1"""
+        service = UserStatsService(db_session)
+        day = date(2026, 10, 1)
+        for offset in (0, 0, 1, 2, 5):
+            service.record_messages(TELEGRAM_ID, [("user", "привет")], today=day + timedelta(offset))
+            if offset == 2:
+                assert service.get(TELEGRAM_ID).current_streak == 3
+
+        row = service.get(TELEGRAM_ID)
+        assert row.current_streak == 1
+        assert row.last_active_date == day + timedelta(days=5)
+        assert row.total_messages == 5
+
+    def test_game_results(self, db_session):
+        """Победы по играм и лучший счёт 2048 (только растёт)"""
+        service = UserStatsService(db_session)
+        service.record_game(TELEGRAM_ID, "tic_tac_toe", "win")
+        service.record_game(TELEGRAM_ID, "checkers", "loss")
+        service.record_game(TELEGRAM_ID, "2048", "loss", score=512)
+        service.record_game(TELEGRAM_ID, "2048", "loss", score=256)
+
+        row = service.get(TELEGRAM_ID)
+        assert (row.total_game_wins, row.total_game_sessions) == (1, 4)
+        assert (row.tic_tac_toe_wins, row.checkers_wins) == (1, 0)
+        assert row.best_2048_score == 512
+
+
+class TestBuildFromHistory:
+    """Тесты построения агрегата из существующей истории"""
+
+    def test_lazy_build_without_double_count(self, db_session):
+        """История до появления агрегата учитывается один раз, дальше — инкременты"""
+        now = datetime.now(UTC)
+        texts = ["Задача по физике?", "Что такое атом?", "Столица Франции"]
+        for days_ago, text in enumerate(texts):
+            db_session.add(
+                ChatHistory(
+                    user_telegram_id=TELEGRAM_ID,
+                    message_text=text,
+                    message_type="user",
+                    timestamp=now - timedelta(days=days_ago),
+                )
+            )
+        db_session.add(
+            GameStats(user_telegram_id=TELEGRAM_ID, game_type="checkers", total_games=3, wins=2)
+        )
+        db_session.commit()
+
+        ChatHistoryService(db_session).add_exchange(TELEGRAM_ID, "Ещё вопрос?", "Ответ")
+        db_session.commit()
+        stats = GamificationService(db_session).get_user_stats(TELEGRAM_ID)
+
+        assert stats["total_messages"] == 4
+        assert stats["total_questions"] == 3
+        assert stats["unique_subjects"] == 3
+        assert stats["consecutive_days"] == 3
+        assert stats["checkers_wins"] == 2
+
+    def test_stats_read_only_aggregate_row(self, db_session):
+        """Проверка достижений не обращается к chat_history"""
+        history = ChatHistoryService(db_session)
+        history.add_exchange(TELEGRAM_ID, "Привет", "Привет!")
+        db_session.commit()
+
+        statements = []
+        engine = db_session.get_bind()
+        listener = lambda conn, cursor, stmt, *args: statements.append(stmt)  # noqa: E731
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            unlocked = GamificationService(db_session).check_and_unlock_achievements(TELEGRAM_ID)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+        assert "first_step" in unlocked
+        assert not [s for s in statements if "chat_history" in s]
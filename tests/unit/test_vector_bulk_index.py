@@ -0,0 +1,94 @@
+"""
+Unit тесты для пакетной индексации VectorSearchService.index_many
+
+"""
+
+import hashlib
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from bot.services.rag.vector_search import VectorSearchService, _content_source_hash
+from bot.services.web_scraper import EducationalContent
+
+
+def _content(title: str, url: str = "https://example.com", text: str = "текст") -> EducationalContent:
+    return EducationalContent(
+        title=title,
+        content=text,
+        subject="математика",
+        difficulty="средний",
+        source_url=url,
+        extracted_at=datetime.now(),
+        tags=[],
+    )
+
+
+def _service(embed_document) -> VectorSearchService:
+    """VectorSearchService с подменённым EmbeddingService."""
+    svc = MagicMock()
+    svc.embed_document = embed_document
+    service = VectorSearchService()
+    service._embedding_service = svc
+    return service
+
+
+class TestIndexMany:
+    """Тесты для index_many"""
+
+    async def test_dedup_before_embedding(self):
+        """Повторы и неизменённые материалы не доходят до Embeddings API"""
+        embed = AsyncMock(return_value=[0.1, 0.2])
+        service = _service(embed)
+        unchanged = _content("Дроби", text="старый")
+        items = [_content("Умножение"), _content("Умножение"), unchanged]
+        existing = {
+            _content_source_hash(unchanged.title, unchanged.source_url): hashlib.md5(
+                unchanged.content.encode()
+            ).hexdigest()
+        }
+
+        with (
+            patch.object(service, "_existing_content_digests", return_value=existing),
+            patch.object(service, "_write_rows", side_effect=len) as write_rows,
+        ):
+            stats = await service.index_many(items)
+
+        assert embed.await_count == 1
+        assert stats.total == 3
+        assert stats.duplicates == 1
+        assert stats.unchanged == 1
+        assert stats.written == 1
+        write_rows.assert_called_once()
+
+    async def test_batches_and_progress(self):
+        """Строки пишутся пачками по batch_size, прогресс доходит до конца"""
+        service = _service(AsyncMock(return_value=[1.0]))
+        items = [_content(f"Тема {i}") for i in range(5)]
+        progress = MagicMock()
+
+        with (
+            patch.object(service, "_existing_content_digests", return_value={}),
+            patch.object(service, "_write_rows", side_effect=len) as write_rows,
+        ):
+            stats = await service.index_many(items, batch_size=2, progress=progress)
+
+        assert [len(call.args[0]) for call in write_rows.call_args_list] == [2, 2, 1]
+        assert stats.written == 5
+        progress.assert_called_with(5, 5)
+
+    async def test_retry_then_fail(self):
+        """Эмбеддинг повторяется с задержкой, после всех попыток материал — в failed"""
+        embed = AsyncMock(side_effect=RuntimeError("429"))
+        service = _service(embed)
+
+        with (
+            patch.object(service, "_existing_content_digests", return_value={}),
+            patch.object(service, "_write_rows", side_effect=len),
+            patch("bot.services.rag.vector_search.asyncio.sleep", new=AsyncMock()) as sleep,
+        ):
+            stats = await service.index_many([_content("Тема")], max_retries=3)
+
+        assert embed.await_count == 3
+        assert sleep.await_count == 2
+        assert stats.failed == 1
+        assert stats.written == 0
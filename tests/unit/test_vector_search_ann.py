@@ -0,0 +1,69 @@
+"""
+Unit тесты для параметров ANN-поиска pgvector (hnsw.ef_search, ivfflat.probes)
+
+"""
+
+from contextlib import contextmanager
+from unittest.mock import MagicMock, patch
+
+from bot.services.rag.vector_search import VectorSearchService, apply_ann_search_params
+
+
+def _executed_sql(db: MagicMock) -> list[str]:
+    return [str(call.args[0]) for call in db.execute.call_args_list]
+
+
+class TestAnnSearchParams:
+    """Тесты для apply_ann_search_params и запроса search"""
+
+    def test_defaults_from_settings(self):
+        """Без аргументов значения берутся из settings"""
+        db = MagicMock()
+        with patch("bot.services.rag.vector_search.settings") as settings:
+            settings.vector_hnsw_ef_search = 64
+            settings.vector_ivfflat_probes = 7
+            apply_ann_search_params(db)
+
+        assert _executed_sql(db) == [
+            "SET LOCAL hnsw.ef_search = 64",
+            "SET LOCAL ivfflat.probes = 7",
+        ]
+
+    def test_per_query_override(self):
+        """ef_search запроса перекрывает значение из settings"""
+        db = MagicMock()
+        apply_ann_search_params(db, ef_search=200, probes=3)
+
+        assert "SET LOCAL hnsw.ef_search = 200" in _executed_sql(db)
+
+    def test_failed_set_keeps_transaction(self, tmp_path):
+        """Неподдерживаемый SET откатывает только savepoint, транзакция продолжается"""
+        from sqlalchemy import create_engine, text
+        from sqlalchemy.orm import Session
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'ann.db'}")
+        with Session(engine) as db:
+            db.execute(text("CREATE TABLE t (x INTEGER)"))
+            db.execute(text("INSERT INTO t VALUES (1)"))
+            apply_ann_search_params(db)
+
+            assert db.execute(text("SELECT count(*) FROM t")).scalar() == 1
+        engine.dispose()
+
+    async def test_search_threshold_outside_knn(self):
+        """Порог сходства проверяется снаружи ORDER BY ... LIMIT"""
+        db = MagicMock()
+        db.execute.return_value.fetchall.return_value = []
+
+        @contextmanager
+        def fake_db():
+            yield db
+
+        service = VectorSearchService()
+        with patch("bot.services.rag.vector_search.get_db", fake_db):
+            await service.search("дроби", embedding=[0.1, 0.2], ef_search=100)
+
+        statements = _executed_sql(db)
+        assert statements[0] == "SET LOCAL hnsw.ef_search = 100"
+        knn = statements[-1]
+        assert knn.index("LIMIT :limit") < knn.index("WHERE 1 - dist >= :th")
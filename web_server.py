@@ -60,6 +60,7 @@ class PandaPalBotServer:
         self.site: web.TCPSite | None = None
         self.settings = settings
         self._shutdown_in_progress = False
+        self._render_warmup_task: asyncio.Task | None = None
 
         # Создаем приложение и добавляем ВСЕ роуты сразу (до запуска сервера)
         try:
@@ -175,6 +176,8 @@ class PandaPalBotServer:
 
         # Создаем приложение с увеличенным лимитом для больших запросов (фото, аудио)
         # По умолчанию aiohttp ~1MB. Фото base64 ~1.33× размера; 25MB даёт запас для крупных снимков.
+        # Лимит нужен только JSON-режиму: multipart (бинарные фото/аудио) читается потоково
+        # со своими лимитами частей (bot.api.miniapp.media_upload).
         self.app = web.Application(
             client_max_size=25 * 1024 * 1024,  # 25MB для медиа (фото, аудио)
         )
@@ -373,6 +376,21 @@ class PandaPalBotServer:
             await self.engagement_service.start()
             logger.info("⏰ SimpleEngagementService запущен")
 
+        # Прогрев пула рендера визуализаций (matplotlib импортируется в воркерах заранее)
+        try:
+            from bot.services.visualization.render_pool import get_render_executor
+
+            render_executor = get_render_executor()
+            await render_executor.start()
+            logger.info("🎨 Пул рендера визуализаций запущен")
+            if self.settings.visualization_render_warmup_top_n:
+                # В фоне: наполнение кэша PNG не задерживает готовность сервера
+                self._render_warmup_task = asyncio.create_task(
+                    render_executor.warm_up(self.settings.visualization_render_warmup_top_n)
+                )
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось прогреть пул рендера визуализаций: {e}")
+
         # Настройка webhook основного бота
         webhook_url = await self.setup_webhook()
 
@@ -423,6 +441,40 @@ class PandaPalBotServer:
                 except Exception as e:
                     logger.warning(f"⚠️ Ошибка остановки SimpleEngagementService: {e}")
 
+            # Останавливаем прогрев кэша визуализаций до пула, иначе он пересоздаст пул
+            warmup_task, self._render_warmup_task = self._render_warmup_task, None
+            if warmup_task is not None:
+                warmup_task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await warmup_task
+
+            # Останавливаем пул рендера визуализаций
+            try:
+                from bot.services.visualization.render_pool import get_render_executor
+
+                get_render_executor().shutdown()
+                logger.info("✅ Пул рендера визуализаций остановлен")
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка остановки пула рендера визуализаций: {e}")
+
+            # Сбрасываем в БД счётчики лимитов, накопленные после последнего flush
+            try:
+                from bot.services.request_quota import get_request_quota
+
+                await get_request_quota().flush()
+                logger.info("✅ Счётчики лимитов AI запросов сохранены")
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка сохранения счётчиков лимитов: {e}")
+
+            # Закрываем соединения async-пула БД
+            try:
+                from bot.database import dispose_async_engine
+
+                await dispose_async_engine()
+                logger.info("✅ Async-пул БД закрыт")
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка закрытия async-пула БД: {e}")
+
             # Удаляем webhook (опционально, для чистоты)
             if self.bot:
                 try:
@@ -473,6 +525,24 @@ class PandaPalBotServer:
             # Keep-alive пинг в фоне (для Railway Free)
             keep_alive_task = asyncio.create_task(self._keep_alive_ping(port))
 
+            # Фоновая очистка устаревших записей семантического кэша (вне пути записи)
+            from bot.services.knowledge_service import get_knowledge_service
+
+            cache_eviction_task = asyncio.create_task(
+                get_knowledge_service().semantic_cache.run_eviction_loop(
+                    self.settings.semantic_cache_eviction_interval_seconds
+                )
+            )
+
+            # Write-behind счётчиков лимитов AI запросов в daily_request_counts
+            from bot.services.request_quota import get_request_quota
+
+            quota_flush_task = asyncio.create_task(
+                get_request_quota().run_flush_loop(
+                    self.settings.request_quota_flush_interval_seconds
+                )
+            )
+
             # Event для graceful shutdown
             shutdown_event = asyncio.Event()
 
@@ -500,8 +570,14 @@ class PandaPalBotServer:
                 logger.info("🛑 Получен KeyboardInterrupt, останавливаем сервер...")
             finally:
                 keep_alive_task.cancel()
+                cache_eviction_task.cancel()
+                quota_flush_task.cancel()
                 with contextlib.suppress(asyncio.CancelledError):
                     await keep_alive_task
+                with contextlib.suppress(asyncio.CancelledError):
+                    await cache_eviction_task
+                with contextlib.suppress(asyncio.CancelledError):
+                    await quota_flush_task
 
         except Exception as e:
             logger.error(f"❌ Ошибка запуска веб-сервера: {e}")